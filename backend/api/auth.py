@@ -2,25 +2,33 @@
 Multi-tenant authentication endpoints
 Login, School selection, Token management
 """
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import authenticate
+from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q
 
+from backend.users.auth import AuthService
 from backend.users.models import User
 from backend.core.models import School
+from backend.core.sharding import DIRECTORY
+from backend.core.tenant_context import get_tenant, school_cache
 from backend.api.serializers import UserSerializer
 
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def school_login(request):
+async def school_login(request):
     """
     Tenant-aware login endpoint
     
+    A plain async Django view rather than a DRF one: under ASGI it waits
+    for the password hash (on AuthService's hashing pool) on the event
+    loop instead of holding a thread, so a staff room logging in at once
+    costs a bounded pool of hashing threads rather than one per login.
+    
     Request:
     {
         "school_code": "MUNTECH001",
@@ -36,49 +44,56 @@ def school_login(request):
         "user": {...}
     }
     """
-    school_code = request.data.get('school_code')
-    username = request.data.get('username')
-    password = request.data.get('password')
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    try:
+        data = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+    except ValueError:
+        return JsonResponse({'detail': 'JSON parse error'}, status=status.HTTP_400_BAD_REQUEST)
+    school_code = data.get('school_code')
+    username = data.get('username')
+    password = data.get('password')
 
     if not all([school_code, username, password]):
-        return Response(
+        return JsonResponse(
             {'error': 'school_code, username, and password required'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    try:
-        school = School.objects.get(code=school_code)
-    except School.DoesNotExist:
-        return Response(
+    school = school_cache().cached_by_code(school_code)
+    if school is None:
+        school = await sync_to_async(school_cache().get_by_code)(school_code)
+    if school is None:
+        return JsonResponse(
             {'error': f'School "{school_code}" not found'},
             status=status.HTTP_404_NOT_FOUND
         )
 
     # Authenticate user
-    user = authenticate(username=username, password=password)
+    user = await AuthService.alogin_user(username, password)
     
     if not user:
-        return Response(
+        return JsonResponse(
             {'error': 'Invalid username or password'},
             status=status.HTTP_401_UNAUTHORIZED
         )
 
     # Check if user belongs to this school
-    if user.school and user.school != school:
-        return Response(
+    if user.school_id and user.school_id != school.id:
+        return JsonResponse(
             {'error': 'This user does not belong to the selected school'},
             status=status.HTTP_403_FORBIDDEN
         )
 
     # If user has no school assigned, assign it now
-    if not user.school:
+    if not user.school_id:
         user.school = school
-        user.save()
+        await user.asave()
 
-    # Generate tokens
-    refresh = RefreshToken.for_user(user)
+    # Generate tokens carrying the user's school and role claims
+    refresh = await sync_to_async(AuthService.create_token)(user)
 
-    return Response({
+    return JsonResponse({
         'access': str(refresh.access_token),
         'refresh': str(refresh),
         'school': {
@@ -95,6 +110,10 @@ def school_login(request):
     }, status=status.HTTP_200_OK)
 
 
+# Token login; csrf_exempt() in Django 4.2 would turn the view synchronous
+school_login.csrf_exempt = True
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_schools(request):
@@ -102,10 +121,11 @@ def get_schools(request):
     Get available schools for the authenticated user.
     Superusers see all schools, regular users see only their school.
     """
-    if request.user.is_superuser:
+    tenant = get_tenant(request)
+    if tenant.is_superuser:
         schools = School.objects.all()
-    elif request.user.school:
-        schools = School.objects.filter(id=request.user.school_id)
+    elif tenant.school_id:
+        schools = School.objects.filter(id=tenant.school_id)
     else:
         schools = School.objects.none()
 
@@ -128,6 +148,8 @@ def get_schools(request):
 def switch_school(request):
     """
     Switch active school for superuser/admin.
+    The school is a token claim, so the response carries new tokens and
+    the ones issued before are revoked.
     
     Request:
     {
@@ -148,19 +170,24 @@ def switch_school(request):
         )
 
     try:
-        school = School.objects.get(id=school_id)
+        # The caller's shard only has copies of its own schools
+        school = School.objects.using(DIRECTORY).get(id=school_id)
     except School.DoesNotExist:
         return Response(
             {'error': 'School not found'},
             status=status.HTTP_404_NOT_FOUND
         )
 
-    # Update user's school
-    request.user.school = school
-    request.user.save()
+    # Update user's school (request.user is built from claims, not loaded)
+    user = User.objects.get(pk=request.user.pk)
+    user.school = school
+    user.save()
+    refresh = AuthService.create_token(user)
 
     return Response({
         'success': True,
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
         'school': {
             'id': school.id,
             'name': school.name,
@@ -188,13 +215,13 @@ def current_school(request):
     """
     Get current user's school context
     """
-    if not request.user.school:
+    school = get_tenant(request).school
+    if not school:
         return Response(
             {'error': 'User not assigned to any school'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    school = request.user.school
     return Response({
         'id': school.id,
         'name': school.name,
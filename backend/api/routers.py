@@ -9,8 +9,10 @@ from backend.attendance.api import (
     AttendanceViewSet,
     AttendanceSessionViewSet,
     AttendanceExceptionViewSet,
-    AttendanceReportViewSet
+    AttendanceReportViewSet,
+    AbsenteeismFlagViewSet
 )
+from backend.sync.api import SyncViewSet
 from backend.api import auth as auth_views
 
 
@@ -29,6 +31,8 @@ router.register(r'attendance/records', AttendanceViewSet, basename='attendance-r
 router.register(r'attendance/sessions', AttendanceSessionViewSet, basename='attendance-session')
 router.register(r'attendance/exceptions', AttendanceExceptionViewSet, basename='attendance-exception')
 router.register(r'attendance/reports', AttendanceReportViewSet, basename='attendance-report')
+router.register(r'attendance/absenteeism-flags', AbsenteeismFlagViewSet, basename='absenteeism-flag')
+router.register(r'sync', SyncViewSet, basename='sync')
 
 urlpatterns = [
     path('health/', health_check, name='health-check'),
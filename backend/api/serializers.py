@@ -2,7 +2,7 @@
 DRF Serializers - Phase 1
 """
 from rest_framework import serializers
-from backend.attendance.models import Attendance, AttendanceSession, AttendanceException
+from backend.attendance.models import Attendance, AttendanceSession, AttendanceException, AbsenteeismFlag
 from backend.people.models import Student, Teacher
 from backend.core.models import Class
 from backend.users.models import User
@@ -71,7 +71,7 @@ class AttendanceSessionSerializer(serializers.ModelSerializer):
     teacher = TeacherBasicSerializer(read_only=True)
     teacher_id = serializers.IntegerField(write_only=True, required=False, allow_null=True)
     klass = ClassBasicSerializer(read_only=True)
-    class_id = serializers.IntegerField(write_only=True)
+    class_id = serializers.IntegerField(source='klass_id', write_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     
     class Meta:
@@ -93,6 +93,8 @@ class AttendanceSessionDetailedSerializer(serializers.ModelSerializer):
     total_students = serializers.IntegerField(read_only=True)
     present_count = serializers.IntegerField(read_only=True)
     absent_count = serializers.IntegerField(read_only=True)
+    late_count = serializers.IntegerField(read_only=True)
+    excused_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = AttendanceSession
@@ -100,6 +102,7 @@ class AttendanceSessionDetailedSerializer(serializers.ModelSerializer):
             'id', 'school', 'klass', 'term', 'date', 'subject', 'teacher',
             'status', 'status_display', 'opened_at', 'closed_at', 'synced_at',
             'total_students', 'present_count', 'absent_count',
+            'late_count', 'excused_count',
             'attendances', 'synced'
         ]
         read_only_fields = ['opened_at', 'closed_at', 'synced_at', 'id']
@@ -120,6 +123,25 @@ class AttendanceExceptionSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'id']
 
 
+class AbsenteeismFlagSerializer(serializers.ModelSerializer):
+    """Chronic-absenteeism flag serializer (read only)"""
+    student = StudentBasicSerializer(read_only=True)
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+    rate = serializers.FloatField(source='student.absenteeism_state.rate', read_only=True, default=None)
+    consecutive_absences = serializers.IntegerField(
+        source='student.absenteeism_state.consecutive_absences', read_only=True, default=None
+    )
+    
+    class Meta:
+        model = AbsenteeismFlag
+        fields = [
+            'id', 'student', 'kind', 'kind_display', 'value', 'threshold',
+            'window_days', 'flagged_on', 'resolved_on', 'is_open',
+            'rate', 'consecutive_absences'
+        ]
+        read_only_fields = fields
+
+
 class BulkAttendanceSerializer(serializers.Serializer):
     """Serializer for bulk attendance marking"""
     session_id = serializers.IntegerField()
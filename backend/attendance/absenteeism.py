@@ -0,0 +1,217 @@
+"""
+Chronic-absenteeism detection over sliding windows
+Incremental: each run only recomputes students whose attendance changed
+since the previous run's watermark, plus students with open flags.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from backend.attendance.models import (
+    Attendance, AbsenteeismState, AbsenteeismFlag, AbsenteeismRun
+)
+from backend.core.sharding import shard_atomic
+
+DEFAULTS = {
+    'WINDOW_DAYS': 30,           # calendar days in the rolling window
+    'RATE_THRESHOLD': 90.0,      # flag when present-day rate falls below this %
+    'CONSECUTIVE_ABSENCES': 3,   # flag after this many absent school days in a row
+    'MIN_DAYS': 5,               # recorded days needed before a rate flag is raised
+    'BATCH_SIZE': 5000,          # students recomputed per query
+}
+
+
+def absenteeism_settings():
+    return {**DEFAULTS, **getattr(settings, 'ATTENDANCE_ABSENTEEISM', {})}
+
+
+class AbsenteeismEngine:
+    """Maintains AbsenteeismState per student and raises/resolves flags
+    
+    A student's day is present if any session that day was P or L,
+    excused if none was and any was E, and absent otherwise. Excused days
+    neither count towards the rate nor break an absence streak.
+    """
+    
+    STATE_FIELDS = [
+        'school', 'window_start', 'window_end', 'days_recorded', 'days_present',
+        'days_absent', 'days_excused', 'rate', 'consecutive_absences',
+        'last_attendance_date', 'computed_at',
+    ]
+    
+    def __init__(self, **overrides):
+        config = absenteeism_settings()
+        config.update({k.upper(): v for k, v in overrides.items() if v is not None})
+        self.window_days = config['WINDOW_DAYS']
+        self.rate_threshold = config['RATE_THRESHOLD']
+        self.consecutive_threshold = config['CONSECUTIVE_ABSENCES']
+        self.min_days = config['MIN_DAYS']
+        self.batch_size = config['BATCH_SIZE']
+    
+    def run(self, as_of=None, full=False):
+        """Process changed students and return the AbsenteeismRun record"""
+        as_of = as_of or timezone.now().date()
+        watermark = timezone.now()
+        previous = AbsenteeismRun.objects.filter(finished_at__isnull=False).order_by('-watermark').first()
+        
+        run = AbsenteeismRun.objects.create(
+            watermark=watermark, as_of=as_of, full=full or previous is None
+        )
+        
+        changed = Attendance.objects.filter(updated_at__lte=watermark)
+        if not run.full:
+            changed = changed.filter(updated_at__gt=previous.watermark)
+        student_ids = set(changed.order_by().values_list('student_id', flat=True).distinct())
+        # Windows slide even without new records, so open flags are rechecked
+        student_ids.update(
+            AbsenteeismFlag.objects.filter(resolved_on__isnull=True).values_list('student_id', flat=True)
+        )
+        
+        ordered = sorted(student_ids)
+        for start in range(0, len(ordered), self.batch_size):
+            raised, resolved = self.process(ordered[start:start + self.batch_size], as_of)
+            run.flags_raised += raised
+            run.flags_resolved += resolved
+        
+        run.students_processed = len(ordered)
+        run.finished_at = timezone.now()
+        run.save()
+        return run
+    
+    PRESENT_STATUSES = ['P', 'L']
+    RECORDED_STATUSES = ['P', 'L', 'E']
+    
+    def window_totals(self, student_ids, window_start, as_of):
+        """One row of distinct-day counts per student
+        
+        A day counts as present if any session that day was P/L, so
+        excused days are days with an E but no P/L and absent days are
+        the rest.
+        """
+        present = Q(status__in=self.PRESENT_STATUSES)
+        return (
+            Attendance.objects.filter(
+                student_id__in=student_ids,
+                session__date__gte=window_start,
+                session__date__lte=as_of,
+            )
+            .values('student_id')
+            .annotate(
+                school=Max('school_id'),
+                days=Count('session__date', distinct=True),
+                present=Count('session__date', filter=present, distinct=True),
+                recorded=Count('session__date', filter=Q(status__in=self.RECORDED_STATUSES), distinct=True),
+                last_present=Max('session__date', filter=present),
+                last_date=Max('session__date'),
+            )
+            .order_by()
+        )
+    
+    def trailing_absences(self, last_present_by_student, window_start, as_of):
+        """Absent days after each student's last present day
+        
+        Only students whose window ends without a present day are passed in,
+        so this reads a handful of rows per student.
+        """
+        rows = (
+            Attendance.objects.filter(
+                student_id__in=list(last_present_by_student),
+                session__date__gte=window_start,
+                session__date__lte=as_of,
+            )
+            .values('student_id', 'session__date')
+            .annotate(excused=Count('id', filter=Q(status='E')))
+            .order_by()
+            .values_list('student_id', 'session__date', 'excused')
+        )
+        streaks = dict.fromkeys(last_present_by_student, 0)
+        for student_id, date, excused in rows:
+            last_present = last_present_by_student[student_id]
+            if not excused and (last_present is None or date > last_present):
+                streaks[student_id] += 1
+        return streaks
+    
+    def build_states(self, student_ids, as_of):
+        """AbsenteeismState per student id, None for students with no records in the window"""
+        window_start = as_of - timedelta(days=self.window_days - 1)
+        now = timezone.now()
+        states = dict.fromkeys(student_ids)
+        trailing = {}
+        for row in self.window_totals(student_ids, window_start, as_of):
+            counted = row['days'] - (row['recorded'] - row['present'])
+            states[row['student_id']] = AbsenteeismState(
+                student_id=row['student_id'],
+                school_id=row['school'],
+                window_start=window_start,
+                window_end=as_of,
+                days_recorded=row['days'],
+                days_present=row['present'],
+                days_absent=row['days'] - row['recorded'],
+                days_excused=row['recorded'] - row['present'],
+                rate=(row['present'] / counted * 100) if counted else 100.0,
+                last_attendance_date=row['last_date'],
+                computed_at=now,
+            )
+            if row['last_present'] != row['last_date']:
+                trailing[row['student_id']] = row['last_present']
+        
+        if trailing:
+            for student_id, streak in self.trailing_absences(trailing, window_start, as_of).items():
+                states[student_id].consecutive_absences = streak
+        return states
+    
+    def breaches(self, state):
+        """Dict of flag kind -> (value, threshold) the state crosses"""
+        if state is None:
+            return {}
+        found = {}
+        if state.days_present + state.days_absent >= self.min_days and state.rate < self.rate_threshold:
+            found[AbsenteeismFlag.LOW_RATE] = (state.rate, self.rate_threshold)
+        if state.consecutive_absences >= self.consecutive_threshold:
+            found[AbsenteeismFlag.CONSECUTIVE] = (state.consecutive_absences, self.consecutive_threshold)
+        return found
+    
+    def process(self, student_ids, as_of):
+        """Recompute one batch of students; returns (raised, resolved) counts"""
+        states = self.build_states(student_ids, as_of)
+        live_states = [state for state in states.values() if state is not None]
+        
+        with shard_atomic():
+            AbsenteeismState.objects.filter(student_id__in=[sid for sid, st in states.items() if st is None]).delete()
+            AbsenteeismState.objects.bulk_create(
+                live_states,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['student'],
+                update_fields=self.STATE_FIELDS,
+            )
+            
+            open_flags = {
+                (flag.student_id, flag.kind): flag
+                for flag in AbsenteeismFlag.objects.filter(
+                    student_id__in=student_ids, resolved_on__isnull=True
+                ).only('id', 'student_id', 'kind')
+            }
+            
+            new_flags = []
+            still_open = set()
+            for student_id, state in states.items():
+                for kind, (value, threshold) in self.breaches(state).items():
+                    still_open.add((student_id, kind))
+                    if (student_id, kind) not in open_flags:
+                        new_flags.append(AbsenteeismFlag(
+                            school_id=state.school_id, student_id=student_id, kind=kind,
+                            value=value, threshold=threshold, window_days=self.window_days,
+                            flagged_on=as_of,
+                        ))
+            
+            resolved_ids = [flag.id for key, flag in open_flags.items() if key not in still_open]
+            AbsenteeismFlag.objects.bulk_create(new_flags, batch_size=1000)
+            if resolved_ids:
+                AbsenteeismFlag.objects.filter(id__in=resolved_ids).update(
+                    resolved_on=as_of, updated_at=timezone.now()
+                )
+        
+        return len(new_flags), len(resolved_ids)
@@ -3,8 +3,10 @@ Django admin configuration for attendance app - Phase 1
 """
 from django.contrib import admin
 from django.utils.html import format_html
-from django.db.models import Count
-from backend.attendance.models import AttendanceSession, Attendance, AttendanceException
+from backend.attendance.models import (
+    AttendanceSession, Attendance, AttendanceException, DailyAttendanceRollup,
+    AbsenteeismFlag, AbsenteeismRun
+)
 
 
 @admin.register(AttendanceSession)
@@ -12,8 +14,12 @@ class AttendanceSessionAdmin(admin.ModelAdmin):
     list_display = ['formatted_session', 'klass', 'date', 'teacher', 'status', 'attendance_summary', 'synced_badge']
     search_fields = ['klass__name', 'date', 'teacher__person__first_name']
     list_filter = ['status', 'date', 'school', 'synced']
+    list_select_related = ['klass__school', 'teacher__person']
     ordering = ['-date']
-    readonly_fields = ['opened_at', 'closed_at', 'synced_at', 'updated_at', 'attendance_summary_detailed']
+    readonly_fields = [
+        'opened_at', 'closed_at', 'synced_at', 'updated_at', 'attendance_summary_detailed',
+        'count_present', 'count_absent', 'count_late', 'count_excused',
+    ]
     
     fieldsets = (
         ('Session Info', {
@@ -56,8 +62,11 @@ class AttendanceSessionAdmin(admin.ModelAdmin):
     synced_badge.short_description = 'Sync Status'
     
     def attendance_summary_detailed(self, obj):
-        counts = obj.attendances.values('status').annotate(count=Count('id')).order_by('status')
-        summary = "\n".join([f"{item['status']}: {item['count']}" for item in counts])
+        summary = "\n".join(
+            f"{status}: {obj.get_attendance_count(status)}"
+            for status in AttendanceSession.COUNTER_FIELDS
+            if obj.get_attendance_count(status)
+        )
         return summary or "No records yet"
     attendance_summary_detailed.short_description = 'Attendance Summary'
 
@@ -133,3 +142,47 @@ class AttendanceExceptionAdmin(admin.ModelAdmin):
     def date_range(self, obj):
         return f"{obj.start_date} to {obj.end_date}"
     date_range.short_description = 'Period'
+
+
+@admin.register(DailyAttendanceRollup)
+class DailyAttendanceRollupAdmin(admin.ModelAdmin):
+    list_display = ['klass', 'date', 'term', 'count_present', 'count_absent', 'count_late', 'count_excused']
+    list_filter = ['school', 'date']
+    list_select_related = ['klass__school', 'term__school']
+    ordering = ['-date']
+    readonly_fields = [
+        'school', 'klass', 'date', 'term',
+        'count_present', 'count_absent', 'count_late', 'count_excused', 'updated_at',
+    ]
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(AbsenteeismFlag)
+class AbsenteeismFlagAdmin(admin.ModelAdmin):
+    list_display = ['student', 'kind', 'value', 'threshold', 'flagged_on', 'resolved_on']
+    search_fields = ['student__person__first_name', 'student__person__last_name', 'student__admission_number']
+    list_filter = ['kind', 'school', 'flagged_on', 'resolved_on']
+    list_select_related = ['student__person']
+    ordering = ['-flagged_on']
+    readonly_fields = [
+        'school', 'student', 'kind', 'value', 'threshold', 'window_days',
+        'flagged_on', 'resolved_on', 'created_at', 'updated_at',
+    ]
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(AbsenteeismRun)
+class AbsenteeismRunAdmin(admin.ModelAdmin):
+    list_display = ['started_at', 'finished_at', 'as_of', 'full', 'students_processed', 'flags_raised', 'flags_resolved']
+    ordering = ['-started_at']
+    readonly_fields = [
+        'started_at', 'finished_at', 'watermark', 'as_of', 'full',
+        'students_processed', 'flags_raised', 'flags_resolved',
+    ]
+    
+    def has_add_permission(self, request):
+        return False
@@ -5,27 +5,35 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
 from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Q
 
-from backend.attendance.models import Attendance, AttendanceSession, AttendanceException
+from backend.attendance.models import Attendance, AttendanceSession, AttendanceException, AbsenteeismFlag
+from backend.people.models import Teacher
 from backend.api.serializers import (
     AttendanceSerializer, AttendanceDetailedSerializer,
     AttendanceSessionSerializer, AttendanceSessionDetailedSerializer,
     AttendanceExceptionSerializer, AttendanceSyncSerializer,
-    AttendanceReportSerializer, BulkAttendanceSerializer
+    AttendanceReportSerializer, BulkAttendanceSerializer, AbsenteeismFlagSerializer
 )
-from backend.attendance.services import AttendanceEngine, AttendanceService, SyncService
+from backend.attendance.services import AttendanceEngine, AttendanceService, SyncService, BulkMarkingEngine
+from backend.attendance.exports import EXPORT_FORMATS, streaming_report_response
+from backend.sync.admission import AdmissionControlMixin
+from backend.sync.devices import DeviceRegistry
+from backend.sync.parsers import ColumnarAttendanceParser
+from backend.core.tenant_context import get_tenant
 from backend.core.tenant_permissions import TenantIsolationMixin, IsTenantMember, IsTeacherOfSchool
-from backend.core.permissions import IsTeacher, IsSchoolAdmin
+from backend.core.permissions import IsTeacher, IsSchoolAdmin, requires
 
 
-class AttendanceViewSet(TenantIsolationMixin, viewsets.ModelViewSet):
+class AttendanceViewSet(AdmissionControlMixin, TenantIsolationMixin, viewsets.ModelViewSet):
     """Attendance record endpoints - Tenant isolated"""
-    queryset = Attendance.objects.select_related('session__school', 'student', 'session', 'marked_by')
+    queryset = Attendance.objects.select_related('session__school', 'student__person', 'marked_by__person')
     serializer_class = AttendanceSerializer
     permission_classes = [IsAuthenticated, IsTenantMember]
+    admission_actions = ('sync_batch',)
     
     def get_serializer_class(self):
         if self.action in ['retrieve']:
@@ -34,13 +42,13 @@ class AttendanceViewSet(TenantIsolationMixin, viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter by user's school - tenant isolation"""
-        user = self.request.user
+        tenant = get_tenant(self.request)
         
         qs = super().get_queryset()  # Already filtered by TenantIsolationMixin
         
         # Additional filter by student if student user
-        if hasattr(user, 'person') and hasattr(user.person, 'student'):
-            qs = qs.filter(student=user.person.student)
+        if tenant.is_student:
+            qs = qs.filter(student_id=tenant.student_id)
         
         return qs
     
@@ -64,58 +72,63 @@ class AttendanceViewSet(TenantIsolationMixin, viewsets.ModelViewSet):
         SyncService.mark_records_synced(record_ids)
         return Response({'success': True, 'synced_count': len(record_ids)})
     
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsTenantMember, IsTeacherOfSchool],
+            parser_classes=api_settings.DEFAULT_PARSER_CLASSES + [ColumnarAttendanceParser])
     def sync_batch(self, request):
-        """Sync batch of attendance records from client"""
-        records = request.data.get('records', [])
-        session_id = request.data.get('session_id')
+        """Ingest offline attendance for one or many sessions
+        
+        Request:
+        {
+            "sessions": [
+                {"session_id": 12, "records": [{"student_id": 1, "status": "P"}]},
+                {"class_id": 3, "date": "2026-05-04", "subject_id": null, "records": [...]}
+            ]
+        }
+        
+        The single-session form {"session_id": 12, "records": [...]} is still
+        accepted. Clients on metered data can instead send the columnar
+        encoding in backend.sync.wire with its Content-Type, optionally
+        gzip- or zstd-framed. Totals are returned alongside per-session results.
+        """
+        sessions = request.data.get('sessions')
+        if sessions is None and request.data.get('session_id'):
+            sessions = [{
+                'session_id': request.data.get('session_id'),
+                'records': request.data.get('records', []),
+            }]
         
-        if not session_id or not records:
+        if not sessions or not isinstance(sessions, list):
             return Response(
-                {'error': 'session_id and records required'},
+                {'error': 'sessions (or session_id and records) required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            session = AttendanceSession.objects.get(id=session_id)
-        except AttendanceSession.DoesNotExist:
-            return Response(
-                {'error': 'Session not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        tenant = get_tenant(request)
+        school = None if tenant.is_superuser else tenant.school
+        marked_by = Teacher.objects.get(pk=tenant.teacher_id) if tenant.is_teacher else None
         
-        created = 0
-        updated = 0
-        errors = []
+        results = SyncService.ingest(sessions, school=school, marked_by=marked_by)
+        DeviceRegistry.record_push(request)
         
-        for record in records:
-            try:
-                attendance, is_created = AttendanceEngine.mark_attendance(
-                    session=session,
-                    student_id=record.get('student_id'),
-                    status=record.get('status'),
-                    remarks=record.get('remarks', ''),
-                    marked_by_id=record.get('marked_by_id')
-                )
-                if is_created:
-                    created += 1
-                else:
-                    updated += 1
-            except Exception as e:
-                errors.append({'student_id': record.get('student_id'), 'error': str(e)})
+        errors = []
+        for result in results:
+            if result.get('error'):
+                errors.append({'session_id': result['session_id'], 'local_id': result['local_id'], 'error': result['error']})
+            errors.extend(dict(e, session_id=result['session_id']) for e in result['errors'])
         
         return Response({
-            'created': created,
-            'updated': updated,
-            'errors': errors
+            'created': sum(r['created'] for r in results),
+            'updated': sum(r['updated'] for r in results),
+            'errors': errors,
+            'sessions': results,
         })
 
 
 class AttendanceSessionViewSet(TenantIsolationMixin, viewsets.ModelViewSet):
     """Attendance session management - Tenant isolated"""
     queryset = AttendanceSession.objects.select_related(
-        'school', 'klass', 'term', 'subject', 'teacher'
-    ).prefetch_related('attendances')
+        'school', 'klass', 'term', 'subject', 'teacher__person'
+    )
     serializer_class = AttendanceSessionSerializer
     permission_classes = [IsAuthenticated, IsTenantMember, IsTeacherOfSchool]
     
@@ -126,17 +139,27 @@ class AttendanceSessionViewSet(TenantIsolationMixin, viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter by user's school and permissions - tenant isolation"""
-        user = self.request.user
+        tenant = get_tenant(self.request)
         
         qs = super().get_queryset()  # Already filtered by TenantIsolationMixin
         
+        # Only the detail view renders attendance rows; summaries use counters
+        if self.action == 'retrieve':
+            qs = qs.prefetch_related('attendances__student__person')
+        
         # Further filter by teacher's classes
-        if hasattr(user, 'person') and hasattr(user.person, 'teacher'):
-            teacher = user.person.teacher
-            qs = qs.filter(teacher=teacher) | qs.filter(klass__form_teacher=teacher)
+        if tenant.is_teacher:
+            teacher_id = tenant.teacher_id
+            qs = qs.filter(teacher_id=teacher_id) | qs.filter(klass__form_teacher_id=teacher_id)
         
         return qs.order_by('-date')
     
+    def perform_create(self, serializer):
+        """Create the session and pre-mark students with approved exceptions"""
+        super().perform_create(serializer)
+        if BulkMarkingEngine(serializer.instance).apply_exceptions():
+            serializer.instance.refresh_from_db(fields=list(AttendanceSession.COUNTER_FIELDS.values()))
+    
     @action(detail=True, methods=['post'])
     def close(self, request, pk=None):
         """Close attendance session"""
@@ -177,12 +200,21 @@ class AttendanceSessionViewSet(TenantIsolationMixin, viewsets.ModelViewSet):
         """Bulk mark attendance for session"""
         session = self.get_object()
         records = request.data.get('records', [])
+        tenant = get_tenant(request)
+        # The caller is the marker, whatever the records say
+        marked_by = Teacher.objects.get(pk=tenant.teacher_id) if tenant.is_teacher else None
         
-        created, updated = AttendanceEngine.bulk_mark_attendance(session, records)
+        try:
+            result = BulkMarkingEngine(session).mark(records, marked_by=marked_by)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        session.refresh_from_db(fields=list(AttendanceSession.COUNTER_FIELDS.values()))
         
         return Response({
-            'created': created,
-            'updated': updated,
+            'created': result['created'],
+            'updated': result['updated'],
+            'excused': result['excused'],
+            'errors': result['errors'],
             'session': AttendanceSessionDetailedSerializer(session).data
         })
     
@@ -197,6 +229,8 @@ class AttendanceSessionViewSet(TenantIsolationMixin, viewsets.ModelViewSet):
             'total_students': session.total_students,
             'present': session.present_count,
             'absent': session.absent_count,
+            'late': session.late_count,
+            'excused': session.excused_count,
             'present_rate': session.get_attendance_percentage('P'),
             'status': session.status,
             'synced': session.synced
@@ -223,9 +257,78 @@ class AttendanceExceptionViewSet(viewsets.ModelViewSet):
         return qs
 
 
+class AbsenteeismFlagViewSet(TenantIsolationMixin, viewsets.ReadOnlyModelViewSet):
+    """Chronic-absenteeism flags raised by detect_absenteeism - Tenant isolated"""
+    queryset = AbsenteeismFlag.objects.select_related(
+        'student__person', 'student__current_class', 'student__absenteeism_state'
+    )
+    serializer_class = AbsenteeismFlagSerializer
+    permission_classes = [IsAuthenticated, IsTenantMember, requires('view_reports')]
+    
+    def get_queryset(self):
+        """Filter by open/resolved state, kind, class and student"""
+        qs = super().get_queryset()
+        params = self.request.query_params
+        
+        is_open = params.get('open')
+        if is_open is not None:
+            qs = qs.filter(resolved_on__isnull=is_open.lower() in ('1', 'true', 'yes'))
+        if params.get('kind'):
+            qs = qs.filter(kind=params['kind'])
+        if params.get('class_id'):
+            qs = qs.filter(student__current_class_id=params['class_id'])
+        if params.get('student_id'):
+            qs = qs.filter(student_id=params['student_id'])
+        
+        return qs
+
+
 class AttendanceReportViewSet(viewsets.ViewSet):
     """Attendance reporting endpoints"""
-    permission_classes = [IsAuthenticated, IsSchoolAdmin]
+    permission_classes = [IsAuthenticated, IsTenantMember, requires('view_reports')]
+    
+    def get_class_and_term(self, request, class_id=None, term_id=None):
+        """Look up the optional class and term a report is about
+        
+        Both must belong to the caller's school (superusers may report on
+        any school). Other schools' classes and terms don't exist as far as
+        the caller can tell.
+        
+        Returns:
+            Tuple (klass, term, error) where error is a Response or None
+        """
+        from backend.core.models import Class, Term
+        for name, value in (('class_id', class_id), ('term_id', term_id)):
+            if value and not value.isdigit():
+                return None, None, Response(
+                    {'error': f'Invalid {name}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        tenant = get_tenant(request)
+        klass = None
+        if class_id:
+            klass = Class.objects.filter(id=class_id).first()
+            if klass is None or not (tenant.is_superuser or klass.school_id == tenant.school_id):
+                return None, None, Response(
+                    {'error': 'Class not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+        
+        term = None
+        if term_id:
+            terms = Term.objects.filter(id=term_id)
+            if klass is not None:
+                terms = terms.filter(school_id=klass.school_id)
+            elif not tenant.is_superuser:
+                terms = terms.filter(school_id=tenant.school_id)
+            term = terms.first()
+            if term is None:
+                return None, None, Response(
+                    {'error': 'Term not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+        return klass, term, None
     
     @action(detail=False, methods=['get'])
     def class_summary(self, request):
@@ -240,22 +343,65 @@ class AttendanceReportViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        from backend.core.models import Class
-        try:
-            klass = Class.objects.get(id=class_id)
-        except Class.DoesNotExist:
-            return Response(
-                {'error': 'Class not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        klass, term, error = self.get_class_and_term(request, class_id, term_id)
+        if error:
+            return error
         
         summary = AttendanceService.get_class_attendance_summary(
             klass,
             date=date,
-            term=term_id
+            term=term
         )
         return Response(summary)
     
+    @action(detail=False, methods=['get'])
+    def daily(self, request):
+        """Per-day attendance totals for the user's school or one class"""
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        class_id = request.query_params.get('class_id')
+        term_id = request.query_params.get('term_id')
+        
+        if not all([start_date, end_date]):
+            return Response(
+                {'error': 'start_date, end_date required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        klass, term, error = self.get_class_and_term(request, class_id, term_id)
+        if error:
+            return error
+        school = get_tenant(request).school
+        if klass is not None:
+            school = klass.school_id
+        elif school is None:
+            return Response(
+                {'error': 'class_id required for users without a school'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        series = AttendanceService.get_daily_attendance_series(
+            school, start_date, end_date, klass=klass, term=term
+        )
+        return Response(series)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, requires('flag:superuser')])
+    def schools(self, request):
+        """Attendance totals of every school, lowest rate first (superusers)
+        
+        Query params: start_date, end_date. Reads every school shard.
+        """
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        
+        if not all([start_date, end_date]):
+            return Response(
+                {'error': 'start_date, end_date required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(AttendanceService.get_school_attendance_rates(start_date, end_date))
+    
     @action(detail=False, methods=['get'])
     def student_rate(self, request):
         """Get student attendance rate"""
@@ -279,17 +425,59 @@ class AttendanceReportViewSet(viewsets.ViewSet):
         
         rate = AttendanceService.calculate_attendance_rate(
             student,
-            term_id=term_id
+            term=term_id
         )
         return Response({'student_id': student_id, 'attendance_rate': rate})
     
+    @action(detail=False, methods=['get'])
+    def rates(self, request):
+        """Ranked attendance rates for every student in a class, school or term
+        
+        Query params: class_id, term_id, page, page_size (max 1000), order
+        (desc or asc). Without class_id the user's school is used.
+        """
+        class_id = request.query_params.get('class_id')
+        term_id = request.query_params.get('term_id')
+        order = request.query_params.get('order', 'desc')
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+            page_size = min(1000, max(1, int(request.query_params.get('page_size', 100))))
+        except ValueError:
+            return Response(
+                {'error': 'page and page_size must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        klass, term, error = self.get_class_and_term(request, class_id, term_id)
+        if error:
+            return error
+        tenant = get_tenant(request)
+        school = None if tenant.is_superuser else tenant.school
+        if school is None and klass is None and term is None:
+            return Response(
+                {'error': 'class_id or term_id required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result = AttendanceService.calculate_attendance_rates(
+            school=school, klass=klass, term=term,
+            page=page, page_size=page_size, ascending=(order == 'asc')
+        )
+        return Response(result)
+    
     @action(detail=False, methods=['get'])
     def generate(self, request):
-        """Generate attendance report"""
+        """Generate attendance report
+        
+        Pass export=csv or export=ndjson to stream the report instead of
+        returning JSON; add detail=records to stream individual records.
+        """
         class_id = request.query_params.get('class_id')
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
         term_id = request.query_params.get('term_id')
+        export = request.query_params.get('export')
+        detail = request.query_params.get('detail', 'summary')
         
         if not all([class_id, start_date, end_date]):
             return Response(
@@ -297,14 +485,25 @@ class AttendanceReportViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        from backend.core.models import Class, Term
-        try:
-            klass = Class.objects.get(id=class_id)
-            term = Term.objects.get(id=term_id) if term_id else None
-        except (Class.DoesNotExist, Term.DoesNotExist):
+        if export and export not in EXPORT_FORMATS:
             return Response(
-                {'error': 'Class or Term not found'},
-                status=status.HTTP_404_NOT_FOUND
+                {'error': f'export must be one of: {", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if detail not in ('summary', 'records'):
+            return Response(
+                {'error': 'detail must be summary or records'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        klass, term, error = self.get_class_and_term(request, class_id, term_id)
+        if error:
+            return error
+        
+        if export:
+            return streaming_report_response(
+                export, klass, start_date, end_date, term=term, detail=detail
             )
         
         report = AttendanceService.generate_attendance_report(
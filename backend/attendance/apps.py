@@ -0,0 +1,13 @@
+"""
+App configuration for attendance app
+"""
+from django.apps import AppConfig
+
+
+class AttendanceConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'backend.attendance'
+    label = 'attendance'
+
+    def ready(self):
+        from backend.attendance import signals  # noqa: F401
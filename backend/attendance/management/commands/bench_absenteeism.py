@@ -0,0 +1,51 @@
+"""
+Benchmark a full and an incremental absenteeism detection run
+
+Usage:
+    python manage.py bench_absenteeism
+    python manage.py bench_absenteeism --students 100000 --classes 400 --days 30
+"""
+import random
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.attendance.absenteeism import AbsenteeismEngine
+from backend.attendance.models import Attendance
+from backend.core.benchmarking import Timer, rolled_back, seed_attendance, seed_school
+
+
+class Command(BaseCommand):
+    help = 'Time AbsenteeismEngine over a seeded school'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=20000)
+        parser.add_argument('--classes', type=int, default=80)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--changed', type=float, default=0.05,
+                            help='Fraction of students re-marked before the incremental run')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.stdout.write('Seeding...')
+            seeded = seed_school(students=options['students'], classes=options['classes'])
+            seed_attendance(seeded, options['days'], statuses='P' * 30 + 'LLAAE')
+            as_of = timezone.now().date()
+            engine = AbsenteeismEngine()
+
+            for label, full in (('full', True), ('incremental', False)):
+                if not full:
+                    changed = random.sample(seeded['students'], int(len(seeded['students']) * options['changed']))
+                    Attendance.objects.filter(
+                        student__in=changed, session__date=as_of - timezone.timedelta(days=1)
+                    ).update(status='A', updated_at=timezone.now())
+
+                timer = Timer()
+                with timer.measure():
+                    run = engine.run(as_of=as_of, full=full)
+                rate = run.students_processed / timer.elapsed if timer.elapsed else float('inf')
+                self.stdout.write(
+                    f'{label:>12}: {run.students_processed} students in {timer.elapsed:.3f}s '
+                    f'({rate:.0f}/s, {timer.queries} queries), '
+                    f'+{run.flags_raised} / -{run.flags_resolved} flags'
+                )
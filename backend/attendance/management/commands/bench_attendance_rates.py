@@ -0,0 +1,51 @@
+"""
+Benchmark batch attendance-rate ranking for a whole school
+
+Usage:
+    python manage.py bench_attendance_rates
+    python manage.py bench_attendance_rates --students 10000 --classes 40 --days 20
+"""
+from django.core.management.base import BaseCommand
+
+from backend.attendance.services import AttendanceService
+from backend.core.benchmarking import Timer, rolled_back, seed_attendance, seed_school
+
+
+class Command(BaseCommand):
+    help = 'Time school-wide attendance-rate ranking against the per-student method'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10000)
+        parser.add_argument('--classes', type=int, default=40)
+        parser.add_argument('--days', type=int, default=20)
+        parser.add_argument('--sample', type=int, default=200,
+                            help='Students timed with the per-student method (extrapolated)')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.stdout.write('Seeding...')
+            seeded = seed_school(students=options['students'], classes=options['classes'])
+            seed_attendance(seeded, options['days'])
+            school = seeded['school']
+
+            batch = Timer()
+            with batch.measure():
+                result = AttendanceService.calculate_attendance_rates(school=school, page_size=100)
+
+            sample = seeded['students'][:options['sample']]
+            single = Timer()
+            with single.measure():
+                for student in sample:
+                    AttendanceService.calculate_attendance_rate(student)
+            per_student = single.elapsed / max(1, len(sample))
+
+            stats = result['stats']
+            self.stdout.write(
+                f"students={result['count']} records={stats.get('records', 0)} "
+                f"mean={stats.get('mean', 0):.1f}% p50={stats.get('percentiles', {}).get('p50', 0):.1f}%"
+            )
+            self.stdout.write(f'batch:       {batch.elapsed:.3f}s, {batch.queries} queries')
+            self.stdout.write(
+                f'per-student: {per_student * result["count"]:.3f}s estimated '
+                f'({per_student * 1000:.2f}ms x {result["count"]}, {single.queries // max(1, len(sample))} queries each)'
+            )
@@ -0,0 +1,89 @@
+"""
+Benchmark set-based bulk marking against the per-record update_or_create loop
+
+Usage:
+    python manage.py bench_bulk_mark
+    python manage.py bench_bulk_mark --sizes 50 500 5000 --repeat 3
+"""
+import random
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.attendance.models import Attendance, AttendanceSession
+from backend.attendance.services import BulkMarkingEngine
+from backend.core.benchmarking import Timer, rolled_back, seed_school
+
+
+def per_record_loop(session, records):
+    """The pre-engine implementation: one update_or_create per record"""
+    created_count = 0
+    updated_count = 0
+    for record in records:
+        _, created = Attendance.objects.update_or_create(
+            session=session,
+            student_id=record['student_id'],
+            defaults={
+                'status': record['status'],
+                'remarks': record.get('remarks', ''),
+                'marked_by_id': record.get('marked_by_id'),
+                'synced': False
+            }
+        )
+        if created:
+            created_count += 1
+        else:
+            updated_count += 1
+    return created_count, updated_count
+
+
+def bulk_engine(session, records):
+    result = BulkMarkingEngine(session).mark(records)
+    return result['created'], result['updated']
+
+
+class Command(BaseCommand):
+    help = 'Compare records/sec of the bulk marking engine and the per-record loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[50, 500, 5000])
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per size and method (best is reported)')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        methods = [('loop', per_record_loop), ('bulk', bulk_engine)]
+
+        self.stdout.write(f"{'records':>8} {'method':>6} {'pass':>7} {'seconds':>9} {'rec/s':>10} {'queries':>8}")
+        with rolled_back():
+            seeded = seed_school(students=sizes[-1])
+            school, klass = seeded['school'], seeded['classes'][0]
+            student_ids = [s.id for s in seeded['students']]
+            day = timezone.now().date()
+
+            for size in sizes:
+                for name, fn in methods:
+                    for pass_name in ('insert', 'update'):
+                        best = None
+                        for run in range(options['repeat']):
+                            day -= timezone.timedelta(days=1)
+                            session = AttendanceSession.objects.create(school=school, klass=klass, date=day)
+                            records = [
+                                {'student_id': sid, 'status': random.choice('PALE')}
+                                for sid in student_ids[:size]
+                            ]
+                            if pass_name == 'update':
+                                bulk_engine(session, records)
+                                for record in records:
+                                    record['status'] = random.choice('PALE')
+
+                            timer = Timer()
+                            with timer.measure():
+                                created, updated = fn(session, records)
+                            assert created + updated == size, (created, updated)
+                            if best is None or timer.elapsed < best.elapsed:
+                                best = timer
+
+                        rate = size / best.elapsed if best.elapsed else float('inf')
+                        self.stdout.write(
+                            f'{size:>8} {name:>6} {pass_name:>7} {best.elapsed:>9.4f} {rate:>10.0f} {best.queries:>8}'
+                        )
@@ -0,0 +1,85 @@
+"""
+Benchmark the cost of HLC conflict handling on attendance ingest
+
+A session is marked once with versioned records, then re-ingested with
+a batch where --stale-ratio of the fields carry older versions than the
+stored row. The same batch is applied with and without the merge step,
+on a fresh copy of the session each run, and the overhead is reported.
+
+Usage:
+    python manage.py bench_conflict_ingest
+    python manage.py bench_conflict_ingest --records 1000 --stale-ratio 0.3 --repeat 10
+"""
+import random
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.attendance.models import AttendanceSession
+from backend.attendance.services import BulkMarkingEngine
+from backend.core.benchmarking import Timer, rolled_back, seed_school
+from backend.sync.hlc import encode, wall_ms
+from backend.sync.models import SyncConflict
+
+
+class NoMergeEngine(BulkMarkingEngine):
+    """The engine with conflict handling switched off: incoming rows always win"""
+
+    @staticmethod
+    def merge(pending, existing):
+        return set(), {}
+
+
+class Command(BaseCommand):
+    help = 'Compare 1,000-record ingest time with and without field-level conflict merging'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=1000)
+        parser.add_argument('--stale-ratio', type=float, default=0.05, help='Share of fields older than the stored row')
+        parser.add_argument('--repeat', type=int, default=10, help='Runs per method (best is reported)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+        size = options['records']
+        base = wall_ms() - 60_000
+
+        with rolled_back():
+            seeded = seed_school(students=size)
+            school, klass = seeded['school'], seeded['classes'][0]
+            student_ids = [s.id for s in seeded['students']]
+            initial = [
+                {'student_id': sid, 'status': 'P', 'remarks': '', 'hlc': encode(base, 1)}
+                for sid in student_ids
+            ]
+
+            def version():
+                return encode(base, 0) if rng.random() < options['stale_ratio'] else encode(base + 1000, 0)
+
+            batch = [
+                {'student_id': sid, 'status': rng.choice('ALE'), 'remarks': 'synced',
+                 'status_hlc': version(), 'remarks_hlc': version()}
+                for sid in student_ids
+            ]
+
+            # Runs alternate between the engines so drift affects both alike
+            engines = {'no-merge': NoMergeEngine, 'merge': BulkMarkingEngine}
+            timings = {}
+            day = timezone.now().date()
+            for _ in range(options['repeat']):
+                for name, engine in engines.items():
+                    day -= timezone.timedelta(days=1)
+                    session = AttendanceSession.objects.create(school=school, klass=klass, date=day)
+                    BulkMarkingEngine(session).mark(initial, apply_exceptions=False)
+
+                    timer = Timer()
+                    with timer.measure():
+                        result = engine(session).mark(batch, apply_exceptions=False)
+                    assert not result['errors'], result['errors'][:3]
+                    if name not in timings or timer.elapsed < timings[name].elapsed:
+                        timings[name] = timer
+            for name, best in timings.items():
+                self.stdout.write(f'{name:>9} {best.elapsed:>9.4f}s {best.queries:>4} queries')
+
+            overhead = (timings['merge'].elapsed / timings['no-merge'].elapsed - 1) * 100
+            conflicts = SyncConflict.objects.filter(school=school).count() // options['repeat']
+            self.stdout.write(f'{conflicts} conflicts logged per run, overhead {overhead:+.1f}%')
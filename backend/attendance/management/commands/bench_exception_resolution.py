@@ -0,0 +1,92 @@
+"""
+Benchmark roster-wide exception resolution against per-student lookups
+
+Seeds a class roster with a year of approved exceptions, then resolves
+coverage for every school day both ways and compares the results.
+
+Usage:
+    python manage.py bench_exception_resolution
+    python manage.py bench_exception_resolution --roster 80 --per-student 12 --days 200
+"""
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.attendance.models import AttendanceException, AttendanceSession
+from backend.attendance.services import AttendanceService, BulkMarkingEngine, ExceptionResolver
+from backend.core.benchmarking import Timer, rolled_back, seed_school
+
+
+class Command(BaseCommand):
+    help = 'Time ExceptionResolver against check_attendance_exceptions for a roster'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--roster', type=int, default=80)
+        parser.add_argument('--per-student', type=int, default=12, help='Exceptions per student over the year')
+        parser.add_argument('--days', type=int, default=200, help='School days resolved')
+        parser.add_argument('--other-classes', type=int, default=20,
+                            help='Extra classes with the same load, so the index has to discriminate')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        year_start = timezone.now().date().replace(month=1, day=1)
+        categories = [code for code, _ in AttendanceException.CATEGORY_CHOICES]
+
+        with rolled_back():
+            seeded = seed_school(
+                students=options['roster'] * (1 + options['other_classes']),
+                classes=1 + options['other_classes'],
+            )
+            klass = seeded['classes'][0]
+            roster = [s for s in seeded['students'] if s.current_class_id == klass.id]
+
+            exceptions = []
+            for student in seeded['students']:
+                for _ in range(options['per_student']):
+                    start = year_start + timedelta(days=rng.randrange(365))
+                    exceptions.append(AttendanceException(
+                        student=student, category=rng.choice(categories), reason='bench',
+                        start_date=start, end_date=start + timedelta(days=rng.randrange(5)),
+                        approved_by=seeded['teachers'][0],
+                    ))
+            AttendanceException.objects.bulk_create(exceptions, batch_size=2000)
+            self.stdout.write(f'{len(roster)} students on the roster, {len(exceptions)} exceptions seeded')
+
+            days = sorted(rng.sample(range(365), min(options['days'], 365)))
+            dates = [year_start + timedelta(days=day) for day in days]
+
+            per_student = Timer()
+            with per_student.measure():
+                expected = [
+                    {s.id for s in roster if AttendanceService.check_attendance_exceptions(s, date)}
+                    for date in dates
+                ]
+
+            resolver = Timer()
+            with resolver.measure():
+                resolved = [set(ExceptionResolver(klass.id, date).covered()) for date in dates]
+
+            assert resolved == expected, 'resolver disagrees with per-student lookups'
+            covered = sum(len(ids) for ids in resolved)
+
+            marking = Timer()
+            with marking.measure():
+                for date in dates:
+                    session = AttendanceSession.objects.create(school=seeded['school'], klass=klass, date=date)
+                    excused = set(BulkMarkingEngine(session).mark([
+                        {'student_id': s.id, 'status': 'P'} for s in roster
+                    ])['excused'])
+                    assert not excused, 'explicit marks must win over exceptions'
+
+            self.stdout.write(f'{len(dates)} days, {covered} student-days covered')
+            for label, timer in (('per-student', per_student), ('resolver', resolver)):
+                self.stdout.write(
+                    f'{label:>12}: {timer.elapsed:.3f}s total, {timer.elapsed / len(dates) * 1000:.2f}ms/day, '
+                    f'{timer.queries // len(dates)} queries/day'
+                )
+            self.stdout.write(
+                f'{"bulk mark":>12}: {marking.elapsed / len(dates) * 1000:.2f}ms/day for {len(roster)} records '
+                f'including resolution, {marking.queries // len(dates)} queries/day'
+            )
@@ -0,0 +1,76 @@
+"""
+Replay the same offline batch repeatedly and check ingest is idempotent
+
+Every replay after the first must be recognised through the (school,
+local_id) key: constant query count and no INSERT/UPDATE/DELETE.
+
+Usage:
+    python manage.py bench_sync_replay
+    python manage.py bench_sync_replay --records 1000 --replays 10
+"""
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from backend.attendance.models import Attendance
+from backend.attendance.services import SyncService
+from backend.core.benchmarking import Timer, rolled_back, seed_school
+
+
+class Command(BaseCommand):
+    help = 'Replay one offline sync batch N times and report queries/writes per replay'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=1000)
+        parser.add_argument('--per-session', type=int, default=50)
+        parser.add_argument('--replays', type=int, default=10)
+
+    def handle(self, *args, **options):
+        per_session = options['per_session']
+        session_count = max(1, options['records'] // per_session)
+
+        with rolled_back():
+            seeded = seed_school(students=per_session)
+            school, klass = seeded['school'], seeded['classes'][0]
+            today = timezone.now().date()
+            batch = [
+                {
+                    'class_id': klass.id,
+                    'date': (today - timezone.timedelta(days=day)).isoformat(),
+                    'local_id': f'session-{uuid.uuid4()}',
+                    'records': [
+                        {'student_id': student.id, 'status': 'PALE'[i % 4], 'local_id': str(uuid.uuid4())}
+                        for i, student in enumerate(seeded['students'])
+                    ],
+                }
+                for day in range(session_count)
+            ]
+            total = session_count * per_session
+
+            self.stdout.write(f"{'run':>6} {'seconds':>9} {'queries':>8} {'writes':>7} {'unchanged':>10}")
+            replay_costs = set()
+            for run in range(options['replays'] + 1):
+                timer = Timer()
+                with timer.measure():
+                    results = SyncService.ingest(batch, school=school)
+                unchanged = sum(
+                    1 for r in results for item in r['results'] if item['result'] == 'unchanged'
+                )
+                label = 'first' if run == 0 else f'#{run}'
+                self.stdout.write(f'{label:>6} {timer.elapsed:>9.4f} {timer.queries:>8} {timer.writes:>7} {unchanged:>10}')
+
+                if run > 0:
+                    replay_costs.add(timer.queries)
+                    if timer.writes or unchanged != total:
+                        raise CommandError(f'Replay {run} wrote {timer.writes} statements, {unchanged}/{total} unchanged')
+
+            stored = Attendance.objects.filter(school=school).count()
+            if stored != total:
+                raise CommandError(f'Expected {total} stored rows, found {stored}')
+            if len(replay_costs) != 1:
+                raise CommandError(f'Replay query counts vary: {sorted(replay_costs)}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["replays"]} replays of {total} records: {replay_costs.pop()} queries each, no writes'
+        ))
@@ -0,0 +1,72 @@
+"""
+Backfill or rebuild DailyAttendanceRollup from attendance records
+
+Usage:
+    python manage.py rebuild_attendance_rollups
+    python manage.py rebuild_attendance_rollups --school 3 --start 2026-01-01 --end 2026-04-30
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_date
+
+from backend.attendance.models import Attendance, AttendanceSession, DailyAttendanceRollup
+from backend.core.models import School
+from backend.core.sharding import shard_atomic
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily per-class attendance rollups from raw attendance'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, help='Only rebuild this school id')
+        parser.add_argument('--start', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        date_filter = {}
+        for option, lookup in (('start', 'date__gte'), ('end', 'date__lte')):
+            if options[option]:
+                value = parse_date(options[option])
+                if value is None:
+                    raise CommandError(f'Invalid --{option} date: {options[option]}')
+                date_filter[lookup] = value
+
+        schools = School.objects.order_by('pk').values_list('pk', flat=True)
+        if options['school']:
+            schools = schools.filter(pk=options['school'])
+
+        total_rows = 0
+        for school_id in schools:
+            total_rows += self.rebuild_school(school_id, date_filter)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total_rows} rollup rows'))
+
+    def rebuild_school(self, school_id, date_filter):
+        """Replace one school's rollups inside a single transaction"""
+        session_filter = {f'session__{k}': v for k, v in date_filter.items()}
+        counts = (
+            Attendance.objects.filter(school_id=school_id, **session_filter)
+            .values('session__klass_id', 'session__date', 'session__term_id')
+            .annotate(**{
+                field: Count('id', filter=Q(status=status))
+                for status, field in AttendanceSession.COUNTER_FIELDS.items()
+            })
+            .order_by()
+        )
+        with shard_atomic():
+            # Lock the school's sessions first: writers update the session
+            # row before committing, so none can land between count and swap.
+            list(AttendanceSession.objects.select_for_update().filter(school_id=school_id, **date_filter).values_list('pk'))
+            rollups = [
+                DailyAttendanceRollup(
+                    school_id=school_id,
+                    klass_id=row['session__klass_id'],
+                    date=row['session__date'],
+                    term_id=row['session__term_id'],
+                    **{field: row[field] for field in AttendanceSession.COUNTER_FIELDS.values()}
+                )
+                for row in counts
+            ]
+            DailyAttendanceRollup.objects.filter(school_id=school_id, **date_filter).delete()
+            DailyAttendanceRollup.objects.bulk_create(rollups, batch_size=1000)
+        return len(rollups)
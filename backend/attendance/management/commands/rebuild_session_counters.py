@@ -0,0 +1,68 @@
+"""
+Rebuild the denormalised per-status counters on AttendanceSession
+
+Usage:
+    python manage.py rebuild_session_counters
+    python manage.py rebuild_session_counters --school 3 --chunk-size 2000
+    python manage.py rebuild_session_counters --dry-run
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+
+from backend.attendance.models import AttendanceSession
+from backend.core.sharding import shard_atomic
+from backend.sync.changelog import record
+
+
+def counted_sessions(queryset):
+    """Annotate sessions with per-status counts computed from attendance rows"""
+    return queryset.annotate(**{
+        f'actual_{field}': Count('attendances', filter=Q(attendances__status=status))
+        for status, field in AttendanceSession.COUNTER_FIELDS.items()
+    })
+
+
+class Command(BaseCommand):
+    help = 'Recount attendance per session and fix counters that have drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, help='Only rebuild sessions for this school id')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        fields = list(AttendanceSession.COUNTER_FIELDS.values())
+        qs = AttendanceSession.objects.order_by('pk')
+        if options['school']:
+            qs = qs.filter(school_id=options['school'])
+
+        scanned = drifted = 0
+        last_pk = 0
+        while True:
+            # Each chunk is locked, recounted and fixed in its own short
+            # transaction. Writers lock or update the session row before
+            # committing, so none can slip in between the count and the fix.
+            with shard_atomic():
+                ids = list(
+                    qs.filter(pk__gt=last_pk).select_for_update()
+                    .values_list('pk', flat=True)[:options['chunk_size']]
+                )
+                if not ids:
+                    break
+                last_pk = ids[-1]
+                scanned += len(ids)
+
+                stale = []
+                for session in counted_sessions(AttendanceSession.objects.filter(pk__in=ids)).only('pk', 'school_id', *fields):
+                    if any(getattr(session, f) != getattr(session, f'actual_{f}') for f in fields):
+                        for f in fields:
+                            setattr(session, f, getattr(session, f'actual_{f}'))
+                        stale.append(session)
+                drifted += len(stale)
+                if stale and not options['dry_run']:
+                    AttendanceSession.objects.bulk_update(stale, fields)
+                    for school_id in {session.school_id for session in stale}:
+                        record(school_id, 'session', [s.pk for s in stale if s.school_id == school_id])
+
+        verb = 'would fix' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Scanned {scanned} sessions, {verb} {drifted} with drifted counters'))
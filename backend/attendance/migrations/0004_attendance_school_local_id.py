@@ -0,0 +1,62 @@
+# Generated by Django 4.2.8 on 2026-10-16 22:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_school_and_dedupe_local_ids(apps, schema_editor):
+    """Copy school from session and clear duplicate local_ids before the
+    unique constraints are created. The most recently updated row keeps its
+    local_id."""
+    Attendance = apps.get_model('attendance', 'Attendance')
+    AttendanceSession = apps.get_model('attendance', 'AttendanceSession')
+
+    Attendance.objects.filter(school__isnull=True).update(
+        school_id=Subquery(
+            AttendanceSession.objects.filter(pk=OuterRef('session_id')).values('school_id')[:1]
+        )
+    )
+
+    for model in (Attendance, AttendanceSession):
+        duplicates = (
+            model.objects.filter(local_id__gt='')
+            .values('school_id', 'local_id')
+            .annotate(n=Count('id'))
+            .filter(n__gt=1)
+        )
+        for dup in duplicates:
+            rows = model.objects.filter(
+                school_id=dup['school_id'], local_id=dup['local_id']
+            ).order_by('-updated_at', '-id')
+            model.objects.filter(pk__in=list(rows.values_list('pk', flat=True)[1:])).update(local_id=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_initial'),
+        ('attendance', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='school',
+            field=models.ForeignKey(help_text='Copied from session; scopes local_id', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_records', to='core.school'),
+        ),
+        migrations.RunPython(backfill_school_and_dedupe_local_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='attendance',
+            name='school',
+            field=models.ForeignKey(help_text='Copied from session; scopes local_id', on_delete=django.db.models.deletion.CASCADE, related_name='attendance_records', to='core.school'),
+        ),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(condition=models.Q(('local_id__gt', '')), fields=('school', 'local_id'), name='attendance_school_local_id_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='attendancesession',
+            constraint=models.UniqueConstraint(condition=models.Q(('local_id__gt', '')), fields=('school', 'local_id'), name='attendance_session_school_local_id_uniq'),
+        ),
+    ]
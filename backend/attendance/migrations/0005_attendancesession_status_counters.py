@@ -0,0 +1,60 @@
+# Generated by Django 4.2.8 on 2026-10-16 22:33
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+COUNTER_FIELDS = {
+    'P': 'count_present',
+    'A': 'count_absent',
+    'L': 'count_late',
+    'E': 'count_excused',
+}
+
+
+def backfill_counters(apps, schema_editor):
+    Attendance = apps.get_model('attendance', 'Attendance')
+    AttendanceSession = apps.get_model('attendance', 'AttendanceSession')
+
+    def status_count(status):
+        counts = (
+            Attendance.objects.filter(session_id=OuterRef('pk'), status=status)
+            .order_by().values('session_id').annotate(n=Count('id')).values('n')
+        )
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    AttendanceSession.objects.update(**{
+        field: status_count(status) for status, field in COUNTER_FIELDS.items()
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_attendance_school_local_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancesession',
+            name='count_absent',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='attendancesession',
+            name='count_excused',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='attendancesession',
+            name='count_late',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='attendancesession',
+            name='count_present',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.8 on 2026-10-16 22:35
+
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+COUNTER_FIELDS = ['count_present', 'count_absent', 'count_late', 'count_excused']
+
+
+def backfill_rollups(apps, schema_editor):
+    """Seed rollups from the per-session counters added in 0005"""
+    AttendanceSession = apps.get_model('attendance', 'AttendanceSession')
+    DailyAttendanceRollup = apps.get_model('attendance', 'DailyAttendanceRollup')
+
+    rows = (
+        AttendanceSession.objects.values('school_id', 'klass_id', 'date', 'term_id')
+        .annotate(**{f'sum_{field}': Sum(field) for field in COUNTER_FIELDS})
+        .order_by()
+    )
+    DailyAttendanceRollup.objects.bulk_create(
+        (
+            DailyAttendanceRollup(
+                school_id=row['school_id'], klass_id=row['klass_id'],
+                date=row['date'], term_id=row['term_id'],
+                **{field: row[f'sum_{field}'] or 0 for field in COUNTER_FIELDS}
+            )
+            for row in rows
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_initial'),
+        ('attendance', '0005_attendancesession_status_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count_present', models.IntegerField(default=0)),
+                ('count_absent', models.IntegerField(default=0)),
+                ('count_late', models.IntegerField(default=0)),
+                ('count_excused', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('klass', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_rollups', to='core.class')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_rollups', to='core.school')),
+                ('term', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendance_rollups', to='core.term')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['school', 'date'], name='attendance__school__bcd9ae_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyattendancerollup',
+            constraint=models.UniqueConstraint(fields=('school', 'klass', 'date', 'term'), name='attendance_rollup_key_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyattendancerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('term__isnull', True)), fields=('school', 'klass', 'date'), name='attendance_rollup_key_no_term_uniq'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
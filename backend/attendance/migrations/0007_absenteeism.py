@@ -0,0 +1,97 @@
+# Generated by Django 4.2.8 on 2026-10-16 22:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0002_initial'),
+        ('core', '0003_initial'),
+        ('attendance', '0006_dailyattendancerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AbsenteeismFlag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('low_rate', 'Attendance rate below threshold'), ('consecutive', 'Consecutive absences')], max_length=20)),
+                ('value', models.FloatField(help_text='Rate (%) or number of consecutive absent days when flagged')),
+                ('threshold', models.FloatField()),
+                ('window_days', models.PositiveIntegerField()),
+                ('flagged_on', models.DateField()),
+                ('resolved_on', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-flagged_on'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AbsenteeismRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('watermark', models.DateTimeField(help_text='Attendance rows updated up to this time were processed')),
+                ('as_of', models.DateField()),
+                ('full', models.BooleanField(default=False)),
+                ('students_processed', models.PositiveIntegerField(default=0)),
+                ('flags_raised', models.PositiveIntegerField(default=0)),
+                ('flags_resolved', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AbsenteeismState',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='absenteeism_state', serialize=False, to='people.student')),
+                ('window_start', models.DateField()),
+                ('window_end', models.DateField()),
+                ('days_recorded', models.PositiveIntegerField(default=0)),
+                ('days_present', models.PositiveIntegerField(default=0)),
+                ('days_absent', models.PositiveIntegerField(default=0)),
+                ('days_excused', models.PositiveIntegerField(default=0)),
+                ('rate', models.FloatField(default=0, help_text='Present days as % of recorded, non-excused days')),
+                ('consecutive_absences', models.PositiveIntegerField(default=0, help_text='Trailing run of absent days')),
+                ('last_attendance_date', models.DateField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['updated_at'], name='attendance__updated_b93c80_idx'),
+        ),
+        migrations.AddField(
+            model_name='absenteeismstate',
+            name='school',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='absenteeism_states', to='core.school'),
+        ),
+        migrations.AddField(
+            model_name='absenteeismflag',
+            name='school',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='absenteeism_flags', to='core.school'),
+        ),
+        migrations.AddField(
+            model_name='absenteeismflag',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='absenteeism_flags', to='people.student'),
+        ),
+        migrations.AddIndex(
+            model_name='absenteeismstate',
+            index=models.Index(fields=['school', 'rate'], name='attendance__school__6914c0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='absenteeismflag',
+            index=models.Index(fields=['school', 'resolved_on', 'kind'], name='attendance__school__b4b2d7_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='absenteeismflag',
+            constraint=models.UniqueConstraint(condition=models.Q(('resolved_on__isnull', True)), fields=('student', 'kind'), name='absenteeism_one_open_flag_per_kind'),
+        ),
+    ]
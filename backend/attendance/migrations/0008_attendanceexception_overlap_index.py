@@ -0,0 +1,17 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0007_absenteeism'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendanceexception',
+            index=models.Index(fields=['student', 'start_date', 'end_date'], name='attendance__student_5eb1b8_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0008_attendanceexception_overlap_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['school', 'updated_at', 'id'], name='attendance__school__4d74ca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendanceexception',
+            index=models.Index(fields=['updated_at', 'id'], name='attendance__updated_eda696_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancesession',
+            index=models.Index(fields=['school', 'updated_at', 'id'], name='attendance__school__2192d4_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0009_delta_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='remarks_hlc',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='status_hlc',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -5,6 +5,7 @@ Complete attendance tracking with offline-first support
 from django.db import models
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from backend.core.sharding import instance_db, shard_atomic
 
 
 class AttendanceSession(models.Model):
@@ -33,12 +34,36 @@ class AttendanceSession(models.Model):
     synced = models.BooleanField(default=False)
     local_id = models.CharField(max_length=100, null=True, blank=True, help_text='UUID for offline sync')
     
+    # Denormalised per-status counts, maintained by every attendance write.
+    # Rebuild with `manage.py rebuild_session_counters` if they drift.
+    count_present = models.PositiveIntegerField(default=0)
+    count_absent = models.PositiveIntegerField(default=0)
+    count_late = models.PositiveIntegerField(default=0)
+    count_excused = models.PositiveIntegerField(default=0)
+    
+    COUNTER_FIELDS = {
+        'P': 'count_present',
+        'A': 'count_absent',
+        'L': 'count_late',
+        'E': 'count_excused',
+    }
+    
     class Meta:
         unique_together = [('school', 'klass', 'date', 'subject')]
         ordering = ['-date']
         indexes = [
             models.Index(fields=['date', 'school']),
             models.Index(fields=['status', 'school']),
+            # Delta pull keyset: school = ? AND (updated_at, id) > cursor
+            models.Index(fields=['school', 'updated_at', 'id']),
+        ]
+        constraints = [
+            # Idempotency key for offline replays; blank local_ids are not keys
+            models.UniqueConstraint(
+                fields=['school', 'local_id'],
+                condition=models.Q(local_id__gt=''),
+                name='attendance_session_school_local_id_uniq',
+            ),
         ]
     
     def __str__(self):
@@ -57,32 +82,107 @@ class AttendanceSession(models.Model):
         self.synced_at = timezone.now()
         self.save(update_fields=['status', 'synced', 'synced_at'])
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_rollup_key = instance.rollup_key()
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """Save, log the change and move the session's counts if its rollup bucket changed
+        
+        Updates leave the count_* columns alone: apply_status_deltas keeps
+        them with F() expressions, so this instance's copies may be stale.
+        Pass update_fields naming them to overwrite them on purpose.
+        """
+        from backend.sync.changelog import record
+        old_key = getattr(self, '_stored_rollup_key', None)
+        updating = not self._state.adding and self.pk is not None and not args and not kwargs.get('force_insert')
+        if updating and kwargs.get('update_fields') is None:
+            counters = set(self.COUNTER_FIELDS.values())
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in counters
+            ]
+        with shard_atomic(instance_db(self, kwargs.get('using'))):
+            super().save(*args, **kwargs)
+            new_key = self.rollup_key()
+            if old_key and old_key != new_key:
+                # Move the stored counts, not this instance's copies
+                self.refresh_from_db(fields=list(self.COUNTER_FIELDS.values()))
+                if self.total_students:
+                    counts = {status: self.get_attendance_count(status) for status in self.COUNTER_FIELDS}
+                    DailyAttendanceRollup.apply_deltas(old_key, {s: -n for s, n in counts.items()})
+                    DailyAttendanceRollup.apply_deltas(new_key, counts)
+            record(self.school_id, 'session', [self.pk])
+        self._stored_rollup_key = self.rollup_key()
+    
+    def rollup_key(self):
+        """Key of the DailyAttendanceRollup row this session contributes to"""
+        return (
+            self.__dict__.get('school_id'),
+            self.__dict__.get('klass_id'),
+            self.__dict__.get('date'),
+            self.__dict__.get('term_id'),
+        )
+    
+    def apply_status_deltas(self, deltas, log_change=True):
+        """Adjust this session's counters and its daily rollup
+        
+        Both are single F() expression UPDATEs, so concurrent writers never
+        lose increments. Call inside the transaction that wrote the rows.
+        
+        Args:
+            deltas: Dict of status code -> change in count (may be negative)
+            log_change: Append a change-log entry for the session. Callers
+                logging other rows in the same transaction pass False and
+                include the session in their own entry batch.
+        """
+        changes = {
+            self.COUNTER_FIELDS[status]: models.F(self.COUNTER_FIELDS[status]) + delta
+            for status, delta in deltas.items()
+            if delta and status in self.COUNTER_FIELDS
+        }
+        if changes:
+            # updated_at moves too, so delta pulls pick up the new counts
+            AttendanceSession.objects.filter(pk=self.pk).update(updated_at=timezone.now(), **changes)
+            DailyAttendanceRollup.apply_deltas(self.rollup_key(), deltas)
+            if log_change:
+                from backend.sync.changelog import record
+                record(self.school_id, 'session', [self.pk])
+    
     def get_attendance_count(self, status=None):
         """Get count of attendance records with optional status filter"""
-        qs = self.attendances.all()
         if status:
-            qs = qs.filter(status=status)
-        return qs.count()
+            return getattr(self, self.COUNTER_FIELDS[status], 0) if status in self.COUNTER_FIELDS else 0
+        return self.total_students
     
     def get_attendance_percentage(self, status='P'):
         """Calculate attendance percentage for status"""
-        total = self.attendances.count()
+        total = self.total_students
         if total == 0:
             return 0
-        count = self.attendances.filter(status=status).count()
-        return (count / total) * 100
+        return (self.get_attendance_count(status) / total) * 100
     
     @property
     def total_students(self):
-        return self.attendances.count()
+        return self.count_present + self.count_absent + self.count_late + self.count_excused
     
     @property
     def present_count(self):
-        return self.get_attendance_count('P')
+        return self.count_present
     
     @property
     def absent_count(self):
-        return self.get_attendance_count('A')
+        return self.count_absent
+    
+    @property
+    def late_count(self):
+        return self.count_late
+    
+    @property
+    def excused_count(self):
+        return self.count_excused
 
 
 class Attendance(models.Model):
@@ -99,6 +199,7 @@ class Attendance(models.Model):
         (EXCUSED, 'Excused'),
     ]
     
+    school = models.ForeignKey('core.School', on_delete=models.CASCADE, related_name='attendance_records', help_text='Copied from session; scopes local_id')
     session = models.ForeignKey(AttendanceSession, on_delete=models.CASCADE, related_name='attendances')
     student = models.ForeignKey('people.Student', on_delete=models.CASCADE, related_name='attendances')
     status = models.CharField(max_length=1, choices=STATUS_CHOICES)
@@ -113,6 +214,9 @@ class Attendance(models.Model):
     synced = models.BooleanField(default=False)
     local_id = models.CharField(max_length=100, null=True, blank=True, help_text='UUID for offline sync')
     last_sync_at = models.DateTimeField(null=True, blank=True)
+    # Hybrid-logical-clock versions of each field (backend.sync.hlc)
+    status_hlc = models.BigIntegerField(default=0)
+    remarks_hlc = models.BigIntegerField(default=0)
     
     class Meta:
         unique_together = ['session', 'student']
@@ -121,11 +225,64 @@ class Attendance(models.Model):
             models.Index(fields=['student', 'status']),
             models.Index(fields=['marked_at']),
             models.Index(fields=['synced']),
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['school', 'updated_at', 'id']),
+        ]
+        constraints = [
+            # Idempotency key for offline replays; blank local_ids are not keys
+            models.UniqueConstraint(
+                fields=['school', 'local_id'],
+                condition=models.Q(local_id__gt=''),
+                name='attendance_school_local_id_uniq',
+            ),
         ]
     
     def __str__(self):
         return f"{self.student} - {self.session.date} - {self.get_status_display()}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_state = (instance.__dict__.get('session_id'), instance.__dict__.get('status'))
+        instance._stored_remarks = instance.__dict__.get('remarks')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """Save, keep the session's status counters in step and log the change
+        
+        Also inherits school from the session when not set explicitly, and
+        stamps changed status or remarks with a new clock version.
+        """
+        from backend.sync.changelog import record_changes
+        from backend.sync.hlc import clock
+        if not self.school_id and self.session_id:
+            self.school_id = self.session.school_id
+        
+        update_fields = kwargs.get('update_fields')
+        stored = {'status': getattr(self, '_stored_state', (None, None))[1], 'remarks': getattr(self, '_stored_remarks', None)}
+        for field, version_field in (('status', 'status_hlc'), ('remarks', 'remarks_hlc')):
+            if (update_fields is None or field in update_fields) and stored[field] != getattr(self, field):
+                setattr(self, version_field, clock.now())
+                if update_fields is not None:
+                    kwargs['update_fields'] = update_fields = [*update_fields, version_field]
+        tracks_status = update_fields is None or {'status', 'session', 'session_id'} & set(update_fields)
+        old_session_id, old_status = getattr(self, '_stored_state', (None, None))
+        with shard_atomic(instance_db(self, kwargs.get('using'))):
+            super().save(*args, **kwargs)
+            changes = [('attendance', self.pk, False)]
+            if tracks_status and (old_session_id, old_status) != (self.session_id, self.status):
+                if old_session_id == self.session_id:
+                    self.session.apply_status_deltas({old_status: -1, self.status: 1}, log_change=False)
+                else:
+                    if old_session_id:
+                        AttendanceSession.objects.get(pk=old_session_id).apply_status_deltas({old_status: -1}, log_change=False)
+                        changes.append(('session', old_session_id, False))
+                    self.session.apply_status_deltas({self.status: 1}, log_change=False)
+                changes.append(('session', self.session_id, False))
+            record_changes(self.school_id, changes)
+        self._stored_state = (self.session_id, self.status)
+        self._stored_remarks = self.remarks
+    
     def mark_synced(self):
         """Mark record as synced to server"""
         self.synced = True
@@ -161,10 +318,178 @@ class AttendanceException(models.Model):
     
     class Meta:
         ordering = ['-start_date']
+        indexes = [
+            # Interval-overlap lookups: student_id IN roster AND start <= day <= end
+            models.Index(fields=['student', 'start_date', 'end_date']),
+            models.Index(fields=['updated_at', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.student} - {self.get_category_display()} ({self.start_date})"
     
+    def save(self, *args, **kwargs):
+        """Save and log the change for the student's school"""
+        from backend.sync.changelog import record
+        with shard_atomic(instance_db(self, kwargs.get('using'))):
+            super().save(*args, **kwargs)
+            record(self.get_school_id(), 'exception', [self.pk])
+    
+    def get_school_id(self):
+        """School of the student, which exceptions are scoped to"""
+        from backend.people.models import Person
+        return Person.objects.filter(student__id=self.student_id).values_list('school_id', flat=True).first()
+    
     def covers_date(self, date):
         """Check if exception covers a specific date"""
         return self.start_date <= date <= self.end_date
+
+
+class DailyAttendanceRollup(models.Model):
+    """Per-status attendance counts for a class on one day
+    
+    Summed over every session of the class that day and maintained by the
+    same writes that maintain AttendanceSession counters. Dashboards and
+    range summaries read these rows instead of raw Attendance.
+    Rebuild with `manage.py rebuild_attendance_rollups`.
+    """
+    school = models.ForeignKey('core.School', on_delete=models.CASCADE, related_name='attendance_rollups')
+    klass = models.ForeignKey('core.Class', on_delete=models.CASCADE, related_name='attendance_rollups')
+    date = models.DateField()
+    term = models.ForeignKey('core.Term', on_delete=models.SET_NULL, null=True, blank=True, related_name='attendance_rollups')
+    
+    count_present = models.IntegerField(default=0)
+    count_absent = models.IntegerField(default=0)
+    count_late = models.IntegerField(default=0)
+    count_excused = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    COUNTER_FIELDS = AttendanceSession.COUNTER_FIELDS
+    
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['school', 'klass', 'date', 'term'],
+                name='attendance_rollup_key_uniq',
+            ),
+            # NULLs are distinct in unique indexes, so sessions without a
+            # term need their own constraint to share one row per day.
+            models.UniqueConstraint(
+                fields=['school', 'klass', 'date'],
+                condition=models.Q(term__isnull=True),
+                name='attendance_rollup_key_no_term_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['school', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.klass_id} - {self.date}"
+    
+    @property
+    def total(self):
+        return self.count_present + self.count_absent + self.count_late + self.count_excused
+    
+    @classmethod
+    def apply_deltas(cls, key, deltas):
+        """Add status deltas to the rollup row for key, creating it if needed
+        
+        Args:
+            key: Tuple of (school_id, klass_id, date, term_id)
+            deltas: Dict of status code -> change in count
+        """
+        changes = {
+            cls.COUNTER_FIELDS[status]: models.F(cls.COUNTER_FIELDS[status]) + delta
+            for status, delta in deltas.items()
+            if delta and status in cls.COUNTER_FIELDS
+        }
+        if not changes:
+            return
+        school_id, klass_id, date, term_id = key
+        lookup = {'school_id': school_id, 'klass_id': klass_id, 'date': date, 'term_id': term_id}
+        cls.objects.bulk_create([cls(**lookup)], ignore_conflicts=True)
+        cls.objects.filter(**lookup).update(**changes)
+
+
+class AbsenteeismState(models.Model):
+    """Rolling attendance window for one student, kept by AbsenteeismEngine"""
+    student = models.OneToOneField('people.Student', on_delete=models.CASCADE, primary_key=True, related_name='absenteeism_state')
+    school = models.ForeignKey('core.School', on_delete=models.CASCADE, related_name='absenteeism_states')
+    window_start = models.DateField()
+    window_end = models.DateField()
+    days_recorded = models.PositiveIntegerField(default=0)
+    days_present = models.PositiveIntegerField(default=0)
+    days_absent = models.PositiveIntegerField(default=0)
+    days_excused = models.PositiveIntegerField(default=0)
+    rate = models.FloatField(default=0, help_text='Present days as % of recorded, non-excused days')
+    consecutive_absences = models.PositiveIntegerField(default=0, help_text='Trailing run of absent days')
+    last_attendance_date = models.DateField(null=True, blank=True)
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['school', 'rate']),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id}: {self.rate:.1f}% ({self.window_start} - {self.window_end})"
+
+
+class AbsenteeismFlag(models.Model):
+    """A student crossing a chronic-absenteeism threshold"""
+    LOW_RATE = 'low_rate'
+    CONSECUTIVE = 'consecutive'
+    KIND_CHOICES = [
+        (LOW_RATE, 'Attendance rate below threshold'),
+        (CONSECUTIVE, 'Consecutive absences'),
+    ]
+    
+    school = models.ForeignKey('core.School', on_delete=models.CASCADE, related_name='absenteeism_flags')
+    student = models.ForeignKey('people.Student', on_delete=models.CASCADE, related_name='absenteeism_flags')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    value = models.FloatField(help_text='Rate (%) or number of consecutive absent days when flagged')
+    threshold = models.FloatField()
+    window_days = models.PositiveIntegerField()
+    flagged_on = models.DateField()
+    resolved_on = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-flagged_on']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'kind'],
+                condition=models.Q(resolved_on__isnull=True),
+                name='absenteeism_one_open_flag_per_kind',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['school', 'resolved_on', 'kind']),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.get_kind_display()} ({self.flagged_on})"
+    
+    @property
+    def is_open(self):
+        return self.resolved_on is None
+
+
+class AbsenteeismRun(models.Model):
+    """Watermark and stats for one AbsenteeismEngine run"""
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    watermark = models.DateTimeField(help_text='Attendance rows updated up to this time were processed')
+    as_of = models.DateField()
+    full = models.BooleanField(default=False)
+    students_processed = models.PositiveIntegerField(default=0)
+    flags_raised = models.PositiveIntegerField(default=0)
+    flags_resolved = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Absenteeism run {self.started_at:%Y-%m-%d %H:%M} ({self.students_processed} students)"
@@ -0,0 +1,109 @@
+"""
+Batch attendance-rate computation
+One grouped query per scope, post-processed as NumPy arrays
+"""
+import numpy as np
+from django.db.models import Count, Q
+
+from backend.attendance.models import Attendance
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = np.linspace(0, 100, 11)
+
+
+class AttendanceRates:
+    """Attendance rates, counts and percentile ranks for a set of students
+    
+    Scope is a school, a class (by session class) and/or a term. Counts are
+    computed in the database with a single GROUP BY student query; rates,
+    ranks and distribution statistics are computed on arrays.
+    """
+    
+    def __init__(self, school=None, klass=None, term=None):
+        if school is None and klass is None and term is None:
+            raise ValueError("school, klass or term required")
+        
+        qs = Attendance.objects.all()
+        if school is not None:
+            qs = qs.filter(school=school)
+        if klass is not None:
+            qs = qs.filter(session__klass=klass)
+        if term is not None:
+            qs = qs.filter(session__term=term)
+        
+        rows = list(
+            qs.values('student_id').annotate(
+                total=Count('id'),
+                present=Count('id', filter=Q(status='P')),
+                absent=Count('id', filter=Q(status='A')),
+                late=Count('id', filter=Q(status='L')),
+                excused=Count('id', filter=Q(status='E')),
+            ).order_by().values_list('student_id', 'total', 'present', 'absent', 'late', 'excused')
+        )
+        counts = np.array(rows, dtype=np.int64).reshape(-1, 6)
+        self.student_ids = counts[:, 0]
+        self.total = counts[:, 1]
+        self.present = counts[:, 2]
+        self.absent = counts[:, 3]
+        self.late = counts[:, 4]
+        self.excused = counts[:, 5]
+        self.rate = np.divide(
+            self.present * 100.0, self.total,
+            out=np.zeros(len(self.total)), where=self.total > 0
+        )
+        
+        # Percentile rank: share of students whose rate is at or below this one
+        sorted_rates = np.sort(self.rate)
+        n = len(sorted_rates)
+        self.percentile = (
+            np.searchsorted(sorted_rates, self.rate, side='right') * 100.0 / n
+            if n else np.zeros(0)
+        )
+    
+    def __len__(self):
+        return len(self.student_ids)
+    
+    def stats(self):
+        """Distribution statistics of the rates in scope"""
+        if not len(self):
+            return {'students': 0}
+        hist, _ = np.histogram(self.rate, bins=HISTOGRAM_BINS)
+        return {
+            'students': len(self),
+            'records': int(self.total.sum()),
+            'mean': float(self.rate.mean()),
+            'std': float(self.rate.std()),
+            'min': float(self.rate.min()),
+            'max': float(self.rate.max()),
+            'percentiles': {
+                f'p{p}': float(v) for p, v in zip(PERCENTILES, np.percentile(self.rate, PERCENTILES))
+            },
+            'histogram': [
+                {'from': int(lo), 'to': int(hi), 'students': int(count)}
+                for lo, hi, count in zip(HISTOGRAM_BINS[:-1], HISTOGRAM_BINS[1:], hist)
+            ],
+        }
+    
+    def ranked(self, ascending=False):
+        """Row indices ordered by rate, ties broken by more recorded sessions"""
+        rate_key = self.rate if ascending else -self.rate
+        return np.lexsort((self.student_ids, -self.total, rate_key))
+    
+    def page(self, page=1, page_size=100, ascending=False):
+        """One page of per-student results in rank order"""
+        order = self.ranked(ascending=ascending)
+        start = (page - 1) * page_size
+        return [
+            {
+                'rank': int(start + offset + 1),
+                'student_id': int(self.student_ids[i]),
+                'total_sessions': int(self.total[i]),
+                'present': int(self.present[i]),
+                'absent': int(self.absent[i]),
+                'late': int(self.late[i]),
+                'excused': int(self.excused[i]),
+                'rate': float(self.rate[i]),
+                'percentile': float(self.percentile[i]),
+            }
+            for offset, i in enumerate(order[start:start + page_size])
+        ]
@@ -2,17 +2,330 @@
 Attendance business logic services - Phase 1
 """
 from django.utils import timezone
-from django.db.models import Q, Count
+from django.utils.dateparse import parse_date
+from django.db.models import Q, Count, F, Sum
+from django.db.models.functions import Coalesce
+from collections import Counter
 from datetime import timedelta
-from backend.attendance.models import AttendanceSession, Attendance, AttendanceException
-from backend.core.models import Term
+from backend.attendance.models import AttendanceSession, Attendance, AttendanceException, DailyAttendanceRollup
+from backend.core.models import School, Term
+from backend.core.sharding import DIRECTORY, fan_out, instance_db, owned_rows, shard_atomic
+from backend.people.models import Student
+from backend.sync.changelog import record_changes
+from backend.sync.conflicts import ConflictResolver
+from backend.sync.hlc import InvalidVersion, clock
+from backend.sync.wire import AttendanceColumns
+
+
+class ExceptionResolver:
+    """Finds the roster students whose approved exceptions cover a day
+    
+    One interval-overlap query per class and date, served by the
+    (student, start_date, end_date) index on AttendanceException. An
+    exception counts once a teacher has approved it (approved_by is set).
+    """
+    
+    def __init__(self, klass_id, date):
+        self.klass_id = klass_id
+        self.date = date
+    
+    @classmethod
+    def for_session(cls, session):
+        return cls(session.klass_id, session.date)
+    
+    def queryset(self):
+        return AttendanceException.objects.filter(
+            student__in=Student.objects.filter(current_class_id=self.klass_id).values('id'),
+            start_date__lte=self.date,
+            end_date__gte=self.date,
+            approved_by__isnull=False,
+        )
+    
+    def covered(self):
+        """Map of student_id -> covering AttendanceException
+        
+        When several exceptions overlap the day, the most recent one wins.
+        """
+        covered = {}
+        for exception in self.queryset().only('id', 'student_id', 'category', 'start_date', 'end_date').order_by('start_date'):
+            covered[exception.student_id] = exception
+        return covered
+
+
+class BulkMarkingEngine:
+    """Set-based attendance marking for a whole session roster
+    
+    Validates every record in one pass, checks the roster against the
+    session's school with a single query and writes the rows with one
+    upsert per chunk keyed on the (session, student) unique constraint.
+    
+    Records may carry hybrid-logical-clock versions (``hlc``, or
+    ``status_hlc`` and ``remarks_hlc`` per field); records without one are
+    stamped with the server clock. Status and remarks are merged
+    independently against the stored row and the older value loses.
+    """
+    CHUNK_SIZE = 500
+    VALID_STATUSES = frozenset(code for code, _ in Attendance.STATUS_CHOICES)
+    UPDATE_FIELDS = ['status', 'remarks', 'status_hlc', 'remarks_hlc', 'marked_by', 'synced', 'updated_at']
+    VERSION_KEYS = ('hlc', 'status_hlc', 'remarks_hlc')
+    
+    def __init__(self, session, chunk_size=None):
+        self.session = session
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+    
+    @staticmethod
+    def record_rows(records, marked_by_id=None):
+        """(student_id, status, remarks, local_id, status_hlc, remarks_hlc, marked_by_id) per record
+        
+        Columnar records are read straight from their columns. The marker is
+        always marked_by_id: records cannot name another teacher. Records
+        that are not dicts yield empty values, which validate() rejects.
+        """
+        if isinstance(records, AttendanceColumns):
+            for student_id, status, remarks, local_id, version in records.rows():
+                yield student_id, status, remarks, local_id, version, version, marked_by_id
+            return
+        for record in records:
+            record = record if isinstance(record, dict) else {}
+            base = record.get('hlc')
+            yield (
+                record.get('student_id'), record.get('status'), record.get('remarks') or '',
+                record.get('local_id') or None, record.get('status_hlc', base), record.get('remarks_hlc', base),
+                marked_by_id,
+            )
+    
+    def validate(self, records, marked_by=None, student_schools=None):
+        """Normalise records and drop the ones that cannot be written
+        
+        Args:
+            records: List of dicts with student_id, status, remarks, or
+                AttendanceColumns
+            marked_by: Optional Teacher recorded as the marker of every record
+            student_schools: Optional preloaded dict of student_id -> school_id.
+                Callers handling several sessions resolve it once for all of them.
+        
+        Returns:
+            Tuple of (dict of student_id -> Attendance, list of errors).
+            Later records for the same student replace earlier ones.
+        """
+        marked_by_id = marked_by.id if marked_by else None
+        server_version = clock.now()
+        pending = {}
+        errors = []
+        
+        for index, row in enumerate(self.record_rows(records, marked_by_id)):
+            student_id, status, remarks, local_id, status_hlc, remarks_hlc, row_marked_by_id = row
+            try:
+                student_id = int(student_id)
+            except (TypeError, ValueError):
+                errors.append({'index': index, 'student_id': student_id, 'error': 'Invalid student_id'})
+                continue
+            if not isinstance(status, str) or status not in self.VALID_STATUSES:
+                errors.append({'index': index, 'student_id': student_id, 'error': f'Invalid status "{status}"'})
+                continue
+            try:
+                status_hlc, remarks_hlc = (
+                    server_version if version is None else clock.parse(version)
+                    for version in (status_hlc, remarks_hlc)
+                )
+            except InvalidVersion as e:
+                errors.append({'index': index, 'student_id': student_id, 'error': str(e)})
+                continue
+            
+            pending[student_id] = Attendance(
+                school_id=self.session.school_id,
+                session_id=self.session.id,
+                student_id=student_id,
+                status=status,
+                remarks=remarks,
+                marked_by_id=row_marked_by_id,
+                synced=False,
+                local_id=local_id,
+                status_hlc=status_hlc,
+                remarks_hlc=remarks_hlc,
+            )
+        
+        if pending:
+            # Look students up by primary key and compare the school in
+            # Python; filtering on person__school_id lets SQLite drive the
+            # join from the school index, which is far slower for big rosters.
+            school_of = student_schools
+            if school_of is None:
+                school_of = dict(
+                    Student.objects.filter(id__in=list(pending)).values_list('id', 'person__school_id')
+                )
+            for student_id in [sid for sid in pending if school_of.get(sid) != self.session.school_id]:
+                del pending[student_id]
+                errors.append({'student_id': student_id, 'error': 'Student not found in this school'})
+        
+        return pending, errors
+    
+    def excused_rows(self, covered, skip):
+        """Unsaved 'E' rows for covered students that have no mark yet"""
+        version = clock.now()
+        return {
+            student_id: Attendance(
+                school_id=self.session.school_id,
+                session_id=self.session.id,
+                student_id=student_id,
+                status='E',
+                remarks=f"Excused: {exception.get_category_display()}",
+                synced=False,
+                status_hlc=version,
+                remarks_hlc=version,
+            )
+            for student_id, exception in covered.items()
+            if student_id not in skip
+        }
+    
+    @staticmethod
+    def merge(pending, existing):
+        """Merge incoming rows with their stored versions in place
+        
+        Args:
+            pending: Dict of student_id -> unsaved Attendance
+            existing: Dict of student_id -> stored values and versions
+        
+        Returns:
+            Tuple of (student ids that won no field and must not be written,
+            dict of student_id -> losing fields)
+        """
+        rejected = set()
+        losers = {}
+        for sid, stored in existing.items():
+            obj = pending[sid]
+            incoming = {
+                'status': obj.status, 'remarks': obj.remarks,
+                'status_hlc': obj.status_hlc, 'remarks_hlc': obj.remarks_hlc,
+            }
+            merged, lost = ConflictResolver.resolve_attendance_conflict(stored, incoming)
+            if lost:
+                losers[sid] = lost
+            if merged == {key: stored[key] for key in incoming}:
+                rejected.add(sid)
+                continue
+            for key, value in merged.items():
+                setattr(obj, key, value)
+        return rejected, losers
+    
+    def mark(self, records, marked_by=None, student_schools=None, apply_exceptions=True):
+        """Validate and upsert a batch of attendance records
+        
+        Roster students covered by an AttendanceException who have not been
+        marked in the session are written as excused in the same upsert.
+        Explicit records always win over an exception.
+        
+        Stored rows for the whole batch are loaded with one query and each
+        record is merged against its row field by field. Values that lose to
+        a newer stored version are logged as SyncConflicts; a record that
+        wins no field is not written and reports ``conflict``.
+        
+        Returns:
+            Dict with created/updated counts, per-student results, the
+            auto-excused student ids, conflict count and errors
+        """
+        if self.session.status == 'synced':
+            raise ValueError("Cannot modify synced session")
+        
+        pending, errors = self.validate(records, marked_by=marked_by, student_schools=student_schools)
+        covered = ExceptionResolver.for_session(self.session).covered() if apply_exceptions else {}
+        if not pending and not covered:
+            return {'created': 0, 'updated': 0, 'results': [], 'excused': [], 'conflicts': 0, 'errors': errors}
+        
+        with shard_atomic(instance_db(self.session)):
+            # Serialise concurrent writers on the same session so the
+            # created/updated split and counter deltas below stay accurate.
+            AttendanceSession.objects.select_for_update().filter(pk=self.session.pk).first()
+            existing = {
+                row['student_id']: row
+                for row in Attendance.objects.filter(
+                    session_id=self.session.id,
+                    student_id__in=list(pending.keys() | covered.keys())
+                ).values('student_id', 'status', 'remarks', 'status_hlc', 'remarks_hlc')
+            }
+            excused = self.excused_rows(covered, skip=pending.keys() | existing.keys())
+            existing = {sid: row for sid, row in existing.items() if sid in pending}
+            
+            rejected, losers = self.merge(pending, existing)
+            rows = [obj for sid, obj in pending.items() if sid not in rejected] + list(excused.values())
+            
+            # Rows without a local_id must not clear one stored by an
+            # earlier sync, so they are upserted without that column.
+            with_local_id = [obj for obj in rows if obj.local_id]
+            without_local_id = [obj for obj in rows if not obj.local_id]
+            for objs, update_fields in (
+                (with_local_id, self.UPDATE_FIELDS + ['local_id']),
+                (without_local_id, self.UPDATE_FIELDS),
+            ):
+                for start in range(0, len(objs), self.chunk_size):
+                    Attendance.objects.bulk_create(
+                        objs[start:start + self.chunk_size],
+                        update_conflicts=True,
+                        unique_fields=['session', 'student'],
+                        update_fields=update_fields,
+                    )
+            
+            deltas = Counter(obj.status for obj in rows)
+            deltas.subtract(row['status'] for sid, row in existing.items() if sid not in rejected)
+            if rows:
+                self.session.apply_status_deltas(deltas, log_change=False)
+            
+            # Upserts do not return ids on every backend; read them back
+            # once for the change log and the per-record results.
+            ids = dict(
+                Attendance.objects.filter(
+                    session_id=self.session.id,
+                    student_id__in=list(pending.keys() | excused.keys())
+                ).values_list('student_id', 'id')
+            )
+            if rows:
+                record_changes(
+                    self.session.school_id,
+                    [('session', self.session.id, False)] + [('attendance', ids[obj.student_id], False) for obj in rows]
+                )
+            ConflictResolver.log_conflicts([
+                ConflictResolver.conflict(self.session.school_id, 'attendance', ids[sid], loser)
+                for sid, lost in losers.items()
+                for loser in lost
+            ])
+        
+        results = []
+        for sid, obj in pending.items():
+            result = {
+                'student_id': sid,
+                'local_id': obj.local_id,
+                'id': ids.get(sid),
+                'result': 'updated' if sid in existing else 'created',
+            }
+            if sid in rejected:
+                result['result'] = 'conflict' if sid in losers else 'unchanged'
+            if sid in losers:
+                result['conflicts'] = [field for field, _, _ in losers[sid]]
+            results.append(result)
+        updated_count = len(existing) - len(rejected)
+        return {
+            'created': len(pending) - len(existing),
+            'updated': updated_count,
+            'results': results,
+            'excused': list(excused),
+            'conflicts': sum(len(lost) for lost in losers.values()),
+            'errors': errors,
+        }
+    
+    def apply_exceptions(self):
+        """Excuse every covered roster student not yet marked in the session
+        
+        Returns:
+            List of student ids written as excused
+        """
+        return self.mark([])['excused']
 
 
 class AttendanceEngine:
     """Core attendance operations"""
     
     @staticmethod
-    def create_session(klass, term, date, subject=None, teacher=None):
+    def create_session(klass, term, date, subject=None, teacher=None, local_id=None):
         """Create new attendance session"""
         session, created = AttendanceSession.objects.get_or_create(
             school=klass.school,
@@ -22,9 +335,13 @@ class AttendanceEngine:
             defaults={
                 'term': term,
                 'teacher': teacher,
-                'status': 'open'
+                'status': 'open',
+                'local_id': local_id or None,
             }
         )
+        if created:
+            # Students on approved leave start out excused
+            BulkMarkingEngine(session).apply_exceptions()
         return session, created
     
     @staticmethod
@@ -52,36 +369,19 @@ class AttendanceEngine:
         return session
     
     @staticmethod
-    def bulk_mark_attendance(session, records):
+    def bulk_mark_attendance(session, records, marked_by=None):
         """Mark multiple attendance records at once
         
         Args:
             session: AttendanceSession
-            records: List of dicts with student_id, status, remarks, marked_by
+            records: List of dicts with student_id, status, remarks
+            marked_by: Optional Teacher recorded as the marker of every record
         
         Returns:
             Tuple of (created_count, updated_count)
         """
-        created_count = 0
-        updated_count = 0
-        
-        for record in records:
-            attendance, created = Attendance.objects.update_or_create(
-                session=session,
-                student_id=record['student_id'],
-                defaults={
-                    'status': record['status'],
-                    'remarks': record.get('remarks', ''),
-                    'marked_by_id': record.get('marked_by_id'),
-                    'synced': False
-                }
-            )
-            if created:
-                created_count += 1
-            else:
-                updated_count += 1
-        
-        return created_count, updated_count
+        result = BulkMarkingEngine(session).mark(records, marked_by=marked_by)
+        return result['created'], result['updated']
 
 
 class AttendanceService:
@@ -104,24 +404,50 @@ class AttendanceService:
         Returns:
             float: Attendance rate
         """
-        qs = Attendance.objects.filter(student=student, status='P')
-        
+        qs = Attendance.objects.filter(student=student)
         if term:
             qs = qs.filter(session__term=term)
         
-        total_sessions = Attendance.objects.filter(student=student)
-        if term:
-            total_sessions = total_sessions.filter(session__term=term)
-        
-        total_sessions = total_sessions.count()
+        counts = qs.aggregate(total=Count('id'), present=Count('id', filter=Q(status='P')))
+        total_sessions = counts['total']
         if total_sessions == 0:
             return 0
         
-        present_count = qs.count()
+        present_count = counts['present']
         rate = (present_count / total_sessions) * 100 if as_percentage else present_count / total_sessions
         
         return rate
     
+    @staticmethod
+    def calculate_attendance_rates(school=None, klass=None, term=None, page=1, page_size=100, ascending=False):
+        """Rank every student in a school, class and/or term by attendance rate
+        
+        Counts come from one grouped query; names are loaded for the
+        returned page only.
+        
+        Returns:
+            Dict with total count, distribution stats and one page of results
+        """
+        from backend.attendance.rates import AttendanceRates
+        
+        rates = AttendanceRates(school=school, klass=klass, term=term)
+        results = rates.page(page=page, page_size=page_size, ascending=ascending)
+        
+        students = Student.objects.filter(
+            id__in=[r['student_id'] for r in results]
+        ).values_list('id', 'admission_number', 'person__first_name', 'person__last_name')
+        names = {sid: (adm, f'{first} {last}') for sid, adm, first, last in students}
+        for result in results:
+            result['admission_number'], result['name'] = names.get(result['student_id'], (None, None))
+        
+        return {
+            'count': len(rates),
+            'page': page,
+            'page_size': page_size,
+            'stats': rates.stats(),
+            'results': results,
+        }
+    
     @staticmethod
     def get_absentees(klass, date=None):
         """Get students absent on specific date
@@ -154,96 +480,204 @@ class AttendanceService:
             status='L'
         ).select_related('student', 'session')
     
+    @staticmethod
+    def rollup_totals(rollups):
+        """Sum per-status counts over a DailyAttendanceRollup queryset"""
+        totals = rollups.aggregate(**{
+            status: Coalesce(Sum(field), 0)
+            for status, field in DailyAttendanceRollup.COUNTER_FIELDS.items()
+        })
+        total = sum(totals.values())
+        return {
+            'total_records': total,
+            'present': totals['P'],
+            'absent': totals['A'],
+            'late': totals['L'],
+            'excused': totals['E'],
+            'present_rate': (totals['P'] / total * 100) if total > 0 else 0,
+        }
+    
     @staticmethod
     def get_class_attendance_summary(klass, date=None, term=None):
         """Get attendance summary for class
         
+        Reads the daily rollup rather than raw attendance records.
+        
         Returns:
             Dict with attendance statistics
         """
         if not date:
             date = timezone.now().date()
         
-        qs = AttendanceSession.objects.filter(klass=klass, date=date)
+        rollups = DailyAttendanceRollup.objects.filter(klass=klass, date=date)
         if term:
-            qs = qs.filter(term=term)
-        
-        sessions = qs
-        attendance_qs = Attendance.objects.filter(session__in=sessions)
-        
-        stats = attendance_qs.values('status').annotate(count=Count('id')).order_by('status')
-        status_map = {s['status']: s['count'] for s in stats}
-        
-        total = attendance_qs.count()
+            rollups = rollups.filter(term=term)
         
         return {
             'date': date,
             'class': klass.name,
-            'total_records': total,
-            'present': status_map.get('P', 0),
-            'absent': status_map.get('A', 0),
-            'late': status_map.get('L', 0),
-            'excused': status_map.get('E', 0),
-            'present_rate': (status_map.get('P', 0) / total * 100) if total > 0 else 0,
+            **AttendanceService.rollup_totals(rollups),
         }
     
     @staticmethod
-    def generate_attendance_report(klass, start_date, end_date, term=None):
-        """Generate attendance report for class over date range
+    def get_daily_attendance_series(school, start_date, end_date, klass=None, term=None):
+        """Per-day attendance totals for a school or class over a date range
+        
+        Reads one rollup row per class per day, so a term-long dashboard
+        touches roughly 60 rows per class.
         
         Returns:
-            Dict with report data
+            Dict with range totals and a list of per-date totals
         """
-        sessions = AttendanceSession.objects.filter(
-            klass=klass,
-            date__gte=start_date,
-            date__lte=end_date
+        rollups = DailyAttendanceRollup.objects.filter(
+            school=school, date__gte=start_date, date__lte=end_date
         )
+        if klass:
+            rollups = rollups.filter(klass=klass)
+        if term:
+            rollups = rollups.filter(term=term)
+        
+        days = rollups.values('date').annotate(**{
+            name: Sum(field)
+            for name, field in (
+                ('present', 'count_present'), ('absent', 'count_absent'),
+                ('late', 'count_late'), ('excused', 'count_excused'),
+            )
+        }).order_by('date')
+        
+        series = []
+        for day in days:
+            total = day['present'] + day['absent'] + day['late'] + day['excused']
+            series.append({
+                **day,
+                'total_records': total,
+                'present_rate': (day['present'] / total * 100) if total > 0 else 0,
+            })
+        
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            **AttendanceService.rollup_totals(rollups),
+            'days': series,
+        }
+    
+    @staticmethod
+    def get_school_attendance_rates(start_date, end_date):
+        """Attendance totals per school over a date range, for every shard
+        
+        Each shard sums its own rollups (in parallel, see
+        backend.core.sharding.fan_out); the rows are merged and ranked here.
+        
+        Returns:
+            Dict with overall totals and one row per school, lowest rate first
+        """
+        def shard_totals():
+            return list(
+                DailyAttendanceRollup.objects.filter(date__gte=start_date, date__lte=end_date)
+                .values('school_id').annotate(**{
+                    name: Sum(field)
+                    for name, field in (
+                        ('present', 'count_present'), ('absent', 'count_absent'),
+                        ('late', 'count_late'), ('excused', 'count_excused'),
+                    )
+                }).order_by()
+            )
+        
+        schools = owned_rows(fan_out(shard_totals))
+        names = dict(School.objects.using(DIRECTORY).filter(
+            id__in=[row['school_id'] for row in schools]
+        ).values_list('id', 'name'))
+        totals = Counter()
+        for row in schools:
+            counts = {name: row[name] for name in ('present', 'absent', 'late', 'excused')}
+            totals.update(counts)
+            total = sum(counts.values())
+            row.update({
+                'school_name': names.get(row['school_id']),
+                'total_records': total,
+                'present_rate': (row['present'] / total * 100) if total > 0 else 0,
+            })
+        schools.sort(key=lambda row: (row['present_rate'], row['school_id']))
         
+        total = sum(totals.values())
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'total_records': total,
+            'present': totals['present'],
+            'absent': totals['absent'],
+            'late': totals['late'],
+            'excused': totals['excused'],
+            'present_rate': (totals['present'] / total * 100) if total > 0 else 0,
+            'schools': schools,
+        }
+    
+    @staticmethod
+    def attendance_records_queryset(klass, start_date, end_date, term=None):
+        """Attendance rows for a class over a date range, unevaluated"""
+        qs = Attendance.objects.filter(
+            session__klass=klass,
+            session__date__gte=start_date,
+            session__date__lte=end_date
+        )
         if term:
-            sessions = sessions.filter(term=term)
+            qs = qs.filter(session__term=term)
+        return qs
+    
+    @staticmethod
+    def attendance_report_queryset(klass, start_date, end_date, term=None):
+        """Per-student status totals for a class, aggregated in the database
         
-        attendance_qs = Attendance.objects.filter(
-            session__in=sessions
-        ).select_related('student', 'session')
+        Returns:
+            Values QuerySet with one row per student, ordered by admission number
+        """
+        return AttendanceService.attendance_records_queryset(
+            klass, start_date, end_date, term=term
+        ).values(
+            'student_id',
+            admission_number=F('student__admission_number'),
+            first_name=F('student__person__first_name'),
+            last_name=F('student__person__last_name'),
+        ).annotate(
+            total_sessions=Count('id'),
+            present=Count('id', filter=Q(status='P')),
+            absent=Count('id', filter=Q(status='A')),
+            late=Count('id', filter=Q(status='L')),
+            excused=Count('id', filter=Q(status='E')),
+        ).order_by('admission_number')
+    
+    @staticmethod
+    def format_report_row(row):
+        """Turn an aggregated report row into the report dict shape"""
+        total = row['total_sessions']
+        return {
+            'student_id': row['student_id'],
+            'admission_number': row['admission_number'],
+            'name': f"{row['first_name']} {row['last_name']}",
+            'total_sessions': total,
+            'present': row['present'],
+            'absent': row['absent'],
+            'late': row['late'],
+            'excused': row['excused'],
+            'rate': (row['present'] / total) * 100 if total > 0 else 0,
+        }
+    
+    @staticmethod
+    def generate_attendance_report(klass, start_date, end_date, term=None):
+        """Generate attendance report for class over date range
         
-        # Group by student
-        report = {}
-        for record in attendance_qs:
-            student = record.student
-            if student.id not in report:
-                report[student.id] = {
-                    'student': student,
-                    'admission_number': student.admission_number,
-                    'name': student.person.full_name,
-                    'total_sessions': 0,
-                    'present': 0,
-                    'absent': 0,
-                    'late': 0,
-                    'excused': 0,
-                    'rate': 0,
-                }
-            
-            report[student.id]['total_sessions'] += 1
-            if record.status == 'P':
-                report[student.id]['present'] += 1
-            elif record.status == 'A':
-                report[student.id]['absent'] += 1
-            elif record.status == 'L':
-                report[student.id]['late'] += 1
-            elif record.status == 'E':
-                report[student.id]['excused'] += 1
-        
-        # Calculate rates
-        for student_data in report.values():
-            if student_data['total_sessions'] > 0:
-                student_data['rate'] = (student_data['present'] / student_data['total_sessions']) * 100
-        
-        return list(report.values())
+        Returns:
+            List of per-student dicts with status totals and attendance rate
+        """
+        rows = AttendanceService.attendance_report_queryset(klass, start_date, end_date, term=term)
+        return [AttendanceService.format_report_row(row) for row in rows]
     
     @staticmethod
     def check_attendance_exceptions(student, date):
-        """Check if student has exceptions covering a date
+        """Check if student has an approved exception covering a date
+        
+        For a whole class use ExceptionResolver, which answers for every
+        student in one query.
         
         Returns:
             AttendanceException or None
@@ -251,7 +685,8 @@ class AttendanceService:
         return AttendanceException.objects.filter(
             student=student,
             start_date__lte=date,
-            end_date__gte=date
+            end_date__gte=date,
+            approved_by__isnull=False,
         ).first()
     
     @staticmethod
@@ -289,6 +724,258 @@ class AttendanceService:
         return qs[:limit]
 
 
+class SyncIngest:
+    """Multi-session attendance ingest for reconnecting devices
+    
+    Each entry references an existing session by ``session_id``, or
+    describes one created offline with ``class_id``, ``date``, an optional
+    ``subject_id`` and the device's ``local_id``. Records may carry a
+    ``local_id`` too; ``(school, local_id)`` is the idempotency key.
+    
+    Sessions, classes, subjects, previously stored local_ids and students
+    are each resolved with one ``IN`` query. Records whose local_id is
+    already stored with the same content are reported as ``unchanged``
+    without being written, so a replayed batch costs only those lookups.
+    Everything else goes through BulkMarkingEngine, one transaction per
+    session, so a failure only affects that session. Malformed entries and
+    records are reported in that entry's outcome.
+    """
+    
+    def __init__(self, sessions, school=None, marked_by=None):
+        self.entries = sessions
+        self.school = school
+        self.marked_by = marked_by
+    
+    def run(self):
+        self._resolve_references()
+        self._load_stored_records()
+        
+        plans = [self._plan(entry) for entry in self.entries]
+        
+        fresh_ids = {
+            int(row[0])
+            for plan in plans if 'fresh' in plan
+            for row in BulkMarkingEngine.record_rows(plan['fresh'])
+            if str(row[0]).isdigit()
+        }
+        student_schools = dict(
+            Student.objects.filter(id__in=fresh_ids).values_list('id', 'person__school_id')
+        ) if fresh_ids else {}
+        
+        return [self._apply(plan, student_schools) for plan in plans]
+    
+    def _scoped(self, qs):
+        return qs.filter(school=self.school) if self.school is not None else qs
+    
+    @staticmethod
+    def _id(value):
+        """value as a primary key, or None when it cannot be one"""
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value if value > 0 else None
+        if isinstance(value, str) and value.isdigit():
+            return int(value)
+        return None
+    
+    @staticmethod
+    def _records(entry):
+        """The entry's records, or an empty list when they are not a list"""
+        records = entry.get('records') or []
+        return records if isinstance(records, (list, AttendanceColumns)) else []
+    
+    @staticmethod
+    def _parse_date(value):
+        try:
+            return parse_date(str(value))
+        except ValueError:
+            # Well formed but not a real date, e.g. 2026-02-30
+            return None
+    
+    def _resolve_references(self):
+        from backend.core.models import Class, Subject
+        
+        session_ids, session_local_ids = set(), set()
+        class_ids, subject_ids = set(), set()
+        for entry in self.entries:
+            if not isinstance(entry, dict):
+                continue
+            if entry.get('session_id'):
+                session_ids.add(self._id(entry['session_id']))
+            elif entry.get('class_id'):
+                class_ids.add(self._id(entry['class_id']))
+                if entry.get('subject_id'):
+                    subject_ids.add(self._id(entry['subject_id']))
+                if entry.get('local_id'):
+                    session_local_ids.add(str(entry['local_id']))
+        # Malformed ids are reported by _plan
+        session_ids.discard(None)
+        class_ids.discard(None)
+        subject_ids.discard(None)
+        
+        self.sessions_by_id = {}
+        self.sessions_by_local_id = {}
+        if session_ids or session_local_ids:
+            for session in self._scoped(AttendanceSession.objects.filter(
+                Q(id__in=session_ids) | Q(local_id__in=session_local_ids)
+            )):
+                self.sessions_by_id[str(session.id)] = session
+                if session.local_id:
+                    self.sessions_by_local_id[(session.school_id, session.local_id)] = session
+        
+        self.classes_by_id = {
+            str(c.id): c
+            for c in self._scoped(Class.objects.filter(id__in=class_ids).select_related('school'))
+        } if class_ids else {}
+        self.subjects_by_id = {
+            str(s.id): s for s in self._scoped(Subject.objects.filter(id__in=subject_ids))
+        } if subject_ids else {}
+        self.terms_by_school = {}
+    
+    def _load_stored_records(self):
+        local_ids = {
+            str(row[3])
+            for entry in self.entries if isinstance(entry, dict)
+            for row in BulkMarkingEngine.record_rows(self._records(entry))
+            if row[3]
+        }
+        self.stored = {}
+        if local_ids:
+            rows = self._scoped(Attendance.objects.filter(local_id__in=local_ids)).values_list(
+                'school_id', 'local_id', 'id', 'session_id', 'student_id', 'status', 'remarks'
+            )
+            for school_id, local_id, *row in rows:
+                self.stored[(school_id, local_id)] = row
+    
+    def _plan(self, entry):
+        """Resolve the entry's session and split records into replayed and fresh"""
+        if not isinstance(entry, dict):
+            entry = {}
+            error = 'Session entry must be an object'
+        else:
+            error = None
+        outcome = {
+            'session_id': entry.get('session_id'),
+            'local_id': entry.get('local_id'),
+            'created': 0,
+            'updated': 0,
+            'results': [],
+            'errors': [],
+        }
+        plan = {'entry': entry, 'outcome': outcome, 'session': None}
+        if error:
+            outcome['error'] = error
+            return plan
+        
+        records = entry.get('records') or []
+        if not isinstance(records, (list, AttendanceColumns)):
+            outcome['error'] = 'records must be a list'
+            return plan
+        if entry.get('session_id'):
+            session_id = self._id(entry['session_id'])
+            if session_id is None:
+                outcome['error'] = 'Invalid session_id'
+                return plan
+            plan['session'] = self.sessions_by_id.get(str(session_id))
+            if plan['session'] is None:
+                outcome['error'] = 'Session not found'
+                return plan
+        elif entry.get('class_id') and entry.get('date'):
+            class_id = self._id(entry['class_id'])
+            if class_id is None:
+                outcome['error'] = 'Invalid class_id'
+                return plan
+            klass = self.classes_by_id.get(str(class_id))
+            if klass is None:
+                outcome['error'] = 'Class not found'
+                return plan
+            if entry.get('local_id'):
+                plan['session'] = self.sessions_by_local_id.get((klass.school_id, str(entry['local_id'])))
+            if plan['session'] is None:
+                subject_id = self._id(entry.get('subject_id'))
+                if entry.get('subject_id') and subject_id is None:
+                    outcome['error'] = 'Invalid subject_id'
+                    return plan
+                subject = self.subjects_by_id.get(str(subject_id))
+                date = self._parse_date(entry['date'])
+                if entry.get('subject_id') and subject is None:
+                    outcome['error'] = 'Subject not found'
+                    return plan
+                if date is None:
+                    outcome['error'] = 'Invalid date'
+                    return plan
+                plan.update(klass=klass, subject=subject, date=date)
+        else:
+            outcome['error'] = 'session_id or class_id and date required'
+            return plan
+        
+        session = plan['session']
+        school_id = session.school_id if session else plan['klass'].school_id
+        fresh = []
+        for index, row in enumerate(BulkMarkingEngine.record_rows(records)):
+            if not isinstance(records, AttendanceColumns) and not isinstance(records[index], dict):
+                outcome['errors'].append({'index': index, 'error': 'Record must be an object'})
+                continue
+            record_student_id, record_status, record_remarks, local_id = row[:4]
+            stored = self.stored.get((school_id, str(local_id))) if local_id else None
+            if stored is None:
+                fresh.append(index)
+                continue
+            stored_id, session_id, student_id, status, remarks = stored
+            if session is None or session_id != session.id or str(student_id) != str(record_student_id):
+                outcome['errors'].append({
+                    'index': index,
+                    'student_id': record_student_id,
+                    'local_id': local_id,
+                    'error': 'local_id already used for another record',
+                })
+            elif status == record_status and remarks == record_remarks:
+                outcome['results'].append({
+                    'student_id': student_id, 'local_id': local_id,
+                    'id': stored_id, 'result': 'unchanged',
+                })
+            else:
+                fresh.append(index)
+        plan['fresh'] = records.take(fresh) if isinstance(records, AttendanceColumns) else [records[i] for i in fresh]
+        return plan
+    
+    def _apply(self, plan, student_schools):
+        outcome = plan['outcome']
+        session = plan['session']
+        if 'fresh' not in plan:
+            return outcome
+        if session is not None:
+            outcome['session_id'] = session.id
+            if not plan['fresh']:
+                return outcome
+        
+        try:
+            with shard_atomic():
+                if session is None:
+                    klass = plan['klass']
+                    if klass.school_id not in self.terms_by_school:
+                        self.terms_by_school[klass.school_id] = AttendanceService.get_current_term(klass.school)
+                    session, _ = AttendanceEngine.create_session(
+                        klass,
+                        self.terms_by_school[klass.school_id],
+                        plan['date'],
+                        subject=plan['subject'],
+                        teacher=self.marked_by,
+                        local_id=plan['entry'].get('local_id'),
+                    )
+                    outcome['session_id'] = session.id
+                marked = BulkMarkingEngine(session).mark(
+                    plan['fresh'], marked_by=self.marked_by, student_schools=student_schools
+                )
+        except Exception as e:
+            outcome['error'] = str(e)
+            return outcome
+        
+        outcome['created'] = marked['created']
+        outcome['updated'] = marked['updated']
+        outcome['results'].extend(marked['results'])
+        outcome['errors'].extend(marked['errors'])
+        return outcome
+
+
 class SyncService:
     """Sync-ready operations for offline-first reconciliation"""
     
@@ -334,25 +1021,31 @@ class SyncService:
             ]
         }
     
+    @staticmethod
+    def ingest(sessions, school=None, marked_by=None):
+        """Apply offline attendance for many sessions in one pass
+        
+        See SyncIngest for the request shape and query plan.
+        
+        Returns:
+            List of per-session result dicts in request order
+        """
+        return SyncIngest(sessions, school=school, marked_by=marked_by).run()
+    
     @staticmethod
     def handle_sync_conflict(local_record, server_record):
-        """Handle conflicts during sync - last write wins
+        """Merge a client and a server version of an attendance record
         
         Args:
-            local_record: Dict from client
-            server_record: Dict from server
+            local_record: Dict from client with status, remarks and their
+                status_hlc/remarks_hlc versions
+            server_record: Dict from server in the same shape
         
         Returns:
-            Dict: The record that should be kept
+            Dict: The merged record; each field comes from the newer version
         """
-        # Parse timestamps
-        local_time = local_record.get('marked_at')
-        server_time = server_record.get('marked_at')
-        
-        # Last write wins
-        if local_time > server_time:
-            return local_record
-        return server_record
+        merged, _ = ConflictResolver.resolve_attendance_conflict(server_record, local_record)
+        return merged
     
     @staticmethod
     def mark_records_synced(record_ids):
@@ -0,0 +1,99 @@
+"""
+Signal handlers keeping session counters, daily rollups and the change log
+in step with deletes
+Saves are handled in the models' save(); bulk paths apply their own deltas.
+"""
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from backend.attendance.models import Attendance, AttendanceSession, AttendanceException, DailyAttendanceRollup
+from backend.core.models import Term
+from backend.sync.changelog import record, record_changes
+
+
+def deleting_sessions(origin):
+    """True when a delete started from AttendanceSession rows themselves"""
+    return isinstance(origin, AttendanceSession) or getattr(origin, 'model', None) is AttendanceSession
+
+
+def deleting_schools(origin):
+    """True when a whole school is being deleted, change log included"""
+    from backend.core.models import School
+    return isinstance(origin, School) or getattr(origin, 'model', None) is School
+
+
+@receiver(post_delete, sender=Attendance)
+def attendance_deleted(sender, instance, origin=None, **kwargs):
+    """Decrement the session counter and rollup and log a tombstone"""
+    # Deleting the session itself cascades here; session_deleted settles
+    # the rollup in one go and its tombstone covers the records.
+    if deleting_sessions(origin) or deleting_schools(origin):
+        return
+    stored_session_id, stored_status = getattr(instance, '_stored_state', (instance.session_id, instance.status))
+    session = instance.session if stored_session_id == instance.session_id else (
+        AttendanceSession.objects.filter(pk=stored_session_id).first()
+    )
+    changes = [('attendance', instance.pk, True)]
+    if session is not None:
+        session.apply_status_deltas({stored_status: -1}, log_change=False)
+        changes.append(('session', session.pk, False))
+    record_changes(instance.school_id, changes)
+
+
+@receiver(pre_delete, sender=AttendanceSession)
+def session_deleted(sender, instance, origin=None, **kwargs):
+    """Remove a session's counts from its daily rollup before it is deleted"""
+    # Other cascades (class, school, student) settle the rollup record by
+    # record in attendance_deleted.
+    if not deleting_sessions(origin):
+        return
+    fields = list(AttendanceSession.COUNTER_FIELDS.values())
+    instance.refresh_from_db(fields=fields)
+    counts = {status: -instance.get_attendance_count(status) for status in AttendanceSession.COUNTER_FIELDS}
+    DailyAttendanceRollup.apply_deltas(instance.rollup_key(), counts)
+
+
+@receiver(pre_delete, sender=Term)
+def term_deleted(sender, instance, origin=None, **kwargs):
+    """Fold a deleted term's rollup rows into the term-less rows of the same days
+    
+    The term's sessions keep their counts with term set to NULL, so their
+    rollup rows must land in the NULL-term bucket too. The rows are moved
+    with set-based queries, not one per day.
+    """
+    # Deleting the school drops its rollups along with the term.
+    if not (isinstance(origin, Term) or getattr(origin, 'model', None) is Term):
+        return
+    # Its sessions lose their term without a save(), so log them here
+    record(instance.school_id, 'session', instance.attendance_sessions.values_list('id', flat=True))
+    rows = DailyAttendanceRollup.objects.filter(term=instance)
+    DailyAttendanceRollup.objects.bulk_create(
+        [DailyAttendanceRollup(school_id=school_id, klass_id=klass_id, date=date)
+         for school_id, klass_id, date in rows.values_list('school_id', 'klass_id', 'date')],
+        ignore_conflicts=True,
+    )
+    folded = rows.filter(klass_id=OuterRef('klass_id'), date=OuterRef('date'))
+    DailyAttendanceRollup.objects.filter(school_id=instance.school_id, term__isnull=True).filter(Exists(folded)).update(**{
+        field: F(field) + Subquery(folded.values(field)[:1])
+        for field in DailyAttendanceRollup.COUNTER_FIELDS.values()
+    })
+    rows.delete()
+
+
+@receiver(post_delete, sender=AttendanceSession)
+def session_tombstone(sender, instance, origin=None, **kwargs):
+    if not deleting_schools(origin):
+        record(instance.school_id, 'session', [instance.pk], deleted=True)
+
+
+@receiver(pre_delete, sender=AttendanceException)
+def exception_deleting(sender, instance, **kwargs):
+    # The student may be deleted in the same cascade, so resolve the school first
+    instance._school_id = instance.get_school_id()
+
+
+@receiver(post_delete, sender=AttendanceException)
+def exception_tombstone(sender, instance, origin=None, **kwargs):
+    if not deleting_schools(origin):
+        record(getattr(instance, '_school_id', None), 'exception', [instance.pk], deleted=True)
@@ -0,0 +1,428 @@
+"""
+Bulk sync handlers for attendance data types
+Registered with SyncEngine through backend.sync.handlers.DEFAULT_SYNC_HANDLERS.
+"""
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from backend.attendance.models import Attendance, AttendanceSession, AttendanceException
+from backend.attendance.services import AttendanceService, BulkMarkingEngine, SyncIngest
+from backend.people.models import Student
+from backend.sync.changelog import record
+from backend.sync.handlers import SyncHandler
+
+
+def split_record_ids(changes):
+    """Split record_ids into server ids and device local_ids"""
+    ids, local_ids = set(), set()
+    for change in changes:
+        record_id = str(change.get('record_id') or '')
+        if record_id.isdigit():
+            ids.add(int(record_id))
+        elif record_id:
+            local_ids.add(record_id)
+    return ids, local_ids
+
+
+def match_record(change, by_id, by_local_id):
+    """Find the stored row a change's record_id refers to"""
+    record_id = str(change.get('record_id') or '')
+    if record_id.isdigit():
+        return by_id.get(int(record_id))
+    return by_local_id.get(record_id)
+
+
+class SessionSyncHandler(SyncHandler):
+    """Attendance sessions created, closed or deleted offline
+    
+    Create payload: class_id, date, optional subject_id and local_id; the
+    caller becomes the session's teacher. Sessions already stored under the
+    local_id, or for the same class, date and subject, are reported as
+    unchanged. Update payload: status and/or teacher_id, which must name a
+    teacher of the caller's school (or null).
+    """
+    data_type = 'session'
+    permission = 'mark_attendance'
+    UPDATABLE_STATUSES = ('open', 'closed')
+    
+    def create(self, changes):
+        from backend.core.models import Class, Subject
+        school = self.context.school
+        payloads = {change['index']: change.get('payload') or {} for change in changes}
+        
+        class_ids = {p.get('class_id') for p in payloads.values() if p.get('class_id')}
+        subject_ids = {p.get('subject_id') for p in payloads.values() if p.get('subject_id')}
+        classes = {str(c.id): c for c in Class.objects.filter(school=school, id__in=class_ids)} if class_ids else {}
+        subjects = {str(s.id): s for s in Subject.objects.filter(school=school, id__in=subject_ids)} if subject_ids else {}
+        
+        outcomes = {}
+        planned = {}
+        for change in changes:
+            payload = payloads[change['index']]
+            klass = classes.get(str(payload.get('class_id')))
+            date = parse_date(str(payload.get('date') or ''))
+            if klass is None:
+                outcomes[change['index']] = self.error('Class not found')
+            elif date is None:
+                outcomes[change['index']] = self.error('Invalid date')
+            elif payload.get('subject_id') and str(payload['subject_id']) not in subjects:
+                outcomes[change['index']] = self.error('Subject not found')
+            else:
+                planned[change['index']] = (
+                    klass, date, subjects.get(str(payload.get('subject_id'))),
+                    str(payload.get('local_id') or change.get('record_id') or '') or None,
+                )
+        
+        existing = AttendanceSession.objects.filter(school=school).filter(
+            Q(local_id__in=[p[3] for p in planned.values() if p[3]]) |
+            Q(klass_id__in=[p[0].id for p in planned.values()], date__in=[p[1] for p in planned.values()])
+        ).only('id', 'klass_id', 'date', 'subject_id', 'local_id') if planned else []
+        by_local_id = {s.local_id: s for s in existing if s.local_id}
+        by_key = {(s.klass_id, s.date, s.subject_id): s for s in existing}
+        
+        term = AttendanceService.get_current_term(school)
+        new_sessions = {}
+        for index, (klass, date, subject, local_id) in planned.items():
+            key = (klass.id, date, subject.id if subject else None)
+            found = by_local_id.get(local_id) or by_key.get(key)
+            if found is None and key in new_sessions:
+                found = new_sessions[key]
+            if found is not None:
+                outcomes[index] = {'result': 'unchanged', 'session': found}
+                continue
+            new_sessions[key] = AttendanceSession(
+                school=school, klass=klass, term=term, date=date, subject=subject,
+                teacher_id=self.context.teacher_id, status='open', local_id=local_id,
+            )
+            outcomes[index] = {'result': 'created', 'session': new_sessions[key]}
+        
+        AttendanceSession.objects.bulk_create(list(new_sessions.values()))
+        record(school.id, 'session', [session.id for session in new_sessions.values()])
+        for session in new_sessions.values():
+            BulkMarkingEngine(session).apply_exceptions()
+        
+        for outcome in outcomes.values():
+            session = outcome.pop('session', None)
+            if session is not None:
+                outcome['id'] = session.id
+        return outcomes
+    
+    def school_teacher_ids(self, changes):
+        """Ids of the teachers of the caller's school named in update payloads"""
+        from backend.people.models import Teacher
+        requested = {
+            int(teacher_id) for teacher_id in (
+                (change.get('payload') or {}).get('teacher_id') for change in changes
+            )
+            if str(teacher_id).isdigit()
+        }
+        if not requested:
+            return set()
+        return set(
+            Teacher.objects.filter(id__in=requested, person__school=self.context.school).values_list('id', flat=True)
+        )
+    
+    def update(self, changes):
+        ids, local_ids = split_record_ids(changes)
+        sessions = list(AttendanceSession.objects.filter(school=self.context.school).filter(
+            Q(id__in=ids) | Q(local_id__in=local_ids)
+        ))
+        by_id = {s.id: s for s in sessions}
+        by_local_id = {s.local_id: s for s in sessions if s.local_id}
+        teacher_ids = self.school_teacher_ids(changes)
+        
+        outcomes = self.not_found(
+            [change for change in changes if match_record(change, by_id, by_local_id) is None], 'Session not found'
+        )
+        changed = {}
+        for change in changes:
+            session = match_record(change, by_id, by_local_id)
+            payload = change.get('payload') or {}
+            status = payload.get('status', session.status if session else None)
+            if session is None:
+                continue
+            if session.status == 'synced':
+                outcomes[change['index']] = self.error('Cannot modify synced session')
+                continue
+            if status not in self.UPDATABLE_STATUSES:
+                outcomes[change['index']] = self.error(f'Invalid status "{status}"')
+                continue
+            teacher_id = payload.get('teacher_id', session.teacher_id)
+            if teacher_id is not None:
+                if not str(teacher_id).isdigit():
+                    outcomes[change['index']] = self.error('Invalid teacher_id')
+                    continue
+                teacher_id = int(teacher_id)
+                if teacher_id != session.teacher_id and teacher_id not in teacher_ids:
+                    outcomes[change['index']] = self.error('Teacher not found in this school')
+                    continue
+            if status == session.status and teacher_id == session.teacher_id:
+                outcomes[change['index']] = {'result': 'unchanged', 'id': session.id}
+                continue
+            if status != session.status:
+                session.status = status
+                session.closed_at = timezone.now() if status == 'closed' else None
+            session.teacher_id = teacher_id
+            session.updated_at = timezone.now()
+            changed[session.id] = session
+            outcomes[change['index']] = {'result': 'updated', 'id': session.id}
+        
+        AttendanceSession.objects.bulk_update(
+            list(changed.values()), ['status', 'closed_at', 'teacher', 'updated_at'], batch_size=500
+        )
+        record(self.context.school.id, 'session', list(changed))
+        return outcomes
+    
+    def delete(self, changes):
+        ids, local_ids = split_record_ids(changes)
+        found = AttendanceSession.objects.filter(school=self.context.school).filter(
+            Q(id__in=ids) | Q(local_id__in=local_ids)
+        )
+        stored = list(found.values_list('id', 'local_id'))
+        by_id = {pk: pk for pk, _ in stored}
+        by_local_id = {local_id: pk for pk, local_id in stored if local_id}
+        found.delete()
+        
+        outcomes = {}
+        for change in changes:
+            pk = match_record(change, by_id, by_local_id)
+            # A session that is already gone is a replayed delete
+            outcomes[change['index']] = {'result': 'deleted', 'id': pk} if pk else {'result': 'unchanged'}
+        return outcomes
+
+
+class AttendanceSyncHandler(SyncHandler):
+    """Attendance marks, written through SyncIngest and BulkMarkingEngine
+    
+    Create/update payload: student_id, status, optional remarks and
+    local_id, and the session as session_id or session_local_id. Updates
+    may instead name the stored row by record_id (server id or local_id).
+    """
+    data_type = 'attendance'
+    permission = 'mark_attendance'
+    
+    def create(self, changes):
+        return self.upsert(changes)
+    
+    def update(self, changes):
+        return self.upsert(changes)
+    
+    def upsert(self, changes):
+        school = self.context.school
+        payloads = {change['index']: dict(change.get('payload') or {}) for change in changes}
+        
+        # Updates addressed by record_id take session and student from the stored row
+        ids, local_ids = split_record_ids([c for c in changes if not payloads[c['index']].get('student_id')])
+        if ids or local_ids:
+            rows = Attendance.objects.filter(school=school).filter(
+                Q(id__in=ids) | Q(local_id__in=local_ids)
+            ).values_list('id', 'local_id', 'session_id', 'student_id')
+            by_id = {row[0]: row for row in rows}
+            by_local_id = {row[1]: row for row in by_id.values() if row[1]}
+            for change in changes:
+                payload = payloads[change['index']]
+                row = None if payload.get('student_id') else match_record(change, by_id, by_local_id)
+                if row is not None:
+                    payload.setdefault('session_id', row[2])
+                    payload['student_id'] = row[3]
+                    payload.setdefault('local_id', row[1])
+        
+        session_local_ids = {
+            str(p['session_local_id']) for p in payloads.values()
+            if p.get('session_local_id') and not p.get('session_id')
+        }
+        session_by_local_id = dict(
+            AttendanceSession.objects.filter(school=school, local_id__in=session_local_ids).values_list('local_id', 'id')
+        ) if session_local_ids else {}
+        
+        outcomes = {}
+        entries = {}
+        for change in changes:
+            payload = payloads[change['index']]
+            session_id = payload.get('session_id') or session_by_local_id.get(str(payload.get('session_local_id')))
+            if not session_id:
+                outcomes[change['index']] = self.error('Session not found')
+                continue
+            if not payload.get('student_id'):
+                outcomes[change['index']] = self.error('Record not found' if change['action'] == 'update' else 'student_id required')
+                continue
+            entry = entries.setdefault(str(session_id), {'session_id': session_id, 'records': [], 'indexes': {}})
+            entry['records'].append({
+                'student_id': payload['student_id'],
+                'status': payload.get('status'),
+                'remarks': payload.get('remarks') or '',
+                'local_id': payload.get('local_id') or None,
+                **{key: payload[key] for key in BulkMarkingEngine.VERSION_KEYS if payload.get(key) is not None},
+            })
+            entry['indexes'].setdefault(str(payload['student_id']), []).append(change['index'])
+        
+        if not entries:
+            return outcomes
+        
+        ingest = SyncIngest(
+            [{'session_id': e['session_id'], 'records': e['records']} for e in entries.values()],
+            school=school,
+            marked_by=self.context.teacher,
+        )
+        for entry, result in zip(entries.values(), ingest.run()):
+            indexes = entry['indexes']
+            if result.get('error'):
+                for change_indexes in indexes.values():
+                    for index in change_indexes:
+                        outcomes[index] = self.error(result['error'])
+                continue
+            for record in result['results']:
+                for index in indexes.get(str(record['student_id']), []):
+                    outcomes[index] = {'result': record['result'], 'id': record.get('id')}
+                    if record.get('conflicts'):
+                        outcomes[index]['conflicts'] = record['conflicts']
+            for error in result['errors']:
+                for index in indexes.get(str(error.get('student_id')), []):
+                    outcomes[index] = self.error(error['error'])
+        
+        return outcomes
+    
+    def delete(self, changes):
+        ids, local_ids = split_record_ids(changes)
+        found = Attendance.objects.filter(school=self.context.school).filter(
+            Q(id__in=ids) | Q(local_id__in=local_ids)
+        )
+        stored = list(found.values_list('id', 'local_id'))
+        by_id = {pk: pk for pk, _ in stored}
+        by_local_id = {local_id: pk for pk, local_id in stored if local_id}
+        # Counters and rollups are settled by the post_delete signal
+        found.delete()
+        
+        outcomes = {}
+        for change in changes:
+            pk = match_record(change, by_id, by_local_id)
+            outcomes[change['index']] = {'result': 'deleted', 'id': pk} if pk else {'result': 'unchanged'}
+        return outcomes
+
+
+class ExceptionSyncHandler(SyncHandler):
+    """Absences recorded offline, pending approval
+    
+    Create payload: student_id, category, start_date, end_date, reason.
+    An identical exception already on file is reported as unchanged.
+    Exceptions are stored unapproved: approving one excuses the student,
+    which stays with the school's staff. Approved exceptions cannot be
+    changed or deleted through sync.
+    """
+    data_type = 'exception'
+    permission = 'mark_attendance'
+    CATEGORIES = frozenset(code for code, _ in AttendanceException.CATEGORY_CHOICES)
+    FIELDS = ('category', 'start_date', 'end_date', 'reason')
+    
+    def clean(self, payload, current=None):
+        """Validated field values, or an error message"""
+        values = {field: payload.get(field, getattr(current, field, None)) for field in self.FIELDS}
+        for field in ('start_date', 'end_date'):
+            if not hasattr(values[field], 'isoformat'):
+                values[field] = parse_date(str(values[field] or ''))
+            if values[field] is None:
+                return f'Invalid {field}'
+        if values['category'] not in self.CATEGORIES:
+            return f'Invalid category "{values["category"]}"'
+        if values['start_date'] > values['end_date']:
+            return 'start_date is after end_date'
+        values['reason'] = values['reason'] or ''
+        return values
+    
+    def school_exceptions(self):
+        return AttendanceException.objects.filter(student__person__school=self.context.school)
+    
+    def create(self, changes):
+        payloads = {change['index']: change.get('payload') or {} for change in changes}
+        student_ids = {
+            int(p['student_id']) for p in payloads.values()
+            if str(p.get('student_id', '')).isdigit()
+        }
+        school_of = dict(
+            Student.objects.filter(id__in=student_ids).values_list('id', 'person__school_id')
+        ) if student_ids else {}
+        
+        outcomes = {}
+        planned = {}
+        for index, payload in payloads.items():
+            student_id = int(payload['student_id']) if str(payload.get('student_id', '')).isdigit() else None
+            if school_of.get(student_id) != self.context.school.id:
+                outcomes[index] = self.error('Student not found in this school')
+                continue
+            values = self.clean(payload)
+            if isinstance(values, str):
+                outcomes[index] = self.error(values)
+                continue
+            planned[index] = (student_id, values)
+        
+        existing = {
+            (e.student_id, e.category, e.start_date, e.end_date): e.id
+            for e in AttendanceException.objects.filter(
+                student_id__in=[sid for sid, _ in planned.values()]
+            ).only('id', 'student_id', 'category', 'start_date', 'end_date')
+        } if planned else {}
+        
+        new_exceptions = {}
+        for index, (student_id, values) in planned.items():
+            key = (student_id, values['category'], values['start_date'], values['end_date'])
+            if key in existing:
+                outcomes[index] = {'result': 'unchanged', 'id': existing[key]}
+                continue
+            if key not in new_exceptions:
+                new_exceptions[key] = AttendanceException(student_id=student_id, **values)
+            outcomes[index] = {'result': 'created', 'exception': new_exceptions[key]}
+        
+        AttendanceException.objects.bulk_create(list(new_exceptions.values()))
+        record(self.context.school.id, 'exception', [e.id for e in new_exceptions.values()])
+        for outcome in outcomes.values():
+            exception = outcome.pop('exception', None)
+            if exception is not None:
+                outcome['id'] = exception.id
+        return outcomes
+    
+    def update(self, changes):
+        record_ids = self.record_ids(changes)
+        stored = {e.id: e for e in self.school_exceptions().filter(id__in={pk for pk in record_ids.values() if pk})}
+        
+        outcomes = self.not_found(
+            [change for change in changes if record_ids[change['index']] not in stored], 'Exception not found'
+        )
+        changed = {}
+        for change in changes:
+            record_id = str(change.get('record_id') or '')
+            exception = stored.get(int(record_id)) if record_id.isdigit() else None
+            if exception is None:
+                continue
+            if exception.approved_by_id is not None:
+                outcomes[change['index']] = self.error('Exception already approved')
+                continue
+            values = self.clean(change.get('payload') or {}, current=exception)
+            if isinstance(values, str):
+                outcomes[change['index']] = self.error(values)
+                continue
+            for field, value in values.items():
+                setattr(exception, field, value)
+            exception.updated_at = timezone.now()
+            changed[exception.id] = exception
+            outcomes[change['index']] = {'result': 'updated', 'id': exception.id}
+        
+        AttendanceException.objects.bulk_update(list(changed.values()), list(self.FIELDS) + ['updated_at'], batch_size=500)
+        record(self.context.school.id, 'exception', list(changed))
+        return outcomes
+    
+    def delete(self, changes):
+        record_ids = self.record_ids(changes)
+        found = self.school_exceptions().filter(id__in=[pk for pk in record_ids.values() if pk])
+        stored = dict(found.values_list('id', 'approved_by_id'))
+        found.filter(approved_by__isnull=True).delete()
+        
+        outcomes = {}
+        for index, pk in record_ids.items():
+            if pk not in stored:
+                outcomes[index] = {'result': 'unchanged'}
+            elif stored[pk] is not None:
+                outcomes[index] = self.error('Exception already approved')
+            else:
+                outcomes[index] = {'result': 'deleted', 'id': pk}
+        return outcomes
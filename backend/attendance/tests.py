@@ -0,0 +1,614 @@
+"""
+Attendance tests
+
+    python manage.py test backend/attendance
+"""
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend.attendance.absenteeism import AbsenteeismEngine
+from backend.attendance.exports import REPORT_COLUMNS
+from backend.attendance.models import (
+    AbsenteeismFlag, AbsenteeismState, Attendance, AttendanceException, AttendanceSession, DailyAttendanceRollup,
+)
+from backend.attendance.services import BulkMarkingEngine, ExceptionResolver, SyncService
+from backend.core.benchmarking import seed_school
+from backend.core.sharding import shard_for, use_shard
+from backend.people.models import Person
+from backend.people.roles import ROLES
+from backend.sync import wire
+from backend.sync.models import SyncConflict
+from backend.users.models import User
+
+
+def api_client(user):
+    """APIClient authenticated as user"""
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+class AttendanceTestCase(TestCase):
+    """A seeded school with one session open today"""
+    databases = '__all__'
+    students = 2
+    teachers = 1
+    
+    def setUp(self):
+        self.seeded = seed_school(students=self.students, teachers=self.teachers)
+        self.school = self.seeded['school']
+        # Unpinned creates go to default; act as a request of this school would
+        self.shard = shard_for(self.school.id)
+        self.enterContext(use_shard(self.shard))
+        self.klass = self.seeded['classes'][0]
+        self.teacher = self.seeded['teachers'][0]
+        self.today = timezone.now().date()
+        self.session = AttendanceSession.objects.create(
+            school=self.school, klass=self.klass, term=self.school.terms.first(), date=self.today,
+            teacher=self.teacher,
+        )
+    
+    def user(self, person, username='user'):
+        return User.objects.create(username=username, school=self.school, person=person)
+    
+    def school_admin(self, username='admin'):
+        person = Person.objects.create(
+            first_name='Admin', last_name=username, role=ROLES['SCHOOL_ADMIN'], school=self.school,
+        )
+        return self.user(person, username)
+    
+    def records(self, count, status='P'):
+        return [{'student_id': student.id, 'status': status} for student in self.seeded['students'][:count]]
+
+
+class BulkMarkingEngineTests(AttendanceTestCase):
+    """Set-based marking of a session roster"""
+    students = 30
+    
+    def test_marks_then_updates_a_roster(self):
+        first = BulkMarkingEngine(self.session).mark(self.records(3))
+        second = BulkMarkingEngine(self.session).mark(self.records(5, status='A'))
+        
+        self.assertEqual((first['created'], first['updated']), (3, 0))
+        self.assertEqual((second['created'], second['updated']), (2, 3))
+        self.assertEqual(set(Attendance.objects.filter(session=self.session).values_list('status', flat=True)), {'A'})
+    
+    def test_queries_do_not_grow_with_the_roster(self):
+        with self.assertNumQueries(14, using=self.shard):
+            BulkMarkingEngine(self.session).mark(self.records(5))
+        with self.assertNumQueries(14, using=self.shard):
+            BulkMarkingEngine(self.session).mark(self.records(30, status='A'))
+    
+    def test_invalid_records_are_reported(self):
+        first, second = self.seeded['students'][:2]
+        outsider = seed_school(students=1, prefix='OTHER')['students'][0]
+        
+        result = BulkMarkingEngine(self.session).mark([
+            {'student_id': 'abc', 'status': 'P'},
+            {'student_id': first.id, 'status': 'X'},
+            {'student_id': outsider.id, 'status': 'P'},
+            {'student_id': second.id, 'status': 'P'},
+        ])
+        
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([e['error'] for e in result['errors']], [
+            'Invalid student_id', 'Invalid status "X"', 'Student not found in this school',
+        ])
+    
+    def test_older_versions_lose_field_by_field(self):
+        first, second, third = self.seeded['students'][:3]
+        BulkMarkingEngine(self.session).mark([
+            {'student_id': s.id, 'status': 'P', 'remarks': 'On time', 'hlc': '2000:0'} for s in (first, second, third)
+        ])
+        
+        result = BulkMarkingEngine(self.session).mark([
+            # Newer status, stale remarks
+            {'student_id': first.id, 'status': 'A', 'remarks': 'Sick', 'status_hlc': '3000:0', 'remarks_hlc': '1000:0'},
+            # Stale on both fields
+            {'student_id': second.id, 'status': 'L', 'hlc': '1000:0'},
+            {'student_id': third.id, 'status': 'P', 'hlc': '99999999999999:0'},
+        ])
+        
+        self.assertEqual(
+            [(r['result'], r.get('conflicts')) for r in result['results']],
+            [('updated', ['remarks']), ('conflict', ['status', 'remarks'])],
+        )
+        self.assertEqual(result['errors'][0]['error'], 'Version "99999999999999:0" is too far in the future')
+        rows = dict(Attendance.objects.filter(session=self.session).values_list('student_id', 'status'))
+        self.assertEqual((rows[first.id], rows[second.id]), ('A', 'P'))
+        self.assertEqual(Attendance.objects.get(student=first).remarks, 'On time')
+        self.assertEqual(
+            sorted(SyncConflict.objects.values_list('field', 'kept_value', 'lost_value')),
+            [('remarks', 'On time', ''), ('remarks', 'On time', 'Sick'), ('status', 'P', 'L')],
+        )
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.count_present, self.session.count_absent), (2, 1))
+    
+    def test_synced_session_is_refused(self):
+        self.session.mark_synced()
+        with self.assertRaises(ValueError):
+            BulkMarkingEngine(self.session).mark(self.records(1))
+
+
+class BulkMarkTests(AttendanceTestCase):
+    """attendance/sessions/<id>/bulk_mark"""
+    teachers = 2
+    
+    def test_records_are_marked_by_the_caller(self):
+        teacher, other_teacher = self.seeded['teachers']
+        student = self.seeded['students'][0]
+        client = api_client(self.user(teacher.person))
+        
+        response = client.post(f'/api/v1/attendance/sessions/{self.session.id}/bulk_mark/', {'records': [
+            {'student_id': student.id, 'status': 'P', 'marked_by_id': other_teacher.id},
+        ]}, format='json')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Attendance.objects.get(session=self.session, student=student).marked_by_id, teacher.id)
+
+
+class SyncBatchTests(AttendanceTestCase):
+    """attendance/records/sync_batch"""
+    URL = '/api/v1/attendance/records/sync_batch/'
+    students = 4
+    
+    def post(self, sessions, person=None):
+        client = api_client(self.user((person or self.teacher).person))
+        return client.post(self.URL, {'sessions': sessions}, format='json')
+    
+    def test_ingests_many_sessions_in_one_request(self):
+        first, second = self.seeded['students'][:2]
+        yesterday = self.today - timezone.timedelta(days=1)
+        
+        response = self.post([
+            {'session_id': self.session.id, 'records': [{'student_id': first.id, 'status': 'P'}]},
+            {'class_id': self.klass.id, 'date': str(yesterday), 'records': [
+                {'student_id': first.id, 'status': 'A'}, {'student_id': second.id, 'status': 'L'},
+            ]},
+        ])
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['errors']), (3, 0, []))
+        created = AttendanceSession.objects.get(klass=self.klass, date=yesterday)
+        self.assertEqual(response.data['sessions'][1]['session_id'], created.id)
+        self.assertEqual(created.attendances.count(), 2)
+    
+    def test_malformed_entries_are_rejected_one_by_one(self):
+        student = self.seeded['students'][0]
+        response = self.post([
+            'not an object',
+            {'session_id': 'abc', 'records': []},
+            {'session_id': ['1'], 'records': []},
+            {'class_id': 'x', 'date': '2026-05-04', 'records': []},
+            {'class_id': self.klass.id, 'date': '2026-02-30', 'records': []},
+            {'class_id': self.klass.id, 'date': '2026-05-04', 'subject_id': 'y', 'records': []},
+            {'session_id': self.session.id, 'records': 'not a list'},
+            {'session_id': self.session.id, 'records': [
+                'not an object',
+                {'student_id': student.id, 'status': ['P']},
+                {'student_id': student.id, 'status': 'P'},
+            ]},
+        ])
+        
+        self.assertEqual(response.status_code, 200)
+        sessions = response.data['sessions']
+        self.assertEqual([s.get('error') for s in sessions], [
+            'Session entry must be an object',
+            'Invalid session_id',
+            'Invalid session_id',
+            'Invalid class_id',
+            'Invalid date',
+            'Invalid subject_id',
+            'records must be a list',
+            None,
+        ])
+        self.assertEqual(sessions[-1]['created'], 1)
+        self.assertEqual([e['error'] for e in sessions[-1]['errors']], [
+            'Record must be an object',
+            'Invalid status "[\'P\']"',
+        ])
+        self.assertEqual(Attendance.objects.filter(session=self.session).count(), 1)
+    
+    def test_columnar_uploads_match_json(self):
+        students = self.seeded['students']
+        records = [
+            {'student_id': students[2].id, 'status': 'A', 'remarks': 'Sick', 'local_id': 'dev-a3'},
+            {'student_id': students[0].id, 'status': 'P', 'local_id': 'dev-a1'},
+            {'student_id': students[1].id, 'status': 'L'},
+        ]
+        sessions = [{'session_id': self.session.id, 'records': records}]
+        self.assertEqual(
+            [list(entry['records'].rows()) for entry in wire.decode(wire.encode(sessions, 'gzip'), 'gzip')],
+            [[(s.id, status, remarks, local_id, None) for s, status, remarks, local_id in (
+                (students[0], 'P', '', 'dev-a1'), (students[1], 'L', '', None), (students[2], 'A', 'Sick', 'dev-a3'),
+            )]],
+        )
+        client = api_client(self.user(self.teacher.person))
+        
+        response = client.post(
+            self.URL, wire.encode(sessions, 'gzip'), content_type=wire.MEDIA_TYPE, HTTP_CONTENT_ENCODING='gzip',
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['errors']), (3, []))
+        self.assertEqual(
+            sorted(Attendance.objects.filter(session=self.session).values_list('student_id', 'status', 'remarks')),
+            [(students[0].id, 'P', ''), (students[1].id, 'L', ''), (students[2].id, 'A', 'Sick')],
+        )
+        replay = client.post(self.URL, {'sessions': sessions}, format='json')
+        self.assertEqual(
+            sorted(r['result'] for r in replay.data['sessions'][0]['results']), ['unchanged', 'unchanged', 'updated'],
+        )
+        
+        corrupt = client.post(self.URL, b'SOC1\xff', content_type=wire.MEDIA_TYPE)
+        self.assertEqual(corrupt.status_code, 400)
+    
+    def test_records_are_marked_by_the_caller(self):
+        other_teacher = seed_school(prefix='OTHER')['teachers'][0]
+        student = self.seeded['students'][0]
+        
+        response = self.post([{'session_id': self.session.id, 'records': [
+            {'student_id': student.id, 'status': 'P', 'marked_by_id': other_teacher.id},
+        ]}])
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Attendance.objects.get(session=self.session, student=student).marked_by_id, self.teacher.id)
+    
+    def test_students_cannot_write(self):
+        student = self.seeded['students'][0]
+        
+        response = self.post(
+            [{'session_id': self.session.id, 'records': [{'student_id': student.id, 'status': 'P'}]}],
+            person=student,
+        )
+        
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Attendance.objects.exists())
+
+
+class SyncReplayTests(AttendanceTestCase):
+    """(school, local_id) makes replayed batches idempotent"""
+    students = 50
+    
+    def batch(self, sessions=20):
+        return [
+            {
+                'class_id': self.klass.id,
+                'date': str(self.today - timezone.timedelta(days=day + 1)),
+                'local_id': f'device-s{day}',
+                'records': [
+                    {'student_id': student.id, 'status': 'PALE'[i % 4], 'local_id': f'device-s{day}-a{i}'}
+                    for i, student in enumerate(self.seeded['students'])
+                ],
+            }
+            for day in range(sessions)
+        ]
+    
+    def test_replays_cost_constant_queries_and_write_nothing(self):
+        batch = self.batch()
+        SyncService.ingest(batch, school=self.school)
+        self.assertEqual(Attendance.objects.filter(school=self.school).count(), 1000)
+        
+        for _ in range(10):
+            with self.assertNumQueries(3, using=self.shard), CaptureQueriesContext(connections[self.shard]) as queries:
+                results = SyncService.ingest(batch, school=self.school)
+            self.assertEqual([q['sql'] for q in queries if not q['sql'].startswith('SELECT')], [])
+            self.assertEqual({item['result'] for result in results for item in result['results']}, {'unchanged'})
+        
+        self.assertEqual(AttendanceSession.objects.filter(school=self.school, local_id__startswith='device-').count(), 20)
+        self.assertEqual(Attendance.objects.filter(school=self.school).count(), 1000)
+    
+    def test_changed_replay_updates_in_place(self):
+        batch = self.batch(sessions=1)
+        SyncService.ingest(batch, school=self.school)
+        batch[0]['records'][0]['status'] = 'E'
+        
+        result = SyncService.ingest(batch, school=self.school)[0]
+        
+        self.assertEqual((result['created'], result['updated']), (0, 1))
+        self.assertEqual(Attendance.objects.get(local_id='device-s0-a0').status, 'E')
+        self.assertEqual(Attendance.objects.filter(school=self.school).count(), 50)
+    
+    def test_local_id_of_another_record_is_refused(self):
+        batch = self.batch(sessions=1)
+        SyncService.ingest(batch, school=self.school)
+        batch[0]['records'][1]['local_id'] = 'device-s0-a0'
+        
+        result = SyncService.ingest(batch, school=self.school)[0]
+        
+        self.assertEqual([e['error'] for e in result['errors']], ['local_id already used for another record'])
+
+
+class SessionCounterTests(AttendanceTestCase):
+    """count_* columns follow every attendance write"""
+    students = 4
+    
+    def counts(self):
+        self.session.refresh_from_db()
+        return (self.session.count_present, self.session.count_absent, self.session.count_late, self.session.count_excused)
+    
+    def test_counters_follow_saves_bulk_marks_and_deletes(self):
+        first, second, third = self.seeded['students'][:3]
+        record = Attendance.objects.create(session=self.session, student=first, status='P')
+        BulkMarkingEngine(self.session).mark([
+            {'student_id': second.id, 'status': 'A'}, {'student_id': third.id, 'status': 'L'},
+        ])
+        self.assertEqual(self.counts(), (1, 1, 1, 0))
+        
+        record.status = 'E'
+        record.save()
+        BulkMarkingEngine(self.session).mark([{'student_id': second.id, 'status': 'P'}])
+        self.assertEqual(self.counts(), (1, 0, 1, 1))
+        
+        record.delete()
+        self.assertEqual(self.counts(), (1, 0, 1, 0))
+        self.assertEqual(self.session.total_students, 2)
+    
+    def test_saving_a_stale_session_keeps_the_stored_counts(self):
+        stale = AttendanceSession.objects.get(pk=self.session.pk)
+        BulkMarkingEngine(self.session).mark(self.records(3))
+        
+        stale.status = 'closed'
+        stale.save()
+        
+        self.assertEqual(self.counts(), (3, 0, 0, 0))
+        self.assertEqual(self.session.status, 'closed')
+    
+    def test_rebuild_command_fixes_drift(self):
+        BulkMarkingEngine(self.session).mark(self.records(2))
+        AttendanceSession.objects.filter(pk=self.session.pk).update(count_present=7, count_late=1)
+        
+        call_command('rebuild_session_counters', stdout=StringIO())
+        
+        self.assertEqual(self.counts(), (2, 0, 0, 0))
+
+
+class ReportExportTests(AttendanceTestCase):
+    """attendance/reports/generate"""
+    URL = '/api/v1/attendance/reports/generate/'
+    students = 3
+    
+    def setUp(self):
+        super().setUp()
+        BulkMarkingEngine(self.session).mark(self.records(2) + [
+            {'student_id': self.seeded['students'][2].id, 'status': 'A'},
+        ])
+        self.client = api_client(self.school_admin())
+        self.params = {'class_id': self.klass.id, 'start_date': str(self.today), 'end_date': str(self.today)}
+    
+    def test_csv_export_streams_per_student_totals(self):
+        response = self.client.get(self.URL, {**self.params, 'export': 'csv'})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(','), REPORT_COLUMNS)
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(sorted(line.split(',')[4] for line in lines[1:]), ['0', '1', '1'])
+    
+    def test_ndjson_export_streams_records(self):
+        response = self.client.get(self.URL, {**self.params, 'export': 'ndjson', 'detail': 'records'})
+        
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(sorted(row['status'] for row in rows), ['A', 'P', 'P'])
+        self.assertEqual({row['session_id'] for row in rows}, {self.session.id})
+    
+    def test_unknown_export_format_is_rejected(self):
+        response = self.client.get(self.URL, {**self.params, 'export': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_other_schools_classes_and_terms_are_not_found(self):
+        other = seed_school(prefix='OTHER')
+        
+        responses = [
+            self.client.get(self.URL, {**self.params, 'class_id': other['classes'][0].id}),
+            self.client.get(self.URL, {**self.params, 'term_id': other['school'].terms.first().id}),
+            self.client.get(self.URL, {**self.params, 'class_id': 'abc'}),
+        ]
+        
+        self.assertEqual([r.status_code for r in responses], [404, 404, 400])
+
+
+class DailyRollupTests(AttendanceTestCase):
+    """DailyAttendanceRollup follows session counters"""
+    students = 4
+    
+    def rollups(self, **filters):
+        return {
+            (row.date, row.term_id): (row.count_present, row.count_absent, row.count_late, row.count_excused)
+            for row in DailyAttendanceRollup.objects.filter(klass=self.klass, **filters)
+        }
+    
+    def test_marks_and_deletes_update_the_days_row(self):
+        BulkMarkingEngine(self.session).mark(self.records(3) + [
+            {'student_id': self.seeded['students'][3].id, 'status': 'L'},
+        ])
+        Attendance.objects.filter(session=self.session, status='L').delete()
+        
+        self.assertEqual(self.rollups(), {(self.today, self.session.term_id): (3, 0, 0, 0)})
+        
+        self.session.delete()
+        self.assertEqual(self.rollups(), {(self.today, self.session.term_id): (0, 0, 0, 0)})
+    
+    def test_moving_a_stale_session_moves_its_stored_counts(self):
+        stale = AttendanceSession.objects.get(pk=self.session.pk)
+        BulkMarkingEngine(self.session).mark(self.records(2))
+        yesterday = self.today - timezone.timedelta(days=1)
+        
+        stale.date = yesterday
+        stale.save()
+        
+        term_id = self.session.term_id
+        self.assertEqual(self.rollups(), {(self.today, term_id): (0, 0, 0, 0), (yesterday, term_id): (2, 0, 0, 0)})
+    
+    def test_deleting_a_term_folds_its_rows_into_the_termless_bucket(self):
+        termless = AttendanceSession.objects.create(school=self.school, klass=self.klass, date=self.today)
+        BulkMarkingEngine(termless).mark(self.records(1, status='A'))
+        BulkMarkingEngine(self.session).mark(self.records(2))
+        
+        self.session.term.delete()
+        
+        self.assertEqual(self.rollups(), {(self.today, None): (2, 1, 0, 0)})
+        self.session.refresh_from_db()
+        self.assertIsNone(self.session.term_id)
+    
+    def test_reports_only_cover_the_callers_school(self):
+        BulkMarkingEngine(self.session).mark(self.records(2))
+        other = seed_school(prefix='OTHER')
+        client = api_client(self.school_admin())
+        day = {'start_date': str(self.today), 'end_date': str(self.today)}
+        
+        daily = client.get('/api/v1/attendance/reports/daily/', day)
+        summary = client.get('/api/v1/attendance/reports/class_summary/', {'class_id': self.klass.id})
+        
+        self.assertEqual(daily.data['present'], 2)
+        self.assertEqual(summary.data['present'], 2)
+        for action in ('daily', 'class_summary'):
+            response = client.get(f'/api/v1/attendance/reports/{action}/', {**day, 'class_id': other['classes'][0].id})
+            self.assertEqual(response.status_code, 404)
+        response = client.get('/api/v1/attendance/reports/daily/', {**day, 'term_id': other['school'].terms.first().id})
+        self.assertEqual(response.status_code, 404)
+
+
+class AttendanceRatesTests(AttendanceTestCase):
+    """attendance/reports/rates"""
+    URL = '/api/v1/attendance/reports/rates/'
+    students = 3
+    
+    def setUp(self):
+        super().setUp()
+        first, second, third = self.seeded['students']
+        yesterday = AttendanceSession.objects.create(
+            school=self.school, klass=self.klass, term=self.session.term, date=self.today - timezone.timedelta(days=1),
+        )
+        BulkMarkingEngine(self.session).mark([
+            {'student_id': first.id, 'status': 'P'}, {'student_id': second.id, 'status': 'A'},
+            {'student_id': third.id, 'status': 'P'},
+        ])
+        BulkMarkingEngine(yesterday).mark([
+            {'student_id': first.id, 'status': 'P'}, {'student_id': second.id, 'status': 'A'},
+            {'student_id': third.id, 'status': 'L'},
+        ])
+        self.client = api_client(self.school_admin())
+    
+    def test_students_are_ranked_by_rate(self):
+        first, second, third = self.seeded['students']
+        
+        response = self.client.get(self.URL, {'class_id': self.klass.id, 'term_id': self.session.term_id})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([(r['student_id'], r['rate']) for r in response.data['results']], [
+            (first.id, 100.0), (third.id, 50.0), (second.id, 0.0),
+        ])
+        self.assertEqual(response.data['stats']['mean'], 50.0)
+        
+        ascending = self.client.get(self.URL, {'order': 'asc', 'page_size': 1})
+        self.assertEqual([r['student_id'] for r in ascending.data['results']], [second.id])
+    
+    def test_bad_or_foreign_ids_are_rejected(self):
+        other = seed_school(prefix='OTHER')
+        
+        responses = [
+            self.client.get(self.URL, {'class_id': 'abc'}),
+            self.client.get(self.URL, {'term_id': '1 OR 1=1'}),
+            self.client.get(self.URL, {'page': 'two'}),
+            self.client.get(self.URL, {'class_id': other['classes'][0].id}),
+            self.client.get(self.URL, {'term_id': other['school'].terms.first().id}),
+        ]
+        
+        self.assertEqual([r.status_code for r in responses], [400, 400, 400, 404, 404])
+
+
+class AbsenteeismTests(AttendanceTestCase):
+    """AbsenteeismEngine raises and resolves flags incrementally"""
+    students = 3
+    
+    def mark_day(self, days_ago, statuses):
+        session = AttendanceSession.objects.create(
+            school=self.school, klass=self.klass, date=self.today - timezone.timedelta(days=days_ago),
+        )
+        BulkMarkingEngine(session).mark([
+            {'student_id': student.id, 'status': status}
+            for student, status in zip(self.seeded['students'], statuses)
+        ])
+    
+    def open_flags(self):
+        return set(AbsenteeismFlag.objects.filter(resolved_on__isnull=True).values_list('student_id', 'kind'))
+    
+    def test_flags_are_raised_and_resolved(self):
+        first, second, third = self.seeded['students']
+        for days_ago, statuses in enumerate(['AEP', 'AAP', 'APP', 'PPP', 'PPP', 'PPP'], start=1):
+            self.mark_day(days_ago, statuses)
+        
+        run = AbsenteeismEngine().run()
+        
+        self.assertEqual((run.full, run.students_processed, run.flags_raised), (True, 3, 3))
+        self.assertEqual(self.open_flags(), {
+            (first.id, AbsenteeismFlag.LOW_RATE), (first.id, AbsenteeismFlag.CONSECUTIVE),
+            (second.id, AbsenteeismFlag.LOW_RATE),
+        })
+        # The excused day neither counts towards the streak nor breaks it
+        self.assertEqual(AbsenteeismState.objects.get(student=second).consecutive_absences, 1)
+        self.assertEqual(AbsenteeismState.objects.get(student=first).consecutive_absences, 3)
+        
+        self.mark_day(0, 'P')
+        run = AbsenteeismEngine().run()
+        
+        self.assertEqual((run.full, run.students_processed, run.flags_resolved), (False, 2, 1))
+        self.assertEqual(self.open_flags(), {(first.id, AbsenteeismFlag.LOW_RATE), (second.id, AbsenteeismFlag.LOW_RATE)})
+    
+    def test_flags_endpoint_only_lists_the_callers_school(self):
+        other = seed_school(students=1, prefix='OTHER')
+        for seeded in (self.seeded, other):
+            with use_shard(shard_for(seeded['school'].id)):
+                AbsenteeismFlag.objects.create(
+                    school=seeded['school'], student=seeded['students'][0], kind=AbsenteeismFlag.CONSECUTIVE,
+                    value=3, threshold=3, window_days=30, flagged_on=self.today,
+                )
+        
+        response = api_client(self.school_admin()).get('/api/v1/attendance/absenteeism-flags/', {'open': 'true'})
+        
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([flag['student']['id'] for flag in results], [self.seeded['students'][0].id])
+
+
+class ExceptionResolverTests(AttendanceTestCase):
+    """Approved exceptions excuse students a teacher has not marked"""
+    students = 3
+    
+    def exception(self, student, approved_by=None):
+        return AttendanceException.objects.create(
+            student=student, category='medical', reason='Clinic visit',
+            start_date=self.today, end_date=self.today, approved_by=approved_by,
+        )
+    
+    def test_unapproved_exception_does_not_excuse(self):
+        submitted, approved = self.seeded['students'][:2]
+        self.exception(submitted)
+        self.exception(approved, approved_by=self.teacher)
+        
+        self.assertEqual(set(ExceptionResolver.for_session(self.session).covered()), {approved.id})
+        self.assertEqual(BulkMarkingEngine(self.session).apply_exceptions(), [approved.id])
+        self.assertFalse(Attendance.objects.filter(session=self.session, student=submitted).exists())
+    
+    def test_explicit_records_win_over_exceptions(self):
+        marked, excused, _ = self.seeded['students']
+        for student in (marked, excused):
+            self.exception(student, approved_by=self.teacher)
+        
+        result = BulkMarkingEngine(self.session).mark([{'student_id': marked.id, 'status': 'P'}])
+        
+        self.assertEqual(result['excused'], [excused.id])
+        self.assertEqual(dict(self.session.attendances.values_list('student_id', 'status')), {marked.id: 'P', excused.id: 'E'})
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.count_present, self.session.count_excused), (1, 1))
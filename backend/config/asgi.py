@@ -1,5 +1,14 @@
 """
 ASGI config for MunTech School Infrastructure
+Served by gunicorn's uvicorn workers (see Procfile). Async views such as
+school_login wait on the event loop. Sync views do not run one at a time
+per worker: Django gives each request its own ThreadSensitiveContext, so
+every request runs its sync code in a thread of its own, concurrently.
+What bounds sync ingest is admission control (backend/sync/admission.py),
+and since each thread opens its own database connection, connections
+are not kept between requests (DB_CONN_MAX_AGE in settings). Keep every
+middleware async-capable so async views stay on the event loop (see
+backend/core/middleware.py).
 """
 import os
 from django.core.asgi import get_asgi_application
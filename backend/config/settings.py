@@ -22,12 +22,18 @@ else:
         ALLOWED_HOSTS.append(os.environ.get('RAILWAY_DOMAIN'))
 
 # Database configuration
+# Persistent connections belong to the thread that opened them. Under ASGI
+# every request runs its sync code in a thread of its own, so a kept
+# connection is never reused and idle ones pile up until the database
+# refuses new clients. Close them at the end of each request; put a pooler
+# such as PgBouncer in front of the database if connecting gets costly.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 0))
 if os.environ.get('DATABASE_URL'):
     import dj_database_url
     DATABASES = {
         'default': dj_database_url.config(
             default=os.environ.get('DATABASE_URL'),
-            conn_max_age=600,
+            conn_max_age=DB_CONN_MAX_AGE,
             conn_health_checks=True,
         )
     }
@@ -39,6 +45,18 @@ else:
         }
     }
 
+# School shards: more databases holding whole schools, as
+# "alias=url,alias=url" (see backend.core.sharding). Default stays the
+# directory of schools and users. Append new shards at the end: a shard's
+# position sets its id range.
+shard_urls = os.environ.get('SHARD_DATABASE_URLS')
+if shard_urls:
+    import dj_database_url
+    for entry in shard_urls.split(','):
+        alias, _, url = entry.strip().partition('=')
+        DATABASES[alias.strip()] = dj_database_url.parse(url.strip(), conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=True)
+    DATABASE_ROUTERS = ['backend.core.sharding.SchoolShardRouter']
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -59,7 +77,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', # Critical: Must be here
+    'backend.core.middleware.AsyncWhiteNoiseMiddleware', # Critical: Must be here (WhiteNoise, async-capable)
+    'backend.core.middleware.ShardMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -124,10 +143,69 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100,
     'DEFAULT_FILTER_BACKENDS': ['rest_framework.filters.SearchFilter', 'rest_framework.filters.OrderingFilter'],
-    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework_simplejwt.authentication.JWTAuthentication'],
+    'DEFAULT_AUTHENTICATION_CLASSES': ['backend.users.auth.ClaimsJWTAuthentication'],
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
 }
 
+# Chronic-absenteeism detection (python manage.py detect_absenteeism)
+ATTENDANCE_ABSENTEEISM = {
+    'WINDOW_DAYS': int(os.environ.get('ABSENTEEISM_WINDOW_DAYS', 30)),
+    'RATE_THRESHOLD': float(os.environ.get('ABSENTEEISM_RATE_THRESHOLD', 90.0)),
+    'CONSECUTIVE_ABSENCES': int(os.environ.get('ABSENTEEISM_CONSECUTIVE_ABSENCES', 3)),
+}
+
+# SyncQueue drain workers (python manage.py drain_sync_queue)
+SYNC_QUEUE = {
+    'BATCH_SIZE': int(os.environ.get('SYNC_QUEUE_BATCH_SIZE', 500)),
+    'MAX_ATTEMPTS': int(os.environ.get('SYNC_QUEUE_MAX_ATTEMPTS', 5)),
+}
+
+# Bootstrap snapshots for new devices (python manage.py build_snapshots)
+# Files hold whole rosters: keep LOCATION out of MEDIA_ROOT and any public URL.
+SYNC_SNAPSHOT = {
+    'SESSION_DAYS': int(os.environ.get('SYNC_SNAPSHOT_SESSION_DAYS', 14)),
+    'LOCATION': os.environ.get('SYNC_SNAPSHOT_LOCATION', str(BASE_DIR / 'private')),
+    'GRACE_SECONDS': int(os.environ.get('SYNC_SNAPSHOT_GRACE_SECONDS', 3600)),
+}
+
+# Sync ingest admission control. Under ASGI each request runs its sync
+# code in its own thread, so only these limits bound how many sync
+# requests run at once. Each holds a database connection and CPU time:
+# keep GLOBAL_LIMIT near the host's cores (default two per CPU) and well
+# below the database's connection limit, leaving both for logins and
+# page loads.
+SYNC_ADMISSION = {
+    'ENABLED': os.environ.get('SYNC_ADMISSION_ENABLED', 'True') == 'True',
+    'GLOBAL_LIMIT': int(os.environ.get('SYNC_ADMISSION_GLOBAL_LIMIT', 0)) or None,
+    'SCHOOL_LIMIT': int(os.environ.get('SYNC_ADMISSION_SCHOOL_LIMIT', 2)),
+}
+
+# SyncLog retention (python manage.py prune_sync_logs)
+SYNC_LOG_RETENTION = {
+    'DETAIL_DAYS': int(os.environ.get('SYNC_LOG_DETAIL_DAYS', 30)),
+}
+
+# Claims-based JWTs and login. VERSION_TTL: seconds other workers may
+# still honour a revoked token. HASH_WORKERS: concurrent password hashes
+# per process for the async login (default one per CPU).
+USER_AUTH = {
+    'VERSION_TTL': int(os.environ.get('TOKEN_VERSION_TTL', 30)),
+    'HASH_WORKERS': int(os.environ.get('LOGIN_HASH_WORKERS', 0)) or None,
+}
+
+# Per-request tenant context: School rows cached per process
+TENANT_CONTEXT = {
+    'SCHOOL_CACHE_TTL': int(os.environ.get('TENANT_SCHOOL_CACHE_TTL', 300)),
+}
+
+# School shards (SHARD_DATABASE_URLS). PLACEMENT: databases new schools
+# are spread over (default all). MAP_TTL: seconds other workers may still
+# route a moved school to its old database.
+SCHOOL_SHARDS = {
+    'PLACEMENT': [a.strip() for a in os.environ.get('SCHOOL_SHARD_PLACEMENT', '').split(',') if a.strip()] or None,
+    'MAP_TTL': int(os.environ.get('SCHOOL_SHARD_MAP_TTL', 60)),
+}
+
 # CORS Configuration
 cors_env = os.environ.get('CORS_ALLOWED_ORIGINS')
 if cors_env:
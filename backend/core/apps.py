@@ -0,0 +1,13 @@
+"""
+App configuration for core app
+"""
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'backend.core'
+    label = 'core'
+
+    def ready(self):
+        from backend.core import signals  # noqa: F401
@@ -0,0 +1,184 @@
+"""
+Shared helpers for the benchmark management commands
+Seeds throwaway schools and times code paths against the configured database
+"""
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+
+from backend.core.sharding import shard_aliases, shard_for, sharded, unmirror, use_shard
+
+
+class Rollback(Exception):
+    """Raised to unwind a benchmark transaction"""
+
+
+@contextmanager
+def rolled_back():
+    """Run a block inside transactions that are always rolled back
+    
+    Every database gets one, so rows routed to school shards are undone
+    too. Schools created in the block are then unmirrored from the shards,
+    which also drops anything written there outside these transactions.
+    """
+    from backend.core.models import School
+    
+    schools = []
+    
+    def school_saved(sender, instance, created, **kwargs):
+        if created:
+            schools.append(instance.pk)
+    
+    post_save.connect(school_saved, sender=School, weak=False)
+    try:
+        with ExitStack() as stack:
+            for alias in shard_aliases():
+                stack.enter_context(transaction.atomic(using=alias))
+            yield
+            raise Rollback()
+    except Rollback:
+        pass
+    finally:
+        post_save.disconnect(school_saved, sender=School)
+        if sharded():
+            for pk in schools:
+                unmirror(School, pk)
+
+
+class Timer:
+    """Wall-clock timer that also counts queries issued inside the block"""
+    WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+    
+    def __init__(self):
+        self.elapsed = 0.0
+        self.queries = 0
+        self.writes = 0
+    
+    def _count(self, execute, sql, params, many, context):
+        self.queries += 1
+        if sql.lstrip().upper().startswith(self.WRITE_PREFIXES):
+            self.writes += 1
+        return execute(sql, params, many, context)
+    
+    @contextmanager
+    def measure(self):
+        self.queries = 0
+        self.writes = 0
+        with connection.execute_wrapper(self._count):
+            start = time.perf_counter()
+            yield self
+            self.elapsed = time.perf_counter() - start
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers (None when empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def seed_school(students=0, classes=1, teachers=1, prefix='BENCH'):
+    """Create a school with classes, teachers and a student roster
+    
+    Students are spread evenly over the classes. Everything is written with
+    bulk_create so seeding large rosters stays cheap.
+    
+    Returns:
+        Dict with school, classes, teachers and students (lists of instances)
+    """
+    from backend.core.models import School, Class, Term
+    from backend.people.models import Person, Student, Teacher
+    from backend.people.roles import ROLES
+    from django.utils import timezone
+    
+    tag = uuid.uuid4().hex[:8]
+    school = School.objects.create(name=f'{prefix} School {tag}', code=f'{prefix}-{tag}')
+    # bulk_create has no instance to route by, so pin the school's shard
+    with use_shard(shard_for(school.id)):
+        today = timezone.now().date()
+        Term.objects.create(
+            school=school, year=today.year, term='1',
+            start_date=today.replace(month=1, day=1), end_date=today.replace(month=12, day=31),
+        )
+        
+        klasses = Class.objects.bulk_create([
+            Class(school=school, name=f'Form {i + 1}', level=f'Form {i + 1}', stream=tag)
+            for i in range(classes)
+        ])
+        
+        teacher_people = Person.objects.bulk_create([
+            Person(first_name='Teacher', last_name=f'{tag}-{i}', role=ROLES['TEACHER'], school=school)
+            for i in range(teachers)
+        ])
+        teacher_objs = Teacher.objects.bulk_create([
+            Teacher(person=person, teacher_code=f'{tag}-T{i}')
+            for i, person in enumerate(teacher_people)
+        ])
+        
+        student_people = Person.objects.bulk_create([
+            Person(first_name='Student', last_name=f'{tag}-{i}', role=ROLES['STUDENT'], school=school)
+            for i in range(students)
+        ], batch_size=1000)
+        student_objs = Student.objects.bulk_create([
+            Student(person=person, admission_number=f'{tag}-{i}', current_class=klasses[i % len(klasses)])
+            for i, person in enumerate(student_people)
+        ], batch_size=1000)
+    
+    return {
+        'school': school,
+        'classes': klasses,
+        'teachers': teacher_objs,
+        'students': student_objs,
+    }
+
+
+def seed_attendance(seeded, days, start_date=None, statuses='PPPPPPPALE'):
+    """Create one session per class per day and mark every student in it
+    
+    Written with bulk_create for speed. Session counters are filled in;
+    daily rollups are not maintained for seeded data.
+    
+    Returns:
+        List of created AttendanceSession instances
+    """
+    import random
+    from datetime import timedelta
+    from django.utils import timezone
+    from backend.attendance.models import Attendance, AttendanceSession
+    
+    school = seeded['school']
+    term = school.terms.first()
+    start_date = start_date or timezone.now().date() - timedelta(days=days)
+    roster = {}
+    for student in seeded['students']:
+        roster.setdefault(student.current_class_id, []).append(student.id)
+    
+    rng = random.Random(school.id)
+    sessions = []
+    marks = []
+    for day in range(days):
+        date = start_date + timedelta(days=day)
+        for klass in seeded['classes']:
+            session = AttendanceSession(school=school, klass=klass, term=term, date=date, status='closed')
+            day_marks = [(sid, rng.choice(statuses)) for sid in roster.get(klass.id, [])]
+            for code, field in AttendanceSession.COUNTER_FIELDS.items():
+                setattr(session, field, sum(1 for _, status in day_marks if status == code))
+            sessions.append(session)
+            marks.append(day_marks)
+    
+    with use_shard(shard_for(school.id)):
+        AttendanceSession.objects.bulk_create(sessions, batch_size=1000)
+        Attendance.objects.bulk_create(
+            (
+                Attendance(school=school, session=session, student_id=sid, status=status)
+                for session, day_marks in zip(sessions, marks)
+                for sid, status in day_marks
+            ),
+            batch_size=2000,
+        )
+    return sessions
@@ -0,0 +1,86 @@
+"""
+Compiled capability model
+ROLES and PERMISSIONS (backend.people.roles) are compiled once, at import,
+into integer bits: one per account flag, one per role and one per
+permission. A caller's effective mask is computed once per token (it
+travels in the JWT claims, tagged with the layout's fingerprint) or once
+per request for other callers, so a permission class is a couple of
+integer ANDs.
+"""
+import zlib
+
+from django.core.exceptions import ImproperlyConfigured
+
+from backend.people.roles import PERMISSIONS, ROLES
+
+# Facts about the caller, not granted by any role
+FLAGS = ('authenticated', 'superuser', 'staff', 'school_member', 'teacher_profile', 'student_profile')
+
+# Granting this permission grants every permission
+ALL_PERMISSIONS = 'manage_all'
+
+
+class CapabilityModel:
+    """Bit registry for flags, roles and permissions
+    
+    Names are 'flag:<flag>', 'role:<role value>' and bare permission
+    names, e.g. mask('role:teacher', 'mark_attendance').
+    """
+    
+    def __init__(self, roles, permissions):
+        names = [f'flag:{flag}' for flag in FLAGS] + [f'role:{role}' for role in roles.values()]
+        for granted in permissions.values():
+            names += [name for name in granted if name not in names]
+        self.bits = {name: 1 << index for index, name in enumerate(names)}
+        # Masks in tokens issued under another layout are recomputed
+        self.fingerprint = zlib.crc32('|'.join(names).encode())
+        self.permission_mask = self.mask(*{name for granted in permissions.values() for name in granted})
+        
+        unknown = set(permissions) - set(roles.values())
+        if unknown:
+            raise ImproperlyConfigured(f'PERMISSIONS names unknown roles: {", ".join(sorted(unknown))}')
+        self.role_masks = {}
+        for role in roles.values():
+            mask = self.bits[f'role:{role}'] | self.mask(*permissions.get(role, ()))
+            if ALL_PERMISSIONS in permissions.get(role, ()):
+                mask |= self.permission_mask
+            self.role_masks[role] = mask
+    
+    def mask(self, *names):
+        """Mask with the bits of names
+        
+        Raises:
+            ImproperlyConfigured: A name is not a known flag, role or permission
+        """
+        mask = 0
+        for name in names:
+            try:
+                mask |= self.bits[name]
+            except KeyError:
+                raise ImproperlyConfigured(f'Unknown capability "{name}"') from None
+        return mask
+    
+    def names(self, mask):
+        """Names of the bits set in mask, for debugging and admin display"""
+        return [name for name, bit in self.bits.items() if mask & bit]
+    
+    def for_tenant(self, tenant):
+        """Effective mask of a TenantContext"""
+        if not tenant.is_authenticated:
+            return 0
+        bits = self.bits
+        mask = bits['flag:authenticated'] | self.role_masks.get(tenant.role, 0)
+        if tenant.is_superuser:
+            mask |= bits['flag:superuser']
+        if tenant.is_staff:
+            mask |= bits['flag:staff']
+        if tenant.school_id is not None:
+            mask |= bits['flag:school_member']
+        if tenant.teacher_id is not None:
+            mask |= bits['flag:teacher_profile']
+        if tenant.student_id is not None:
+            mask |= bits['flag:student_profile']
+        return mask
+
+
+CAPABILITIES = CapabilityModel(ROLES, PERMISSIONS)
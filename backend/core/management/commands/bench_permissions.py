@@ -0,0 +1,166 @@
+"""
+Micro-benchmark permission evaluation per request
+
+Builds callers for every persona (anonymous, student, teacher, school
+admin, admin, staff, superuser, a user without a school) from token
+claims, without the database, and evaluates the permission stack of
+every routed viewset and action for each of them, as DRF's
+check_permissions does: a fresh request, and so a fresh TenantContext,
+per evaluation. Times the compiled capability-mask classes, with the mask
+carried in the token and computed per request (callers without claims),
+against the role and flag checks they replaced, and fails if they ever
+disagree.
+
+Usage:
+    python manage.py bench_permissions
+    python manage.py bench_permissions --requests 200000
+"""
+import time
+from types import SimpleNamespace
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.permissions import BasePermission, IsAuthenticated
+
+from backend.core import permissions, tenant_permissions
+from backend.core.capabilities import CAPABILITIES
+from backend.core.tenant_context import TenantContext, get_tenant
+from backend.people.roles import ROLES
+from backend.users.models import ClaimsUser
+
+SCHOOL_ADMINS = (ROLES['ADMIN'], ROLES['SCHOOL_ADMIN'])
+
+# The checks each class made before capability masks, on a TenantContext
+LEGACY = {
+    'IsTeacher': lambda t: t.role == ROLES['TEACHER'],
+    'IsStudent': lambda t: t.role == ROLES['STUDENT'],
+    'IsAdmin': lambda t: t.role == ROLES['ADMIN'],
+    'IsSchoolAdmin': lambda t: t.role in SCHOOL_ADMINS,
+    'Requires(view_reports)': lambda t: t.role in SCHOOL_ADMINS,
+    'IsTenantMember': lambda t: t.is_authenticated and (t.is_superuser or t.school_id is not None),
+    'IsTeacherOfSchool': lambda t: t.is_authenticated and (
+        t.is_superuser or (t.is_teacher and t.school_id is not None)
+    ),
+    'IsAdminOfSchool': lambda t: t.is_authenticated and (t.is_staff or t.is_superuser),
+    'TenantSyncPermission': lambda t: t.is_authenticated and (t.is_superuser or t.school_id is not None),
+}
+
+
+def legacy_class(name):
+    """The permission class as it was: its check on get_tenant(request)"""
+    check = LEGACY[name]
+    return type(f'Previous{name}', (BasePermission,), {
+        'has_permission': lambda self, request, view: check(get_tenant(request)),
+    })
+
+
+LEGACY_CLASSES = {name: legacy_class(name) for name in LEGACY}
+
+PERSONAS = {
+    'anonymous': None,
+    'student': {'role': ROLES['STUDENT'], 'person__student__id': 1},
+    'teacher': {'role': ROLES['TEACHER'], 'person__teacher__id': 1},
+    'teacher_no_profile': {'role': ROLES['TEACHER']},
+    'school_admin': {'role': ROLES['SCHOOL_ADMIN']},
+    'admin': {'role': ROLES['ADMIN']},
+    'staff': {'role': ROLES['STAFF'], 'is_staff': True},
+    'superuser': {'is_superuser': True, 'is_staff': True},
+    'no_school': {'role': ROLES['TEACHER'], 'person__teacher__id': 1, 'school_id': None},
+}
+
+
+class Command(BaseCommand):
+    help = 'Time capability-mask permission checks against the role checks they replaced'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000, help='Simulated requests per measurement')
+
+    def handle(self, *args, **options):
+        from backend.api.routers import router
+
+        stacks = self.stacks(router)
+        users = {name: self.user(index, claims) for index, (name, claims) in enumerate(PERSONAS.items(), 1)}
+        unmasked = {name: self.user(index, claims, False) for index, (name, claims) in enumerate(PERSONAS.items(), 1)}
+        previous = {
+            name: [LEGACY_CLASSES.get(permission.__name__, permission) for permission in stack]
+            for name, stack in stacks.items()
+        }
+        self.check_equivalence(stacks, previous, users)
+        self.check_equivalence(stacks, previous, unmasked)
+        self.stdout.write(
+            f'{len(stacks)} permission stacks x {len(users)} personas agree with the previous checks'
+        )
+
+        count = options['requests']
+        # Every simulated request cycles through personas and stacks
+        cases = [(users[persona], name) for persona in users for name in stacks]
+        fresh = [(unmasked[persona], name) for persona in users for name in stacks]
+        rounds = max(1, count // len(cases))
+        results = {
+            'mask from token': self.measure(cases, stacks, rounds),
+            'mask per request': self.measure(fresh, stacks, rounds),
+            'previous checks': self.measure(cases, previous, rounds),
+        }
+        requests = rounds * len(cases)
+        checks = rounds * sum(len(stacks[name]) for _, name in cases)
+        self.stdout.write(f"{'':<22} {'ns/request':>11} {'ns/check':>9}")
+        for label, elapsed in results.items():
+            self.stdout.write(f'{label:<22} {elapsed / requests * 1e9:>11.0f} {elapsed / checks * 1e9:>9.0f}')
+
+    @staticmethod
+    def stacks(router):
+        """{'<prefix>[:<action>]': [permission classes]} of every routed viewset"""
+        stacks = {}
+        for prefix, viewset, _ in router.registry:
+            stacks[prefix] = list(viewset.permission_classes)
+            for extra in viewset.get_extra_actions():
+                if extra.kwargs.get('permission_classes'):
+                    stacks[f'{prefix}:{extra.url_path}'] = list(extra.kwargs['permission_classes'])
+        for name in ('IsTeacher', 'IsStudent', 'IsAdmin'):
+            stacks[name] = [IsAuthenticated, getattr(permissions, name)]
+        stacks['TenantSyncPermission'] = [IsAuthenticated, tenant_permissions.TenantSyncPermission]
+        return stacks
+
+    @staticmethod
+    def user(index, claims, with_mask=True):
+        """A caller as ClaimsJWTAuthentication would build it"""
+        if claims is None:
+            return AnonymousUser()
+        user = ClaimsUser(
+            id=index, username=f'bench-{index}',
+            is_staff=claims.get('is_staff', False), is_superuser=claims.get('is_superuser', False),
+        )
+        user.tenant_claims = {
+            'school_id': claims.get('school_id', 1),
+            'person_id': index,
+            'person__role': claims.get('role'),
+            'person__teacher__id': claims.get('person__teacher__id'),
+            'person__student__id': claims.get('person__student__id'),
+        }
+        if with_mask:
+            # Issued once with the token, as AuthService.claims does
+            user.tenant_claims['capabilities'] = CAPABILITIES.for_tenant(TenantContext(user, user.tenant_claims))
+        return user
+
+    @staticmethod
+    def evaluate(stack, request):
+        return all(permission().has_permission(request, None) for permission in stack)
+
+    def check_equivalence(self, stacks, previous, users):
+        mismatches = []
+        for persona, user in users.items():
+            for name, stack in stacks.items():
+                masked = self.evaluate(stack, SimpleNamespace(user=user))
+                legacy = self.evaluate(previous[name], SimpleNamespace(user=user))
+                if masked != legacy:
+                    mismatches.append(f'{persona} on {name}: mask {masked}, previous {legacy}')
+        if mismatches:
+            raise CommandError('\n'.join(mismatches))
+
+    def measure(self, cases, stacks, rounds):
+        """Seconds to check rounds of cases, a fresh request (and TenantContext) each"""
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for user, name in cases:
+                self.evaluate(stacks[name], SimpleNamespace(user=user))
+        return time.perf_counter() - start
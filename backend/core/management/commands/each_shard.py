@@ -0,0 +1,42 @@
+"""
+Run a management command once per school shard
+
+The command runs pinned to each database in turn (backend.core.sharding),
+so its unhinted tenant queries and shard_atomic() transactions go there.
+Maintenance commands that scan every school (drain_sync_queue,
+detect_absenteeism, prune_sync_logs, compact_change_log,
+rebuild_attendance_rollups, ...) only see the default database when run
+on their own.
+
+Usage:
+    python manage.py each_shard prune_sync_logs
+    python manage.py each_shard detect_absenteeism -- --full
+    python manage.py each_shard --shard shard2 drain_sync_queue -- --until-empty
+"""
+import argparse
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.core.sharding import shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = 'Run a management command on every school shard in turn'
+
+    def add_arguments(self, parser):
+        parser.add_argument('command_name', help='Command to run')
+        parser.add_argument('command_args', nargs=argparse.REMAINDER, help='Its arguments, after --')
+        parser.add_argument('--shard', action='append', help='Only this database alias (repeatable)')
+
+    def handle(self, *args, **options):
+        aliases = options['shard'] or shard_aliases()
+        unknown = set(aliases) - set(shard_aliases())
+        if unknown:
+            raise CommandError(f'Unknown database alias: {", ".join(sorted(unknown))}')
+        command_args = [arg for arg in options['command_args'] if arg != '--']
+
+        for alias in aliases:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{alias}:'))
+            with use_shard(alias):
+                call_command(options['command_name'], *command_args, stdout=self.stdout, stderr=self.stderr)
@@ -0,0 +1,185 @@
+"""
+Move a school's data to another database
+
+  1. copy the school's School and User rows into the target, then every
+     tenant row that leads to the school, in foreign-key order and inside
+     one transaction on the target, keeping ids (prepare_shards gives each
+     shard its own id range); row counts are checked before committing
+  2. point the school's SchoolShard row at the target
+  3. wait SCHOOL_SHARDS MAP_TTL seconds, until every worker routes the
+     school to the target
+  4. check the source again (row counts and latest updated_at): if
+     anything was written there during the wait, keep it and fail;
+     otherwise delete the school's rows there, unless --keep-source
+
+Devices keep marking offline while a school moves; only their pushes
+during step 3 can land on the source, so prefer a quiet hour.
+
+Usage:
+    python manage.py move_school 12 --to shard2 --dry-run
+    python manage.py move_school KAPS-001 --to shard2
+    python manage.py move_school 12 --to default --keep-source --wait 0
+"""
+import time
+from collections import deque
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from backend.core.models import School, SchoolShard
+from backend.core.sharding import (
+    DIRECTORY, kept_sequences, mirror, shard_aliases, shard_for, shard_map, shard_settings, tenant_models,
+)
+from backend.users.models import User
+
+
+def school_path(model, depth=4):
+    """Shortest lookup from model's rows to their School, e.g. 'session__school', or None"""
+    queue = deque([(model, [])])
+    seen = {model}
+    while queue:
+        current, path = queue.popleft()
+        for field in current._meta.concrete_fields:
+            if not field.is_relation or field.related_model is None:
+                continue
+            related = field.related_model._meta.concrete_model
+            if related is School:
+                return '__'.join([*path, field.name])
+            if related not in seen and len(path) < depth - 1:
+                seen.add(related)
+                queue.append((related, [*path, field.name]))
+    return None
+
+
+class Command(BaseCommand):
+    help = "Move a school's rows to another database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('school', help='School id or code')
+        parser.add_argument('--to', required=True, dest='target', help='Database alias to move the school to')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per insert')
+        parser.add_argument('--wait', type=float, help='Seconds to wait after switching (default MAP_TTL)')
+        parser.add_argument('--keep-source', action='store_true', help='Leave the rows on the old database')
+        parser.add_argument('--dry-run', action='store_true', help='Count the rows to move without moving them')
+
+    def handle(self, *args, **options):
+        school = self.get_school(options['school'])
+        target = options['target']
+        if target not in shard_aliases():
+            raise CommandError(f'Unknown database alias: {target}')
+        shard_map().invalidate(school.pk)
+        source = shard_for(school.pk)
+        if source == target:
+            raise CommandError(f'{school} is already on {target}')
+
+        plan, unowned = self.plan()
+        before = self.snapshot(plan, school.pk, source)
+        for label, (count, _) in before.items():
+            if count:
+                self.stdout.write(f'  {label}: {count}')
+        total = sum(count for count, _ in before.values())
+        self.stdout.write(f'{total} rows of {school} on {source}; not per school: {", ".join(unowned) or "none"}')
+        if options['dry_run']:
+            return
+
+        # The copies the school's rows reference on the target
+        mirror(school, [target])
+        for user in User.objects.using(DIRECTORY).filter(school=school).iterator():
+            mirror(user, [target])
+        if any(count for count, _ in self.snapshot(plan, school.pk, target).values()):
+            raise CommandError(f'{target} already holds rows of {school}; delete them first')
+
+        with kept_sequences(target, [model for model, _ in plan]), transaction.atomic(using=target):
+            for model, path in plan:
+                self.copy(model, path, school.pk, source, target, options['batch_size'])
+            copied = self.snapshot(plan, school.pk, target)
+            mismatched = [label for label in before if before[label][0] != copied[label][0]]
+            if mismatched:
+                raise CommandError(f'Row counts differ after copying, nothing moved: {", ".join(mismatched)}')
+        self.stdout.write(f'Copied {total} rows to {target}')
+
+        SchoolShard.objects.using(DIRECTORY).update_or_create(
+            school=school, defaults={'alias': target, 'moved_at': timezone.now()},
+        )
+        wait = shard_settings()['MAP_TTL'] if options['wait'] is None else options['wait']
+        self.stdout.write(f'{school} now routes to {target}; waiting {wait:g}s for other workers')
+        time.sleep(wait)
+
+        late = [label for label, value in self.snapshot(plan, school.pk, source).items() if value != before[label]]
+        if late:
+            raise CommandError(
+                f'Rows of {school} changed on {source} while workers switched ({", ".join(late)}); '
+                f'{source} was kept. Reconcile them with {target} before deleting them.'
+            )
+        if options['keep_source']:
+            self.stdout.write(self.style.SUCCESS(f'Moved {school} to {target}; kept its rows on {source}'))
+            return
+
+        with transaction.atomic(using=source):
+            # Raw deletes: no cascades, and no signals (which would revoke
+            # tokens or unlink users as if people had been deleted)
+            for model, path in reversed(plan):
+                self.rows(model, path, school.pk, source)._raw_delete(source)
+            if source != DIRECTORY:
+                User._base_manager.using(source).filter(school=school)._raw_delete(source)
+                School._base_manager.using(source).filter(pk=school.pk)._raw_delete(source)
+        self.stdout.write(self.style.SUCCESS(f'Moved {school} from {source} to {target}'))
+
+    @staticmethod
+    def get_school(key):
+        schools = School.objects.using(DIRECTORY)
+        school = schools.filter(pk=key).first() if key.isdigit() else schools.filter(code=key).first()
+        if school is None:
+            raise CommandError(f'No school {key}')
+        return school
+
+    @staticmethod
+    def plan():
+        """[(model, school path)] parents first, and labels of models with no school"""
+        paths = {model: school_path(model) for model in tenant_models()}
+        unowned = sorted(model._meta.label for model, path in paths.items() if path is None)
+        pending = [model for model, path in paths.items() if path is not None]
+        parents = {
+            model: {
+                field.related_model._meta.concrete_model for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model is not None
+            } & set(pending) - {model}
+            for model in pending
+        }
+        order = []
+        while pending:
+            ready = [model for model in pending if parents[model] <= set(order)]
+            if not ready:
+                raise CommandError(f'Foreign keys form a cycle between: {", ".join(m._meta.label for m in pending)}')
+            order += ready
+            pending = [model for model in pending if model not in ready]
+        return [(model, paths[model]) for model in order], unowned
+
+    @staticmethod
+    def rows(model, path, school_id, alias):
+        return model._base_manager.using(alias).filter(**{path: school_id})
+
+    def snapshot(self, plan, school_id, alias):
+        """{label: (rows, latest updated_at)} of the school's rows on alias"""
+        result = {}
+        for model, path in plan:
+            aggregates = {'count': Count('pk')}
+            if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+                aggregates['latest'] = Max('updated_at')
+            values = self.rows(model, path, school_id, alias).aggregate(**aggregates)
+            result[model._meta.label] = (values['count'], values.get('latest'))
+        return result
+
+    def copy(self, model, path, school_id, source, target, batch_size):
+        fields = model._meta.concrete_fields
+        batch = []
+        for row in self.rows(model, path, school_id, source).order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                # raw, as loaddata saves: values as stored, auto_now untouched
+                model._base_manager._insert(batch, fields=fields, using=target, raw=True)
+                batch = []
+        if batch:
+            model._base_manager._insert(batch, fields=fields, using=target, raw=True)
@@ -0,0 +1,65 @@
+"""
+Prepare school shards after migrating them
+
+For every shard (every database but default):
+  ids     its tenant tables hand out ids from n * ID_BLOCK, n being its
+          position in settings.DATABASES, so ids stay unique across shards
+          and move_school can copy rows without renumbering them
+          (migrate sets this up for a new shard; re-applied for older ones)
+  mirrors the School rows of its schools, their users and every user
+          without a school are copied into it
+
+Run after `migrate --database <alias>` for a new shard, and after bulk
+imports of schools or users, which skip the signals that keep the copies
+current. Safe to re-run.
+
+Usage:
+    python manage.py migrate --database shard1
+    python manage.py prepare_shards
+    python manage.py prepare_shards --shard shard1 --skip-ids
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from backend.core.models import SchoolShard
+from backend.core.sharding import (
+    DIRECTORY, mirror, raise_sequences, shard_aliases, shard_settings, tenant_models,
+)
+from backend.users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Set shard id ranges and copy School and User rows into school shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard', action='append', help='Only this database alias (repeatable)')
+        parser.add_argument('--skip-ids', action='store_true', help='Leave id sequences alone')
+
+    def handle(self, *args, **options):
+        aliases = [alias for alias in shard_aliases() if alias != DIRECTORY]
+        if options['shard']:
+            unknown = set(options['shard']) - set(aliases)
+            if unknown:
+                raise CommandError(f'Not a school shard: {", ".join(sorted(unknown))}')
+            aliases = options['shard']
+        if not aliases:
+            self.stdout.write('Only the default database is configured; nothing to prepare')
+            return
+
+        models = tenant_models()
+        block = shard_settings()['ID_BLOCK']
+        for alias in aliases:
+            if not options['skip_ids']:
+                floor = shard_aliases().index(alias) * block
+                raise_sequences(alias, models, floor)
+                self.stdout.write(f'{alias}: tenant ids start above {floor}')
+
+            schools = users = 0
+            for placement in SchoolShard.objects.using(DIRECTORY).filter(alias=alias).select_related('school').iterator():
+                mirror(placement.school, [alias])
+                schools += 1
+            accounts = User.objects.using(DIRECTORY).filter(Q(school__shard__alias=alias) | Q(school__isnull=True))
+            for user in accounts.iterator():
+                mirror(user, [alias])
+                users += 1
+            self.stdout.write(self.style.SUCCESS(f'{alias}: copied {schools} schools and {users} users'))
@@ -0,0 +1,71 @@
+"""
+Async-capable middleware
+Under ASGI, one sync-only middleware in MIDDLEWARE makes Django adapt the
+whole chain to sync: every request, async views included, is moved onto
+a thread of its own (one per request's ThreadSensitiveContext) and back.
+A login then holds a thread for as long as it waits on its password hash,
+instead of only a coroutine on the event loop.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from backend.core.sharding import pin_scope
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware that stays on the event loop under ASGI
+    
+    WhiteNoise 6.6 is sync-only; file lookup is a dict hit (or a
+    filesystem search with autorefresh, which is offloaded), so only the
+    call into the next handler needs an async path.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+    
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class ShardMiddleware:
+    """Scope the pinned school shard to each request
+    
+    ClaimsJWTAuthentication pins the caller's shard once it knows them;
+    on a WSGI worker thread the pin would otherwise outlive the request.
+    The pin from before the request (none on a server; the test's school
+    in tests) is restored afterwards.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with pin_scope():
+            return self.get_response(request)
+    
+    async def __acall__(self, request):
+        with pin_scope():
+            return await self.get_response(request)
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.8 on 2026-10-17 00:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolShard',
+            fields=[
+                ('school', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shard', serialize=False, to='core.school')),
+                ('alias', models.CharField(help_text='Key of settings.DATABASES', max_length=100)),
+                ('moved_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -82,3 +82,17 @@ class Subject(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.code})"
+
+
+class SchoolShard(models.Model):
+    """Database holding a school's data (see backend.core.sharding)
+
+    Rows live in the default database only. Schools without a row are in
+    default.
+    """
+    school = models.OneToOneField(School, on_delete=models.CASCADE, primary_key=True, related_name='shard')
+    alias = models.CharField(max_length=100, help_text='Key of settings.DATABASES')
+    moved_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.school_id} -> {self.alias}"
@@ -1,30 +1,57 @@
 """
 Custom permission classes for MunTech School Infrastructure
-Phase 0: Skeleton role-based permissions
+Role and permission checks against the caller's compiled capability mask
+(backend.core.capabilities), resolved once per request.
 """
 from rest_framework import permissions
+from backend.core.capabilities import CAPABILITIES
+from backend.core.tenant_context import get_tenant
 from backend.people.roles import ROLES
 
 
-class IsTeacher(permissions.BasePermission):
-    """Allow access only to teacher users"""
+class CapabilityPermission(permissions.BasePermission):
+    """
+    Grant when the caller's mask has every bit of all_of and at least one
+    bit of any_of (either may be 0), or any bit of bypass.
+    """
+    all_of = 0
+    any_of = 0
+    bypass = 0
+
     def has_permission(self, request, view):
-        return hasattr(request.user, 'person') and request.user.person.role == ROLES['TEACHER']
+        mask = get_tenant(request).capabilities
+        if mask & self.bypass:
+            return True
+        return mask & self.all_of == self.all_of and (not self.any_of or bool(mask & self.any_of))
+
 
+def requires(*names):
+    """Permission class granting callers that have every named capability
 
-class IsStudent(permissions.BasePermission):
+    Example:
+        permission_classes = [IsAuthenticated, requires('view_reports')]
+    """
+    return type(
+        f"Requires({', '.join(names)})", (CapabilityPermission,),
+        {'all_of': CAPABILITIES.mask('flag:authenticated', *names), '__doc__': f"Requires {', '.join(names)}"},
+    )
+
+
+class IsTeacher(CapabilityPermission):
+    """Allow access only to teacher users"""
+    all_of = CAPABILITIES.mask(f"role:{ROLES['TEACHER']}")
+
+
+class IsStudent(CapabilityPermission):
     """Allow access only to student users"""
-    def has_permission(self, request, view):
-        return hasattr(request.user, 'person') and request.user.person.role == ROLES['STUDENT']
+    all_of = CAPABILITIES.mask(f"role:{ROLES['STUDENT']}")
 
 
-class IsAdmin(permissions.BasePermission):
+class IsAdmin(CapabilityPermission):
     """Allow access only to admin users"""
-    def has_permission(self, request, view):
-        return hasattr(request.user, 'person') and request.user.person.role == ROLES['ADMIN']
+    all_of = CAPABILITIES.mask(f"role:{ROLES['ADMIN']}")
 
 
-class IsSchoolAdmin(permissions.BasePermission):
+class IsSchoolAdmin(CapabilityPermission):
     """Allow access only to school admin users"""
-    def has_permission(self, request, view):
-        return hasattr(request.user, 'person') and request.user.person.role in [ROLES['ADMIN'], ROLES['SCHOOL_ADMIN']]
+    any_of = CAPABILITIES.mask(f"role:{ROLES['ADMIN']}", f"role:{ROLES['SCHOOL_ADMIN']}")
@@ -0,0 +1,371 @@
+"""
+School-sharded database routing
+Every database in settings.DATABASES holds whole schools. The default
+database is also the directory: School and User rows, auth, sessions and
+the SchoolShard map of which database holds which school. Schools without
+a map row are in default; new schools are placed by a hash of their id.
+
+School and User rows are mirrored into the shards that reference them so
+that foreign keys and joins stay inside one database; writes always go to
+default and signals copy them. Tenant models are routed by the instance
+being saved or followed, then by the shard pinned for the current
+request or command (use_shard, pin_school), then to default.
+Authenticated API requests are pinned to the caller's school.
+
+Code that needs a transaction on tenant data uses shard_atomic(), which
+opens it on the pinned shard rather than on default. Cross-shard reads
+run per shard in parallel with fan_out().
+"""
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, models, router, transaction
+
+DEFAULTS = {
+    # Databases new schools are placed on (None: every database)
+    'PLACEMENT': None,
+    # Other workers follow a moved school within this many seconds
+    'MAP_TTL': 60,
+    'MAP_CACHE_SIZE': 4096,
+    # The nth database hands out ids from n * ID_BLOCK (prepare_shards),
+    # so rows keep their ids when their school moves
+    'ID_BLOCK': 10 ** 12,
+    # Threads per fan_out() call (None: one per database)
+    'FAN_OUT_WORKERS': None,
+}
+
+DIRECTORY = DEFAULT_DB_ALIAS
+# Written to the directory, copied into shards
+MIRRORED = {'core.school', 'users.user'}
+# Only in the directory (their tables exist but stay empty on shards,
+# as deleting a School copy cascades through them)
+DIRECTORY_MODELS = {'core.schoolshard'}
+DIRECTORY_APPS = {'admin', 'auth', 'contenttypes', 'sessions', 'users'}
+
+_pinned = ContextVar('school_shard', default=None)
+
+
+def shard_settings():
+    return {**DEFAULTS, **getattr(settings, 'SCHOOL_SHARDS', {})}
+
+
+def shard_aliases():
+    """Every database holding schools, default first"""
+    return tuple(settings.DATABASES)
+
+
+def sharded():
+    return len(settings.DATABASES) > 1
+
+
+def place(school_id):
+    """Database a new school goes to"""
+    aliases = shard_settings()['PLACEMENT'] or shard_aliases()
+    return aliases[zlib.crc32(str(school_id).encode()) % len(aliases)]
+
+
+class ShardMap:
+    """Thread-safe LRU of SchoolShard aliases by school id"""
+    
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, school_id):
+        """Alias of the database holding a school"""
+        from backend.core.models import SchoolShard
+        
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(school_id)
+            if entry is not None and entry[1] > now:
+                self._rows.move_to_end(school_id)
+                return entry[0]
+        
+        alias = SchoolShard.objects.using(DIRECTORY).filter(school_id=school_id).values_list('alias', flat=True).first()
+        alias = alias or DIRECTORY
+        with self._lock:
+            self._rows[school_id] = (alias, now + self.ttl)
+            self._rows.move_to_end(school_id)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+        return alias
+    
+    def invalidate(self, school_id):
+        with self._lock:
+            self._rows.pop(school_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+_shard_map = None
+_shard_map_lock = threading.Lock()
+
+
+def shard_map():
+    global _shard_map
+    with _shard_map_lock:
+        if _shard_map is None:
+            config = shard_settings()
+            _shard_map = ShardMap(config['MAP_CACHE_SIZE'], config['MAP_TTL'])
+    return _shard_map
+
+
+def shard_for(school_id):
+    """Alias of the database holding a school (default when not sharded)"""
+    if school_id is None or not sharded():
+        return DIRECTORY
+    return shard_map().get(school_id)
+
+
+def current_shard():
+    """The pinned shard, or None"""
+    return _pinned.get()
+
+
+@contextmanager
+def use_shard(alias):
+    """Send unhinted tenant queries in this block to alias"""
+    token = _pinned.set(alias)
+    try:
+        yield alias
+    finally:
+        _pinned.reset(token)
+
+
+def pin_school(school_id):
+    """Pin the rest of this request to a school's shard (ShardMiddleware scopes it)"""
+    _pinned.set(shard_for(school_id) if school_id is not None else None)
+
+
+@contextmanager
+def pin_scope():
+    """Undo pins made inside the block, restoring the one before it"""
+    token = _pinned.set(_pinned.get())
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def instance_db(instance, using=None):
+    """Database a model instance is saved to (using, when given)"""
+    return using or router.db_for_write(type(instance), instance=instance)
+
+
+@contextmanager
+def shard_atomic(using=None, savepoint=True):
+    """transaction.atomic on a shard (default: the pinned one)
+    
+    The shard stays pinned inside the block, so unhinted queries join
+    the transaction instead of going to default.
+    """
+    using = using or current_shard() or DIRECTORY
+    with use_shard(using), transaction.atomic(using=using, savepoint=savepoint):
+        yield using
+
+
+def fan_out(function, aliases=None):
+    """Call function once per shard, pinned to it, in parallel
+    
+    Each call runs in its own thread with its own connections, which are
+    closed when it returns.
+    
+    Returns:
+        {alias: result}, in shard_aliases() order
+    
+    Raises:
+        The first exception raised by a call
+    """
+    aliases = list(aliases or shard_aliases())
+    
+    def run(alias):
+        try:
+            with use_shard(alias):
+                return function()
+        finally:
+            connections.close_all()
+    
+    if len(aliases) == 1:
+        with use_shard(aliases[0]):
+            return {aliases[0]: function()}
+    workers = shard_settings()['FAN_OUT_WORKERS'] or len(aliases)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shard-fan-out') as pool:
+        return dict(zip(aliases, pool.map(run, aliases)))
+
+
+def owned_rows(results, key='school_id'):
+    """Merge fan_out() results that are lists of rows with a school id
+    
+    Keeps each row only from the shard that holds its school, dropping
+    copies left behind by move_school --keep-source.
+    """
+    from backend.core.models import SchoolShard
+    
+    if not sharded():
+        return [row for rows in results.values() for row in rows]
+    placements = dict(SchoolShard.objects.using(DIRECTORY).values_list('school_id', 'alias'))
+    return [
+        row for alias, rows in results.items() for row in rows
+        if placements.get(row[key], DIRECTORY) == alias
+    ]
+
+
+def mirror_aliases(instance):
+    """Shards that need a copy of a School or User row"""
+    if instance._meta.concrete_model._meta.label_lower == 'core.school':
+        return [shard_for(instance.pk)]
+    if instance.school_id is not None:
+        return [shard_for(instance.school_id)]
+    # Accounts without a school (staff, superusers) can act in any school
+    return list(shard_aliases())
+
+
+def mirror(instance, aliases=None):
+    """Copy a directory row into shards, inserting or updating it"""
+    model = instance._meta.concrete_model
+    values = {f.attname: getattr(instance, f.attname) for f in model._meta.concrete_fields if not f.primary_key}
+    for alias in aliases or mirror_aliases(instance):
+        if alias == DIRECTORY:
+            continue
+        rows = model._base_manager.using(alias).filter(pk=instance.pk)
+        if rows.update(**values):
+            continue
+        try:
+            with transaction.atomic(using=alias):
+                model._base_manager.using(alias).bulk_create([model(pk=instance.pk, **values)])
+        except IntegrityError:
+            rows.update(**values)
+
+
+def unmirror(model, pk, aliases=None):
+    """Delete the copies of a directory row, cascading as Django does"""
+    for alias in aliases or shard_aliases():
+        if alias != DIRECTORY:
+            model._base_manager.using(alias).filter(pk=pk).delete()
+
+
+def tenant_models():
+    """Concrete models whose rows live on school shards"""
+    from django.apps import apps
+    
+    return [
+        model for model in apps.get_models(include_auto_created=True)
+        if model._meta.managed and not model._meta.proxy
+        and model._meta.label_lower not in MIRRORED | DIRECTORY_MODELS
+        and model._meta.app_label not in DIRECTORY_APPS
+    ]
+
+
+def sequenced(tenant_models):
+    """(table, column) of the auto-increment ids of models"""
+    return [
+        (model._meta.db_table, model._meta.pk.column)
+        for model in tenant_models if isinstance(model._meta.pk, models.AutoField)
+    ]
+
+
+def raise_sequences(alias, tenant_models, floor):
+    """Make alias hand out ids above floor for models
+    
+    Raises:
+        ImproperlyConfigured: The database is neither SQLite nor PostgreSQL
+    """
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for table, column in sequenced(tenant_models):
+            if connection.vendor == 'sqlite':
+                cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, floor])
+                elif row[0] < floor:
+                    cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [floor, table])
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, column])
+                sequence = cursor.fetchone()[0]
+                cursor.execute(f'SELECT last_value FROM {sequence}')
+                if cursor.fetchone()[0] < floor:
+                    cursor.execute('SELECT setval(%s, %s)', [sequence, floor])
+            else:
+                raise ImproperlyConfigured(f'Shard id ranges are not supported on {connection.vendor}')
+
+
+@contextmanager
+def kept_sequences(alias, tenant_models):
+    """Undo sequence changes on alias caused by inserting explicit ids
+    
+    SQLite moves an AUTOINCREMENT counter up to the largest id inserted,
+    which would take a shard into the id range of the shard rows came
+    from. PostgreSQL sequences ignore explicit ids.
+    """
+    connection = connections[alias]
+    tables = [table for table, _ in sequenced(tenant_models)]
+    if connection.vendor != 'sqlite' or not tables:
+        yield
+        return
+    placeholders = ', '.join(['%s'] * len(tables))
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT name, seq FROM sqlite_sequence WHERE name IN ({placeholders})', tables)
+        before = dict(cursor.fetchall())
+    yield
+    with connection.cursor() as cursor:
+        for table in tables:
+            if table in before:
+                cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [before[table], table])
+            else:
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s', [table])
+
+
+class SchoolShardRouter:
+    """Route tenant models to their school's database (see module docstring)"""
+    
+    def db_for_read(self, model, **hints):
+        label = model._meta.concrete_model._meta.label_lower
+        if label in MIRRORED:
+            # The pinned shard's copy joins with its tenant rows
+            instance = hints.get('instance')
+            return current_shard() or (instance is not None and instance._state.db) or DIRECTORY
+        if label in DIRECTORY_MODELS or model._meta.app_label in DIRECTORY_APPS:
+            return DIRECTORY
+        return self.tenant_db(hints)
+    
+    def db_for_write(self, model, **hints):
+        label = model._meta.concrete_model._meta.label_lower
+        if label in MIRRORED or label in DIRECTORY_MODELS or model._meta.app_label in DIRECTORY_APPS:
+            return DIRECTORY
+        return self.tenant_db(hints)
+    
+    @staticmethod
+    def tenant_db(hints):
+        instance = hints.get('instance')
+        if instance is not None:
+            label = instance._meta.concrete_model._meta.label_lower
+            if label in MIRRORED:
+                # Following a directory row to its school's data
+                school_id = instance.pk if label == 'core.school' else instance.school_id
+                if school_id is not None:
+                    return shard_for(school_id)
+            elif instance._state.db:
+                return instance._state.db
+            elif getattr(instance, 'school_id', None) is not None:
+                return shard_for(instance.school_id)
+        return current_shard() or DIRECTORY
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        labels = {obj1._meta.concrete_model._meta.label_lower, obj2._meta.concrete_model._meta.label_lower}
+        if labels & MIRRORED:
+            return True
+        return None
+    
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""
+Keep the per-process School cache of the tenant context fresh, and School
+rows and the shard map in step across school shards
+"""
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from backend.core.models import School, SchoolShard
+from backend.core.sharding import (
+    DIRECTORY, mirror, place, raise_sequences, shard_aliases, shard_map, shard_settings, sharded, tenant_models, unmirror,
+)
+from backend.core.tenant_context import school_cache
+
+
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def school_changed(sender, instance, **kwargs):
+    school_cache().invalidate(instance.pk)
+
+
+@receiver(post_save, sender=School)
+def school_saved(sender, instance, created, using, **kwargs):
+    if using != DIRECTORY or not sharded():
+        return
+    if created:
+        SchoolShard.objects.using(DIRECTORY).get_or_create(school=instance, defaults={'alias': place(instance.pk)})
+    # Tenant rows on the school's shard reference its copy there
+    mirror(instance)
+
+
+@receiver(post_delete, sender=School)
+def school_deleted(sender, instance, using, **kwargs):
+    if using == DIRECTORY and sharded():
+        # Cascades to the school's data on its shard
+        unmirror(School, instance.pk)
+
+
+@receiver(post_save, sender=SchoolShard)
+@receiver(post_delete, sender=SchoolShard)
+def school_shard_changed(sender, instance, **kwargs):
+    shard_map().invalidate(instance.school_id)
+
+
+@receiver(post_migrate)
+def shard_migrated(sender, using, **kwargs):
+    # A freshly migrated shard hands out ids in its own range from the start
+    # (prepare_shards does the same for shards migrated before)
+    if sender.label == 'core' and using != DIRECTORY and sharded():
+        raise_sequences(using, tenant_models(), shard_aliases().index(using) * shard_settings()['ID_BLOCK'])
@@ -0,0 +1,232 @@
+"""
+Request-scoped tenant context
+Who the caller is within their school — school, role, teacher and student
+ids — resolved once per request with one joined query, instead of every
+permission class and mixin walking request.user.school and
+request.user.person.teacher on its own. School rows come from a
+per-process LRU cache that School save/delete signals invalidate.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from backend.core.capabilities import CAPABILITIES
+from backend.core.sharding import DIRECTORY, shard_for
+
+DEFAULTS = {
+    'SCHOOL_CACHE_SIZE': 256,   # School rows kept per process
+    # Signals only reach the process that saved the school, so other
+    # workers see an edit once their cached row expires
+    'SCHOOL_CACHE_TTL': 300,
+}
+
+
+def tenant_settings():
+    return {**DEFAULTS, **getattr(settings, 'TENANT_CONTEXT', {})}
+
+
+class SchoolCache:
+    """Thread-safe LRU of School rows by id, also looked up by code
+    
+    Cached instances are shared between requests; treat them as read-only
+    and fetch a fresh row to modify a school.
+    """
+    
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._rows = OrderedDict()
+        self._codes = {}
+        self._lock = threading.Lock()
+    
+    def get(self, school_id):
+        """School with this id, or None if it does not exist"""
+        from backend.core.models import School
+        
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(school_id)
+            if entry is not None and entry[1] > now:
+                self._rows.move_to_end(school_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        
+        # From the directory: the cache is shared by requests pinned to any shard
+        school = School.objects.using(DIRECTORY).filter(pk=school_id).first()
+        if school is not None:
+            self._store(school, now)
+        return school
+    
+    def cached_by_code(self, code):
+        """School with this code if it is cached, without touching the database
+        
+        Safe to call from async code; fall back to get_by_code() on None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(self._codes.get(code))
+            if entry is not None and entry[1] > now and entry[0].code == code:
+                self._rows.move_to_end(entry[0].pk)
+                self.hits += 1
+                return entry[0]
+        return None
+    
+    def get_by_code(self, code):
+        """School with this code (as typed at login), or None"""
+        from backend.core.models import School
+        
+        school = self.cached_by_code(code)
+        if school is not None:
+            return school
+        with self._lock:
+            self.misses += 1
+        school = School.objects.using(DIRECTORY).filter(code=code).first()
+        if school is not None:
+            self._store(school, time.monotonic())
+        return school
+    
+    def _store(self, school, now):
+        with self._lock:
+            self._rows[school.pk] = (school, now + self.ttl)
+            self._rows.move_to_end(school.pk)
+            self._codes[school.code] = school.pk
+            while len(self._rows) > self.maxsize:
+                evicted = self._rows.popitem(last=False)[1][0]
+                self._codes.pop(evicted.code, None)
+    
+    def invalidate(self, school_id):
+        with self._lock:
+            entry = self._rows.pop(school_id, None)
+            if entry is not None:
+                self._codes.pop(entry[0].code, None)
+    
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._codes.clear()
+
+
+_school_cache = None
+_school_cache_lock = threading.Lock()
+
+
+def school_cache():
+    global _school_cache
+    with _school_cache_lock:
+        if _school_cache is None:
+            config = tenant_settings()
+            _school_cache = SchoolCache(config['SCHOOL_CACHE_SIZE'], config['SCHOOL_CACHE_TTL'])
+    return _school_cache
+
+
+class TenantContext:
+    """The caller's tenant facts for one request"""
+    __slots__ = (
+        'user_id', 'is_authenticated', 'is_superuser', 'is_staff',
+        'school_id', 'person_id', 'role', 'teacher_id', 'student_id', '_school', '_capabilities',
+    )
+    
+    FIELDS = ('school_id', 'person_id', 'person__role', 'person__teacher__id', 'person__student__id')
+    
+    def __init__(self, user=None, row=None):
+        row = row or {}
+        self.user_id = getattr(user, 'pk', None)
+        self.is_authenticated = bool(user and user.is_authenticated)
+        self.is_superuser = bool(user and getattr(user, 'is_superuser', False))
+        self.is_staff = bool(user and getattr(user, 'is_staff', False))
+        self.school_id = row.get('school_id')
+        self.person_id = row.get('person_id')
+        self.role = row.get('person__role')
+        self.teacher_id = row.get('person__teacher__id')
+        self.student_id = row.get('person__student__id')
+        self._school = None
+        # Precomputed for users built from token claims
+        self._capabilities = row.get('capabilities')
+    
+    @classmethod
+    def for_user(cls, user):
+        """Context of a user, with one query joining person, teacher and student
+        
+        No query for users built from token claims (see backend.users.auth).
+        """
+        if user is None or not user.is_authenticated:
+            return cls(user)
+        # Users authenticated from JWT claims already carry the row
+        claims = getattr(user, 'tenant_claims', None)
+        if claims is not None:
+            return cls(user, claims)
+        return cls(user, cls.row_for(user))
+    
+    @classmethod
+    def row_for(cls, user, *extra):
+        """FIELDS and extra User fields of a user, or None
+        
+        One joined query, or two when the user's school is on another
+        shard than the directory (backend.core.sharding): the user, then
+        their person there.
+        """
+        from backend.people.models import Person
+        from backend.users.models import User
+        
+        users = User.objects.using(DIRECTORY).filter(pk=user.pk)
+        if shard_for(getattr(user, 'school_id', None)) == DIRECTORY:
+            return users.values(*extra, *cls.FIELDS).first()
+        row = users.values(*extra, 'school_id', 'person_id').first()
+        if row is None:
+            return None
+        person = {}
+        if row['person_id'] is not None:
+            person = Person.objects.using(shard_for(row['school_id'])).filter(pk=row['person_id']).values(
+                'role', 'teacher__id', 'student__id',
+            ).first() or {}
+        row.update({
+            'person__role': person.get('role'),
+            'person__teacher__id': person.get('teacher__id'),
+            'person__student__id': person.get('student__id'),
+        })
+        return row
+    
+    @property
+    def school(self):
+        """The caller's School (cached per process), or None"""
+        if self._school is None and self.school_id is not None:
+            self._school = school_cache().get(self.school_id)
+        return self._school
+    
+    @property
+    def capabilities(self):
+        """Effective capability mask (see backend.core.capabilities)"""
+        if self._capabilities is None:
+            self._capabilities = CAPABILITIES.for_tenant(self)
+        return self._capabilities
+    
+    def can(self, mask):
+        """Whether the caller has every bit of mask"""
+        return self.capabilities & mask == mask
+    
+    @property
+    def is_teacher(self):
+        return self.teacher_id is not None
+    
+    @property
+    def is_student(self):
+        return self.student_id is not None
+
+
+def get_tenant(request):
+    """The request's TenantContext, built on first use
+    
+    Works with Django and DRF requests. Rebuilt if request.user changes,
+    e.g. once DRF authenticates a token after the middleware ran.
+    """
+    user = getattr(request, 'user', None)
+    tenant = getattr(request, '_tenant', None)
+    if tenant is None or tenant.user_id != getattr(user, 'pk', None):
+        tenant = TenantContext.for_user(user)
+        request._tenant = tenant
+    return tenant
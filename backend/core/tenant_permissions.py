@@ -5,69 +5,60 @@ Ensures users only access their school's data
 from rest_framework import permissions
 from django.core.exceptions import ValidationError
 
+from backend.core.capabilities import CAPABILITIES
+from backend.core.permissions import CapabilityPermission
+from backend.core.sharding import shard_for
+from backend.core.tenant_context import get_tenant
 
-class IsTenantMember(permissions.BasePermission):
+SUPERUSER = CAPABILITIES.mask('flag:superuser')
+SCHOOL_MEMBER = CAPABILITIES.mask('flag:school_member')
+
+
+def same_school(obj, tenant):
+    """Whether obj belongs to the caller's school (False if it has no school)"""
+    if hasattr(obj, 'school_id'):
+        return obj.school_id == tenant.school_id
+    if hasattr(obj, 'school'):
+        return getattr(obj.school, 'pk', None) == tenant.school_id
+    return False
+
+
+class IsTenantMember(CapabilityPermission):
     """
     Permission check: User must belong to the requested school/tenant.
+    Superusers can access all; anonymous callers have an empty mask.
     """
     message = "Access denied. You don't belong to this school."
-
-    def has_permission(self, request, view):
-        """Check if user is authenticated and has a school"""
-        if not request.user or not request.user.is_authenticated:
-            return False
-        
-        # Superuser can access all
-        if request.user.is_superuser:
-            return True
-        
-        # Regular user must have a school
-        return hasattr(request.user, 'school') and request.user.school is not None
+    any_of = SUPERUSER | SCHOOL_MEMBER
 
     def has_object_permission(self, request, view, obj):
         """Check if object belongs to user's school"""
-        if request.user.is_superuser:
+        tenant = get_tenant(request)
+        if tenant.is_superuser:
             return True
         
-        # Object must have school field that matches user's school
-        if hasattr(obj, 'school'):
-            return obj.school == request.user.school
-        
-        # If object doesn't have school field, deny access
-        return False
+        # Object must have school field that matches user's school;
+        # if it doesn't have one, deny access
+        return same_school(obj, tenant)
 
 
-class IsTeacherOfSchool(permissions.BasePermission):
+class IsTeacherOfSchool(CapabilityPermission):
     """
     Permission check: User must be a teacher in their school.
+    A teacher profile and a school, or superuser.
     """
     message = "Only teachers can perform this action."
+    all_of = CAPABILITIES.mask('flag:teacher_profile') | SCHOOL_MEMBER
+    bypass = SUPERUSER
 
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-        
-        if request.user.is_superuser:
-            return True
-        
-        # Check if user has a teacher profile
-        return hasattr(request.user, 'person') and \
-               hasattr(request.user.person, 'teacher') and \
-               request.user.school is not None
 
-
-class IsAdminOfSchool(permissions.BasePermission):
+class IsAdminOfSchool(CapabilityPermission):
     """
     Permission check: User must be admin for their school.
+    Superuser or staff member.
     """
     message = "Only school administrators can perform this action."
-
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-        
-        # Superuser or staff member
-        return request.user.is_staff or request.user.is_superuser
+    any_of = CAPABILITIES.mask('flag:staff') | SUPERUSER
 
 
 class TenantFilterPermission(permissions.BasePermission):
@@ -83,7 +74,8 @@ class TenantFilterPermission(permissions.BasePermission):
 class TenantIsolationMixin:
     """
     Mixin for ViewSets to enforce tenant isolation.
-    Filters queryset by user's school automatically.
+    Filters queryset by user's school automatically, on the school's shard.
+    Superusers without a school see the default database's schools.
     """
     permission_classes = [IsTenantMember]
 
@@ -91,15 +83,15 @@ class TenantIsolationMixin:
         """Filter queryset by user's school"""
         queryset = super().get_queryset()
         
-        user = self.request.user
+        tenant = get_tenant(self.request)
         
         # Superuser sees all
-        if user.is_superuser:
+        if tenant.is_superuser:
             return queryset
         
         # Regular users see only their school's data
-        if user.school:
-            queryset = queryset.filter(school=user.school)
+        if tenant.school_id is not None:
+            queryset = queryset.using(shard_for(tenant.school_id)).filter(school_id=tenant.school_id)
         else:
             # No school assigned - empty queryset
             queryset = queryset.none()
@@ -108,47 +100,41 @@ class TenantIsolationMixin:
 
     def perform_create(self, serializer):
         """Automatically set school from user"""
-        if self.request.user.school:
-            serializer.save(school=self.request.user.school)
+        school = get_tenant(self.request).school
+        if school:
+            serializer.save(school=school)
         else:
             raise ValidationError("User must belong to a school to create records.")
 
     def perform_update(self, serializer):
         """Ensure school isn't changed"""
-        serializer.save(school=self.request.user.school)
+        serializer.save(school=get_tenant(self.request).school)
 
     def perform_destroy(self, instance):
         """Ensure user can only delete their school's records"""
-        if self.request.user.school != instance.school and not self.request.user.is_superuser:
+        tenant = get_tenant(self.request)
+        if not same_school(instance, tenant) and not tenant.is_superuser:
             raise ValidationError("You can only delete records from your school.")
         instance.delete()
 
 
-class TenantSyncPermission(permissions.BasePermission):
+class TenantSyncPermission(CapabilityPermission):
     """
     Permission for sync operations.
     Users can only sync their school's data.
     """
     message = "You can only sync data from your school."
-
-    def has_permission(self, request, view):
-        if not request.user.is_authenticated:
-            return False
-        if request.user.is_superuser:
-            return True
-        return request.user.school is not None
+    any_of = SUPERUSER | SCHOOL_MEMBER
 
     def has_object_permission(self, request, view, obj):
-        if request.user.is_superuser:
+        tenant = get_tenant(request)
+        if tenant.is_superuser:
             return True
         
         # For sync operations, check school_id in data
         school_id = request.data.get('school_id') if hasattr(request, 'data') else None
         if school_id:
-            return request.user.school_id == int(school_id)
+            return tenant.school_id == int(school_id)
         
         # Fallback to object check
-        if hasattr(obj, 'school'):
-            return obj.school == request.user.school
-        
-        return False
+        return same_school(obj, tenant)
@@ -1,9 +1,14 @@
 """
 Multi-Tenant Infrastructure for School Management System
-Provides tenant awareness across all models
+Provides tenant awareness across all models. Tenant querysets read from
+the school's shard (backend.core.sharding).
 """
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.utils.functional import SimpleLazyObject
+
+from backend.core.sharding import shard_for
+from backend.core.tenant_context import get_tenant
 
 
 class TenantMixin(models.Model):
@@ -33,8 +38,11 @@ class TenantQuerySet(models.QuerySet):
     Usage: Model.objects.for_school(school_obj).all()
     """
     def for_school(self, school):
-        """Filter queryset by school (tenant)"""
-        return self.filter(school=school)
+        """Filter queryset by school (tenant), on its shard unless using() was given"""
+        queryset = self.filter(school=school)
+        if self._db is None:
+            queryset = queryset.using(shard_for(getattr(school, 'pk', school)))
+        return queryset
 
 
 class TenantManager(models.Manager):
@@ -75,19 +83,19 @@ class TenantPermissionMixin:
         """Filter queryset by school from request user"""
         queryset = super().get_queryset()
         
-        school = self.request.user.school
-        if school:
-            queryset = queryset.filter(school=school)
+        tenant = get_tenant(self.request)
+        if tenant.school_id is not None:
+            queryset = queryset.using(shard_for(tenant.school_id)).filter(school_id=tenant.school_id)
         else:
             # Superuser can see all
-            if not self.request.user.is_superuser:
+            if not tenant.is_superuser:
                 queryset = queryset.none()
         
         return queryset
 
     def perform_create(self, serializer):
         """Automatically set school from request user"""
-        serializer.save(school=self.request.user.school)
+        serializer.save(school=get_tenant(self.request).school)
 
 
 class TenantMiddleware:
@@ -98,11 +106,9 @@ class TenantMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        # Attach school to request from user
-        if request.user.is_authenticated:
-            request.school = getattr(request.user, 'school', None)
-        else:
-            request.school = None
+        # Attach tenant context and school; both resolve on first use
+        request.tenant = SimpleLazyObject(lambda: get_tenant(request))
+        request.school = SimpleLazyObject(lambda: get_tenant(request).school)
 
         response = self.get_response(request)
         return response
@@ -0,0 +1,247 @@
+"""
+Core tests
+
+    python manage.py test backend/core
+"""
+import re
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from backend.core.benchmarking import percentile, rolled_back, seed_attendance, seed_school
+from backend.core.capabilities import CAPABILITIES, CapabilityModel
+from backend.core.models import Class, School, SchoolShard
+from backend.core.sharding import (
+    current_shard, fan_out, shard_aliases, shard_atomic, shard_for, shard_settings, use_shard,
+)
+from backend.core.tenant_context import TenantContext, get_tenant, school_cache
+from backend.people.models import Person
+from backend.people.roles import PERMISSIONS, ROLES
+from backend.users.auth import AuthService, token_versions
+from backend.users.models import User
+
+
+class PercentileTests(SimpleTestCase):
+    """Nearest-rank percentiles reported by the benchmark commands"""
+    
+    def test_nearest_rank(self):
+        values = [15, 20, 35, 40, 50]
+        self.assertEqual([percentile(values, p) for p in (5, 30, 40, 50, 100)], [15, 20, 20, 35, 50])
+        self.assertEqual(percentile([3, 1, 2], 50), 2)
+        self.assertIsNone(percentile([], 95))
+
+
+class EndpointQueryCountTests(TestCase):
+    """Endpoints stay within their query budget and make no auth lookups
+    
+    Requests carry claims-based JWTs as issued by school_login. Budgets are
+    counted with warm token-version and School caches, as most requests of
+    a long-running worker see them.
+    """
+    databases = '__all__'
+    FROM_TABLE = re.compile(r'\bFROM "(\w+)"')
+    # Sync streams read people_* rows as data, so only these count as auth lookups
+    TENANT_TABLES = {'users_user', 'core_school'}
+    
+    @classmethod
+    def setUpTestData(cls):
+        seeded = seed_school(students=20, classes=2)
+        seed_attendance(seeded, days=3)
+        school = seeded['school']
+        cls.shard = shard_for(school.id)
+        cls.users = {
+            'teacher': User.objects.create(username='teacher', school=school, person=seeded['teachers'][0].person),
+            'student': User.objects.create(username='student', school=school, person=seeded['students'][0].person),
+            'staff': User.objects.create(
+                username='staff', school=school, is_staff=True,
+                person=Person.objects.using(cls.shard).create(
+                    first_name='Admin', last_name='QC', role=ROLES['ADMIN'], school=school,
+                ),
+            ),
+        }
+        cls.tokens = {caller: str(AuthService.create_token(user).access_token) for caller, user in cls.users.items()}
+    
+    def assertWithinBudget(self, caller, path, budget):
+        school_cache().clear()
+        token_versions().clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.tokens[caller]}')
+        self.assertEqual(client.get(path).status_code, 200)
+        
+        # Tenant queries run on the school's shard, auth lookups on the directory
+        with self.assertNumQueries(budget, using=self.shard), CaptureQueriesContext(connection) as queries:
+            client.get(path)
+        
+        tables = [self.FROM_TABLE.search(q['sql']) for q in queries.captured_queries]
+        self.assertFalse([match.group(1) for match in tables if match and match.group(1) in self.TENANT_TABLES])
+    
+    def test_attendance_endpoints(self):
+        for caller, path, budget in [
+            ('teacher', '/api/v1/attendance/sessions/', 1),
+            ('teacher', '/api/v1/attendance/sessions/today/', 1),
+            ('teacher', '/api/v1/attendance/records/', 2),
+            ('student', '/api/v1/attendance/records/', 2),
+            ('staff', '/api/v1/attendance/exceptions/', 1),
+            ('staff', '/api/v1/attendance/absenteeism-flags/', 1),
+        ]:
+            with self.subTest(caller=caller, path=path):
+                self.assertWithinBudget(caller, path, budget)
+    
+    def test_sync_endpoints(self):
+        for caller, path, budget in [
+            ('teacher', '/api/v1/sync/state/', 3),
+            ('teacher', '/api/v1/sync/changes/?limit=50', 5),
+            ('staff', '/api/v1/sync/devices/', 1),
+        ]:
+            with self.subTest(caller=caller, path=path):
+                self.assertWithinBudget(caller, path, budget)
+
+
+class TenantContextTests(TestCase):
+    """get_tenant resolves the caller once per request"""
+    databases = '__all__'
+    
+    def test_one_query_per_request_and_cached_school(self):
+        seeded = seed_school()
+        user = User.objects.create(username='teacher', school=seeded['school'], person=seeded['teachers'][0].person)
+        request = type('Request', (), {'user': user})()
+        school_cache().clear()
+        
+        with self.assertNumQueries(2):
+            tenant = get_tenant(request)
+            self.assertEqual((tenant.school.id, tenant.teacher_id), (seeded['school'].id, seeded['teachers'][0].id))
+        with self.assertNumQueries(0):
+            self.assertIs(get_tenant(request), tenant)
+        # The next request looks the user up again but reuses the School
+        with self.assertNumQueries(1):
+            self.assertEqual(get_tenant(type('Request', (), {'user': user})()).school, seeded['school'])
+
+
+class CapabilityTests(TestCase):
+    """Roles, permissions and account flags compile into one mask per caller"""
+    databases = '__all__'
+    
+    def tenant(self, role=None, **row):
+        user = type('User', (), {'is_authenticated': True, 'is_superuser': False, 'is_staff': False, 'id': 1})()
+        return TenantContext(user, {'person__role': role, **row})
+    
+    def test_roles_grant_their_permissions(self):
+        teacher = self.tenant(ROLES['TEACHER'], school_id=1, person__teacher__id=1)
+        self.assertTrue(teacher.can(CAPABILITIES.mask('mark_attendance', 'flag:teacher_profile', 'flag:school_member')))
+        self.assertFalse(teacher.can(CAPABILITIES.mask('view_reports')))
+        self.assertFalse(self.tenant(ROLES['STUDENT'], school_id=1).can(CAPABILITIES.mask('mark_attendance')))
+        self.assertEqual(self.tenant().capabilities, CAPABILITIES.mask('flag:authenticated'))
+    
+    def test_manage_all_grants_every_permission(self):
+        admin = self.tenant(ROLES['ADMIN'])
+        for granted in PERMISSIONS.values():
+            self.assertTrue(admin.can(CAPABILITIES.mask(*granted)))
+    
+    def test_unknown_names_fail_at_startup(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CAPABILITIES.mask('fly')
+        with self.assertRaises(ImproperlyConfigured):
+            CapabilityModel(ROLES, {**PERMISSIONS, 'janitor': ['mop']})
+    
+    def test_tokens_carry_the_mask(self):
+        seeded = seed_school()
+        user = User.objects.create(username='teacher', school=seeded['school'], person=seeded['teachers'][0].person)
+        token = AuthService.create_token(user).access_token
+        fingerprint, mask = token['caps']
+        
+        self.assertEqual(fingerprint, CAPABILITIES.fingerprint)
+        self.assertEqual(mask, TenantContext.for_user(User.objects.get(pk=user.pk)).capabilities)
+        claimed = AuthService.verify_token(token)
+        with self.assertNumQueries(0):
+            self.assertEqual(TenantContext.for_user(claimed).capabilities, mask)
+        
+        # A mask compiled under another bit layout is recomputed, not trusted
+        token['caps'] = [fingerprint + 1, 0]
+        self.assertEqual(TenantContext.for_user(AuthService.verify_token(token)).capabilities, mask)
+
+
+SHARD_TEST_DATABASES = {'default', 's1', 's2'}
+
+
+@skipUnless(SHARD_TEST_DATABASES <= set(settings.DATABASES), 'needs SHARD_DATABASE_URLS with s1 and s2')
+@override_settings(SCHOOL_SHARDS={'PLACEMENT': ['s1']})
+class ShardingTests(TestCase):
+    """Schools live on one shard, which holds copies of their directory rows"""
+    # The runner checks the aliases even when the class is skipped
+    databases = SHARD_TEST_DATABASES & set(settings.DATABASES)
+    
+    def setUp(self):
+        self.school = School.objects.create(name='Sharded School', code='SHARD001')
+    
+    def holding(self, model, **filters):
+        """Aliases with rows matching filters"""
+        return [alias for alias in shard_aliases() if model._base_manager.using(alias).filter(**filters).exists()]
+    
+    def test_tenant_rows_are_routed_to_the_school_shard(self):
+        self.assertEqual(SchoolShard.objects.get(school=self.school).alias, 's1')
+        self.assertEqual(shard_for(self.school.id), 's1')
+        
+        # By the school followed, then by the pinned shard
+        klass = self.school.classes.create(name='Form 1A', level='Form 1')
+        with use_shard('s1'):
+            Class.objects.create(school=self.school, name='Form 2A', level='Form 2')
+        
+        self.assertEqual(klass._state.db, 's1')
+        self.assertGreaterEqual(klass.id, shard_settings()['ID_BLOCK'])
+        self.assertEqual(self.holding(Class, school_id=self.school.id), ['s1'])
+    
+    def test_schools_are_mirrored_to_their_shard(self):
+        self.assertEqual(self.holding(School, pk=self.school.pk), ['default', 's1'])
+        self.school.name = 'Renamed School'
+        self.school.save()
+        self.assertEqual(School.objects.using('s1').get(pk=self.school.pk).name, 'Renamed School')
+        
+        # Deleting the school cascades to its data on the shard
+        self.school.classes.create(name='Form 1A', level='Form 1')
+        school_id = self.school.id
+        self.school.delete()
+        self.assertEqual(self.holding(School, pk=school_id), [])
+        self.assertEqual(self.holding(Class, school_id=school_id), [])
+    
+    def test_users_are_mirrored_where_they_act(self):
+        teacher = User.objects.create(username='teacher', school=self.school)
+        staff = User.objects.create(username='staff', is_staff=True)
+        
+        self.assertEqual(self.holding(User, pk=teacher.pk), ['default', 's1'])
+        self.assertEqual(self.holding(User, pk=staff.pk), ['default', 's1', 's2'])
+        teacher.delete()
+        self.assertEqual(self.holding(User, pk=teacher.pk), [])
+    
+    def test_shard_atomic_opens_on_the_shard(self):
+        with use_shard('s1'), shard_atomic() as using:
+            self.assertEqual(using, 's1')
+        
+        with self.assertRaises(ZeroDivisionError), shard_atomic('s1'):
+            self.assertEqual(current_shard(), 's1')
+            Class.objects.create(school=self.school, name='Form 1A', level='Form 1')
+            1 / 0
+        
+        self.assertIsNone(current_shard())
+        self.assertEqual(self.holding(Class, school_id=self.school.id), [])
+    
+    def test_fan_out_calls_each_shard(self):
+        results = fan_out(current_shard)
+        self.assertEqual(list(results.items()), [(alias, alias) for alias in shard_aliases()])
+        self.assertEqual(fan_out(current_shard, ['s2']), {'s2': 's2'})
+        with self.assertRaises(ZeroDivisionError):
+            fan_out(lambda: 1 / 0)
+    
+    def test_rolled_back_leaves_no_rows_on_any_shard(self):
+        with rolled_back():
+            seeded = seed_school(students=2)
+            school_id = seeded['school'].id
+            self.assertEqual(self.holding(Person, school_id=school_id), ['s1'])
+        
+        self.assertFalse(SchoolShard.objects.filter(school_id=school_id).exists())
+        self.assertEqual(self.holding(School, pk=school_id), [])
+        self.assertEqual(self.holding(Person, school_id=school_id), [])
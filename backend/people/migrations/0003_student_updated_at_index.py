@@ -0,0 +1,17 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['updated_at', 'id'], name='people_stud_updated_fecfcf_idx'),
+        ),
+    ]
@@ -3,6 +3,7 @@ People models: Student, Teacher, Guardian, Staff
 Phase 0: Skeleton models
 """
 from django.db import models
+from backend.core.sharding import instance_db, shard_atomic
 from backend.people.roles import ROLES
 
 
@@ -28,6 +29,15 @@ class Person(models.Model):
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.role})"
 
+    def save(self, *args, **kwargs):
+        """Save and log a roster change when the person is a student"""
+        from backend.sync.changelog import record
+        with shard_atomic(instance_db(self, kwargs.get('using'))):
+            super().save(*args, **kwargs)
+            if self.role == ROLES['STUDENT']:
+                student_ids = Student.objects.filter(person_id=self.pk).values_list('id', flat=True)
+                record(self.school_id, 'student', list(student_ids))
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -43,9 +53,23 @@ class Student(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Delta pull keyset over (updated_at, id)
+            models.Index(fields=['updated_at', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.person.full_name} ({self.admission_number})"
 
+    def save(self, *args, **kwargs):
+        """Save and log the roster change for the student's school"""
+        from backend.sync.changelog import record
+        with shard_atomic(instance_db(self, kwargs.get('using'))):
+            super().save(*args, **kwargs)
+            school_id = Person.objects.filter(pk=self.person_id).values_list('school_id', flat=True).first()
+            record(school_id, 'student', [self.pk])
+
 
 class Teacher(models.Model):
     """Teacher entity"""
@@ -0,0 +1,27 @@
+"""
+Django admin configuration for sync app
+"""
+from django.contrib import admin
+from backend.sync.devices import DeviceRegistry
+from backend.sync.models import DeviceSyncState
+
+
+@admin.register(DeviceSyncState)
+class DeviceSyncStateAdmin(admin.ModelAdmin):
+    """Devices ordered by how far they lag behind their school's change log"""
+    list_display = ['device_id', 'user', 'school', 'seq', 'lag', 'backlog', 'last_pull_at', 'last_push_at']
+    search_fields = ['device_id', 'user__username']
+    list_filter = ['school']
+    list_select_related = ['user', 'school']
+    readonly_fields = ['cursor', 'seq', 'last_pull_at', 'last_push_at', 'backlog', 'created_at', 'updated_at']
+    
+    def get_queryset(self, request):
+        # Annotate before ordering: the default get_queryset orders first
+        return DeviceRegistry.with_lag(self.model._default_manager.get_queryset()).order_by('-lag')
+    
+    def get_ordering(self, request):
+        return ['-lag']
+    
+    @admin.display(ordering='lag', description='Entries behind')
+    def lag(self, obj):
+        return obj.lag
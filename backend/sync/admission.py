@@ -0,0 +1,230 @@
+"""
+Admission control for sync ingest
+Sync requests take a slot before running: one of SCHOOL_LIMIT slots for
+their school and one of GLOBAL_LIMIT slots overall. Slots are lock files
+held with a non-blocking flock, so the limits hold across gunicorn workers
+and threads without an external service, and a crashed worker's slots are
+released by the kernel. Requests that find no free slot are rejected at
+once with 429 and a jittered retry hint. Interactive endpoints never take
+slots. Every admitted request holds a database connection and CPU time
+(under ASGI each request has a thread of its own, so nothing else caps
+them), so GLOBAL_LIMIT is sized by cores and connections: with it below
+both, logins and page loads always find some free.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+DEFAULTS = {
+    'ENABLED': True,
+    'GLOBAL_LIMIT': None,         # concurrent sync requests on this host; None: two per CPU
+    'SCHOOL_LIMIT': 2,            # concurrent sync requests per school
+    'RETRY_AFTER_MS': 1000,       # base retry hint for rejected requests
+    'JITTER': 1.0,                # hint is spread over [base, base * (1 + JITTER)]
+    'DIRECTORY': os.path.join(tempfile.gettempdir(), 'schoolos-admission'),
+    'METRICS_FLUSH_SECONDS': 5,   # how often each process writes its counters
+}
+
+
+def admission_settings():
+    return {**DEFAULTS, **getattr(settings, 'SYNC_ADMISSION', {})}
+
+
+class SyncBusy(APIException):
+    """429 for sync requests over the concurrency limit"""
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_code = 'sync_busy'
+    
+    def __init__(self, scope, retry_after_ms):
+        message = 'The server is busy with other syncs. Retry later.'
+        super().__init__(message)
+        # Set after __init__ so retry_after_ms stays an integer in the body
+        self.detail = {'detail': message, 'scope': scope, 'retry_after_ms': retry_after_ms}
+        self.wait = math.ceil(retry_after_ms / 1000)
+
+
+class AdmissionMetrics:
+    """Per-process admitted/rejected counters, flushed to a shared directory
+    
+    Each process writes its own file, so no locking is needed; totals()
+    sums every file.
+    """
+    
+    def __init__(self, directory, flush_seconds):
+        self.path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        self.flush_seconds = flush_seconds
+        self.counts = {}
+        self.flushed = 0.0
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+    
+    def count(self, outcome, action):
+        with self._lock:
+            key = f'{outcome}:{action}'
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if time.monotonic() - self.flushed >= self.flush_seconds:
+                self.flush()
+    
+    def flush(self):
+        self.flushed = time.monotonic()
+        if not self.counts:
+            return
+        temp = f'{self.path}.tmp'
+        with open(temp, 'w') as handle:
+            json.dump({'pid': os.getpid(), 'updated': time.time(), 'counts': self.counts}, handle)
+        os.replace(temp, self.path)
+    
+    @staticmethod
+    def totals(directory):
+        """Summed counters of every process that has written metrics
+        
+        Returns:
+            Dict with admitted and rejected totals, rejections by scope and
+            counts per outcome:action
+        """
+        counts = {}
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            try:
+                with open(path) as handle:
+                    data = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            for key, value in data.get('counts', {}).items():
+                counts[key] = counts.get(key, 0) + value
+        admitted = sum(v for k, v in counts.items() if k.startswith('admitted:'))
+        rejected = {
+            scope: sum(v for k, v in counts.items() if k.startswith(f'rejected_{scope}:'))
+            for scope in ('school', 'global')
+        }
+        total = admitted + sum(rejected.values())
+        return {
+            'admitted': admitted,
+            'rejected': sum(rejected.values()),
+            'rejected_by_scope': rejected,
+            'rejection_rate': round(sum(rejected.values()) / total * 100, 1) if total else None,
+            'by_action': dict(sorted(counts.items())),
+        }
+
+
+class AdmissionController:
+    """Hands out sync slots held as flocks on lock files"""
+    
+    def __init__(self, **overrides):
+        config = admission_settings()
+        config.update({k.upper(): v for k, v in overrides.items() if v is not None})
+        self.enabled = config['ENABLED']
+        self.global_limit = config['GLOBAL_LIMIT'] or 2 * (os.cpu_count() or 1)
+        self.school_limit = config['SCHOOL_LIMIT']
+        self.retry_after_ms = config['RETRY_AFTER_MS']
+        self.jitter = config['JITTER']
+        self.directory = config['DIRECTORY']
+        os.makedirs(self.directory, exist_ok=True)
+        self.metrics = AdmissionMetrics(self.directory, config['METRICS_FLUSH_SECONDS'])
+    
+    def _take(self, name, limit):
+        """Open file of a free slot, or None when all limit slots are held"""
+        # Start at a random slot so contenders don't all probe slot 0 first
+        offset = random.randrange(limit)
+        for index in range(limit):
+            handle = open(os.path.join(self.directory, f'{name}-{(offset + index) % limit}.lock'), 'a')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return handle
+            except BlockingIOError:
+                handle.close()
+        return None
+    
+    def retry_hint(self):
+        """Jittered milliseconds to wait, so rejected devices don't retry in lockstep"""
+        return int(self.retry_after_ms * (1 + random.random() * self.jitter))
+    
+    def admit(self, school_id, action):
+        """Take a school slot and a global slot
+        
+        Returns:
+            List of held slot files to pass to release()
+        
+        Raises:
+            SyncBusy: No slot is free
+        """
+        if not self.enabled:
+            return []
+        school_slot = None
+        if school_id is not None and self.school_limit:
+            school_slot = self._take(f'school-{school_id}', self.school_limit)
+            if school_slot is None:
+                self.metrics.count('rejected_school', action)
+                raise SyncBusy('school', self.retry_hint())
+        global_slot = self._take('global', self.global_limit)
+        if global_slot is None:
+            self.release([school_slot] if school_slot else [])
+            self.metrics.count('rejected_global', action)
+            raise SyncBusy('global', self.retry_hint())
+        self.metrics.count('admitted', action)
+        return [slot for slot in (school_slot, global_slot) if slot]
+    
+    @staticmethod
+    def release(slots):
+        for handle in slots:
+            # Closing the file drops its flock
+            handle.close()
+    
+    def held(self):
+        """Slots currently held by any process: {'global': n, 'school-<id>': n}"""
+        held = {}
+        for path in glob.glob(os.path.join(self.directory, '*.lock')):
+            name = os.path.basename(path).rsplit('-', 1)[0]
+            with open(path, 'a') as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    held[name] = held.get(name, 0) + 1
+        return held
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    """The process-wide controller (one metrics file per process)"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+    return _controller
+
+
+class AdmissionControlMixin:
+    """Viewset mixin that admits admission_actions through AdmissionController
+    
+    Runs after authentication and permissions, so the school is known, and
+    before the body is parsed, so rejections stay cheap. Slots are released
+    when dispatch returns, also when the action raises an exception that
+    DRF does not turn into a response.
+    """
+    admission_actions = ()
+    
+    def dispatch(self, request, *args, **kwargs):
+        self._admission_slots = ()
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            AdmissionController.release(self._admission_slots)
+            self._admission_slots = ()
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.admission_actions:
+            self._admission_slots = get_controller().admit(getattr(request.user, 'school_id', None), self.action)
@@ -0,0 +1,212 @@
+"""
+Sync API endpoints
+"""
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from django.http import FileResponse
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+
+from backend.sync.admission import AdmissionControlMixin
+from backend.sync.delta import CursorExpired, InvalidCursor
+from backend.sync.devices import DeviceRegistry
+from backend.sync.engine import SyncEngine
+from backend.sync.models import SchoolSnapshot
+from backend.sync.retention import school_sync_rates
+from backend.sync.snapshots import SnapshotBuilder
+from backend.core.tenant_context import get_tenant
+from backend.core.tenant_permissions import IsAdminOfSchool, IsTenantMember, IsTeacherOfSchool
+
+
+class SyncViewSet(AdmissionControlMixin, viewsets.ViewSet):
+    """Batched change push and sync state for offline clients
+    
+    push and changes are admission controlled: over the concurrency limit
+    they return 429 with Retry-After and a jittered retry_after_ms. Clients
+    send X-Device-Id (and optionally X-Sync-Backlog) so each device keeps
+    its own sync state.
+    """
+    permission_classes = [IsAuthenticated, IsTenantMember]
+    admission_actions = ('push', 'changes')
+    
+    MAX_CHANGES = 5000
+    MAX_PAGE_SIZE = 2000
+    MAX_STATS_DAYS = 366
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsTenantMember, IsTeacherOfSchool])
+    def push(self, request):
+        """Apply a batch of changes from a client
+        
+        Request:
+        {
+            "changes": [
+                {"data_type": "session", "action": "create", "record_id": "dev-s1",
+                 "payload": {"class_id": 3, "date": "2026-05-04", "local_id": "dev-s1"}},
+                {"data_type": "attendance", "action": "create", "record_id": "dev-a1",
+                 "payload": {"session_local_id": "dev-s1", "student_id": 7, "status": "P", "local_id": "dev-a1"}}
+            ]
+        }
+        
+        Teachers only. Returns the SyncLog id and one outcome per change, in
+        request order.
+        """
+        changes = request.data.get('changes')
+        if not isinstance(changes, list) or not changes:
+            return Response({'error': 'changes list required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(changes) > self.MAX_CHANGES:
+            return Response(
+                {'error': f'At most {self.MAX_CHANGES} changes per batch'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        log, results = SyncEngine.sync_from_client(request.user, changes, get_tenant(request))
+        DeviceRegistry.record_push(request)
+        return Response({
+            'sync_log_id': log.id,
+            'status': log.status,
+            'records_count': log.records_count,
+            'errors': log.errors,
+            'results': results,
+        })
+    
+    @action(detail=False, methods=['get'])
+    def state(self, request):
+        """Last successful sync and queued changes for the current user
+        
+        With X-Device-Id the calling device's own cursor, lag and last
+        push/pull times are included under `device`.
+        """
+        since = request.query_params.get('since')
+        state = SyncEngine.get_sync_state(request.user, since=parse_datetime(since) if since else None)
+        device_id = DeviceRegistry.device_id(request)
+        if device_id:
+            state['device'] = DeviceRegistry.with_lag().filter(user=request.user, device_id=device_id).values(
+                'device_id', 'cursor', 'seq', 'lag', 'backlog', 'last_pull_at', 'last_push_at'
+            ).first()
+        return Response(state)
+    
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Rows changed in the caller's school since a cursor
+        
+        Query params:
+            cursor: next_cursor from the previous pull (omit for a full download)
+            limit: rows per stream (full download) or log entries, default 500
+        
+        Keep pulling while has_more is true, then store next_cursor. Ids in
+        `deleted` were removed on the server. 410 means the cursor predates
+        the compacted change log and the client must download again.
+        
+        With X-Device-Id and no cursor param, the pull resumes from the last
+        cursor that device pulled from; send an empty cursor= to download
+        everything again.
+        """
+        school = get_tenant(request).school
+        if school is None:
+            return Response({'error': 'User must belong to a school'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 500)), self.MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        cursor = request.query_params.get('cursor')
+        device_id = DeviceRegistry.device_id(request)
+        if cursor is None and device_id:
+            cursor = DeviceRegistry.cursor(request.user, device_id)
+        
+        try:
+            delta = SyncEngine.get_changes(school, cursor=cursor or None, limit=max(limit, 1))
+        except CursorExpired as e:
+            DeviceRegistry.reset_cursor(request)
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        DeviceRegistry.record_pull(request, cursor or '')
+        return Response(delta)
+    
+    @action(detail=False, methods=['get'])
+    def snapshot(self, request):
+        """Where to download the school's bootstrap snapshot
+        
+        New devices fetch `url` (snapshot/download, a content-addressed gzip
+        JSON file, with the same Authorization header) in one request, load
+        it, then pull deltas from its `cursor`. Send If-None-Match with a
+        previous ETag to get 304 when nothing changed.
+        """
+        school = get_tenant(request).school
+        if school is None:
+            return Response({'error': 'User must belong to a school'}, status=status.HTTP_400_BAD_REQUEST)
+        builder = SnapshotBuilder(school)
+        snapshot = SchoolSnapshot.objects.filter(school=school).first()
+        if snapshot is None or not builder.storage.exists(snapshot.path):
+            snapshot, _ = builder.build()
+        
+        etag = f'"{snapshot.etag}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({
+                'url': request.build_absolute_uri(f"{reverse('sync-snapshot-download')}?etag={snapshot.etag}"),
+                'etag': snapshot.etag,
+                'seq': snapshot.seq,
+                'size': snapshot.size,
+                'built_at': snapshot.built_at,
+            })
+        response['ETag'] = etag
+        return response
+    
+    @action(detail=False, methods=['get'], url_path='snapshot/download')
+    def snapshot_download(self, request):
+        """The caller's school snapshot file
+        
+        Query params:
+            etag: Which file, as returned by snapshot; files superseded by a
+                rebuild stay available for SYNC_SNAPSHOT GRACE_SECONDS.
+                Without it the current file is served.
+        """
+        school = get_tenant(request).school
+        if school is None:
+            return Response({'error': 'User must belong to a school'}, status=status.HTTP_400_BAD_REQUEST)
+        builder = SnapshotBuilder(school)
+        etag = request.query_params.get('etag')
+        if etag is None:
+            snapshot = SchoolSnapshot.objects.filter(school=school).first()
+            etag = snapshot.etag if snapshot else None
+        path = builder.path(etag)
+        if path is None or not builder.storage.exists(path):
+            # Superseded and pruned: ask snapshot for the current one
+            return Response({'error': 'Snapshot not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        # Served as a static .json.gz would be: JSON, gzip-encoded
+        response = FileResponse(builder.storage.open(path), content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+        response['ETag'] = f'"{etag}"'
+        # The content of an etag never changes, but it is a school's roster
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsTenantMember, IsAdminOfSchool])
+    def stats(self, request):
+        """Daily sync success and error rates for the caller's school
+        
+        Query params:
+            days: How many days back, default 30
+        """
+        school = get_tenant(request).school
+        if school is None:
+            return Response({'error': 'User must belong to a school'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(school_sync_rates(school, days=min(max(days, 1), self.MAX_STATS_DAYS)))
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsTenantMember, IsAdminOfSchool])
+    def devices(self, request):
+        """The school's devices, furthest behind the change log first"""
+        school = get_tenant(request).school
+        if school is None:
+            return Response({'error': 'User must belong to a school'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'devices': DeviceRegistry.lagging(school)})
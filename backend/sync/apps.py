@@ -0,0 +1,13 @@
+"""
+App configuration for sync app
+"""
+from django.apps import AppConfig
+
+
+class SyncConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'backend.sync'
+    label = 'sync'
+
+    def ready(self):
+        from backend.sync import signals  # noqa: F401
@@ -0,0 +1,63 @@
+"""
+Change-log outbox writes
+Callers run inside the transaction of the change they record, so a change
+and its log entry commit or roll back together.
+"""
+from django.db.models import F
+from backend.core.sharding import shard_atomic, shard_for
+from backend.sync.models import ChangeLog, ChangeLogSequence
+
+
+def allocate(school_id, count):
+    """Reserve count sequence numbers for a school
+    
+    The UPDATE locks the school's sequence row until the caller's
+    transaction ends, so later writers wait and numbers commit in order.
+    
+    Returns:
+        First reserved sequence number
+    """
+    updated = ChangeLogSequence.objects.filter(school_id=school_id).update(last_seq=F('last_seq') + count)
+    if not updated:
+        ChangeLogSequence.objects.bulk_create([ChangeLogSequence(school_id=school_id)], ignore_conflicts=True)
+        ChangeLogSequence.objects.filter(school_id=school_id).update(last_seq=F('last_seq') + count)
+    last_seq = ChangeLogSequence.objects.filter(school_id=school_id).values_list('last_seq', flat=True).get()
+    return last_seq - count + 1
+
+
+def record_changes(school_id, changes):
+    """Append entries for one school
+    
+    Args:
+        school_id: School the records belong to
+        changes: Iterable of (data_type, record_id, deleted) tuples
+    """
+    changes = list(dict.fromkeys(changes))
+    if not changes or school_id is None:
+        return
+    with shard_atomic(shard_for(school_id), savepoint=False):
+        first = allocate(school_id, len(changes))
+        ChangeLog.objects.bulk_create([
+            ChangeLog(school_id=school_id, seq=first + offset, data_type=data_type, record_id=record_id, deleted=deleted)
+            for offset, (data_type, record_id, deleted) in enumerate(changes)
+        ], batch_size=1000)
+
+
+def record(school_id, data_type, record_ids, deleted=False):
+    """Append one entry per record id of a single data type"""
+    record_changes(school_id, [(data_type, record_id, deleted) for record_id in record_ids])
+
+
+def current_seq(school_id):
+    """Highest committed sequence number for a school (0 if none)"""
+    return ChangeLogSequence.objects.filter(school_id=school_id).values_list('last_seq', flat=True).first() or 0
+
+
+def deleted_records(school_id, data_type, record_ids):
+    """Subset of record_ids whose newest log entry is a tombstone"""
+    latest = {}
+    for record_id, deleted in ChangeLog.objects.filter(
+        school_id=school_id, data_type=data_type, record_id__in=list(record_ids)
+    ).order_by('seq').values_list('record_id', 'deleted'):
+        latest[record_id] = deleted
+    return {record_id for record_id, deleted in latest.items() if deleted}
@@ -1,25 +1,96 @@
 """
 Conflict resolution for data synchronization
-Phase 0: Skeleton conflict handling
+Field-level last-writer-wins on hybrid-logical-clock versions
 """
+from backend.sync.changelog import deleted_records
+from backend.sync.models import SyncConflict
 
 
 class ConflictResolver:
     """Handles conflicts when syncing data"""
     
+    # Independently versioned fields: field -> version field
+    ATTENDANCE_FIELDS = {'status': 'status_hlc', 'remarks': 'remarks_hlc'}
+    
+    @staticmethod
+    def merge(server_record, client_record, fields):
+        """Field-level merge of two versions of a record
+        
+        Each field keeps whichever side carries the higher version; ties
+        keep the server value so every replica converges on the same one.
+        
+        Args:
+            server_record: Dict of stored values and versions
+            client_record: Dict of incoming values and versions
+            fields: Dict of field -> version field
+        
+        Returns:
+            Tuple of (merged dict, list of (field, kept, lost) for client
+            values that lost to a newer server value)
+        """
+        merged = dict(client_record)
+        losers = []
+        for field, version_field in fields.items():
+            if client_record[version_field] > server_record[version_field]:
+                continue
+            merged[field] = server_record[field]
+            merged[version_field] = server_record[version_field]
+            if client_record[field] != server_record[field]:
+                losers.append((
+                    field,
+                    (server_record[field], server_record[version_field]),
+                    (client_record[field], client_record[version_field]),
+                ))
+        return merged, losers
+    
     @staticmethod
     def resolve_attendance_conflict(server_record, client_record):
-        """Resolve attendance data conflicts - last write wins for now"""
-        if client_record.get('marked_at') > server_record.get('marked_at'):
-            return client_record
-        return server_record
+        """Merge status and remarks of an attendance record independently
+        
+        Returns:
+            Tuple of (merged dict, list of losing client fields)
+        """
+        return ConflictResolver.merge(server_record, client_record, ConflictResolver.ATTENDANCE_FIELDS)
+    
+    @staticmethod
+    def handle_deleted_record(data_type, record_id, school_id):
+        """Check a client change against server-side deletes
+        
+        Args:
+            data_type: Change-log data type (session, attendance, student, exception)
+            record_id: Server id the client is writing to
+            school_id: School the record belonged to
+        
+        Returns:
+            True if the server deleted the record, so the client change must
+            be dropped and the client told to remove its copy
+        """
+        return record_id in deleted_records(school_id, data_type, [record_id])
+    
+    @staticmethod
+    def conflict(school_id, data_type, record_id, loser):
+        """Unsaved SyncConflict for one (field, kept, lost) loser"""
+        field, (kept_value, kept_version), (lost_value, lost_version) = loser
+        return SyncConflict(
+            school_id=school_id,
+            data_type=data_type,
+            record_id=record_id,
+            field=field,
+            kept_value=kept_value,
+            kept_version=kept_version,
+            lost_value=lost_value,
+            lost_version=lost_version,
+        )
     
     @staticmethod
-    def handle_deleted_record(data_type, record_id):
-        """Handle deleted records during sync"""
-        pass
+    def log_conflicts(conflicts):
+        """Store many SyncConflict rows with one insert"""
+        if conflicts:
+            SyncConflict.objects.bulk_create(conflicts, batch_size=1000)
     
     @staticmethod
-    def log_conflict(conflict_type, record_id, server_data, client_data):
-        """Log conflict for manual review"""
-        pass
+    def log_conflict(school_id, data_type, record_id, losers):
+        """Log one record's losing fields for manual review"""
+        ConflictResolver.log_conflicts([
+            ConflictResolver.conflict(school_id, data_type, record_id, loser) for loser in losers
+        ])
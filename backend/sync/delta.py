@@ -0,0 +1,221 @@
+"""
+Delta pull for offline clients
+A first download pages every stream by keyset over (updated_at, id); after
+that clients read the per-school change log from the sequence number held
+in their opaque cursor.
+"""
+import base64
+import json
+
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from backend.attendance.models import Attendance, AttendanceSession, AttendanceException
+from backend.people.models import Student
+from backend.sync.changelog import current_seq
+from backend.sync.models import ChangeLog, ChangeLogSequence
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor the server did not issue"""
+
+
+class CursorExpired(InvalidCursor):
+    """Raised when tombstones after the cursor were compacted away
+    
+    The client must discard its copy and start a full download.
+    """
+
+
+class DeltaStream:
+    """One model's changes for a school, ordered by (updated_at, id)
+    
+    Each stream's queryset must be served by an index ending in
+    (updated_at, id) so a page costs one index range scan no matter how
+    much history the table holds.
+    """
+    
+    def __init__(self, name, data_type, queryset, school_lookup, fields):
+        self.name = name
+        self.data_type = data_type
+        self.queryset = queryset
+        self.school_lookup = school_lookup
+        self.fields = fields
+    
+    def page_queryset(self, school_id, position):
+        """Ordered queryset of rows after position ((updated_at, id) or None)"""
+        qs = self.queryset().filter(**{self.school_lookup: school_id})
+        if position is not None:
+            updated_at, pk = position
+            # The redundant lower bound lets the planner range-scan the
+            # (updated_at, id) index instead of filtering every row
+            qs = qs.filter(updated_at__gte=updated_at).filter(
+                Q(updated_at__gt=updated_at) | Q(id__gt=pk)
+            )
+        return qs.order_by('updated_at', 'id')
+    
+    def page(self, school_id, position, limit):
+        """Rows after position, plus whether more remain
+        
+        Args:
+            school_id: Caller's school
+            position: (updated_at, id) of the last row already sent, or None
+            limit: Maximum rows to return
+        
+        Returns:
+            Tuple of (list of row dicts, has_more)
+        """
+        rows = list(self.page_queryset(school_id, position).values(*self.fields)[:limit + 1])
+        return rows[:limit], len(rows) > limit
+
+
+STREAMS = [
+    DeltaStream(
+        'sessions',
+        'session',
+        lambda: AttendanceSession.objects.all(),
+        'school_id',
+        ['id', 'local_id', 'klass_id', 'term_id', 'subject_id', 'teacher_id', 'date', 'status',
+         'count_present', 'count_absent', 'count_late', 'count_excused', 'closed_at', 'updated_at'],
+    ),
+    DeltaStream(
+        'attendance',
+        'attendance',
+        lambda: Attendance.objects.all(),
+        'school_id',
+        ['id', 'local_id', 'session_id', 'student_id', 'status', 'remarks', 'status_hlc', 'remarks_hlc',
+         'marked_at', 'updated_at'],
+    ),
+    DeltaStream(
+        'students',
+        'student',
+        lambda: Student.objects.annotate(first_name=F('person__first_name'), last_name=F('person__last_name')),
+        'person__school_id',
+        ['id', 'admission_number', 'first_name', 'last_name', 'current_class_id', 'updated_at'],
+    ),
+    DeltaStream(
+        'exceptions',
+        'exception',
+        lambda: AttendanceException.objects.all(),
+        'student__person__school_id',
+        ['id', 'student_id', 'category', 'start_date', 'end_date', 'reason', 'updated_at'],
+    ),
+]
+
+
+def encode_cursor(seq, positions=None):
+    """Opaque cursor from a change-log seq and, mid-download, stream positions
+    
+    Args:
+        seq: Change-log sequence number the client is up to date with
+        positions: Dict of stream name -> (updated_at, id) while a full
+            download is still paging, else None
+    """
+    payload = {'seq': seq}
+    if positions is not None:
+        payload['pos'] = {name: [updated_at.isoformat(), pk] for name, (updated_at, pk) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor: (seq, positions or None); raises InvalidCursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        seq = int(payload['seq'])
+        if 'pos' not in payload:
+            return seq, None
+        positions = {}
+        for name, (updated_at, pk) in payload['pos'].items():
+            moment = parse_datetime(updated_at)
+            if moment is None:
+                raise ValueError(updated_at)
+            positions[name] = (moment, int(pk))
+        return seq, positions
+    except (ValueError, TypeError, AttributeError, KeyError) as e:
+        raise InvalidCursor(f'Invalid cursor: {e}')
+
+
+def empty_page(server_time):
+    page = {'server_time': server_time, 'has_more': False, 'deleted': {}}
+    for stream in STREAMS:
+        page[stream.name] = []
+        page['deleted'][stream.name] = []
+    return page
+
+
+def download_page(school, seq, positions, limit):
+    """One keyset page of every stream, for a full download"""
+    page = empty_page(timezone.now())
+    for stream in STREAMS:
+        rows, more = stream.page(school.id, positions.get(stream.name), limit)
+        if rows:
+            positions[stream.name] = (rows[-1]['updated_at'], rows[-1]['id'])
+        page[stream.name] = rows
+        page['has_more'] = page['has_more'] or more
+    # Changes made while the download pages are replayed from the log
+    # afterwards; upserts are idempotent, so overlap is harmless.
+    page['next_cursor'] = encode_cursor(seq, positions if page['has_more'] else None)
+    return page
+
+
+def log_page(school, seq, limit):
+    """Records changed after seq, from the change log"""
+    pruned_through = ChangeLogSequence.objects.filter(school=school).values_list('pruned_through', flat=True).first() or 0
+    if seq < pruned_through:
+        raise CursorExpired('Cursor is older than the change log; start a full download')
+    
+    page = empty_page(timezone.now())
+    entries = list(
+        ChangeLog.objects.filter(school=school, seq__gt=seq).order_by('seq')
+        .values_list('seq', 'data_type', 'record_id', 'deleted')[:limit + 1]
+    )
+    page['has_more'] = len(entries) > limit
+    entries = entries[:limit]
+    
+    latest = {}
+    for _, data_type, record_id, deleted in entries:
+        latest[(data_type, record_id)] = deleted
+    for stream in STREAMS:
+        upserts = [rid for (data_type, rid), deleted in latest.items() if data_type == stream.data_type and not deleted]
+        page['deleted'][stream.name] = [
+            rid for (data_type, rid), deleted in latest.items() if data_type == stream.data_type and deleted
+        ]
+        if upserts:
+            page[stream.name] = list(
+                stream.queryset().filter(**{stream.school_lookup: school.id}, id__in=upserts)
+                .order_by('id').values(*stream.fields)
+            )
+    page['next_cursor'] = encode_cursor(entries[-1][0] if entries else seq)
+    return page
+
+
+def pull_changes(school, cursor=None, limit=500):
+    """One page of changes for a school
+    
+    Without a cursor this starts a full download, paged by keyset. Once
+    that completes the cursor only carries a change-log sequence number
+    and later pulls read seq > N from the log, including tombstones for
+    deleted records. Clients keep calling with next_cursor until
+    has_more is false and store next_cursor for the next sync either way.
+    
+    Args:
+        school: School to read
+        cursor: Opaque cursor from a previous pull, or None for a full download
+        limit: Maximum rows per stream (download) or log entries (incremental)
+    
+    Raises:
+        InvalidCursor: The cursor was not issued by this server
+        CursorExpired: The log no longer reaches back to the cursor
+    
+    Returns:
+        Dict with one list per stream, deleted ids per stream, next_cursor,
+        has_more and server_time
+    """
+    if not cursor:
+        return download_page(school, current_seq(school.id), {}, limit)
+    seq, positions = decode_cursor(cursor)
+    if positions is not None:
+        return download_page(school, seq, positions, limit)
+    return log_page(school, seq, limit)
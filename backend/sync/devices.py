@@ -0,0 +1,125 @@
+"""
+Per-device sync state
+A teacher's phone and the classroom tablet sync independently: each keeps
+its own cursor, push/pull times and reported backlog in DeviceSyncState,
+keyed by the X-Device-Id header.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from backend.core.sharding import shard_atomic
+from backend.sync.delta import InvalidCursor, decode_cursor
+from backend.sync.models import ChangeLogSequence, DeviceSyncState
+
+DEVICE_HEADER = 'X-Device-Id'
+BACKLOG_HEADER = 'X-Sync-Backlog'
+MAX_DEVICE_ID = 64
+
+
+class DeviceRegistry:
+    """Reads and updates DeviceSyncState for sync requests"""
+    
+    @staticmethod
+    def device_id(request):
+        """The request's device id, or None when the client sent none"""
+        device_id = request.headers.get(DEVICE_HEADER, '').strip()
+        return device_id[:MAX_DEVICE_ID] or None
+    
+    @staticmethod
+    def backlog(request):
+        try:
+            return max(int(request.headers.get(BACKLOG_HEADER, '')), 0)
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def touch(user, device_id, **fields):
+        """Update a device's state, creating it on first contact
+        
+        One UPDATE in the common case; concurrent first requests of the
+        same device fall back to the update on the unique constraint.
+        """
+        states = DeviceSyncState.objects.filter(user=user, device_id=device_id)
+        if states.update(updated_at=timezone.now(), **fields):
+            return
+        try:
+            with shard_atomic():
+                DeviceSyncState.objects.create(user=user, school_id=user.school_id, device_id=device_id, **fields)
+        except IntegrityError:
+            states.update(updated_at=timezone.now(), **fields)
+    
+    @staticmethod
+    def cursor(user, device_id):
+        """Cursor to resume a device's pull from ('' when it has none)"""
+        return DeviceSyncState.objects.filter(
+            user=user, device_id=device_id
+        ).values_list('cursor', flat=True).first() or ''
+    
+    @staticmethod
+    def record_pull(request, cursor):
+        """Remember the cursor a device pulled from
+        
+        The stored position is the start of the page just served, not its
+        next_cursor: if the response is lost, resuming re-sends that page
+        (upserts are idempotent) rather than skipping it.
+        """
+        device_id = DeviceRegistry.device_id(request)
+        if device_id is None:
+            return
+        try:
+            seq = decode_cursor(cursor)[0] if cursor else 0
+        except InvalidCursor:
+            return
+        fields = {'cursor': cursor, 'seq': seq, 'last_pull_at': timezone.now()}
+        backlog = DeviceRegistry.backlog(request)
+        if backlog is not None:
+            fields['backlog'] = backlog
+        DeviceRegistry.touch(request.user, device_id, **fields)
+    
+    @staticmethod
+    def record_push(request):
+        device_id = DeviceRegistry.device_id(request)
+        if device_id is None:
+            return
+        fields = {'last_push_at': timezone.now()}
+        backlog = DeviceRegistry.backlog(request)
+        if backlog is not None:
+            fields['backlog'] = backlog
+        DeviceRegistry.touch(request.user, device_id, **fields)
+    
+    @staticmethod
+    def reset_cursor(request):
+        """Forget a device's cursor (it must download again)"""
+        device_id = DeviceRegistry.device_id(request)
+        if device_id is not None:
+            DeviceRegistry.touch(request.user, device_id, cursor='', seq=0)
+    
+    @staticmethod
+    def with_lag(queryset=None):
+        """Device states annotated with lag: change-log entries not yet pulled"""
+        queryset = DeviceSyncState.objects.all() if queryset is None else queryset
+        head = ChangeLogSequence.objects.filter(school_id=OuterRef('school_id')).values('last_seq')[:1]
+        return queryset.annotate(lag=Coalesce(Subquery(head), Value(0)) - F('seq'))
+    
+    @staticmethod
+    def lagging(school, limit=50):
+        """A school's devices, furthest behind first
+        
+        Returns:
+            List of dicts with user, device_id, seq, lag, backlog and times
+        """
+        states = DeviceRegistry.with_lag(DeviceSyncState.objects.filter(school=school))
+        return list(states.order_by('-lag', 'last_pull_at').values(
+            'user_id', 'user__username', 'device_id', 'seq', 'lag', 'backlog',
+            'last_pull_at', 'last_push_at',
+        )[:limit])
+    
+    @staticmethod
+    def prune(days):
+        """Delete devices not seen for days; returns the number deleted"""
+        cutoff = timezone.now() - timedelta(days=days)
+        return DeviceSyncState.objects.filter(updated_at__lt=cutoff).delete()[0]
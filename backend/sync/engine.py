@@ -1,14 +1,19 @@
 """
 Sync engine for offline-first synchronization
-Phase 0: Skeleton sync logic
+Batched change processing through pluggable per-data-type handlers
 """
 from django.utils import timezone
-from backend.sync.models import SyncLog, SyncQueue
+from backend.core.sharding import shard_atomic
+from backend.sync.delta import pull_changes
+from backend.sync.handlers import SyncContext, get_handlers
+from backend.sync.models import SyncLog, SyncLogDaily, SyncQueue
 
 
 class SyncEngine:
     """Handles data synchronization between clients and server"""
     
+    ACTION_ORDER = ('create', 'update', 'delete')
+    
     @staticmethod
     def enqueue_change(user, action, data_type, record_id, payload):
         """Add change to sync queue"""
@@ -21,20 +26,134 @@ class SyncEngine:
         )
     
     @staticmethod
-    def sync_from_client(user, changes):
-        """Process changes from client"""
+    def group_changes(changes, handlers):
+        """Bucket changes by (data_type, action) in application order
+        
+        Creates and updates follow the handler registry order and deletes
+        run last in reverse order, so children go before their parents.
+        
+        Returns:
+            Tuple of (list of ((data_type, action), changes), dict of index -> error outcome)
+        """
+        groups = {}
+        rejected = {}
+        for index, change in enumerate(changes):
+            if not isinstance(change, dict):
+                rejected[index] = {'result': 'error', 'error': 'Change must be an object'}
+                continue
+            data_type, action = change.get('data_type'), change.get('action')
+            if data_type not in handlers:
+                rejected[index] = {'result': 'error', 'error': f'Unknown data_type "{data_type}"'}
+            elif action not in SyncEngine.ACTION_ORDER:
+                rejected[index] = {'result': 'error', 'error': f'Unknown action "{action}"'}
+            else:
+                groups.setdefault((data_type, action), []).append({**change, 'index': index})
+        
+        types = list(handlers)
+        order = [(t, a) for t in types for a in ('create', 'update')] + [(t, 'delete') for t in reversed(types)]
+        return [(key, groups[key]) for key in order if key in groups], rejected
+    
+    @staticmethod
+    def sync_from_client(user, changes, tenant=None):
+        """Apply a batch of client changes
+        
+        Every (data_type, action) group is applied by its handler with
+        set-based writes inside one transaction; each group runs in a
+        savepoint, so a handler failure only fails that group's changes.
+        
+        Args:
+            user: User pushing the changes; writes are scoped to their school
+            changes: List of dicts with data_type, action, record_id, payload
+            tenant: The user's TenantContext, when the caller has it
+                (get_tenant(request)); built from the user otherwise
+        
+        Returns:
+            Tuple of (SyncLog, list of per-change outcomes in input order)
+        """
         log = SyncLog.objects.create(
             user=user,
             status='syncing',
             data_type='batch'
         )
-        # Process changes here
-        log.status = 'success'
+        context = SyncContext(user, tenant)
+        handlers = get_handlers()
+        groups, outcomes = SyncEngine.group_changes(changes, handlers)
+        
+        if context.school is None:
+            groups = []
+            outcomes = {index: {'result': 'error', 'error': 'User must belong to a school to sync'}
+                        for index in range(len(changes))}
+        
+        with shard_atomic():
+            for (data_type, action), group in groups:
+                handler = handlers[data_type](context)
+                try:
+                    with shard_atomic():
+                        results = handler.apply(action, group)
+                except Exception as e:
+                    results = {change['index']: handler.error(str(e)) for change in group}
+                for change in group:
+                    outcomes[change['index']] = results.get(change['index']) or handler.error('Change was not processed')
+        
+        results = []
+        errors = []
+        for index, change in enumerate(changes):
+            change = change if isinstance(change, dict) else {}
+            outcome = {
+                'index': index,
+                'data_type': change.get('data_type'),
+                'action': change.get('action'),
+                'record_id': change.get('record_id'),
+                **outcomes[index],
+            }
+            results.append(outcome)
+            if outcome['result'] == 'error':
+                errors.append({k: outcome[k] for k in ('index', 'data_type', 'action', 'record_id', 'error')})
+        
+        log.records_count = len(results) - len(errors)
+        log.errors = errors
+        log.status = 'error' if errors and not log.records_count else 'success'
+        log.error_message = f'{len(errors)} of {len(results)} changes failed' if errors else ''
         log.completed_at = timezone.now()
         log.save()
-        return log
+        return log, results
     
     @staticmethod
     def get_sync_state(user, since=None):
-        """Get sync state for client"""
-        pass
+        """Get sync state for client
+        
+        Returns:
+            Dict with the last successful sync and queued change count
+        """
+        # Walks the (user, started_at) index backwards
+        last_sync = SyncLog.objects.filter(user=user, status='success').order_by('-started_at').first()
+        if last_sync:
+            last_sync_at = last_sync.completed_at
+        else:
+            # Detailed rows past the retention window only survive as aggregates
+            last_sync_at = SyncLogDaily.objects.filter(
+                user=user, last_success_at__isnull=False
+            ).order_by('-date').values_list('last_success_at', flat=True).first()
+        pending = SyncQueue.objects.filter(user=user, synced=False)
+        if since:
+            pending = pending.filter(created_at__gt=since)
+        return {
+            'server_time': timezone.now(),
+            'last_sync': last_sync_at,
+            'last_sync_id': last_sync.id if last_sync else None,
+            'pending_changes': pending.count(),
+        }
+    
+    @staticmethod
+    def get_changes(school, cursor=None, limit=500):
+        """Server-side changes for a school since an opaque cursor
+        
+        Raises:
+            InvalidCursor: If the cursor was not issued by pull_changes
+            CursorExpired: If the change log was compacted past the cursor
+        
+        Returns:
+            Dict of changed sessions, attendance, students and exceptions,
+            ids deleted per stream, next_cursor and has_more
+        """
+        return pull_changes(school, cursor=cursor, limit=limit)
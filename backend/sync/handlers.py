@@ -0,0 +1,138 @@
+"""
+Pluggable per-data-type handlers for SyncEngine
+Each handler receives every change of one action in a batch and applies
+them with set-based writes. Handlers are registered in DEFAULT_SYNC_HANDLERS,
+which settings.SYNC_HANDLERS replaces when defined.
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+from backend.core.capabilities import CAPABILITIES
+from backend.core.tenant_context import TenantContext
+from backend.sync.changelog import deleted_records
+
+DEFAULT_SYNC_HANDLERS = {
+    'exception': 'backend.attendance.sync_handlers.ExceptionSyncHandler',
+    'session': 'backend.attendance.sync_handlers.SessionSyncHandler',
+    'attendance': 'backend.attendance.sync_handlers.AttendanceSyncHandler',
+}
+
+_registry = None
+
+
+def get_handlers():
+    """Ordered dict of data_type -> handler class
+    
+    Creates and updates are applied in this order and deletes in reverse,
+    so records can reference parents created earlier in the same batch.
+    """
+    global _registry
+    if _registry is None:
+        paths = getattr(settings, 'SYNC_HANDLERS', DEFAULT_SYNC_HANDLERS)
+        _registry = {data_type: import_string(path) for data_type, path in paths.items()}
+    return _registry
+
+
+def reset_handlers():
+    """Drop the cached registry (after changing settings.SYNC_HANDLERS)"""
+    global _registry
+    _registry = None
+
+
+class SyncContext:
+    """Who is syncing and which school the changes are scoped to
+    
+    Built from the caller's TenantContext: the school comes from the
+    per-process School cache and the teacher is known by id, so setting
+    up a push makes no query of its own.
+    """
+    
+    def __init__(self, user, tenant=None):
+        self.user = user
+        self.tenant = tenant or TenantContext.for_user(user)
+        self.school = self.tenant.school
+        self.role = self.tenant.role
+        self.teacher_id = self.tenant.teacher_id
+        # Shared lookups so later groups can see what earlier groups wrote
+        self.cache = {}
+    
+    @property
+    def teacher(self):
+        """The caller's Teacher by reference (only its id is set), or None"""
+        from backend.people.models import Teacher
+        
+        return Teacher(pk=self.teacher_id) if self.teacher_id is not None else None
+    
+    def can(self, permission):
+        """Whether the caller's capability mask grants permission within self.school"""
+        if self.school is None:
+            return False
+        return self.tenant.is_superuser or self.tenant.can(CAPABILITIES.mask(permission))
+
+
+class SyncHandler:
+    """Applies one data type's changes in bulk
+    
+    Subclasses implement create/update/delete. Each receives a list of
+    changes (dicts with index, action, record_id and payload) and returns
+    a dict of change index -> outcome. An outcome has a `result` of
+    created, updated, unchanged, conflict, deleted or error, plus `id`
+    and `error` where relevant. Changes missing from the returned dict are reported
+    as errors.
+    
+    `permission` names the role permission (backend.people.roles) the
+    caller needs for any change of this data type.
+    """
+    data_type = None
+    actions = ('create', 'update', 'delete')
+    permission = None
+    
+    def __init__(self, context):
+        self.context = context
+    
+    def apply(self, action, changes):
+        if action not in self.actions:
+            return {change['index']: self.error(f'Unsupported action "{action}"') for change in changes}
+        if self.permission and not self.context.can(self.permission):
+            return {
+                change['index']: self.error(f'Not allowed to {action} {self.data_type} records')
+                for change in changes
+            }
+        return getattr(self, action)(changes)
+    
+    def create(self, changes):
+        raise NotImplementedError
+    
+    def update(self, changes):
+        raise NotImplementedError
+    
+    def delete(self, changes):
+        raise NotImplementedError
+    
+    @staticmethod
+    def error(message):
+        return {'result': 'error', 'error': message}
+    
+    def not_found(self, changes, message):
+        """Error outcomes for changes whose record is missing
+        
+        Records the change log shows as deleted get a distinct error so the
+        client drops its copy instead of retrying.
+        """
+        ids = {pk for pk in self.record_ids(changes).values() if pk}
+        deleted = deleted_records(self.context.school.id, self.data_type, ids) if ids and self.context.school else set()
+        record_ids = self.record_ids(changes)
+        return {
+            change['index']: self.error('Deleted on server' if record_ids[change['index']] in deleted else message)
+            for change in changes
+        }
+    
+    @staticmethod
+    def record_ids(changes):
+        """Integer record ids of the changes; non-numeric ids map to None"""
+        ids = {}
+        for change in changes:
+            try:
+                ids[change['index']] = int(change.get('record_id'))
+            except (TypeError, ValueError):
+                ids[change['index']] = None
+        return ids
@@ -0,0 +1,75 @@
+"""
+Hybrid logical clocks for record versions
+A version is one 64-bit integer: milliseconds since the epoch shifted left
+by COUNTER_BITS, plus a logical counter, so versions compare as integers
+and still order correctly when wall clocks tie. Clients send versions as
+integers or "<milliseconds>:<counter>" strings.
+"""
+import threading
+import time
+
+COUNTER_BITS = 16
+MAX_DRIFT_MS = 5 * 60 * 1000  # reject versions this far ahead of the server clock
+
+
+class InvalidVersion(ValueError):
+    """Raised for versions that are malformed or too far in the future"""
+
+
+def encode(physical_ms, counter=0):
+    return (int(physical_ms) << COUNTER_BITS) | int(counter)
+
+
+def decode(version):
+    """(milliseconds, counter) of a version"""
+    return version >> COUNTER_BITS, version & ((1 << COUNTER_BITS) - 1)
+
+
+def wall_ms():
+    return int(time.time() * 1000)
+
+
+class HybridLogicalClock:
+    """Per-process clock that never goes backwards
+    
+    now() stamps local writes. observe() folds in versions received from
+    clients, so a server write made after a sync always beats what the
+    client sent, even when the client's clock runs ahead.
+    """
+    
+    def __init__(self):
+        self.last = 0
+        self._lock = threading.Lock()
+    
+    def now(self):
+        with self._lock:
+            self.last = max(self.last + 1, encode(wall_ms()))
+            return self.last
+    
+    def observe(self, version):
+        with self._lock:
+            self.last = max(self.last, version)
+    
+    def parse(self, value):
+        """Validate a client version and advance the clock past it
+        
+        Raises:
+            InvalidVersion: The value is malformed or too far ahead
+        """
+        try:
+            if isinstance(value, str) and ':' in value:
+                physical_ms, counter = (int(part) for part in value.split(':', 1))
+                if not 0 <= counter < 1 << COUNTER_BITS:
+                    raise ValueError(value)
+                version = encode(physical_ms, counter)
+            else:
+                version = int(value)
+        except (TypeError, ValueError):
+            raise InvalidVersion(f'Invalid version "{value}"')
+        if version < 0 or decode(version)[0] > wall_ms() + MAX_DRIFT_MS:
+            raise InvalidVersion(f'Version "{value}" is too far in the future')
+        self.observe(version)
+        return version
+
+
+clock = HybridLogicalClock()
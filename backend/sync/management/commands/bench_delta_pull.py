@@ -0,0 +1,86 @@
+"""
+Benchmark a reconnecting device's delta pull against growing history
+
+For each history size a school is seeded with that many attendance rows,
+all written before the device's last sync. A device holding a change-log
+cursor from then pulls after N fresh changes. The pull should cost the same
+number of queries and roughly the same time whatever the history size.
+
+Usage:
+    python manage.py bench_delta_pull
+    python manage.py bench_delta_pull --history 10000 1000000 --changes 50
+"""
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from backend.attendance.models import Attendance, AttendanceSession, AttendanceException
+from backend.attendance.services import BulkMarkingEngine
+from backend.core.benchmarking import Timer, rolled_back, seed_attendance, seed_school
+from backend.sync.changelog import current_seq
+from backend.sync.delta import STREAMS, encode_cursor, pull_changes
+from backend.sync.models import ChangeLog
+
+
+class Command(BaseCommand):
+    help = 'Time delta pulls of N recent changes over schools with different history sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', nargs='+', type=int, default=[10000, 1000000],
+                            help='Historical attendance rows per run')
+        parser.add_argument('--changes', type=int, default=50)
+        parser.add_argument('--roster', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5, help='Pulls per size (best is reported)')
+        parser.add_argument('--plans', action='store_true', help='Print each stream query plan')
+
+    def handle(self, *args, **options):
+        changes = options['changes']
+        self.stdout.write(f"{'history':>10} {'rows':>6} {'queries':>8} {'seconds':>9}")
+        for history in options['history']:
+            with rolled_back():
+                seeded = seed_school(students=options['roster'], classes=max(1, options['roster'] // 50))
+                school = seeded['school']
+                seed_attendance(seeded, days=max(1, history // options['roster']))
+
+                # Everything seeded is history from the device's point of view
+                cursor = encode_cursor(current_seq(school.id))
+
+                session = AttendanceSession.objects.filter(school=school).order_by('-date').first()
+                roster = [s.id for s in seeded['students'] if s.current_class_id == session.klass_id]
+                BulkMarkingEngine(session).mark([
+                    {'student_id': sid, 'status': random.choice('PALE')}
+                    for sid in random.sample(roster, min(changes, len(roster)))
+                ], apply_exceptions=False)
+                AttendanceException.objects.create(
+                    student=seeded['students'][0], category='medical', reason='bench',
+                    start_date=session.date, end_date=session.date,
+                )
+
+                best = None
+                for _ in range(options['repeat']):
+                    timer = Timer()
+                    with timer.measure():
+                        delta = pull_changes(school, cursor=cursor, limit=500)
+                    if best is None or timer.elapsed < best.elapsed:
+                        best = timer
+                rows = sum(len(delta[stream.name]) for stream in STREAMS)
+                total = Attendance.objects.filter(school=school).count()
+                self.stdout.write(f'{total:>10} {rows:>6} {best.queries:>8} {best.elapsed:>9.4f}')
+
+                if options['plans']:
+                    self.print_plans(school)
+
+    def print_plans(self, school):
+        explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        queries = [('change_log', ChangeLog.objects.filter(school=school, seq__gt=0).order_by('seq').values('seq')[:501])]
+        queries += [
+            (stream.name, stream.queryset().filter(**{stream.school_lookup: school.id}, id__in=[0]).values(*stream.fields))
+            for stream in STREAMS
+        ]
+        for name, qs in queries:
+            sql, params = qs.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(explain + sql, params)
+                plan = '; '.join(str(row[-1]) for row in cursor.fetchall())
+            self.stdout.write(f'  {name}: {plan}')
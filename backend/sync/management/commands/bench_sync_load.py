@@ -0,0 +1,321 @@
+"""
+Simulate many devices reconnecting at once and pushing offline backlogs
+
+Seeds --schools schools with one teacher, class and device per --devices
+share, then releases every device together. Each device pushes --days days
+of marking for its class through the sync endpoints, --per-request
+sessions per request, from its own thread and database connection.
+
+Devices rejected by admission control (429) sleep for the hinted
+retry_after_ms and try again; latency is that of the admitted attempt.
+Reports records/s, request latency percentiles, queries per request and
+lock contention: PostgreSQL is sampled for waiting locks, and on SQLite
+requests failing with "database is locked" are counted. Run it once per
+database (DATABASE_URL) and keep the JSON output to compare releases.
+Seeded data is committed (threads cannot share a transaction) and deleted
+afterwards unless --keep is given.
+
+Usage:
+    python manage.py bench_sync_load
+    python manage.py bench_sync_load --devices 50 --days 10 --endpoint batch
+    python manage.py bench_sync_load --output load.json --baseline last-release.json
+"""
+import json
+import platform
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend.core.benchmarking import Timer, percentile, seed_school
+from backend.core.models import School
+from backend.users.models import User
+
+ENDPOINTS = {
+    'push': '/api/v1/sync/push/',
+    'batch': '/api/v1/attendance/records/sync_batch/',
+}
+LOCK_ERRORS = ('database is locked', 'deadlock detected', 'could not serialize', 'lock timeout')
+
+
+class LockMonitor(threading.Thread):
+    """Samples ungranted PostgreSQL locks while the load runs"""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            with connection.cursor() as cursor:
+                while not self.stopped.is_set():
+                    cursor.execute(
+                        'SELECT count(*) FROM pg_locks l JOIN pg_database d ON d.oid = l.database '
+                        'WHERE NOT l.granted AND d.datname = current_database()'
+                    )
+                    self.samples.append(cursor.fetchone()[0])
+                    self.stopped.wait(self.interval)
+        finally:
+            connection.close()
+
+    def summary(self):
+        waiting = [n for n in self.samples if n]
+        return {
+            'samples': len(self.samples),
+            'samples_with_waiters': len(waiting),
+            'max_waiting': max(self.samples, default=0),
+            # Each waiting lock seen is assumed to wait a whole interval
+            'est_wait_seconds': round(sum(self.samples) * self.interval, 3),
+        }
+
+
+def deadlocks():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()')
+        return cursor.fetchone()[0]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def distribution(values, digits=2):
+    if not values:
+        return None
+    return {
+        'mean': round(sum(values) / len(values), digits),
+        'p50': round(percentile(values, 50), digits),
+        'p95': round(percentile(values, 95), digits),
+        'p99': round(percentile(values, 99), digits),
+        'max': round(max(values), digits),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Push offline backlogs from N concurrent devices and report throughput, latency and lock waits'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=20, help='Concurrent devices (one teacher and class each)')
+        parser.add_argument('--schools', type=int, default=2, help='Schools the devices are spread over')
+        parser.add_argument('--roster', type=int, default=40, help='Students per class')
+        parser.add_argument('--days', type=int, default=5, help='Days of offline marking per device')
+        parser.add_argument('--per-request', type=int, default=1, help='Sessions per request')
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='push')
+        parser.add_argument('--lock-interval', type=float, default=0.05, help='Seconds between lock samples (PostgreSQL)')
+        parser.add_argument('--output', help='Write results as JSON to this path')
+        parser.add_argument('--baseline', help='Earlier JSON output to compare against')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded schools')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in ('', ':memory:'):
+            raise CommandError('An in-memory SQLite database cannot be shared between device threads')
+        devices = options['devices']
+        schools = max(1, min(options['schools'], devices))
+
+        self.stdout.write(f'Seeding {devices} devices over {schools} schools on {connection.vendor}...')
+        seeded, users = [], []
+        for index in range(schools):
+            share = devices // schools + (1 if index < devices % schools else 0)
+            school = seed_school(students=share * options['roster'], classes=share, teachers=share, prefix='LOAD')
+            seeded.append(school)
+            users += [
+                (User.objects.create(
+                    username=f'load-{uuid.uuid4().hex[:12]}', school=school['school'], person=teacher.person
+                ), klass, [s for s in school['students'] if s.current_class_id == klass.id])
+                for teacher, klass in zip(school['teachers'], school['classes'])
+            ]
+
+        try:
+            plans = [(user, self.plan(options, klass, students)) for user, klass, students in users]
+            report = self.run_load(options, plans)
+        finally:
+            if not options['keep']:
+                User.objects.filter(pk__in=[user.pk for user, _, _ in users]).delete()
+                School.objects.filter(pk__in=[s['school'].pk for s in seeded]).delete()
+
+        self.print_report(report)
+        if options['baseline']:
+            self.compare(report, options['baseline'])
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2, default=str)
+            self.stdout.write(f'Wrote {options["output"]}')
+
+    def plan(self, options, klass, students):
+        """Request bodies for one device's backlog: list of (path, body, records)"""
+        today = timezone.now().date()
+        sessions = []
+        for day in range(options['days'], 0, -1):
+            local_id = f'load-{uuid.uuid4()}'
+            sessions.append({
+                'class_id': klass.id,
+                'date': (today - timedelta(days=day)).isoformat(),
+                'local_id': local_id,
+                'records': [
+                    {'student_id': student.id, 'status': 'PPPPPPPALE'[(i + day) % 10], 'local_id': str(uuid.uuid4())}
+                    for i, student in enumerate(students)
+                ],
+            })
+
+        requests = []
+        step = max(1, options['per_request'])
+        for start in range(0, len(sessions), step):
+            chunk = sessions[start:start + step]
+            records = sum(len(s['records']) for s in chunk)
+            if options['endpoint'] == 'batch':
+                body = {'sessions': chunk}
+            else:
+                changes = []
+                for session in chunk:
+                    changes.append({
+                        'data_type': 'session', 'action': 'create', 'record_id': session['local_id'],
+                        'payload': {k: session[k] for k in ('class_id', 'date', 'local_id')},
+                    })
+                    changes += [
+                        {'data_type': 'attendance', 'action': 'create', 'record_id': record['local_id'],
+                         'payload': {**record, 'session_local_id': session['local_id']}}
+                        for record in session['records']
+                    ]
+                body = {'changes': changes}
+            requests.append((ENDPOINTS[options['endpoint']], body, records))
+        return requests
+
+    @staticmethod
+    def run_device(user, requests, barrier):
+        """Push one device's backlog; returns a sample per request"""
+        client = APIClient()
+        client.force_authenticate(user)
+        client.credentials(HTTP_X_DEVICE_ID=f'load-tablet-{user.pk}')
+        timer = Timer()
+        samples = []
+        try:
+            barrier.wait()
+            for path, body, records in requests:
+                sample = {'records': records, 'error': None, 'rejected': 0, 'backoff': 0.0}
+                while True:
+                    with timer.measure():
+                        try:
+                            response = client.post(path, body, format='json')
+                            if response.status_code >= 400:
+                                sample['error'] = f'HTTP {response.status_code}'
+                        except Exception as e:
+                            sample['error'] = str(e) or type(e).__name__
+                    if sample['error'] != 'HTTP 429':
+                        break
+                    # Admission control turned us away: wait as told and retry
+                    sample['error'] = None
+                    sample['rejected'] += 1
+                    sample['backoff'] += response.data['retry_after_ms'] / 1000
+                    time.sleep(response.data['retry_after_ms'] / 1000)
+                sample.update(seconds=timer.elapsed, queries=timer.queries, writes=timer.writes)
+                samples.append(sample)
+        finally:
+            connection.close()
+        return samples
+
+    def run_load(self, options, plans):
+        postgres = connection.vendor == 'postgresql'
+        monitor = LockMonitor(options['lock_interval']) if postgres else None
+        deadlocks_before = deadlocks() if postgres else None
+        barrier = threading.Barrier(len(plans) + 1)
+
+        with ThreadPoolExecutor(max_workers=len(plans)) as pool:
+            futures = [pool.submit(self.run_device, user, requests, barrier) for user, requests in plans]
+            if monitor:
+                monitor.start()
+            barrier.wait()
+            start = time.perf_counter()
+            samples = [sample for future in futures for sample in future.result()]
+            wall = time.perf_counter() - start
+        if monitor:
+            monitor.stopped.set()
+            monitor.join()
+
+        ok = [s for s in samples if not s['error']]
+        failed = [s for s in samples if s['error']]
+        lock_errors = [s for s in failed if any(text in s['error'].lower() for text in LOCK_ERRORS)]
+        records = sum(s['records'] for s in ok)
+
+        if postgres:
+            lock_waits = {**monitor.summary(), 'deadlocks': deadlocks() - deadlocks_before}
+        else:
+            lock_waits = {'sampled': False}
+        lock_waits['lock_errors'] = len(lock_errors)
+
+        return {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'revision': git_revision(),
+                'database': connection.vendor,
+                'database_version': connection.pg_version if postgres else connection.Database.sqlite_version,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'params': {key: options[key] for key in ('devices', 'schools', 'roster', 'days', 'per_request', 'endpoint')},
+            'results': {
+                'requests': len(samples),
+                'failed_requests': len(failed),
+                'rejected_attempts': sum(s['rejected'] for s in samples),
+                'backoff_seconds': round(sum(s['backoff'] for s in samples), 3),
+                'errors': sorted({s['error'] for s in failed})[:10],
+                'records': records,
+                'wall_seconds': round(wall, 3),
+                'records_per_sec': round(records / wall, 1) if wall else None,
+                'requests_per_sec': round(len(samples) / wall, 1) if wall else None,
+                'latency_ms': distribution([s['seconds'] * 1000 for s in samples]),
+                'queries_per_request': distribution([s['queries'] for s in samples], digits=1),
+                'writes_per_request': distribution([s['writes'] for s in samples], digits=1),
+                'lock_waits': lock_waits,
+            },
+        }
+
+    def print_report(self, report):
+        results = report['results']
+        latency, queries = results['latency_ms'], results['queries_per_request']
+        self.stdout.write(
+            f"{results['requests']} requests ({results['failed_requests']} failed, "
+            f"{results['rejected_attempts']} attempts rejected with 429), {results['records']} records "
+            f"in {results['wall_seconds']:.2f}s: {results['records_per_sec']} records/s, "
+            f"{results['requests_per_sec']} requests/s"
+        )
+        if latency:
+            self.stdout.write(
+                f"latency ms  p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}"
+            )
+            self.stdout.write(f"queries/request  mean {queries['mean']}  p95 {queries['p95']}  max {queries['max']}")
+        self.stdout.write(f"lock waits  {results['lock_waits']}")
+        for error in results['errors']:
+            self.stdout.write(self.style.WARNING(f'  {error}'))
+
+    def compare(self, report, path):
+        with open(path) as handle:
+            baseline = json.load(handle)
+        if baseline['params'] != report['params'] or baseline['meta']['database'] != report['meta']['database']:
+            self.stdout.write(self.style.WARNING('Baseline was run with different parameters or database'))
+        old, new = baseline['results'], report['results']
+        rows = [
+            ('records/s', old['records_per_sec'], new['records_per_sec']),
+            ('p50 ms', (old['latency_ms'] or {}).get('p50'), (new['latency_ms'] or {}).get('p50')),
+            ('p95 ms', (old['latency_ms'] or {}).get('p95'), (new['latency_ms'] or {}).get('p95')),
+            ('p99 ms', (old['latency_ms'] or {}).get('p99'), (new['latency_ms'] or {}).get('p99')),
+            ('queries/request', (old['queries_per_request'] or {}).get('mean'), (new['queries_per_request'] or {}).get('mean')),
+        ]
+        self.stdout.write(f"vs {baseline['meta'].get('revision') or path}:")
+        for label, before, after in rows:
+            change = f'{(after - before) / before:+.1%}' if before and after is not None else 'n/a'
+            self.stdout.write(f'  {label:>16} {before} -> {after} ({change})')
@@ -0,0 +1,86 @@
+"""
+Compare bytes on the wire and parse time of JSON and columnar sync bodies
+
+Builds a sync_batch body of --sessions sessions with --roster records each,
+the way a teacher's device uploads a day of marking, and encodes it as
+JSON and as the columnar format, each raw and gzip/zstd framed.
+
+Usage:
+    python manage.py bench_wire_format
+    python manage.py bench_wire_format --sessions 8 --roster 45 --remarks-ratio 0.1
+"""
+import gzip
+import json
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from backend.sync import wire
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Report bytes on wire and parse time for JSON vs columnar attendance bodies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=8)
+        parser.add_argument('--roster', type=int, default=45)
+        parser.add_argument('--remarks-ratio', type=float, default=0.05)
+        parser.add_argument('--local-ids', action='store_true', help='Give every record a UUID local_id')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        rng = random.Random(3)
+        first_id = 10_000
+        sessions = []
+        for index in range(options['sessions']):
+            records = []
+            for offset in range(options['roster']):
+                record = {
+                    'student_id': first_id + index * options['roster'] + offset,
+                    'status': rng.choices('PALE', weights=[85, 8, 5, 2])[0],
+                    'remarks': 'Arrived after assembly' if rng.random() < options['remarks_ratio'] else '',
+                    'marked_at': '2026-05-04T08:15:00Z',
+                }
+                if options['local_ids']:
+                    record['local_id'] = str(uuid.UUID(int=rng.getrandbits(128)))
+                records.append(record)
+            sessions.append({'session_id': 500 + index, 'records': records})
+
+        json_body = json.dumps({'sessions': sessions}).encode()
+        # marked_at has no column: the server stamps it on write
+        columnar_body = wire.encode(sessions)
+        bodies = [
+            ('json', json_body),
+            ('json+gzip', gzip.compress(json_body)),
+            ('columnar', columnar_body),
+            ('columnar+gzip', wire.frame(columnar_body, 'gzip')),
+        ]
+        if 'zstd' in wire.ENCODINGS:
+            bodies.append(('columnar+zstd', wire.frame(columnar_body, 'zstd')))
+
+        records = options['sessions'] * options['roster']
+        self.stdout.write(f'{records} records in {options["sessions"]} sessions')
+        self.stdout.write(f"{'format':>14} {'bytes':>8} {'B/record':>9} {'vs json':>8} {'parse ms':>9}")
+        for name, body in bodies:
+            encoding = name.split('+')[1] if '+' in name else None
+            if name.startswith('json'):
+                parse = lambda body=body, encoding=encoding: json.loads(wire.unframe(body, encoding))
+            else:
+                parse = lambda body=body, encoding=encoding: wire.decode(body, encoding)
+            elapsed = best_of(options['repeat'], parse)
+            self.stdout.write(
+                f'{name:>14} {len(body):>8} {len(body) / records:>9.1f} '
+                f'{len(body) / len(json_body):>7.1%} {elapsed * 1000:>9.3f}'
+            )
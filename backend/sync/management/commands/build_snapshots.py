@@ -0,0 +1,44 @@
+"""
+Build bootstrap snapshots for schools whose change log has advanced
+
+Run after compact_change_log, or every few minutes from cron; schools with
+no new changes are skipped with one query each.
+
+Usage:
+    python manage.py build_snapshots
+    python manage.py build_snapshots --school 3 --full
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.core.models import School
+from backend.sync.snapshots import SnapshotBuilder
+
+
+class Command(BaseCommand):
+    help = 'Regenerate content-addressed school snapshots for new devices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, help='Only build this school id')
+        parser.add_argument('--full', action='store_true', help='Rebuild from the tables instead of patching')
+        parser.add_argument('--session-days', type=int, help='Override SYNC_SNAPSHOT SESSION_DAYS')
+
+    def handle(self, *args, **options):
+        schools = School.objects.order_by('id')
+        if options['school']:
+            schools = schools.filter(id=options['school'])
+
+        counts = {'unchanged': 0, 'patched': 0, 'full': 0}
+        for school in schools:
+            start = time.perf_counter()
+            snapshot, mode = SnapshotBuilder(school, session_days=options['session_days']).build(full=options['full'])
+            counts[mode] += 1
+            if mode != 'unchanged':
+                self.stdout.write(
+                    f'{school.code}: {mode} to seq {snapshot.seq}, {snapshot.size} bytes, '
+                    f'{time.perf_counter() - start:.2f}s, etag {snapshot.etag[:12]}'
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['full']} built, {counts['patched']} patched, {counts['unchanged']} unchanged"
+        ))
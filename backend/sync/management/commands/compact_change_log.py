@@ -0,0 +1,65 @@
+"""
+Compact the sync change log
+
+Entries superseded by a newer entry for the same record are dropped; a
+client pulling past them gets the newer one anyway. Tombstones older than
+--tombstone-days are dropped too and the school's pruned_through moves up,
+so clients whose cursor predates them are told to download again.
+
+Usage:
+    python manage.py compact_change_log
+    python manage.py compact_change_log --school 3 --tombstone-days 30
+    python manage.py compact_change_log --dry-run
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from backend.core.sharding import shard_atomic
+from backend.sync.models import ChangeLog, ChangeLogSequence
+
+
+class Command(BaseCommand):
+    help = 'Drop superseded change-log entries and expired tombstones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, help='Only compact this school id')
+        parser.add_argument('--tombstone-days', type=int, default=90, help='Keep tombstones this many days')
+        parser.add_argument('--dry-run', action='store_true', help='Report counts without deleting')
+
+    def handle(self, *args, **options):
+        schools = ChangeLogSequence.objects.order_by('school_id')
+        if options['school']:
+            schools = schools.filter(school_id=options['school'])
+        cutoff = timezone.now() - timezone.timedelta(days=options['tombstone_days'])
+
+        superseded_total = expired_total = 0
+        for school_id in schools.values_list('school_id', flat=True):
+            # One short transaction per school keeps the sequence row lock brief
+            with shard_atomic():
+                entries = ChangeLog.objects.filter(school_id=school_id)
+                superseded = entries.filter(Exists(ChangeLog.objects.filter(
+                    school_id=OuterRef('school_id'),
+                    data_type=OuterRef('data_type'),
+                    record_id=OuterRef('record_id'),
+                    seq__gt=OuterRef('seq'),
+                )))
+                expired = entries.filter(deleted=True, created_at__lt=cutoff)
+
+                if options['dry_run']:
+                    superseded_total += superseded.count()
+                    expired_total += expired.exclude(pk__in=superseded.values('pk')).count()
+                    continue
+
+                superseded_total += superseded.delete()[0]
+                pruned_through = expired.aggregate(seq=Max('seq'))['seq']
+                if pruned_through is not None:
+                    expired_total += expired.delete()[0]
+                    ChangeLogSequence.objects.filter(
+                        school_id=school_id, pruned_through__lt=pruned_through
+                    ).update(pruned_through=pruned_through)
+
+        verb = 'Would drop' if options['dry_run'] else 'Dropped'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {superseded_total} superseded entries and {expired_total} expired tombstones'
+        ))
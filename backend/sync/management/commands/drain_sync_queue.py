@@ -0,0 +1,60 @@
+"""
+Drain pending SyncQueue rows through the bulk sync handlers
+
+Run one process per core on PostgreSQL; workers claim disjoint batches
+with SKIP LOCKED. On SQLite workers take turns through a lock file.
+
+Usage:
+    python manage.py drain_sync_queue
+    python manage.py drain_sync_queue --until-empty --batch-size 1000
+    python manage.py drain_sync_queue --stats-interval 30
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.sync.queue import QueueDrainer
+
+
+class Command(BaseCommand):
+    help = 'Apply queued client changes in batches and report throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Override SYNC_QUEUE BATCH_SIZE')
+        parser.add_argument('--max-attempts', type=int, help='Override SYNC_QUEUE MAX_ATTEMPTS')
+        parser.add_argument('--until-empty', action='store_true', help='Exit once no rows are pending')
+        parser.add_argument('--idle-sleep', type=float, default=1.0, help='Seconds between polls of an empty queue')
+        parser.add_argument('--max-seconds', type=float, help='Stop after this many seconds')
+        parser.add_argument('--stats-interval', type=float, default=10.0, help='Seconds between progress lines')
+
+    def handle(self, *args, **options):
+        drainer = QueueDrainer(batch_size=options['batch_size'], max_attempts=options['max_attempts'])
+        mode = 'parallel (SKIP LOCKED)' if drainer.parallel else 'single claimer (lock file)'
+        self.stdout.write(f'Draining in {mode} mode, batch size {drainer.batch_size}, depth {drainer.depth()}')
+
+        last_report = time.perf_counter()
+
+        def report(drainer):
+            nonlocal last_report
+            if time.perf_counter() - last_report >= options['stats_interval']:
+                last_report = time.perf_counter()
+                self.stdout.write(self.progress(drainer, drainer.depth()))
+
+        try:
+            drainer.drain(
+                until_empty=options['until_empty'],
+                idle_sleep=options['idle_sleep'],
+                max_seconds=options['max_seconds'],
+                on_batch=report,
+            )
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(self.progress(drainer, drainer.depth())))
+
+    @staticmethod
+    def progress(drainer, depth):
+        stats = drainer.stats
+        return (
+            f'{stats.batches} batches, {stats.synced} synced, {stats.failed} failed, '
+            f'{stats.rate:.0f} rows/s over {stats.elapsed:.1f}s, {depth} pending'
+        )
@@ -0,0 +1,32 @@
+"""
+Delete sync state of devices that have not synced for a while
+
+A pruned device that comes back simply starts a new state; without its
+stored cursor its next pull without a cursor is a full download.
+
+Usage:
+    python manage.py prune_sync_devices
+    python manage.py prune_sync_devices --days 30 --dry-run
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.sync.devices import DeviceRegistry
+from backend.sync.models import DeviceSyncState
+
+
+class Command(BaseCommand):
+    help = 'Delete DeviceSyncState rows not updated for --days days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Keep devices seen within this many days')
+        parser.add_argument('--dry-run', action='store_true', help='Report how many devices would be deleted')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            cutoff = timezone.now() - timezone.timedelta(days=options['days'])
+            count = DeviceSyncState.objects.filter(updated_at__lt=cutoff).count()
+            self.stdout.write(f'Would delete {count} devices not seen for {options["days"]} days')
+            return
+        deleted = DeviceRegistry.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} devices not seen for {options["days"]} days'))
@@ -0,0 +1,38 @@
+"""
+Roll old SyncLog rows into daily aggregates and delete them
+
+Rows older than --days (SYNC_LOG_RETENTION DETAIL_DAYS) are added to the
+per-user, per-day SyncLogDaily row and deleted, --chunk-size rows per
+transaction, so no lock is held for long. Run it daily from cron.
+
+Usage:
+    python manage.py prune_sync_logs
+    python manage.py prune_sync_logs --days 14 --chunk-size 5000
+    python manage.py prune_sync_logs --dry-run
+"""
+from django.core.management.base import BaseCommand
+
+from backend.sync.retention import SyncLogRetention
+
+
+class Command(BaseCommand):
+    help = 'Aggregate and delete SyncLog rows past the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Override SYNC_LOG_RETENTION DETAIL_DAYS')
+        parser.add_argument('--chunk-size', type=int, help='Override SYNC_LOG_RETENTION CHUNK_SIZE')
+        parser.add_argument('--max-chunks', type=int, help='Stop after this many chunks')
+        parser.add_argument('--dry-run', action='store_true', help='Report how many rows would be pruned')
+
+    def handle(self, *args, **options):
+        retention = SyncLogRetention(detail_days=options['days'], chunk_size=options['chunk_size'])
+        if options['dry_run']:
+            self.stdout.write(f'Would prune {retention.expired().count()} rows older than {retention.cutoff:%Y-%m-%d %H:%M}')
+            return
+
+        deleted = retention.run(max_chunks=options['max_chunks'])
+        remaining = retention.expired().count() if options['max_chunks'] else 0
+        message = f'Pruned {deleted} sync log rows older than {retention.detail_days} days'
+        if remaining:
+            message += f'; {remaining} left for the next run'
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,51 @@
+"""
+Report sync admission control: admitted vs rejected requests and held slots
+
+Counters are summed over every process that has served sync requests
+since the metrics directory was last reset.
+
+Usage:
+    python manage.py sync_admission_stats
+    python manage.py sync_admission_stats --json
+    python manage.py sync_admission_stats --reset
+"""
+import glob
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from backend.sync.admission import AdmissionController, AdmissionMetrics
+
+
+class Command(BaseCommand):
+    help = 'Show admitted and rejected sync requests across all workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the totals as JSON')
+        parser.add_argument('--reset', action='store_true', help='Delete the stored counters')
+
+    def handle(self, *args, **options):
+        controller = AdmissionController()
+        if options['reset']:
+            for path in glob.glob(os.path.join(controller.directory, 'metrics-*.json')):
+                os.remove(path)
+            self.stdout.write(self.style.SUCCESS('Admission counters reset'))
+            return
+
+        totals = AdmissionMetrics.totals(controller.directory)
+        totals['held_slots'] = controller.held()
+        totals['limits'] = {'global': controller.global_limit, 'school': controller.school_limit}
+        if options['json']:
+            self.stdout.write(json.dumps(totals, indent=2))
+            return
+
+        rate = f"{totals['rejection_rate']}%" if totals['rejection_rate'] is not None else 'n/a'
+        self.stdout.write(
+            f"admitted {totals['admitted']}, rejected {totals['rejected']} ({rate}): "
+            f"{totals['rejected_by_scope']['school']} by school limit {controller.school_limit}, "
+            f"{totals['rejected_by_scope']['global']} by global limit {controller.global_limit}"
+        )
+        for key, count in totals['by_action'].items():
+            self.stdout.write(f'  {key:<30} {count}')
+        self.stdout.write(f"held slots: {totals['held_slots'] or 'none'}")
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='synclog',
+            name='errors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_initial'),
+        ('sync', '0004_synclog_errors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogSequence',
+            fields=[
+                ('school', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='change_sequence', serialize=False, to='core.school')),
+                ('last_seq', models.BigIntegerField(default=0)),
+                ('pruned_through', models.BigIntegerField(default=0, help_text='Tombstones up to this seq were compacted away')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField()),
+                ('data_type', models.CharField(max_length=20)),
+                ('record_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='change_log', to='core.school')),
+            ],
+            options={
+                'ordering': ['school', 'seq'],
+                'indexes': [models.Index(fields=['school', 'data_type', 'record_id', 'seq'], name='sync_change_school__e50e25_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='changelog',
+            constraint=models.UniqueConstraint(fields=('school', 'seq'), name='change_log_school_seq_uniq'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0005_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncqueue',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='syncqueue',
+            name='last_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='syncqueue',
+            index=models.Index(condition=models.Q(('synced', False)), fields=['id'], name='sync_queue_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_initial'),
+        ('sync', '0006_sync_queue_drain'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncConflict',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_type', models.CharField(max_length=20)),
+                ('record_id', models.BigIntegerField()),
+                ('field', models.CharField(max_length=50)),
+                ('kept_value', models.TextField(blank=True)),
+                ('kept_version', models.BigIntegerField()),
+                ('lost_value', models.TextField(blank=True)),
+                ('lost_version', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_conflicts', to='core.school')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['school', 'created_at'], name='sync_syncco_school__ff0d87_idx')],
+            },
+        ),
+    ]
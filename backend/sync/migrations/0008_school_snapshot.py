@@ -0,0 +1,26 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_initial'),
+        ('sync', '0007_sync_conflict'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolSnapshot',
+            fields=[
+                ('school', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='core.school')),
+                ('seq', models.BigIntegerField(help_text='Change-log position the snapshot is current to')),
+                ('etag', models.CharField(max_length=64)),
+                ('path', models.CharField(help_text='Path in default storage', max_length=255)),
+                ('size', models.PositiveIntegerField()),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_initial'),
+        ('users', '0002_initial'),
+        ('sync', '0008_school_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncLogDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('data_type', models.CharField(max_length=50)),
+                ('syncs', models.PositiveIntegerField(default=0)),
+                ('successes', models.PositiveIntegerField(default=0)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('records_count', models.PositiveIntegerField(default=0)),
+                ('failed_changes', models.PositiveIntegerField(default=0)),
+                ('last_success_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='synclog',
+            index=models.Index(fields=['user', 'started_at'], name='sync_log_user_started_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synclog',
+            index=models.Index(fields=['started_at'], name='sync_log_started_idx'),
+        ),
+        migrations.AddField(
+            model_name='synclogdaily',
+            name='school',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sync_log_days', to='core.school'),
+        ),
+        migrations.AddField(
+            model_name='synclogdaily',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_log_days', to='users.user'),
+        ),
+        migrations.AddIndex(
+            model_name='synclogdaily',
+            index=models.Index(fields=['school', 'date'], name='sync_synclo_school__5d83b8_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='synclogdaily',
+            constraint=models.UniqueConstraint(fields=('user', 'date', 'data_type'), name='sync_log_daily_uniq'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_remove_user_last_sync'),
+        ('core', '0003_initial'),
+        ('sync', '0009_sync_log_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(max_length=64)),
+                ('cursor', models.TextField(blank=True)),
+                ('seq', models.BigIntegerField(default=0)),
+                ('last_pull_at', models.DateTimeField(blank=True, null=True)),
+                ('last_push_at', models.DateTimeField(blank=True, null=True)),
+                ('backlog', models.PositiveIntegerField(default=0, help_text='Changes queued on the device, as it last reported')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sync_devices', to='core.school')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_devices', to='users.user')),
+            ],
+            options={
+                'ordering': ['user', 'device_id'],
+                'indexes': [models.Index(fields=['school', 'seq'], name='sync_device_school__11dee5_idx'), models.Index(fields=['updated_at'], name='sync_device_updated_f3bb64_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='devicesyncstate',
+            constraint=models.UniqueConstraint(fields=('user', 'device_id'), name='device_sync_state_uniq'),
+        ),
+    ]
@@ -20,16 +20,53 @@ class SyncLog(models.Model):
     data_type = models.CharField(max_length=50)  # 'attendance', 'students', etc.
     records_count = models.IntegerField(default=0)
     error_message = models.TextField(blank=True)
+    errors = models.JSONField(default=list, blank=True)  # per-change failures of a batch
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-started_at']
+        indexes = [
+            # Per-user history and last-sync lookups
+            models.Index(fields=['user', 'started_at'], name='sync_log_user_started_idx'),
+            # Retention: rows older than the detail window
+            models.Index(fields=['started_at'], name='sync_log_started_idx'),
+        ]
     
     def __str__(self):
         return f"{self.data_type} - {self.status}"
 
 
+class SyncLogDaily(models.Model):
+    """SyncLog rows older than the retention window, rolled up per user and day
+    
+    prune_sync_logs adds each detailed row into its (user, date, data_type)
+    aggregate before deleting it, so success and error rates survive pruning.
+    """
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='sync_log_days')
+    school = models.ForeignKey('core.School', on_delete=models.CASCADE, null=True, blank=True, related_name='sync_log_days')
+    date = models.DateField()
+    data_type = models.CharField(max_length=50)
+    syncs = models.PositiveIntegerField(default=0)
+    successes = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)  # anything but success, incl. syncs that never completed
+    records_count = models.PositiveIntegerField(default=0)
+    failed_changes = models.PositiveIntegerField(default=0)  # per-change errors inside batches
+    last_success_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'data_type'], name='sync_log_daily_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['school', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.date} {self.data_type}: {self.successes}/{self.syncs}"
+
+
 class SyncQueue(models.Model):
     """Queue of changes pending sync"""
     ACTION_CHOICES = [
@@ -46,9 +83,140 @@ class SyncQueue(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     synced = models.BooleanField(default=False)
     synced_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)  # failed drain attempts
+    last_error = models.TextField(blank=True)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Only pending rows are indexed, so claims stay cheap however
+            # much synced history the table keeps
+            models.Index(fields=['id'], condition=models.Q(synced=False), name='sync_queue_pending_idx'),
+        ]
     
     def __str__(self):
         return f"{self.action} {self.data_type} - {self.record_id}"
+
+
+class ChangeLogSequence(models.Model):
+    """Per-school change counter backing ChangeLog.seq
+    
+    Writers bump last_seq with an UPDATE, which holds the row lock until
+    their transaction commits, so sequence numbers become visible in order.
+    """
+    school = models.OneToOneField('core.School', on_delete=models.CASCADE, primary_key=True, related_name='change_sequence')
+    last_seq = models.BigIntegerField(default=0)
+    pruned_through = models.BigIntegerField(default=0, help_text='Tombstones up to this seq were compacted away')
+    
+    def __str__(self):
+        return f"{self.school_id}: {self.last_seq}"
+
+
+class ChangeLog(models.Model):
+    """Append-only outbox of record changes per school
+    
+    One row per changed record, written in the same transaction as the
+    change. Deletions are tombstones (deleted=True). Pulls read
+    seq > N for a school; compact_change_log keeps only the newest entry
+    per record.
+    """
+    DATA_TYPES = ['session', 'attendance', 'student', 'exception']
+    
+    school = models.ForeignKey('core.School', on_delete=models.CASCADE, related_name='change_log')
+    seq = models.BigIntegerField()
+    data_type = models.CharField(max_length=20)
+    record_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['school', 'seq']
+        constraints = [
+            models.UniqueConstraint(fields=['school', 'seq'], name='change_log_school_seq_uniq'),
+        ]
+        indexes = [
+            # Compaction: newest entry per record
+            models.Index(fields=['school', 'data_type', 'record_id', 'seq']),
+        ]
+    
+    def __str__(self):
+        action = 'delete' if self.deleted else 'upsert'
+        return f"{self.school_id}#{self.seq} {action} {self.data_type} {self.record_id}"
+
+
+class SyncConflict(models.Model):
+    """A field value discarded by conflict resolution
+    
+    Written when a synced value loses to a newer version already stored,
+    so admins can review what was overridden.
+    """
+    school = models.ForeignKey('core.School', on_delete=models.CASCADE, related_name='sync_conflicts')
+    data_type = models.CharField(max_length=20)
+    record_id = models.BigIntegerField()
+    field = models.CharField(max_length=50)
+    kept_value = models.TextField(blank=True)
+    kept_version = models.BigIntegerField()
+    lost_value = models.TextField(blank=True)
+    lost_version = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['school', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.data_type} {self.record_id}.{self.field}: kept {self.kept_value!r} over {self.lost_value!r}"
+
+
+
+class SchoolSnapshot(models.Model):
+    """Latest bootstrap snapshot file for a school
+    
+    The file is named after its content hash, so its URL never changes
+    content and can be cached forever; etag is that hash.
+    """
+    school = models.OneToOneField('core.School', on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    seq = models.BigIntegerField(help_text='Change-log position the snapshot is current to')
+    etag = models.CharField(max_length=64)
+    path = models.CharField(max_length=255, help_text='Path in default storage')
+    size = models.PositiveIntegerField()
+    built_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.school_id}@{self.seq} {self.etag[:12]}"
+
+
+class DeviceSyncState(models.Model):
+    """Sync position of one device of a user
+    
+    Devices identify themselves with the X-Device-Id header. cursor is the
+    last cursor the device pulled from, so a pull without a cursor resumes
+    there; seq is its change-log position, used to find lagging devices.
+    """
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='sync_devices')
+    school = models.ForeignKey('core.School', on_delete=models.CASCADE, null=True, blank=True, related_name='sync_devices')
+    device_id = models.CharField(max_length=64)
+    cursor = models.TextField(blank=True)
+    seq = models.BigIntegerField(default=0)
+    last_pull_at = models.DateTimeField(null=True, blank=True)
+    last_push_at = models.DateTimeField(null=True, blank=True)
+    backlog = models.PositiveIntegerField(default=0, help_text='Changes queued on the device, as it last reported')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['user', 'device_id']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'device_id'], name='device_sync_state_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['school', 'seq']),
+            # Stale-device cleanup
+            models.Index(fields=['updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id}/{self.device_id} @{self.seq}"
+
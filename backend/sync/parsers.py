@@ -0,0 +1,25 @@
+"""
+Request parsers for the compact sync wire format
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from backend.sync.wire import MEDIA_TYPE, WireError, decode
+
+
+class ColumnarAttendanceParser(BaseParser):
+    """Parses columnar attendance bodies into {'sessions': [...]}
+    
+    Records arrive as AttendanceColumns, which SyncIngest and
+    BulkMarkingEngine read without building a dict per record.
+    Content-Encoding gzip (and zstd when installed) is undone first.
+    """
+    media_type = MEDIA_TYPE
+    
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower() if request is not None else ''
+        try:
+            return {'sessions': decode(stream.read() if stream is not None else b'', encoding or None)}
+        except WireError as e:
+            raise ParseError(str(e))
@@ -0,0 +1,163 @@
+"""
+SyncQueue draining
+Workers claim batches of pending rows, apply them through SyncEngine's bulk
+handlers and mark them synced in one UPDATE. Where the database supports
+SELECT ... FOR UPDATE SKIP LOCKED any number of workers drain in parallel;
+elsewhere (SQLite) a lock file admits one claimer at a time.
+"""
+import fcntl
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from backend.core.sharding import shard_atomic
+from backend.core.tenant_context import TenantContext
+from backend.sync.engine import SyncEngine
+from backend.sync.models import SyncQueue
+from backend.users.models import User
+
+DEFAULTS = {
+    'BATCH_SIZE': 500,      # rows claimed per transaction
+    'MAX_ATTEMPTS': 5,      # failed rows are retried until they reach this
+    'LOCK_FILE': os.path.join(tempfile.gettempdir(), 'schoolos-sync-queue.lock'),
+}
+
+
+def queue_settings():
+    return {**DEFAULTS, **getattr(settings, 'SYNC_QUEUE', {})}
+
+
+class DrainStats:
+    """Running totals for a drain worker"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.batches = 0
+        self.synced = 0
+        self.failed = 0
+    
+    @property
+    def rows(self):
+        return self.synced + self.failed
+    
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+    
+    @property
+    def rate(self):
+        """Rows processed per second since the worker started"""
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+class QueueDrainer:
+    """Claims and applies batches of pending SyncQueue rows
+    
+    A row is pending while synced is false and it has failed fewer than
+    MAX_ATTEMPTS times. Claimed rows stay locked until their batch commits,
+    so a worker that dies mid-batch releases them to the others.
+    """
+    
+    def __init__(self, **overrides):
+        config = queue_settings()
+        config.update({k.upper(): v for k, v in overrides.items() if v is not None})
+        self.batch_size = config['BATCH_SIZE']
+        self.max_attempts = config['MAX_ATTEMPTS']
+        self.lock_file = config['LOCK_FILE']
+        self.parallel = connection.features.has_select_for_update_skip_locked
+        self.stats = DrainStats()
+    
+    def pending(self):
+        return SyncQueue.objects.filter(synced=False, attempts__lt=self.max_attempts)
+    
+    def depth(self):
+        """Rows still waiting to be drained"""
+        return self.pending().count()
+    
+    @contextmanager
+    def claim_lock(self):
+        """Serialise claimers on databases without SKIP LOCKED"""
+        if self.parallel:
+            yield
+            return
+        with open(self.lock_file, 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+    
+    def drain_batch(self):
+        """Claim, apply and mark one batch
+        
+        Returns:
+            Number of rows claimed (0 when nothing is pending)
+        """
+        with self.claim_lock(), shard_atomic():
+            rows = list(
+                self.pending().select_for_update(skip_locked=self.parallel)
+                .order_by('id')[:self.batch_size]
+            )
+            if not rows:
+                return 0
+            
+            user_ids = {row.user_id for row in rows}
+            users = User.objects.in_bulk(user_ids)
+            tenants = {
+                values['id']: TenantContext(users[values['id']], values)
+                for values in User.objects.filter(id__in=user_ids).values('id', *TenantContext.FIELDS)
+            }
+            by_user = {}
+            for row in rows:
+                by_user.setdefault(row.user_id, []).append(row)
+            
+            synced_ids = []
+            failed = []
+            for user_id, user_rows in by_user.items():
+                _, results = SyncEngine.sync_from_client(users[user_id], [
+                    {'data_type': row.data_type, 'action': row.action,
+                     'record_id': row.record_id, 'payload': row.payload}
+                    for row in user_rows
+                ], tenants[user_id])
+                for row, outcome in zip(user_rows, results):
+                    if outcome['result'] == 'error':
+                        row.attempts += 1
+                        row.last_error = outcome['error']
+                        failed.append(row)
+                    else:
+                        synced_ids.append(row.id)
+            
+            SyncQueue.objects.filter(id__in=synced_ids).update(synced=True, synced_at=timezone.now(), last_error='')
+            SyncQueue.objects.bulk_update(failed, ['attempts', 'last_error'])
+        
+        self.stats.batches += 1
+        self.stats.synced += len(synced_ids)
+        self.stats.failed += len(failed)
+        return len(rows)
+    
+    def drain(self, until_empty=False, idle_sleep=1.0, max_seconds=None, on_batch=None):
+        """Keep draining batches
+        
+        Args:
+            until_empty: Return as soon as no rows are pending
+            idle_sleep: Seconds to wait before polling an empty queue again
+            max_seconds: Stop after this long (None runs forever)
+            on_batch: Callable invoked with the drainer after each batch
+        
+        Returns:
+            DrainStats for the run
+        """
+        while max_seconds is None or self.stats.elapsed < max_seconds:
+            claimed = self.drain_batch()
+            if claimed and on_batch:
+                on_batch(self)
+            if not claimed:
+                if until_empty:
+                    break
+                time.sleep(idle_sleep)
+        return self.stats
@@ -0,0 +1,174 @@
+"""
+SyncLog retention
+Detailed SyncLog rows are kept for a window of days. Older rows are added
+into per-user, per-day SyncLogDaily aggregates and deleted in bounded
+chunks, each in its own short transaction.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from backend.core.sharding import shard_atomic
+from backend.sync.models import SyncLog, SyncLogDaily
+
+DEFAULTS = {
+    'DETAIL_DAYS': 30,    # keep detailed rows this many days
+    'CHUNK_SIZE': 1000,   # rows rolled up and deleted per transaction
+}
+
+
+def retention_settings():
+    return {**DEFAULTS, **getattr(settings, 'SYNC_LOG_RETENTION', {})}
+
+
+class SyncLogRetention:
+    """Rolls expired SyncLog rows into SyncLogDaily and deletes them"""
+    
+    COUNTERS = ('syncs', 'successes', 'failures', 'records_count', 'failed_changes')
+    
+    def __init__(self, detail_days=None, chunk_size=None):
+        config = retention_settings()
+        self.detail_days = detail_days if detail_days is not None else config['DETAIL_DAYS']
+        self.chunk_size = chunk_size or config['CHUNK_SIZE']
+        self.cutoff = timezone.now() - timedelta(days=self.detail_days)
+    
+    def expired(self):
+        return SyncLog.objects.filter(started_at__lt=self.cutoff)
+    
+    @staticmethod
+    def roll_up(logs):
+        """Aggregate detailed rows by (user, date, data_type)
+        
+        Args:
+            logs: Iterable of SyncLog value dicts with user__school_id
+        
+        Returns:
+            Dict of (user_id, date, data_type) -> dict of totals
+        """
+        days = {}
+        for log in logs:
+            key = (log['user_id'], timezone.localtime(log['started_at']).date(), log['data_type'])
+            day = days.get(key)
+            if day is None:
+                day = days[key] = {
+                    'school_id': log['user__school_id'],
+                    'last_success_at': None,
+                    **dict.fromkeys(SyncLogRetention.COUNTERS, 0),
+                }
+            day['syncs'] += 1
+            day['records_count'] += log['records_count']
+            day['failed_changes'] += len(log['errors'] or [])
+            if log['status'] == 'success':
+                day['successes'] += 1
+                finished = log['completed_at'] or log['started_at']
+                if day['last_success_at'] is None or finished > day['last_success_at']:
+                    day['last_success_at'] = finished
+            else:
+                day['failures'] += 1
+        return days
+    
+    def merge(self, days):
+        """Add rolled-up totals into stored SyncLogDaily rows"""
+        user_ids = {user_id for user_id, _, _ in days}
+        dates = {date for _, date, _ in days}
+        existing = {
+            (row.user_id, row.date, row.data_type): row
+            for row in SyncLogDaily.objects.select_for_update().filter(user_id__in=user_ids, date__in=dates)
+        }
+        created, updated = [], []
+        for (user_id, date, data_type), totals in days.items():
+            row = existing.get((user_id, date, data_type))
+            if row is None:
+                created.append(SyncLogDaily(user_id=user_id, date=date, data_type=data_type, **totals))
+                continue
+            for field in self.COUNTERS:
+                setattr(row, field, getattr(row, field) + totals[field])
+            if totals['last_success_at'] and (row.last_success_at is None or totals['last_success_at'] > row.last_success_at):
+                row.last_success_at = totals['last_success_at']
+            updated.append(row)
+        SyncLogDaily.objects.bulk_create(created)
+        SyncLogDaily.objects.bulk_update(updated, [*self.COUNTERS, 'last_success_at'])
+    
+    def prune_chunk(self):
+        """Roll up and delete the oldest chunk of expired rows
+        
+        Returns:
+            Number of SyncLog rows deleted
+        """
+        with shard_atomic():
+            ids = list(self.expired().order_by('started_at').values_list('id', flat=True)[:self.chunk_size])
+            if not ids:
+                return 0
+            logs = SyncLog.objects.filter(id__in=ids).values(
+                'user_id', 'user__school_id', 'data_type', 'status', 'records_count',
+                'errors', 'started_at', 'completed_at',
+            )
+            self.merge(self.roll_up(logs))
+            return SyncLog.objects.filter(id__in=ids).delete()[0]
+    
+    def run(self, max_chunks=None):
+        """Prune until no expired rows remain or max_chunks is reached
+        
+        Returns:
+            Total rows deleted
+        """
+        total = chunks = 0
+        while max_chunks is None or chunks < max_chunks:
+            deleted = self.prune_chunk()
+            total += deleted
+            chunks += 1
+            if deleted < self.chunk_size:
+                break
+        return total
+
+
+def school_sync_rates(school, days=30):
+    """Daily sync success and error rates of a school
+    
+    Combines SyncLogDaily aggregates with detailed rows not yet pruned, so
+    the window may span the retention cutoff.
+    
+    Args:
+        school: School instance
+        days: Number of days back from today
+    
+    Returns:
+        Dict with totals and one entry per day that had syncs, newest first
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    totals = {}
+    
+    rolled_up = SyncLogDaily.objects.filter(school=school, date__gte=since).values('date').annotate(
+        n=Sum('syncs'), ok=Sum('successes'), failed=Sum('failures'),
+    )
+    # Recent rows still in flight are left out until they finish
+    detailed = SyncLog.objects.filter(
+        user__school=school, started_at__date__gte=since, status__in=['success', 'error']
+    ).annotate(date=TruncDate('started_at')).values('date').annotate(
+        n=Count('id'), ok=Count('id', filter=Q(status='success')), failed=Count('id', filter=Q(status='error')),
+    )
+    for source in (rolled_up, detailed):
+        for row in source:
+            day = totals.setdefault(row['date'], {'syncs': 0, 'successes': 0, 'failures': 0})
+            day['syncs'] += row['n']
+            day['successes'] += row['ok']
+            day['failures'] += row['failed']
+    
+    def rates(counts):
+        syncs = counts['syncs']
+        return {
+            **counts,
+            'success_rate': round(counts['successes'] / syncs * 100, 1) if syncs else None,
+            'error_rate': round(counts['failures'] / syncs * 100, 1) if syncs else None,
+        }
+    
+    overall = {key: sum(day[key] for day in totals.values()) for key in ('syncs', 'successes', 'failures')}
+    return {
+        'school_id': school.id,
+        'since': since,
+        **rates(overall),
+        'days': [{'date': date, **rates(totals[date])} for date in sorted(totals, reverse=True)],
+    }
@@ -0,0 +1,23 @@
+"""
+Change-log tombstones for roster deletes
+Saves are logged in Person.save() and Student.save().
+"""
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from backend.people.models import Person, Student
+from backend.sync.changelog import record
+
+
+@receiver(pre_delete, sender=Student)
+def student_deleting(sender, instance, **kwargs):
+    # Deleting the person cascades to the student, so resolve the school first
+    instance._school_id = Person.objects.filter(pk=instance.person_id).values_list('school_id', flat=True).first()
+
+
+@receiver(post_delete, sender=Student)
+def student_tombstone(sender, instance, origin=None, **kwargs):
+    from backend.core.models import School
+    if isinstance(origin, School) or getattr(origin, 'model', None) is School:
+        return
+    record(getattr(instance, '_school_id', None), 'student', [instance.pk], deleted=True)
@@ -0,0 +1,227 @@
+"""
+Bootstrap snapshots for new devices
+One gzipped JSON file per school with its roster, classes, subjects, active
+term and recent sessions, plus the delta-sync cursor to continue from.
+Files are named after their content hash. When the change log has advanced,
+the previous snapshot is patched with the logged changes instead of being
+rebuilt from scratch. Files hold whole rosters, so they are kept outside
+MEDIA_ROOT and downloaded through the authenticated sync API; superseded
+files stay for GRACE_SECONDS so downloads already under way can finish.
+"""
+import gzip
+import hashlib
+import json
+import re
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from backend.core.models import Class, Subject, Term
+from backend.sync.changelog import current_seq
+from backend.sync.delta import STREAMS, CursorExpired, decode_cursor, encode_cursor, log_page
+from backend.sync.models import SchoolSnapshot
+
+FORMAT = 1
+
+DEFAULTS = {
+    'SESSION_DAYS': 14,       # sessions (and their attendance) from this many days back
+    'LOCATION': None,         # filesystem directory for the files (None: default storage)
+    'DIRECTORY': 'snapshots', # under LOCATION
+    'LOG_PAGE': 5000,         # change-log entries read per query when patching
+    'GRACE_SECONDS': 3600,    # superseded files are kept this long
+}
+
+ETAG = re.compile(r'^[0-9a-f]{64}$')
+
+
+def snapshot_settings():
+    return {**DEFAULTS, **getattr(settings, 'SYNC_SNAPSHOT', {})}
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def snapshot_storage():
+    """Storage holding snapshot files; keep it out of any public URL space"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            location = snapshot_settings()['LOCATION']
+            _storage = FileSystemStorage(location=location) if location else default_storage
+    return _storage
+
+
+class SnapshotBuilder:
+    """Builds and stores the bootstrap snapshot of one school
+    
+    Rows use the same fields as the delta pull streams, so a device loads
+    the snapshot with the code it uses for pulls and then continues from
+    the snapshot's cursor.
+    """
+    
+    def __init__(self, school, **overrides):
+        config = snapshot_settings()
+        config.update({k.upper(): v for k, v in overrides.items() if v is not None})
+        self.school = school
+        self.session_days = config['SESSION_DAYS']
+        self.directory = config['DIRECTORY']
+        self.log_page = config['LOG_PAGE']
+        self.grace = config['GRACE_SECONDS']
+        self.storage = snapshot_storage()
+        self.cutoff = (timezone.now().date() - timedelta(days=self.session_days)).isoformat()
+    
+    def reference_data(self):
+        """School, term, classes and subjects; small, so always read fresh"""
+        school = self.school
+        return {
+            'format': FORMAT,
+            'session_days': self.session_days,
+            'school': {'id': school.id, 'name': school.name, 'code': school.code},
+            'term': Term.objects.filter(school=school, is_active=True).values(
+                'id', 'year', 'term', 'start_date', 'end_date'
+            ).first(),
+            'classes': list(Class.objects.filter(school=school).order_by('id').values(
+                'id', 'name', 'level', 'stream', 'form_teacher_id'
+            )),
+            'subjects': list(Subject.objects.filter(school=school).order_by('id').values(
+                'id', 'name', 'code', 'is_compulsory'
+            )),
+        }
+    
+    def stream_queryset(self, stream):
+        qs = stream.queryset().filter(**{stream.school_lookup: self.school.id})
+        if stream.name == 'sessions':
+            qs = qs.filter(date__gte=self.cutoff)
+        elif stream.name == 'attendance':
+            qs = qs.filter(session__date__gte=self.cutoff)
+        elif stream.name == 'exceptions':
+            qs = qs.filter(end_date__gte=self.cutoff)
+        return qs.order_by('id')
+    
+    def full(self):
+        """Read every stream; returns (seq, rows by stream name)"""
+        # Read the position first: writes racing the reads are replayed
+        # by the device's first delta pull, and upserts are idempotent.
+        seq = current_seq(self.school.id)
+        return seq, {stream.name: list(self.stream_queryset(stream).values(*stream.fields)) for stream in STREAMS}
+    
+    def patch(self, previous, seq):
+        """Apply change-log entries after seq to a previous snapshot
+        
+        Raises:
+            CursorExpired: The log was compacted past seq
+        
+        Returns:
+            (seq, rows by stream name)
+        """
+        rows = {stream.name: {row['id']: row for row in previous[stream.name]} for stream in STREAMS}
+        while True:
+            page = log_page(self.school, seq, self.log_page)
+            for stream in STREAMS:
+                stream_rows = rows[stream.name]
+                for row in page[stream.name]:
+                    stream_rows[row['id']] = row
+                for pk in page['deleted'][stream.name]:
+                    stream_rows.pop(pk, None)
+            seq = decode_cursor(page['next_cursor'])[0]
+            if not page['has_more']:
+                break
+        
+        # Re-apply the window: dates are ISO strings or date objects here,
+        # and both compare correctly once stringified.
+        rows['sessions'] = {pk: row for pk, row in rows['sessions'].items() if str(row['date']) >= self.cutoff}
+        rows['attendance'] = {pk: row for pk, row in rows['attendance'].items() if row['session_id'] in rows['sessions']}
+        rows['exceptions'] = {pk: row for pk, row in rows['exceptions'].items() if str(row['end_date']) >= self.cutoff}
+        return seq, {name: [stream_rows[pk] for pk in sorted(stream_rows)] for name, stream_rows in rows.items()}
+    
+    def load(self, snapshot):
+        """Content of a stored snapshot, or None if unusable for patching"""
+        try:
+            with self.storage.open(snapshot.path) as handle:
+                content = json.loads(gzip.decompress(handle.read()))
+        except (OSError, ValueError):
+            return None
+        if content.get('format') != FORMAT or content.get('session_days') != self.session_days:
+            return None
+        return content
+    
+    @staticmethod
+    def serialize(content):
+        """(gzipped bytes, etag); identical content gives identical bytes"""
+        raw = json.dumps(content, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':')).encode()
+        return gzip.compress(raw, mtime=0), hashlib.sha256(raw).hexdigest()
+    
+    def path(self, etag):
+        """Storage path of the school's file with this etag, or None for a malformed etag"""
+        return f'{self.directory}/{self.school.id}/{etag}.json.gz' if ETAG.match(etag or '') else None
+    
+    def prune(self, current):
+        """Delete superseded files of the school once GRACE_SECONDS have passed
+        
+        A file stops being current when a newer one is written, so the
+        oldest newer file's modification time is when it was superseded.
+        
+        Returns:
+            List of deleted paths
+        """
+        directory = f'{self.directory}/{self.school.id}'
+        try:
+            _, names = self.storage.listdir(directory)
+        except FileNotFoundError:
+            return []
+        modified = {f'{directory}/{name}': self.storage.get_modified_time(f'{directory}/{name}') for name in names}
+        now = timezone.now()
+        deleted = []
+        for path, written in modified.items():
+            superseded = min((other for other in modified.values() if other > written), default=now)
+            if path != current and now - superseded > timedelta(seconds=self.grace):
+                self.storage.delete(path)
+                deleted.append(path)
+        return deleted
+    
+    def build(self, full=False):
+        """Bring the school's snapshot up to date with the change log
+        
+        Args:
+            full: Rebuild from the tables even if patching is possible
+        
+        Returns:
+            Tuple of (SchoolSnapshot, mode) where mode is unchanged, patched or full
+        """
+        snapshot = SchoolSnapshot.objects.filter(school=self.school).first()
+        if (snapshot and not full and snapshot.seq == current_seq(self.school.id)
+                and self.storage.exists(snapshot.path)):
+            self.prune(snapshot.path)
+            return snapshot, 'unchanged'
+        
+        rows = None
+        previous = self.load(snapshot) if snapshot and not full else None
+        if previous is not None:
+            try:
+                seq, rows = self.patch(previous, snapshot.seq)
+                mode = 'patched'
+            except CursorExpired:
+                rows = None
+        if rows is None:
+            seq, rows = self.full()
+            mode = 'full'
+        
+        content = {**self.reference_data(), **rows, 'seq': seq, 'cursor': encode_cursor(seq)}
+        data, etag = self.serialize(content)
+        path = self.path(etag)
+        if not self.storage.exists(path):
+            path = self.storage.save(path, ContentFile(data))
+        
+        snapshot, _ = SchoolSnapshot.objects.update_or_create(
+            school=self.school,
+            defaults={'seq': seq, 'etag': etag, 'path': path, 'size': len(data)},
+        )
+        # The previous file stays until downloads started on it are done
+        self.prune(path)
+        return snapshot, mode
@@ -0,0 +1,487 @@
+"""
+Sync tests
+
+    python manage.py test backend/sync
+"""
+import atexit
+import gzip
+import json
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.attendance.models import Attendance, AttendanceException, AttendanceSession
+from backend.attendance.services import BulkMarkingEngine
+from backend.core.benchmarking import seed_school
+from backend.core.sharding import shard_for, use_shard
+from backend.core.tenant_context import TenantContext, school_cache
+from backend.sync.engine import SyncEngine
+from backend.sync.handlers import SyncContext
+from backend.sync.models import ChangeLog, SyncLog, SyncLogDaily, SyncQueue
+from backend.sync import admission, snapshots
+from backend.sync.admission import AdmissionController
+from backend.sync.queue import QueueDrainer
+from backend.sync.snapshots import SnapshotBuilder
+from backend.users.auth import AuthService
+from backend.users.models import User
+
+
+class SyncTestCase(TestCase):
+    """A seeded school and API clients for its people"""
+    databases = '__all__'
+    students = 2
+    teachers = 2
+    
+    def setUp(self):
+        self.seeded = seed_school(students=self.students, teachers=self.teachers)
+        self.school = self.seeded['school']
+        # Unpinned creates go to default; act as a request of this school would
+        self.shard = shard_for(self.school.id)
+        self.enterContext(use_shard(self.shard))
+        self.klass = self.seeded['classes'][0]
+        self.teacher = self.seeded['teachers'][0]
+        self.student = self.seeded['students'][0]
+        self.today = timezone.now().date()
+    
+    def client_for(self, person=None):
+        person = person or self.teacher.person
+        user, _ = User.objects.get_or_create(username=f'user-{person.id}', school=self.school, person=person)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+
+class PushTests(SyncTestCase):
+    """sync/push applies change batches for teachers of the school"""
+    URL = '/api/v1/sync/push/'
+    
+    def push(self, changes, person=None):
+        return self.client_for(person).post(self.URL, {'changes': changes}, format='json')
+    
+    def session_change(self, action='create', record_id='dev-s1', **payload):
+        payload.setdefault('class_id', self.klass.id)
+        payload.setdefault('date', str(self.today))
+        return {'data_type': 'session', 'action': action, 'record_id': record_id, 'payload': payload}
+    
+    def exception_change(self, action='create', record_id='dev-e1', **payload):
+        return {'data_type': 'exception', 'action': action, 'record_id': record_id, 'payload': {
+            'student_id': self.student.id, 'category': 'medical', 'reason': 'Clinic visit',
+            'start_date': str(self.today), 'end_date': str(self.today), **payload,
+        }}
+    
+    def test_session_and_marks_are_applied_in_one_batch(self):
+        response = self.push([
+            {'data_type': 'attendance', 'action': 'create', 'record_id': 'dev-a1', 'payload': {
+                'session_local_id': 'dev-s1', 'student_id': self.student.id, 'status': 'P', 'local_id': 'dev-a1',
+            }},
+            self.session_change(local_id='dev-s1'),
+        ])
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['result'] for r in response.data['results']], ['created', 'created'])
+        session = AttendanceSession.objects.get(local_id='dev-s1')
+        self.assertEqual(session.teacher_id, self.teacher.id)
+        record = Attendance.objects.get(local_id='dev-a1')
+        self.assertEqual((record.session_id, record.marked_by_id), (session.id, self.teacher.id))
+        self.assertEqual(SyncLog.objects.get(id=response.data['sync_log_id']).records_count, 2)
+        
+        replay = self.push([self.session_change(local_id='dev-s1')])
+        self.assertEqual(replay.data['results'][0]['result'], 'unchanged')
+    
+    def test_context_comes_from_token_claims(self):
+        user = User.objects.create(username='sync-teacher', school=self.school, person=self.teacher.person)
+        access = AuthService.create_token(user).access_token
+        claimed = AuthService.verify_token(AccessToken(str(access)))
+        school_cache().get(self.school.id)
+        
+        with self.assertNumQueries(0):
+            context = SyncContext(claimed, TenantContext.for_user(claimed))
+        self.assertEqual((context.school, context.teacher_id), (self.school, self.teacher.id))
+        
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(self.URL, {'changes': [self.session_change(local_id='dev-s1')]}, format='json')
+        
+        self.assertEqual(response.data['results'][0]['result'], 'created')
+        reads = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+        for table in ('"users_user"', '"core_school"', '"people_person"', '"people_teacher"'):
+            self.assertFalse([sql for sql in reads if f'FROM {table}' in sql], f'push read {table}')
+    
+    def test_students_cannot_push(self):
+        session = AttendanceSession.objects.create(school=self.school, klass=self.klass, date=self.today)
+        
+        response = self.push([
+            self.session_change(action='delete', record_id=str(session.id)),
+            {'data_type': 'attendance', 'action': 'create', 'record_id': 'dev-a1', 'payload': {
+                'session_id': session.id, 'student_id': self.student.id, 'status': 'P',
+            }},
+        ], person=self.student.person)
+        
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(AttendanceSession.objects.filter(id=session.id).exists())
+        self.assertFalse(Attendance.objects.exists())
+    
+    def test_handlers_refuse_roles_without_the_permission(self):
+        # A teacher profile on a person whose role lacks mark_attendance
+        person = self.teacher.person
+        person.role = 'staff'
+        person.save()
+        
+        response = self.push([self.session_change(), self.exception_change()])
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['error'] for r in response.data['results']], [
+            'Not allowed to create session records', 'Not allowed to create exception records',
+        ])
+        self.assertFalse(AttendanceSession.objects.exists())
+        self.assertFalse(AttendanceException.objects.exists())
+    
+    def test_pushed_exceptions_await_approval(self):
+        approved = AttendanceException.objects.create(
+            student=self.student, category='family', reason='Wedding', approved_by=self.teacher,
+            start_date=self.today - timezone.timedelta(days=3), end_date=self.today - timezone.timedelta(days=2),
+        )
+        
+        response = self.push([
+            self.exception_change(),
+            self.exception_change(action='update', record_id=str(approved.id), reason='Changed'),
+            self.exception_change(action='delete', record_id=str(approved.id)),
+        ])
+        
+        self.assertEqual([r['result'] for r in response.data['results']], ['created', 'error', 'error'])
+        self.assertEqual(response.data['results'][1]['error'], 'Exception already approved')
+        created = AttendanceException.objects.get(id=response.data['results'][0]['id'])
+        self.assertIsNone(created.approved_by_id)
+        approved.refresh_from_db()
+        self.assertEqual(approved.reason, 'Wedding')
+        
+        deleted = self.push([self.exception_change(action='delete', record_id=str(created.id))])
+        self.assertEqual(deleted.data['results'][0]['result'], 'deleted')
+        self.assertFalse(AttendanceException.objects.filter(id=created.id).exists())
+    
+    def test_session_teacher_must_belong_to_the_school(self):
+        session = AttendanceSession.objects.create(
+            school=self.school, klass=self.klass, date=self.today, teacher=self.teacher,
+        )
+        other_teacher = seed_school(prefix='OTHER')['teachers'][0]
+        colleague = self.seeded['teachers'][1]
+        
+        response = self.push([
+            self.session_change(action='update', record_id=str(session.id), teacher_id='abc'),
+            self.session_change(action='update', record_id=str(session.id), teacher_id=other_teacher.id),
+            self.session_change(action='update', record_id=str(session.id), teacher_id=999999),
+            self.session_change(action='update', record_id=str(session.id), teacher_id=colleague.id),
+        ])
+        
+        self.assertEqual([r.get('error') for r in response.data['results']], [
+            'Invalid teacher_id', 'Teacher not found in this school', 'Teacher not found in this school', None,
+        ])
+        session.refresh_from_db()
+        self.assertEqual(session.teacher_id, colleague.id)
+
+
+class AdmissionTests(SyncTestCase):
+    """Sync endpoints over the concurrency limit are turned away with 429"""
+    URL = '/api/v1/sync/push/'
+    
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.controller = AdmissionController(directory=directory.name, global_limit=2, school_limit=1)
+        # Its counters would be flushed at exit, into the removed directory
+        self.addCleanup(atexit.unregister, self.controller.metrics.flush)
+        self.addCleanup(setattr, admission, '_controller', admission._controller)
+        admission._controller = self.controller
+        self.changes = {'changes': [{'data_type': 'session', 'action': 'create', 'record_id': 'dev-s1', 'payload': {
+            'class_id': self.klass.id, 'date': str(self.today), 'local_id': 'dev-s1',
+        }}]}
+    
+    def push(self):
+        return self.client_for().post(self.URL, self.changes, format='json')
+    
+    def test_busy_school_gets_a_retry_hint(self):
+        slots = self.controller.admit(self.school.id, 'push')
+        
+        busy = self.push()
+        
+        self.assertEqual(busy.status_code, 429)
+        self.assertEqual(busy.data['scope'], 'school')
+        self.assertGreaterEqual(busy.data['retry_after_ms'], 1000)
+        self.assertEqual(busy['Retry-After'], str(-(-busy.data['retry_after_ms'] // 1000)))
+        self.assertEqual(self.client_for().get('/api/v1/sync/state/').status_code, 200)
+        
+        AdmissionController.release(slots)
+        self.assertEqual(self.push().status_code, 200)
+        self.assertEqual(self.controller.held(), {})
+    
+    def test_slots_are_released_when_the_action_raises(self):
+        client = self.client_for()
+        client.raise_request_exception = False
+        with mock.patch.object(SyncEngine, 'sync_from_client', side_effect=RuntimeError('boom')):
+            self.assertEqual(client.post(self.URL, self.changes, format='json').status_code, 500)
+        
+        self.assertEqual(self.controller.held(), {})
+        self.assertEqual(self.push().status_code, 200)
+
+
+class SnapshotTests(SyncTestCase):
+    """sync/snapshot hands out files only the school's members can download"""
+    URL = '/api/v1/sync/snapshot/'
+    
+    def setUp(self):
+        super().setUp()
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        settings = override_settings(SYNC_SNAPSHOT={'LOCATION': location.name})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # The storage is built once per process from the settings
+        snapshots._storage = None
+        self.addCleanup(setattr, snapshots, '_storage', None)
+    
+    def download(self, etag, client=None):
+        return (client or self.client_for()).get(f'{self.URL}download/', {'etag': etag})
+    
+    def content(self, response):
+        return json.loads(gzip.decompress(b''.join(response.streaming_content)))
+    
+    def test_members_download_the_school_file(self):
+        response = self.client_for().get(self.URL)
+        etag = response.data['etag']
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['url'].endswith(f'/api/v1/sync/snapshot/download/?etag={etag}'))
+        self.assertEqual(self.client_for().get(self.URL, HTTP_IF_NONE_MATCH=f'"{etag}"').status_code, 304)
+        download = self.download(etag)
+        self.assertEqual((download.status_code, download['Content-Encoding']), (200, 'gzip'))
+        self.assertEqual(len(self.content(download)['students']), self.students)
+        
+        outsider = seed_school(prefix='OTHER')['teachers'][0].person
+        outsider_client = APIClient()
+        outsider_client.force_authenticate(User.objects.create(username='outsider', school_id=outsider.school_id, person=outsider))
+        self.assertEqual(self.download(etag, client=outsider_client).status_code, 404)
+        self.assertEqual(self.download('../../settings').status_code, 404)
+        self.assertEqual(APIClient().get(f'{self.URL}download/', {'etag': etag}).status_code, 401)
+    
+    def test_superseded_files_stay_for_the_grace_period(self):
+        first, _ = SnapshotBuilder(self.school).build()
+        AttendanceSession.objects.create(school=self.school, klass=self.klass, date=self.today)
+        
+        second, mode = SnapshotBuilder(self.school).build()
+        
+        self.assertEqual(mode, 'patched')
+        self.assertNotEqual(first.etag, second.etag)
+        self.assertEqual(len(self.content(self.download(second.etag))['sessions']), 1)
+        self.assertEqual(self.download(first.etag).status_code, 200)
+        
+        SnapshotBuilder(self.school, grace_seconds=0).build()
+        self.assertEqual(self.download(first.etag).status_code, 404)
+        self.assertEqual(self.download(second.etag).status_code, 200)
+
+
+class DeltaPullTests(SyncTestCase):
+    """sync/changes pages every stream by keyset behind one cursor"""
+    URL = '/api/v1/sync/changes/'
+    students = 5
+    
+    def pull(self, **params):
+        response = self.client_for().get(self.URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+    
+    def test_pages_until_caught_up_then_only_sends_changes(self):
+        seed_school(students=3, prefix='OTHER')
+        session = AttendanceSession.objects.create(school=self.school, klass=self.klass, date=self.today)
+        BulkMarkingEngine(session).mark([{'student_id': s.id, 'status': 'P'} for s in self.seeded['students']])
+        
+        first = self.pull(limit=3)
+        second = self.pull(limit=3, cursor=first['next_cursor'])
+        
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual(
+            sorted(row['id'] for row in first['attendance'] + second['attendance']),
+            sorted(session.attendances.values_list('id', flat=True)),
+        )
+        self.assertEqual(len(first['students']) + len(second['students']), 5)
+        
+        BulkMarkingEngine(session).mark([{'student_id': self.student.id, 'status': 'A'}])
+        third = self.pull(cursor=second['next_cursor'])
+        
+        self.assertEqual([row['status'] for row in third['attendance']], ['A'])
+        # The counter update bumps the session, so its new counts are pulled too
+        self.assertEqual([(row['id'], row['count_absent']) for row in third['sessions']], [(session.id, 1)])
+        self.assertEqual(third['students'], [])
+    
+    def test_unknown_cursor_is_rejected(self):
+        response = self.client_for().get(self.URL, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ChangeLogTests(DeltaPullTests):
+    """Pulls after a full download read the change log, tombstones included"""
+    
+    def caught_up(self):
+        cursor = None
+        while True:
+            page = self.pull(**({'cursor': cursor} if cursor else {}))
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                return cursor
+    
+    def test_deletes_are_pulled_as_tombstones(self):
+        session = AttendanceSession.objects.create(school=self.school, klass=self.klass, date=self.today)
+        BulkMarkingEngine(session).mark([{'student_id': s.id, 'status': 'P'} for s in self.seeded['students'][:2]])
+        record_id = session.attendances.get(student=self.student).id
+        cursor = self.caught_up()
+        
+        Attendance.objects.get(id=record_id).delete()
+        page = self.pull(cursor=cursor)
+        
+        self.assertEqual(page['deleted']['attendance'], [record_id])
+        self.assertEqual([row['count_present'] for row in page['sessions']], [1])
+        
+        session_id = session.id
+        session.delete()
+        page = self.pull(cursor=page['next_cursor'])
+        self.assertEqual(page['deleted']['sessions'], [session_id])
+    
+    def test_sessions_of_a_deleted_term_are_pulled_again(self):
+        term = self.school.terms.first()
+        session = AttendanceSession.objects.create(school=self.school, klass=self.klass, date=self.today, term=term)
+        cursor = self.caught_up()
+        
+        term.delete()
+        
+        page = self.pull(cursor=cursor)
+        self.assertEqual([(row['id'], row['term_id']) for row in page['sessions']], [(session.id, None)])
+    
+    def test_pushing_to_a_deleted_record_says_so(self):
+        session = AttendanceSession.objects.create(school=self.school, klass=self.klass, date=self.today)
+        session_id = session.id
+        session.delete()
+        
+        response = self.client_for().post('/api/v1/sync/push/', {'changes': [
+            {'data_type': 'session', 'action': 'update', 'record_id': str(session_id), 'payload': {'status': 'closed'}},
+            {'data_type': 'session', 'action': 'update', 'record_id': '999999', 'payload': {'status': 'closed'}},
+        ]}, format='json')
+        
+        self.assertEqual([r['error'] for r in response.data['results']], ['Deleted on server', 'Session not found'])
+    
+    def test_cursors_older_than_compacted_tombstones_expire(self):
+        session = AttendanceSession.objects.create(school=self.school, klass=self.klass, date=self.today)
+        cursor = self.caught_up()
+        session.delete()
+        ChangeLog.objects.filter(deleted=True).update(created_at=timezone.now() - timezone.timedelta(days=100))
+        
+        call_command('compact_change_log', stdout=StringIO())
+        
+        response = self.client_for().get(self.URL, {'cursor': cursor})
+        self.assertEqual(response.status_code, 410)
+
+
+class DeviceStateTests(SyncTestCase):
+    """Each X-Device-Id keeps its own pull cursor and lag"""
+    URL = '/api/v1/sync/changes/'
+    students = 5
+    
+    def pull(self, device, **params):
+        response = self.client_for().get(self.URL, params, HTTP_X_DEVICE_ID=device)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+    
+    def test_devices_resume_from_their_own_cursor(self):
+        session = AttendanceSession.objects.create(school=self.school, klass=self.klass, date=self.today)
+        BulkMarkingEngine(session).mark([{'student_id': s.id, 'status': 'P'} for s in self.seeded['students']])
+        first = self.pull('phone', limit=3)
+        second = self.pull('phone', limit=3, cursor=first['next_cursor'])
+        self.pull('tablet', limit=3)
+        
+        # The phone's response was lost: resuming re-sends that page
+        resumed = self.pull('phone', limit=3)
+        
+        self.assertEqual(resumed['attendance'], second['attendance'])
+        self.assertEqual(len(self.pull('tablet', cursor='', limit=500)['attendance']), 5)
+        phone = self.client_for().get('/api/v1/sync/state/', HTTP_X_DEVICE_ID='phone').data['device']
+        self.assertEqual((phone['cursor'], phone['lag']), (first['next_cursor'], 0))
+        
+        admin = User.objects.create(username='admin', school=self.school, is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        devices = client.get('/api/v1/sync/devices/').data['devices']
+        self.assertEqual([(d['device_id'], d['lag'] > 0) for d in devices], [('tablet', True), ('phone', False)])
+
+
+class RetentionTests(SyncTestCase):
+    """prune_sync_logs folds old SyncLog rows into daily aggregates"""
+    
+    def log(self, user, status, days_ago, records=1):
+        started = timezone.now() - timezone.timedelta(days=days_ago)
+        log = SyncLog.objects.create(user=user, data_type='batch', status=status, records_count=records)
+        SyncLog.objects.filter(id=log.id).update(started_at=started, completed_at=started)
+        return log
+    
+    def test_old_rows_survive_as_daily_totals(self):
+        teacher = User.objects.create(username='teacher', school=self.school, person=self.teacher.person)
+        for status in ('success', 'error', 'success'):
+            self.log(teacher, status, days_ago=40, records=3)
+        self.log(teacher, 'error', days_ago=35)
+        recent = self.log(teacher, 'error', days_ago=1)
+        
+        call_command('prune_sync_logs', '--chunk-size', '2', stdout=StringIO())
+        
+        self.assertEqual(list(SyncLog.objects.values_list('id', flat=True)), [recent.id])
+        self.assertEqual(
+            sorted(SyncLogDaily.objects.values_list('syncs', 'successes', 'failures', 'records_count')),
+            [(1, 0, 1, 1), (3, 2, 1, 9)],
+        )
+        # The last success is only left in the aggregates now
+        self.assertIsNotNone(SyncEngine.get_sync_state(teacher)['last_sync'])
+        
+        admin = User.objects.create(username='admin', school=self.school, is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        stats = client.get('/api/v1/sync/stats/', {'days': 60}).data
+        self.assertEqual((stats['syncs'], stats['successes'], stats['failures']), (5, 2, 3))
+        self.assertEqual(len(stats['days']), 3)
+        self.assertEqual(self.client_for(self.student.person).get('/api/v1/sync/stats/').status_code, 403)
+
+
+class QueueDrainTests(SyncTestCase):
+    """QueueDrainer applies queued changes with the same rules as a push"""
+    
+    def user(self, person):
+        user, _ = User.objects.get_or_create(username=f'user-{person.id}', school=self.school, person=person)
+        return user
+    
+    def test_drains_in_batches_and_retries_failures(self):
+        teacher, student = self.user(self.teacher.person), self.user(self.student.person)
+        for day in range(3):
+            date = str(self.today - timezone.timedelta(days=day))
+            SyncEngine.enqueue_change(teacher, 'create', 'session', f'dev-s{day}', {
+                'class_id': self.klass.id, 'date': date, 'local_id': f'dev-s{day}',
+            })
+        # Students lack mark_attendance, so their queued writes keep failing
+        SyncEngine.enqueue_change(student, 'create', 'session', 'dev-x', {
+            'class_id': self.klass.id, 'date': str(self.today), 'local_id': 'dev-x',
+        })
+        
+        drainer = QueueDrainer(batch_size=2, max_attempts=2)
+        stats = drainer.drain(until_empty=True)
+        
+        self.assertEqual((stats.synced, stats.failed), (3, 2))
+        self.assertEqual(drainer.depth(), 0)
+        self.assertEqual(set(AttendanceSession.objects.values_list('local_id', flat=True)), {'dev-s0', 'dev-s1', 'dev-s2'})
+        failed = SyncQueue.objects.get(record_id='dev-x')
+        self.assertEqual((failed.synced, failed.attempts), (False, 2))
+        self.assertEqual(failed.last_error, 'Not allowed to create session records')
@@ -0,0 +1,278 @@
+"""
+Compact columnar wire format for attendance sync
+Each session's records travel as columns: delta-encoded student ids, one
+status byte per record and sparse remarks, instead of one JSON object per
+record. Bodies may be framed with gzip or zstd via Content-Encoding.
+
+Layout (integers are LEB128 varints, signed ones zigzag encoded):
+
+    body    := MAGIC count:uint session*
+    session := header_len:uint header:json-utf8 n:uint flags:byte
+               id_delta:sint * n           ascending ids give 1-byte deltas
+               statuses:byte * n           ASCII status codes
+               remarks:sparse
+               [local_ids:sparse]          if flags & HAS_LOCAL_IDS
+               [version_delta:sint * n]    if flags & HAS_VERSIONS (HLC)
+    sparse  := count:uint (index_gap:uint len:uint utf8-bytes)*
+
+The session header carries the non-record fields of an ingest entry
+(session_id, or class_id, date, subject_id and local_id).
+"""
+import gzip
+import io
+import json
+import zlib
+
+MAGIC = b'SOC1'
+MEDIA_TYPE = 'application/vnd.schoolos.attendance+columnar'
+HAS_LOCAL_IDS = 1
+HAS_VERSIONS = 2
+MAX_DECODED_BYTES = 32 * 1024 * 1024  # refuse bodies that inflate beyond this
+
+
+class WireError(ValueError):
+    """Raised for bodies that are not valid columnar payloads"""
+
+
+try:
+    import zstandard
+except ImportError:  # zstd framing is optional
+    zstandard = None
+
+ENCODINGS = ('identity', 'gzip') + (('zstd',) if zstandard else ())
+CODEC_ERRORS = (zlib.error, EOFError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+class AttendanceColumns:
+    """One session's records held as columns
+    
+    Stands in for a list of record dicts wherever BulkMarkingEngine and
+    SyncIngest accept records, without materialising a dict per record.
+    """
+    __slots__ = ('student_ids', 'statuses', 'remarks', 'local_ids', 'versions')
+    
+    def __init__(self, student_ids, statuses, remarks=None, local_ids=None, versions=None):
+        self.student_ids = student_ids
+        self.statuses = statuses
+        self.remarks = remarks or {}
+        self.local_ids = local_ids or {}
+        self.versions = versions
+    
+    def __len__(self):
+        return len(self.student_ids)
+    
+    def rows(self):
+        """(student_id, status, remarks, local_id, version) per record; version may be None"""
+        remarks, local_ids = self.remarks, self.local_ids
+        versions = self.versions or [None] * len(self.student_ids)
+        for index, (student_id, status, version) in enumerate(zip(self.student_ids, self.statuses, versions)):
+            yield student_id, status, remarks.get(index, ''), local_ids.get(index), version
+    
+    def take(self, indexes):
+        """Columns for a subset of records, in the given order"""
+        positions = {old: new for new, old in enumerate(indexes)}
+        return AttendanceColumns(
+            [self.student_ids[i] for i in indexes],
+            ''.join(self.statuses[i] for i in indexes),
+            {positions[i]: text for i, text in self.remarks.items() if i in positions},
+            {positions[i]: text for i, text in self.local_ids.items() if i in positions},
+            [self.versions[i] for i in indexes] if self.versions is not None else None,
+        )
+    
+    @classmethod
+    def from_records(cls, records):
+        """Columns from record dicts (the client side of the format)"""
+        records = sorted(records, key=lambda r: int(r['student_id']))
+        versions = [r.get('hlc') for r in records]
+        return cls(
+            [int(r['student_id']) for r in records],
+            ''.join(r['status'] for r in records),
+            {i: r['remarks'] for i, r in enumerate(records) if r.get('remarks')},
+            {i: str(r['local_id']) for i, r in enumerate(records) if r.get('local_id')},
+            [int(v) for v in versions] if all(v is not None for v in versions) else None,
+        )
+
+
+def _uint(value, out):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _sint(value, out):
+    _uint((value << 1) ^ (value >> 63), out)
+
+
+def _sparse(values, out):
+    _uint(len(values), out)
+    previous = 0
+    for index in sorted(values):
+        data = values[index].encode()
+        _uint(index - previous, out)
+        _uint(len(data), out)
+        out += data
+        previous = index
+
+
+def encode(sessions, encoding='identity'):
+    """Encode ingest entries whose records are dicts or AttendanceColumns
+    
+    Args:
+        sessions: List of SyncIngest entries
+        encoding: identity, gzip or zstd framing
+    
+    Returns:
+        bytes
+    """
+    out = bytearray(MAGIC)
+    _uint(len(sessions), out)
+    for entry in sessions:
+        columns = entry.get('records') or []
+        if not isinstance(columns, AttendanceColumns):
+            columns = AttendanceColumns.from_records(columns)
+        header = json.dumps({k: v for k, v in entry.items() if k != 'records'}, separators=(',', ':')).encode()
+        _uint(len(header), out)
+        out += header
+        _uint(len(columns), out)
+        out.append((HAS_LOCAL_IDS if columns.local_ids else 0) | (HAS_VERSIONS if columns.versions is not None else 0))
+        previous = 0
+        for student_id in columns.student_ids:
+            _sint(student_id - previous, out)
+            previous = student_id
+        out += columns.statuses.encode('ascii')
+        _sparse(columns.remarks, out)
+        if columns.local_ids:
+            _sparse(columns.local_ids, out)
+        if columns.versions is not None:
+            previous = 0
+            for version in columns.versions:
+                _sint(version - previous, out)
+                previous = version
+    return frame(bytes(out), encoding)
+
+
+def frame(data, encoding):
+    if encoding in (None, '', 'identity'):
+        return data
+    if encoding == 'gzip':
+        return gzip.compress(data, mtime=0)
+    if encoding == 'zstd' and zstandard:
+        return zstandard.ZstdCompressor().compress(data)
+    raise WireError(f'Unsupported Content-Encoding "{encoding}"')
+
+
+def unframe(data, encoding):
+    """Undo Content-Encoding framing, refusing oversized output"""
+    if encoding in (None, '', 'identity'):
+        return data
+    try:
+        if encoding == 'gzip':
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            data = inflater.decompress(data, MAX_DECODED_BYTES + 1)
+            if not inflater.eof and len(data) <= MAX_DECODED_BYTES:
+                raise WireError('Truncated gzip body')
+        elif encoding == 'zstd' and zstandard:
+            with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)) as reader:
+                data = reader.read(MAX_DECODED_BYTES + 1)
+        else:
+            raise WireError(f'Unsupported Content-Encoding "{encoding}"')
+    except CODEC_ERRORS as e:
+        raise WireError(f'Corrupt {encoding} body: {e}')
+    if len(data) > MAX_DECODED_BYTES:
+        raise WireError('Decoded body is too large')
+    return data
+
+
+class _Reader:
+    __slots__ = ('data', 'pos')
+    
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.pos = pos
+    
+    def uint(self):
+        data, pos = self.data, self.pos
+        result = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                self.pos = pos
+                return result
+            shift += 7
+    
+    def deltas(self, n):
+        """n zigzag deltas, accumulated into absolute values"""
+        data, pos = self.data, self.pos
+        values = []
+        append = values.append
+        current = 0
+        for _ in range(n):
+            result = shift = 0
+            while True:
+                byte = data[pos]
+                pos += 1
+                result |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            current += (result >> 1) ^ -(result & 1)
+            append(current)
+        self.pos = pos
+        return values
+    
+    def take(self, n):
+        if self.pos + n > len(self.data):
+            raise IndexError('truncated')
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+    
+    def sparse(self, n):
+        values = {}
+        index = 0
+        for _ in range(self.uint()):
+            index += self.uint()
+            if index >= n:
+                raise WireError('Sparse index out of range')
+            values[index] = self.take(self.uint()).decode()
+        return values
+
+
+def decode(data, encoding=None):
+    """Decode a columnar body into SyncIngest entries
+    
+    Returns:
+        List of entry dicts whose records are AttendanceColumns
+    
+    Raises:
+        WireError: The body is malformed
+    """
+    data = unframe(data, encoding)
+    if data[:len(MAGIC)] != MAGIC:
+        raise WireError('Not a columnar attendance body')
+    reader = _Reader(data, len(MAGIC))
+    sessions = []
+    try:
+        for _ in range(reader.uint()):
+            entry = json.loads(reader.take(reader.uint()))
+            if not isinstance(entry, dict):
+                raise WireError('Session header must be an object')
+            n = reader.uint()
+            flags = reader.take(1)[0]
+            student_ids = reader.deltas(n)
+            statuses = reader.take(n).decode('ascii')
+            remarks = reader.sparse(n)
+            local_ids = reader.sparse(n) if flags & HAS_LOCAL_IDS else None
+            versions = reader.deltas(n) if flags & HAS_VERSIONS else None
+            entry['records'] = AttendanceColumns(student_ids, statuses, remarks, local_ids, versions)
+            sessions.append(entry)
+    except WireError:
+        raise
+    except (IndexError, UnicodeDecodeError, ValueError) as e:
+        raise WireError(f'Malformed columnar body: {e}')
+    if reader.pos != len(data):
+        raise WireError('Trailing bytes after the last session')
+    return sessions
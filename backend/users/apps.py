@@ -0,0 +1,13 @@
+"""
+App configuration for users app
+"""
+from django.apps import AppConfig
+
+
+class UsersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'backend.users'
+    label = 'users'
+
+    def ready(self):
+        from backend.users import signals  # noqa: F401
@@ -1,7 +1,130 @@
 """
 Authentication logic
-Phase 0: Skeleton JWT/Token based auth
+Login against users.User and claims-based JWTs: tokens carry the caller's
+school, role and person/teacher/student ids, so authenticating a request
+builds the user from the token instead of loading it. Each user has a
+token_version, bumped when a claim goes stale (password, role, school or
+staff changes); tokens carrying an older version are rejected. Versions
+are read through a short-TTL per-process cache, so steady-state requests
+make no authentication queries. Authenticating pins the request to the
+caller's school shard (backend.core.sharding).
+
+alogin_user is the async login used by the school_login view: password
+hashing, deliberately slow, runs on a bounded thread pool so the event
+loop keeps serving other requests. hashlib releases the GIL while
+hashing, so the pool uses every core.
 """
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.db.models import F
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend.core.capabilities import CAPABILITIES
+from backend.core.sharding import DIRECTORY, pin_school
+from backend.core.tenant_context import TenantContext
+from backend.users.models import ClaimsUser, User
+
+DEFAULTS = {
+    # Other workers honour a revoked token for up to this many seconds
+    'VERSION_TTL': 30,
+    'VERSION_CACHE_SIZE': 4096,
+    # Concurrent password hashes per process (None: one per CPU); more
+    # logins queue for a free thread instead of oversubscribing the CPU
+    'HASH_WORKERS': None,
+}
+
+# Claim name -> TenantContext field
+TENANT_CLAIMS = {
+    'school_id': 'school_id',
+    'person_id': 'person_id',
+    'role': 'person__role',
+    'teacher_id': 'person__teacher__id',
+    'student_id': 'person__student__id',
+}
+VERSION_CLAIM = 'ver'
+# [capability layout fingerprint, mask]
+CAPABILITIES_CLAIM = 'caps'
+
+
+def auth_settings():
+    return {**DEFAULTS, **getattr(settings, 'USER_AUTH', {})}
+
+
+class TokenVersionCache:
+    """Thread-safe LRU of (token_version, is_active) by user id"""
+    
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id):
+        """(token_version, is_active) of a user, or None if it does not exist"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._rows.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        
+        row = User.objects.using(DIRECTORY).filter(pk=user_id).values_list('token_version', 'is_active').first()
+        if row is not None:
+            with self._lock:
+                self._rows[user_id] = (row, now + self.ttl)
+                self._rows.move_to_end(user_id)
+                while len(self._rows) > self.maxsize:
+                    self._rows.popitem(last=False)
+        return row
+    
+    def invalidate(self, user_id):
+        with self._lock:
+            self._rows.pop(user_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+_token_versions = None
+_token_versions_lock = threading.Lock()
+
+
+def token_versions():
+    global _token_versions
+    with _token_versions_lock:
+        if _token_versions is None:
+            config = auth_settings()
+            _token_versions = TokenVersionCache(config['VERSION_CACHE_SIZE'], config['VERSION_TTL'])
+    return _token_versions
+
+
+_hashing_pool = None
+_hashing_pool_lock = threading.Lock()
+
+
+def hashing_pool():
+    """The process-wide pool that password hashes run on"""
+    global _hashing_pool
+    with _hashing_pool_lock:
+        if _hashing_pool is None:
+            workers = auth_settings()['HASH_WORKERS'] or os.cpu_count() or 1
+            _hashing_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _hashing_pool
 
 
 class AuthService:
@@ -9,15 +132,123 @@ class AuthService:
     
     @staticmethod
     def login_user(username, password):
-        """Authenticate user"""
-        pass
+        """Authenticate user
+        
+        Returns:
+            The active User with these credentials, or None
+        """
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            User().set_password(password)
+            return None
+        if not user.check_password(password) or not user.is_active:
+            return None
+        return user
+    
+    @staticmethod
+    async def alogin_user(username, password):
+        """Authenticate user without blocking the event loop
+        
+        Same result as login_user, with the hash run on hashing_pool().
+        Outdated hashes are not upgraded here: that would save the user
+        and revoke their tokens on every device.
+        
+        Returns:
+            The active User with these credentials, or None
+        """
+        loop = asyncio.get_running_loop()
+        user = await User.objects.filter(username=username).afirst()
+        if user is None:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            await loop.run_in_executor(hashing_pool(), make_password, password)
+            return None
+        valid = await loop.run_in_executor(hashing_pool(), check_password, password, user.password)
+        if not valid or not user.is_active:
+            return None
+        return user
+    
+    @staticmethod
+    def claims(user):
+        """Token claims of a user, read fresh in one query"""
+        row = TenantContext.row_for(user, 'token_version') or {}
+        claims = {name: row.get(field) for name, field in TENANT_CLAIMS.items()}
+        claims.update({
+            VERSION_CLAIM: row.get('token_version', 0),
+            CAPABILITIES_CLAIM: [CAPABILITIES.fingerprint, TenantContext(user, row).capabilities],
+            'username': user.username,
+            'is_staff': user.is_staff,
+            'is_superuser': user.is_superuser,
+        })
+        return claims
     
     @staticmethod
     def create_token(user):
-        """Generate auth token"""
-        pass
+        """Generate auth token
+        
+        Returns:
+            RefreshToken carrying the user's claims; its access_token
+            inherits them
+        """
+        refresh = RefreshToken.for_user(user)
+        for name, value in AuthService.claims(user).items():
+            refresh[name] = value
+        return refresh
     
     @staticmethod
     def verify_token(token):
-        """Verify auth token"""
-        pass
+        """Verify auth token
+        
+        Args:
+            token: Validated simplejwt token
+        
+        Returns:
+            ClaimsUser built from the token's claims
+        
+        Raises:
+            InvalidToken: The token predates claims-based tokens
+            AuthenticationFailed: The token was revoked or the user is gone or inactive
+        """
+        user_id = token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or VERSION_CLAIM not in token:
+            raise InvalidToken('Token carries no tenant claims; log in again')
+        # simplejwt stores the id as a string; cache and revoke by the real pk
+        user_id = User._meta.pk.to_python(user_id)
+        current = token_versions().get(user_id)
+        if current is None or not current[1]:
+            raise AuthenticationFailed('User not found or inactive', code='user_inactive')
+        if token[VERSION_CLAIM] != current[0]:
+            raise AuthenticationFailed('Token has been revoked; log in again', code='token_revoked')
+        
+        user = ClaimsUser(
+            id=user_id,
+            username=token.get('username', ''),
+            school_id=token.get('school_id'),
+            person_id=token.get('person_id'),
+            is_staff=token.get('is_staff', False),
+            is_superuser=token.get('is_superuser', False),
+            token_version=current[0],
+        )
+        user._state.adding = False
+        # Read by get_tenant, which then needs no query either
+        user.tenant_claims = {field: token.get(name) for name, field in TENANT_CLAIMS.items()}
+        fingerprint, mask = token.get(CAPABILITIES_CLAIM) or (None, None)
+        if fingerprint == CAPABILITIES.fingerprint:
+            user.tenant_claims['capabilities'] = mask
+        return user
+    
+    @staticmethod
+    def revoke_tokens(user_id):
+        """Invalidate every token issued to a user so far"""
+        User.objects.filter(pk=user_id).update(token_version=F('token_version') + 1)
+        token_versions().invalidate(user_id)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWT authentication that trusts the token's claims instead of loading the user"""
+    
+    def get_user(self, validated_token):
+        user = AuthService.verify_token(validated_token)
+        # The rest of the request reads and writes the caller's school shard
+        pin_school(user.school_id)
+        return user
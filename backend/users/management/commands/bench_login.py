@@ -0,0 +1,172 @@
+"""
+Measure login latency when a whole staff room logs in at once
+
+Seeds one school with --logins users and sends all their school_login
+requests together, in two deployments of the same view:
+  wsgi  --workers threads through Django's WSGI handler, as gunicorn's
+        sync workers (the Procfile ran two); each login holds its worker
+        for the whole password hash, and later requests queue behind it
+  asgi  every request in flight on one event loop through the ASGI
+        handler; hashes run on AuthService's hashing pool
+
+While the logins run, a cheap health request is sent every
+--probe-interval seconds to show how long other API traffic waits.
+Reports login and probe latency percentiles per mode. Logins are CPU
+bound, so their p95 mostly tracks core count; the probe latency is what
+moving login off the workers buys. Seeded users are committed (the WSGI
+threads use their own connections) and deleted afterwards.
+
+Usage:
+    python manage.py bench_login
+    python manage.py bench_login --logins 100 --workers 2 --output login.json
+    python manage.py bench_login --mode asgi --hash-workers 4
+"""
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+
+from backend.core.benchmarking import percentile
+from backend.core.models import School
+from backend.core.tenant_context import school_cache
+from backend.users.models import User
+
+LOGIN_URL = '/api/v1/auth/school-login/'
+PROBE_URL = '/health/'
+PASSWORD = 'bench-login-password'
+
+
+class Command(BaseCommand):
+    help = 'Compare school_login latency under WSGI workers and ASGI with concurrent logins'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=100, help='Concurrent logins')
+        parser.add_argument('--mode', choices=['both', 'wsgi', 'asgi'], default='both')
+        parser.add_argument('--workers', type=int, default=2, help='Sync workers in wsgi mode')
+        parser.add_argument('--hash-workers', type=int, help='Hashing pool size in asgi mode (default USER_AUTH)')
+        parser.add_argument('--probe-interval', type=float, default=0.1, help='Seconds between health probes')
+        parser.add_argument('--output', help='Write the report as JSON to this file')
+
+    def handle(self, *args, **options):
+        if options['logins'] < 1 or options['workers'] < 1:
+            raise CommandError('--logins and --workers must be at least 1')
+        if options['hash_workers']:
+            # Read when the pool is first used, which is later in this process
+            settings.USER_AUTH = {**getattr(settings, 'USER_AUTH', {}), 'HASH_WORKERS': options['hash_workers']}
+
+        tag = uuid.uuid4().hex[:8]
+        school = School.objects.create(name=f'LOGIN School {tag}', code=f'LOGIN-{tag}')
+        # Hash once: every user shares the password, and seeding stays fast
+        encoded = make_password(PASSWORD)
+        users = User.objects.bulk_create([
+            User(username=f'login-{tag}-{index}', school=school, password=encoded)
+            for index in range(options['logins'])
+        ])
+        usernames = [user.username for user in users]
+        self.stdout.write(f'{len(usernames)} concurrent logins to {school.code}')
+
+        report = {'logins': len(usernames), 'modes': {}}
+        try:
+            for mode in ('wsgi', 'asgi'):
+                if options['mode'] not in ('both', mode):
+                    continue
+                school_cache().clear()
+                if mode == 'wsgi':
+                    logins, probes, wall = self.run_wsgi(school.code, usernames, options)
+                else:
+                    logins, probes, wall = asyncio.run(self.run_asgi(school.code, usernames, options))
+                report['modes'][mode] = self.summarize(logins, probes, wall)
+        finally:
+            User.objects.filter(username__startswith=f'login-{tag}-').delete()
+            school.delete()
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f'Wrote {options["output"]}')
+
+    @staticmethod
+    def payload(code, username):
+        return json.dumps({'school_code': code, 'username': username, 'password': PASSWORD})
+
+    def run_wsgi(self, code, usernames, options):
+        """All logins queued at once on a pool of --workers blocking workers"""
+        def login(username):
+            response = Client().post(LOGIN_URL, self.payload(code, username), content_type='application/json')
+            return response.status_code, time.perf_counter() - start
+
+        def probe(queued):
+            response = Client().get(PROBE_URL)
+            return response.status_code, time.perf_counter() - queued
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            start = time.perf_counter()
+            logins = [pool.submit(login, username) for username in usernames]
+            probes = []
+            while not all(future.done() for future in logins):
+                probes.append(pool.submit(probe, time.perf_counter()))
+                time.sleep(options['probe_interval'])
+            wall = time.perf_counter() - start
+            return [f.result() for f in logins], [f.result() for f in probes], wall
+
+    async def run_asgi(self, code, usernames, options):
+        """All logins in flight at once on one event loop"""
+        async def login(username):
+            response = await AsyncClient().post(LOGIN_URL, self.payload(code, username), content_type='application/json')
+            return response.status_code, time.perf_counter() - start
+
+        async def probe():
+            queued = time.perf_counter()
+            response = await AsyncClient().get(PROBE_URL)
+            return response.status_code, time.perf_counter() - queued
+
+        start = time.perf_counter()
+        logins = [asyncio.create_task(login(username)) for username in usernames]
+        probes = []
+        while not all(task.done() for task in logins):
+            probes.append(asyncio.create_task(probe()))
+            await asyncio.sleep(options['probe_interval'])
+        wall = time.perf_counter() - start
+        return await asyncio.gather(*logins), await asyncio.gather(*probes), wall
+
+    @staticmethod
+    def summarize(logins, probes, wall):
+        def latency(results):
+            values = [elapsed * 1000 for _, elapsed in results]
+            return {
+                'count': len(values),
+                'failed': sum(1 for status, _ in results if status != 200),
+                **{f'p{p}_ms': round(percentile(values, p) or 0, 1) for p in (50, 95, 99)},
+                'max_ms': round(max(values, default=0), 1),
+            }
+
+        return {
+            'wall_s': round(wall, 2),
+            'logins_per_s': round(len(logins) / wall, 1) if wall else None,
+            'login': latency(logins),
+            'probe': latency(probes),
+        }
+
+    def print_report(self, report):
+        self.stdout.write(f"{'mode':<5} {'what':<6} {'count':>6} {'failed':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for mode, result in report['modes'].items():
+            for what in ('login', 'probe'):
+                row = result[what]
+                self.stdout.write(
+                    f"{mode:<5} {what:<6} {row['count']:>6} {row['failed']:>6} {row['p50_ms']:>9} "
+                    f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}"
+                )
+            self.stdout.write(f"{mode:<5} {result['logins_per_s']} logins/s over {result['wall_s']}s")
+        if {'wsgi', 'asgi'} <= report['modes'].keys():
+            before, after = report['modes']['wsgi'], report['modes']['asgi']
+            for what in ('login', 'probe'):
+                if before[what]['p95_ms']:
+                    change = (after[what]['p95_ms'] - before[what]['p95_ms']) / before[what]['p95_ms'] * 100
+                    self.stdout.write(f'{what} p95 asgi vs wsgi: {change:+.1f}%')
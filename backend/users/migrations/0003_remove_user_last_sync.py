@@ -0,0 +1,17 @@
+# Generated by Django 4.2.8 on 2026-10-16 23:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='last_sync',
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.8 on 2026-10-17 00:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0003_student_updated_at_index'),
+        ('users', '0004_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='person',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='user', to='people.person'),
+        ),
+    ]
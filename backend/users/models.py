@@ -8,13 +8,41 @@ from django.db import models
 
 class User(AbstractUser):
     """Extended user model"""
-    person = models.OneToOneField('people.Person', on_delete=models.SET_NULL, null=True, blank=True, related_name='user')
+    # Users live in the directory database, people on their school's shard
+    person = models.OneToOneField('people.Person', on_delete=models.SET_NULL, null=True, blank=True, related_name='user', db_constraint=False)
     school = models.ForeignKey('core.School', on_delete=models.SET_NULL, null=True, blank=True)
-    last_sync = models.DateTimeField(null=True, blank=True)
     is_verified = models.BooleanField(default=False)
+    # Bumped whenever a JWT claim would change; older tokens are rejected
+    token_version = models.PositiveIntegerField(default=0)
     
     groups = models.ManyToManyField('auth.Group', related_name='custom_user_set', blank=True, help_text='The groups this user belongs to.')
     user_permissions = models.ManyToManyField('auth.Permission', related_name='custom_user_set_perm', blank=True, help_text='Specific permissions for this user.')
     
     def __str__(self):
         return self.username
+    
+    def save(self, *args, **kwargs):
+        # token_version is only bumped in SQL (AuthService.revoke_tokens), so a
+        # stale instance must not write its copy back over a revocation
+        if not self._state.adding and not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != 'token_version'
+            ]
+        super().save(*args, **kwargs)
+
+
+class ClaimsUser(User):
+    """User built from verified JWT claims, without a database query
+    
+    Only the fields carried in the token are set, so it must never be
+    saved; load the User row to modify a user.
+    """
+    
+    class Meta:
+        proxy = True
+    
+    def save(self, *args, **kwargs):
+        raise TypeError('ClaimsUser is built from token claims; load the User to modify it')
+    
+    def delete(self, *args, **kwargs):
+        raise TypeError('ClaimsUser is built from token claims; load the User to delete it')
@@ -0,0 +1,90 @@
+"""
+Revoke issued tokens when a claim they carry goes stale, and keep the
+copies of User rows on school shards in step
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from backend.core.sharding import DIRECTORY, mirror, sharded, unmirror
+from backend.people.models import Person, Student, Teacher
+from backend.users.auth import AuthService
+from backend.users.models import User
+
+# User fields copied into tokens, plus password so a reset logs devices out
+USER_CLAIM_FIELDS = ('password', 'username', 'school_id', 'person_id', 'is_staff', 'is_superuser', 'is_active')
+PERSON_CLAIM_FIELDS = ('role', 'school_id')
+
+
+def revoke_person(person_id):
+    for user_id in User.objects.using(DIRECTORY).filter(person_id=person_id).values_list('id', flat=True):
+        AuthService.revoke_tokens(user_id)
+
+
+def changed(model, instance, fields, update_fields, using):
+    """Whether saving instance to using changes any of fields"""
+    if instance._state.adding or instance.pk is None:
+        return False
+    if update_fields is not None:
+        fields = [f for f in fields if f in update_fields or f.removesuffix('_id') in update_fields]
+        if not fields:
+            return False
+    old = model._base_manager.using(using).filter(pk=instance.pk).values(*fields).first()
+    return old is not None and any(old[f] != getattr(instance, f) for f in fields)
+
+
+@receiver(pre_save, sender=User)
+def user_claims_changing(sender, instance, using, update_fields=None, **kwargs):
+    instance._revoke_tokens = changed(User, instance, USER_CLAIM_FIELDS, update_fields, using)
+
+
+@receiver(post_save, sender=User)
+def user_claims_changed(sender, instance, **kwargs):
+    if getattr(instance, '_revoke_tokens', False):
+        instance._revoke_tokens = False
+        AuthService.revoke_tokens(instance.pk)
+
+
+@receiver(pre_save, sender=Person)
+def person_claims_changing(sender, instance, using, update_fields=None, **kwargs):
+    instance._revoke_tokens = changed(Person, instance, PERSON_CLAIM_FIELDS, update_fields, using)
+
+
+@receiver(post_save, sender=Person)
+def person_claims_changed(sender, instance, **kwargs):
+    if getattr(instance, '_revoke_tokens', False):
+        instance._revoke_tokens = False
+        revoke_person(instance.pk)
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_save, sender=Student)
+def profile_created(sender, instance, created, **kwargs):
+    # Tokens carry the teacher/student id, which was None until now
+    if created:
+        revoke_person(instance.person_id)
+
+
+@receiver(post_delete, sender=Teacher)
+@receiver(post_delete, sender=Student)
+def profile_deleted(sender, instance, **kwargs):
+    revoke_person(instance.person_id)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, using, **kwargs):
+    if using == DIRECTORY and sharded():
+        # Tenant rows on the user's school shard reference its copy there
+        mirror(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, using, **kwargs):
+    if using == DIRECTORY and sharded():
+        unmirror(User, instance.pk)
+
+
+@receiver(post_delete, sender=Person)
+def person_deleted(sender, instance, using, **kwargs):
+    # On a shard, on_delete=SET_NULL only reached the copies of its users
+    if using != DIRECTORY:
+        User.objects.using(DIRECTORY).filter(person_id=instance.pk).update(person=None)
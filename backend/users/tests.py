@@ -0,0 +1,133 @@
+"""
+Users tests
+
+    python manage.py test backend/users
+"""
+import asyncio
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from backend.core.benchmarking import seed_school
+from backend.core.models import School
+from backend.core.sharding import shard_for
+from backend.people.roles import ROLES
+from backend.users.auth import AuthService, token_versions
+from backend.users.models import User
+
+
+class ClaimsTokenTests(TestCase):
+    """Tokens carry the caller's claims and are revoked when one goes stale"""
+    databases = '__all__'
+    URL = '/api/v1/auth/schools/'
+    
+    def setUp(self):
+        self.seeded = seed_school(students=1)
+        self.school = self.seeded['school']
+        self.teacher = self.seeded['teachers'][0]
+        self.user = User.objects.create(username='teacher', school=self.school, person=self.teacher.person)
+        self.user.set_password('secret')
+        self.user.save()
+        token_versions().clear()
+    
+    def login(self):
+        response = APIClient().post('/api/v1/auth/school-login/', {
+            'school_code': self.school.code, 'username': 'teacher', 'password': 'secret',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['access']
+    
+    def get(self, access, path=URL):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return client.get(path)
+    
+    def test_requests_are_authenticated_from_claims(self):
+        access = self.login()
+        self.assertEqual(self.get(access).status_code, 200)
+        
+        # Only the schools listed; the caller and their school come from the token
+        with self.assertNumQueries(1, using=shard_for(self.school.id)):
+            response = self.get(access)
+        self.assertEqual([school['id'] for school in response.data], [self.school.id])
+    
+    def test_password_change_revokes_tokens(self):
+        access = self.login()
+        self.user.set_password('changed')
+        self.user.save()
+        
+        response = self.get(access)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'token_revoked')
+    
+    def test_role_change_revokes_tokens(self):
+        access = self.login()
+        person = self.teacher.person
+        person.role = ROLES['ADMIN']
+        person.save()
+        
+        self.assertEqual(self.get(access).status_code, 401)
+        self.assertEqual(self.get(self.login()).status_code, 200)
+    
+    def test_unrelated_saves_keep_tokens(self):
+        access = self.login()
+        self.user.email = 'teacher@example.com'
+        self.user.save()
+        
+        self.assertEqual(self.get(access).status_code, 200)
+    
+    def test_tokens_without_claims_are_rejected(self):
+        self.assertEqual(self.get(str(RefreshToken.for_user(self.user).access_token)).status_code, 401)
+    
+    def test_switch_school_issues_new_tokens(self):
+        other = School.objects.create(name='Other School', code='OTHER001')
+        self.user.is_staff = True
+        self.user.save()
+        access = self.login()
+        
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = client.post('/api/v1/auth/switch-school/', {'school_id': other.id}, format='json')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get(access).status_code, 401)
+        self.assertEqual(self.get(response.data['access']).data[0]['id'], other.id)
+
+
+class AsyncLoginTests(TestCase):
+    """school_login runs as an async view under the ASGI handler"""
+    databases = '__all__'
+    URL = '/api/v1/auth/school-login/'
+    
+    @classmethod
+    def setUpTestData(cls):
+        seeded = seed_school(students=1)
+        cls.school = seeded['school']
+        cls.user = User.objects.create(username='teacher', school=cls.school, person=seeded['teachers'][0].person)
+        cls.user.set_password('secret')
+        cls.user.save()
+    
+    async def login(self, **data):
+        data = {'school_code': self.school.code, 'username': 'teacher', 'password': 'secret', **data}
+        return await self.async_client.post(self.URL, data, content_type='application/json')
+    
+    async def test_login_issues_claims_tokens(self):
+        response = await self.login()
+        
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['school']['id'], body['user']['id']), (self.school.id, self.user.id))
+        token = AccessToken(body['access'])
+        self.assertEqual((token['school_id'], token['person_id']), (self.school.id, self.user.person_id))
+    
+    async def test_concurrent_logins_all_succeed(self):
+        responses = await asyncio.gather(*[self.login() for _ in range(5)])
+        self.assertEqual([r.status_code for r in responses], [200] * 5)
+    
+    async def test_rejections(self):
+        self.assertEqual((await self.login(password='wrong')).status_code, 401)
+        self.assertEqual((await self.login(username='nobody')).status_code, 401)
+        self.assertEqual((await self.login(school_code='NOPE')).status_code, 404)
+        self.assertEqual((await self.login(password='')).status_code, 400)
+        self.assertEqual((await self.async_client.get(self.URL)).status_code, 405)